@@ -1,6 +1,6 @@
 # app/api/endpoints/__init__.py
 """API endpoints package."""
 
-from . import alerts, logs, metrics
+from . import alerts, logs, metrics, dashboard, admin, saved_searches
 
-__all__ = ["alerts", "logs", "metrics"]
\ No newline at end of file
+__all__ = ["alerts", "logs", "metrics", "dashboard", "admin", "saved_searches"]
\ No newline at end of file
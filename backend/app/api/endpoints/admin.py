@@ -0,0 +1,64 @@
+"""
+Admin-only operational endpoints.
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import Optional
+from ...core.config import settings
+from ...core.profiler import ProfilerBusyError, profile_process
+from ...core.security import is_admin
+from .logs import log_service
+
+router = APIRouter()
+
+async def require_admin(authorization: Optional[str] = Header(default=None)):
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if not is_admin(authorization):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+@router.post("/profile", dependencies=[Depends(require_admin)])
+async def profile(
+    seconds: float = Query(default=10.0, gt=0),
+    interval_ms: Optional[float] = Query(default=None, ge=1),
+    format: str = Query(default="collapsed", regex="^(collapsed|speedscope)$"),
+    tasks: bool = Query(default=True)
+):
+    """
+    Sample every thread and asyncio task of the running process for
+    ``seconds`` and return collapsed stacks or a speedscope profile.
+    """
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {settings.PROFILER_MAX_SECONDS}")
+    interval = interval_ms / 1000 if interval_ms is not None else settings.PROFILER_DEFAULT_INTERVAL_SECONDS
+    try:
+        result = await profile_process(seconds, interval, settings.PROFILER_MAX_OVERHEAD, include_tasks=tasks)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    headers = {
+        "X-Profile-Samples": str(result.samples),
+        "X-Profile-Overhead": str(round(result.overhead, 4)),
+    }
+    if format == "speedscope":
+        document = result.speedscope(f"{settings.PROJECT_NAME} process")
+        document["summary"] = result.summary()
+        return JSONResponse(document, headers=headers)
+    return PlainTextResponse(result.collapsed(), headers=headers)
+
+@router.get("/ingest/traces", dependencies=[Depends(require_admin)])
+async def get_ingest_traces(limit: int = Query(default=100, ge=1, le=1000)):
+    """
+    Sampled per-log ingest traces, newest first: when each log was received,
+    enqueued, dequeued, enriched, sent to storage and acknowledged.
+    """
+    return log_service.lineage.traces(limit)
+
+@router.get("/ingest/dead-letters", dependencies=[Depends(require_admin)])
+async def get_dead_letters(limit: int = Query(default=100, ge=1, le=1000)):
+    """
+    Log writes given up on after retries or a permanent error, newest first.
+    Every one is also kept in ``DEAD_LETTER_PATH`` for replay.
+    """
+    dead_letters = log_service.writer.dead_letters
+    return {"total": dead_letters.count, "items": dead_letters.entries(limit)}
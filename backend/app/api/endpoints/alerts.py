@@ -1,30 +1,49 @@
 """
 API endpoints for alert management and retrieval.
 """
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, Response
 from typing import List, Optional
 from datetime import datetime, timedelta
-from elasticsearch import NotFoundError
+from elasticsearch import NotFoundError, ConflictError
+from ..listing import projection
 from ...core.config import settings
-from ...models.alert import Alert, AlertCreate, AlertUpdate, AlertSeverity
+from ...models.alert import (
+    Alert, AlertCreate, AlertUpdate, AlertSeverity, AlertBulkRequest, BulkAlertAction
+)
 from fastapi import Request
 from ...services.alert_manager import AlertManager
 
 router = APIRouter()
 alert_manager = AlertManager()
 
+def _etag(version) -> Optional[str]:
+    return f'"{version[0]}:{version[1]}"' if version else None
+
+def _parse_if_match(if_match: Optional[str]):
+    """Parse an If-Match header of the form "seq_no:primary_term"."""
+    if not if_match:
+        return None
+    try:
+        seq_no, primary_term = if_match.strip('"').split(":")
+        return int(seq_no), int(primary_term)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be \"seq_no:primary_term\"")
+
 @router.get("/", response_model=List[Alert])
 async def get_alerts(
     severity: Optional[AlertSeverity] = None,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return, e.g. id,title,severity"),
     limit: int = Query(default=50, le=100),
     skip: int = 0,
 ):
     """
-    Retrieve alerts with optional filtering.
+    Retrieve alerts with optional filtering. ``fields`` returns only the
+    named fields of each alert, plus its id.
     """
     try:
+        includes = projection(fields, Alert)
         query = {
             "bool": {
                 "must": [{"match_all": {}}]
@@ -42,57 +61,124 @@ async def get_alerts(
                 time_range["lte"] = end_time.isoformat()
             query["bool"]["must"].append({"range": {"timestamp": time_range}})
         
-        return await alert_manager.get_alerts(query, limit, skip)
+        return Response(await alert_manager.get_alerts_json(query, limit, skip, includes), media_type="application/json")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/", response_model=Alert)
-async def create_alert(alert: AlertCreate):
+async def create_alert(alert: AlertCreate, wait_for: bool = False):
     """
     Create a new alert.
+    
+    Writes are buffered; pass wait_for=true to block until the alert is searchable.
+    """
+    try:
+        return await alert_manager.create_alert(alert, wait_for=wait_for)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bulk/{action}")
+async def bulk_alert_action(action: BulkAlertAction, request: AlertBulkRequest):
+    """
+    Acknowledge, assign, resolve or close many alerts at once.
+    
+    Target alerts either by `ids` or by `filter`; the filter form is applied
+    server-side with update_by_query.
     """
+    if bool(request.ids) == bool(request.filter):
+        raise HTTPException(status_code=422, detail="Provide exactly one of ids or filter")
     try:
-        return await alert_manager.create_alert(alert)
+        query = alert_manager.build_filter_query(request.filter) if request.filter else None
+        return await alert_manager.bulk_transition(
+            action,
+            ids=request.ids,
+            query=query,
+            assigned_to=request.assigned_to,
+            notes=request.notes,
+            resolution=request.resolution
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/fields/{field}/values")
+async def get_field_values(
+    field: str,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+):
+    """
+    Get every distinct value of an alert field, e.g. assigned_to, with its count.
+    """
+    try:
+        values = await alert_manager.get_distinct_values(field, prefix, limit)
+        return [{"value": value, "count": count} for value, count in values]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{alert_id}", response_model=Alert)
-async def get_alert(alert_id: str):
+async def get_alert(alert_id: str, response: Response):
     """
     Retrieve a specific alert by ID.
+    
+    The ETag header carries the version to send back in If-Match on update.
     """
     try:
-        alert = await alert_manager.get_alert(alert_id)
+        alert, version = await alert_manager.get_alert_versioned(alert_id)
         if not alert:
             raise HTTPException(status_code=404, detail="Alert not found")
+        if version:
+            response.headers["ETag"] = _etag(version)
         return alert
+    except HTTPException:
+        raise
     except NotFoundError:
         raise HTTPException(status_code=404, detail="Alert not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{alert_id}", response_model=Alert)
-async def update_alert(alert_id: str, alert_update: AlertUpdate):
+async def update_alert(
+    alert_id: str,
+    alert_update: AlertUpdate,
+    response: Response,
+    wait_for: bool = False,
+    if_match: Optional[str] = Header(default=None),
+):
     """
     Update an existing alert.
     """
+    version = _parse_if_match(if_match)
     try:
-        updated_alert = await alert_manager.update_alert(alert_id, alert_update)
+        updated_alert, new_version = await alert_manager.update_alert_versioned(
+            alert_id, alert_update, wait_for=wait_for, version=version
+        )
         if not updated_alert:
             raise HTTPException(status_code=404, detail="Alert not found")
+        if new_version:
+            response.headers["ETag"] = _etag(new_version)
         return updated_alert
+    except HTTPException:
+        raise
+    except ConflictError:
+        raise HTTPException(status_code=409, detail="Alert was modified concurrently")
     except NotFoundError:
         raise HTTPException(status_code=404, detail="Alert not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{alert_id}")
-async def delete_alert(alert_id: str):
+async def delete_alert(alert_id: str, wait_for: bool = False):
     """
     Delete an alert.
     """
     try:
-        success = await alert_manager.delete_alert(alert_id)
+        success = await alert_manager.delete_alert(alert_id, wait_for=wait_for)
         if not success:
             raise HTTPException(status_code=404, detail="Alert not found")
         return {"status": "success", "message": "Alert deleted"}
@@ -0,0 +1,33 @@
+"""
+API endpoints for composite dashboard views.
+"""
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from datetime import datetime
+from ...services.dashboard import DashboardService
+from .alerts import alert_manager
+from .logs import log_service
+from .metrics import metrics_service, TIME_RANGES
+
+router = APIRouter()
+dashboard_service = DashboardService(metrics_service, log_service, alert_manager)
+
+@router.get("/overview")
+async def get_dashboard_overview(
+    time_range: Optional[str] = Query(
+        default="24h",
+        regex="^(1h|12h|24h|7d|30d)$"
+    )
+):
+    """
+    Get every dashboard panel in a single round trip.
+    
+    Combines the dashboard metrics, threat summary, security score, log
+    statistics and alert statistics, with per-panel timings.
+    """
+    try:
+        end_time = datetime.utcnow()
+        start_time = end_time - TIME_RANGES[time_range]
+        return await dashboard_service.get_overview(start_time, end_time)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
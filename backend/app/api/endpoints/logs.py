@@ -1,62 +1,117 @@
 """
 API endpoints for log management and retrieval.
 """
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from elasticsearch import NotFoundError
+from ..listing import projection
+from ...core.json import dumps
+from ...core.readiness import StorageNotReadyError, require_ready
 from ...models.log_entry import LogEntry, LogCreate, LogLevel
 from ...services.log_ingestion import LogIngestionService
 
 router = APIRouter()
 log_service = LogIngestionService()
 
-@router.get("/", response_model=List[LogEntry])
+def _log_query(
+    level: Optional[LogLevel],
+    source: Optional[str],
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    search_term: Optional[str],
+    extracted: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    query = {
+        "bool": {
+            "must": [{"match_all": {}}]
+        }
+    }
+    
+    if level:
+        query["bool"]["must"].append({"term": {"level": level}})
+        
+    if source:
+        query["bool"]["must"].append({"term": {"source": source}})
+        
+    if search_term:
+        query["bool"]["must"].append({
+            "multi_match": {
+                "query": search_term,
+                "fields": ["message", "host", "source"]
+            }
+        })
+        
+    for field, value in (extracted or {}).items():
+        if value is not None:
+            query["bool"]["must"].append({"term": {f"fields.{field}": value}})
+        
+    if start_time or end_time:
+        time_range = {}
+        if start_time:
+            time_range["gte"] = start_time.isoformat()
+        if end_time:
+            time_range["lte"] = end_time.isoformat()
+        query["bool"]["must"].append({"range": {"timestamp": time_range}})
+    return query
+
+@router.get("/", response_model=List[LogEntry], dependencies=[Depends(require_ready)])
 async def get_logs(
     level: Optional[LogLevel] = None,
     source: Optional[str] = None,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
     search_term: Optional[str] = None,
+    user: Optional[str] = None,
+    src_ip: Optional[str] = None,
+    dst_ip: Optional[str] = None,
+    action: Optional[str] = None,
+    outcome: Optional[str] = None,
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return, e.g. id,timestamp,message"),
     limit: int = Query(default=50, le=1000),
     skip: int = 0,
 ):
     """
-    Retrieve logs with optional filtering.
+    Retrieve logs with optional filtering, including on fields extracted
+    from structured messages. ``fields`` returns only the named fields of
+    each log, plus its id.
     """
     try:
-        query = {
-            "bool": {
-                "must": [{"match_all": {}}]
-            }
-        }
-        
-        if level:
-            query["bool"]["must"].append({"term": {"level": level}})
-            
-        if source:
-            query["bool"]["must"].append({"term": {"source": source}})
-            
-        if search_term:
-            query["bool"]["must"].append({
-                "multi_match": {
-                    "query": search_term,
-                    "fields": ["message", "host", "source"]
-                }
-            })
-            
-        if start_time or end_time:
-            time_range = {}
-            if start_time:
-                time_range["gte"] = start_time.isoformat()
-            if end_time:
-                time_range["lte"] = end_time.isoformat()
-            query["bool"]["must"].append({"range": {"timestamp": time_range}})
-        
-        return await log_service.get_logs(query, limit, skip)
+        includes = projection(fields, LogEntry)
+        extracted = {"user": user, "src_ip": src_ip, "dst_ip": dst_ip, "action": action, "outcome": outcome}
+        query = _log_query(level, source, start_time, end_time, search_term, extracted)
+        return Response(await log_service.get_logs_json(query, limit, skip, includes), media_type="application/json")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/export", dependencies=[Depends(require_ready)])
+async def export_logs(
+    level: Optional[LogLevel] = None,
+    source: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    search_term: Optional[str] = None,
+    user: Optional[str] = None,
+    src_ip: Optional[str] = None,
+    dst_ip: Optional[str] = None,
+    action: Optional[str] = None,
+    outcome: Optional[str] = None,
+):
+    """
+    Stream every matching log, archived ones included, as newline-delimited JSON.
+    """
+    extracted = {"user": user, "src_ip": src_ip, "dst_ip": dst_ip, "action": action, "outcome": outcome}
+    query = _log_query(level, source, start_time, end_time, search_term, extracted)
+
+    async def lines():
+        async for log in log_service.export_logs(query):
+            yield dumps(log) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.post("/", response_model=LogEntry)
 async def create_log(log: LogCreate):
     """
@@ -64,6 +119,8 @@ async def create_log(log: LogCreate):
     """
     try:
         return await log_service.create_log(log)
+    except StorageNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -74,20 +131,39 @@ async def create_logs_batch(logs: List[LogCreate]):
     """
     try:
         return await log_service.create_logs_batch(logs)
+    except StorageNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/sources")
-async def get_log_sources():
+@router.get("/sources", dependencies=[Depends(require_ready)])
+async def get_log_sources(prefix: Optional[str] = None):
     """
     Get list of unique log sources.
     """
     try:
-        return await log_service.get_unique_sources()
+        return await log_service.get_unique_sources(prefix)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/fields/{field}/values", dependencies=[Depends(require_ready)])
+async def get_field_values(
+    field: str,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+):
+    """
+    Get every distinct value of a log field with its count.
+    """
+    try:
+        values = await log_service.get_distinct_values(field, prefix, limit)
+        return [{"value": value, "count": count} for value, count in values]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/statistics")
+@router.get("/statistics", dependencies=[Depends(require_ready)])
 async def get_log_statistics(
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
@@ -100,7 +176,7 @@ async def get_log_statistics(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/analyze")
+@router.post("/analyze", dependencies=[Depends(require_ready)])
 async def analyze_logs(
     start_time: datetime,
     end_time: datetime,
@@ -114,7 +190,22 @@ async def analyze_logs(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.delete("/")
+@router.post("/archive", dependencies=[Depends(require_ready)])
+async def archive_old_logs(
+    older_than: datetime,
+):
+    """
+    Move logs older than specified date to the cold archive.
+    """
+    try:
+        archived_count = await log_service.archive_old_logs(older_than)
+        return {"status": "success", "archived_count": archived_count}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/", dependencies=[Depends(require_ready)])
 async def delete_old_logs(
     older_than: datetime,
 ):
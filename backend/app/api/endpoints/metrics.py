@@ -1,15 +1,26 @@
 """
 API endpoints for security metrics and analytics.
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
+from ...core.config import settings
+from ...core.instrumentation import CONTENT_TYPE, REGISTRY
+from ...core.readiness import require_ready
 from ...services.threat_detection import ThreatDetectionService
 
 router = APIRouter()
 metrics_service = ThreatDetectionService()
 
-@router.get("/dashboard")
+TIME_RANGES = {
+    "1h": timedelta(hours=1),
+    "12h": timedelta(hours=12),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30)
+}
+
+@router.get("/dashboard", dependencies=[Depends(require_ready)])
 async def get_dashboard_metrics(
     time_range: Optional[str] = Query(
         default="24h",
@@ -20,34 +31,45 @@ async def get_dashboard_metrics(
     Get aggregated metrics for dashboard display.
     """
     try:
-        time_ranges = {
-            "1h": timedelta(hours=1),
-            "12h": timedelta(hours=12),
-            "24h": timedelta(hours=24),
-            "7d": timedelta(days=7),
-            "30d": timedelta(days=30)
-        }
         end_time = datetime.utcnow()
-        start_time = end_time - time_ranges[time_range]
+        start_time = end_time - TIME_RANGES[time_range]
         
         return await metrics_service.get_dashboard_metrics(start_time, end_time)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/threats/summary")
+@router.get("/threats/summary", dependencies=[Depends(require_ready)])
 async def get_threat_summary(
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
+    top_sources: int = Query(default=10, ge=1, le=1000),
 ):
     """
     Get summary of detected threats.
     """
     try:
-        return await metrics_service.get_threat_summary(start_time, end_time)
+        return await metrics_service.get_threat_summary(start_time, end_time, top_sources)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/alerts/trends")
+@router.get("/events/fields/{field}/values", dependencies=[Depends(require_ready)])
+async def get_event_field_values(
+    field: str,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+):
+    """
+    Get every distinct value of a security event field, e.g. source_ip, with its count.
+    """
+    try:
+        values = await metrics_service.get_distinct_values(field, prefix, limit)
+        return [{"value": value, "count": count} for value, count in values]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/alerts/trends", dependencies=[Depends(require_ready)])
 async def get_alert_trends(
     interval: str = Query(
         default="1h",
@@ -64,17 +86,22 @@ async def get_alert_trends(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/security-score")
-async def get_security_score():
+@router.get("/security-score", dependencies=[Depends(require_ready)])
+async def get_security_score(
+    days: Optional[int] = Query(default=None, ge=1, le=settings.SECURITY_SCORE_MAX_LOOKBACK_DAYS),
+    half_life_days: Optional[float] = Query(default=None, gt=0),
+):
     """
-    Calculate overall security score based on various metrics.
+    Calculate the security score over the last ``days`` (default
+    SECURITY_SCORE_LOOKBACK_DAYS). With ``half_life_days``, older days'
+    events count for less.
     """
     try:
-        return await metrics_service.calculate_security_score()
+        return await metrics_service.calculate_security_score(days, half_life_days)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/top-threats")
+@router.get("/top-threats", dependencies=[Depends(require_ready)])
 async def get_top_threats(
     limit: int = Query(default=10, le=50),
     start_time: Optional[datetime] = None,
@@ -88,7 +115,7 @@ async def get_top_threats(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/anomalies")
+@router.get("/anomalies", dependencies=[Depends(require_ready)])
 async def get_anomalies(
     sensitivity: float = Query(default=0.75, ge=0, le=1),
     start_time: Optional[datetime] = None,
@@ -102,7 +129,7 @@ async def get_anomalies(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/compliance")
+@router.get("/compliance", dependencies=[Depends(require_ready)])
 async def get_compliance_metrics():
     """
     Get security compliance metrics.
@@ -112,7 +139,7 @@ async def get_compliance_metrics():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/geographic")
+@router.get("/geographic", dependencies=[Depends(require_ready)])
 async def get_geographic_metrics(
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
@@ -123,4 +150,11 @@ async def get_geographic_metrics(
     try:
         return await metrics_service.get_geographic_metrics(start_time, end_time)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/internal", response_class=Response)
+async def get_internal_metrics():
+    """
+    Pipeline, storage, cache and API metrics in the Prometheus text format.
+    """
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,66 @@
+"""
+API endpoints for saved searches evaluated on ingest.
+"""
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+from ...models.saved_search import SavedSearch, SavedSearchCreate, SavedSearchNotification
+from ...services.saved_searches import SavedSearchService
+
+router = APIRouter()
+saved_search_service = SavedSearchService()
+
+@router.post("/", response_model=SavedSearch)
+async def create_saved_search(search: SavedSearchCreate):
+    """
+    Save a search to run against every ingested log.
+
+    Queries may use bool, term, terms, match, match_phrase, multi_match,
+    range, prefix and exists clauses on log fields.
+    """
+    try:
+        return await saved_search_service.create_search(search)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/", response_model=List[SavedSearch])
+async def get_saved_searches():
+    """
+    List saved searches.
+    """
+    return saved_search_service.get_searches()
+
+@router.get("/notifications", response_model=List[SavedSearchNotification])
+async def get_notifications(
+    search_id: Optional[str] = None,
+    limit: int = Query(default=100, le=1000)
+):
+    """
+    Latest saved search matches seen by this process, newest first.
+    """
+    return saved_search_service.get_notifications(limit, search_id)
+
+@router.get("/{search_id}", response_model=SavedSearch)
+async def get_saved_search(search_id: str):
+    """
+    Retrieve a saved search by ID.
+    """
+    search = saved_search_service.get_search(search_id)
+    if search is None:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    return search
+
+@router.delete("/{search_id}")
+async def delete_saved_search(search_id: str):
+    """
+    Delete a saved search.
+    """
+    try:
+        if not await saved_search_service.delete_search(search_id):
+            raise HTTPException(status_code=404, detail="Saved search not found")
+        return {"status": "success", "message": "Saved search deleted"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
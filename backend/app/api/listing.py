@@ -0,0 +1,22 @@
+"""
+Field projection for listings.
+"""
+from typing import List, Optional, Type
+from pydantic import BaseModel
+
+def projection(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """
+    _source includes for a comma-separated ``fields`` parameter, always with
+    the id; raises ValueError naming fields ``model`` does not have.
+    """
+    if not fields:
+        return None
+    includes = ["id"]
+    for path in fields.split(","):
+        path = path.strip()
+        if not path or path in includes:
+            continue
+        if path.split(".")[0] not in model.model_fields:
+            raise ValueError(f"Unknown field: {path}")
+        includes.append(path)
+    return includes
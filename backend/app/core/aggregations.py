@@ -0,0 +1,433 @@
+"""
+Reference implementations of Elasticsearch aggregations, sorting and
+source filtering over plain documents.
+
+Storage backends that cannot compute an aggregation natively fall back to
+these, so every backend answers the same requests with the same shapes.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from ipaddress import ip_address, ip_network
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .query_dsl import get_values, matches, parse_datetime, UnsupportedQueryError
+import math
+import re
+
+EPOCH = datetime(1970, 1, 1)
+INTERVALS = {
+    "s": timedelta(seconds=1), "m": timedelta(minutes=1), "h": timedelta(hours=1),
+    "d": timedelta(days=1), "w": timedelta(weeks=1),
+}
+CALENDAR_UNITS = {
+    "second": "1s", "minute": "1m", "hour": "1h", "day": "1d", "week": "1w",
+    "month": "1M", "quarter": "1q", "year": "1y",
+}
+def to_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value if value.tzinfo is None else value.astimezone(timezone.utc).replace(tzinfo=None)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return EPOCH + timedelta(milliseconds=value)
+    if isinstance(value, str):
+        try:
+            return parse_datetime(value)
+        except ValueError:
+            return None
+    return None
+
+def epoch_millis(moment: datetime) -> int:
+    return int((moment - EPOCH) / timedelta(milliseconds=1))
+
+def format_date(moment: datetime, fmt: Optional[str]) -> str:
+    if fmt == "yyyy-MM-dd":
+        return moment.strftime("%Y-%m-%d")
+    if fmt == "yyyy-MM-dd HH:mm":
+        return moment.strftime("%Y-%m-%d %H:%M")
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+def project_source(source: Dict[str, Any], includes: Optional[List[str]]) -> Dict[str, Any]:
+    """Apply _source includes, keeping dotted paths' parent objects."""
+    if includes is None:
+        return source
+    projected: Dict[str, Any] = {}
+    for path in includes:
+        parts = path.split(".")
+        if parts[-1] == "*":
+            parts = parts[:-1]
+        value: Any = source
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = projected
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return projected
+
+def source_includes(spec: Any) -> Tuple[bool, Optional[List[str]]]:
+    """Normalize the _source parameter to (return source, includes)."""
+    if spec is None or spec is True:
+        return True, None
+    if spec is False:
+        return False, None
+    if isinstance(spec, str):
+        return True, [spec]
+    if isinstance(spec, list):
+        return True, spec
+    includes = spec.get("includes")
+    return True, [includes] if isinstance(includes, str) else includes
+
+def sort_spec(sort: Any) -> List[Tuple[str, bool]]:
+    """Normalize a sort parameter to (field, descending) pairs."""
+    if sort is None:
+        return []
+    if not isinstance(sort, list):
+        sort = [sort]
+    spec = []
+    for item in sort:
+        if isinstance(item, str):
+            for part in item.split(","):
+                field, _, order = part.partition(":")
+                spec.append((field, order == "desc" or (not order and field == "_score")))
+        else:
+            field, order = next(iter(item.items()))
+            if isinstance(order, dict):
+                order = order.get("order", "asc")
+            spec.append((field, order == "desc"))
+    return spec
+
+def sort_docs(items: List[Any], sort: List[Tuple[str, bool]], source: Callable[[Any], Dict[str, Any]]) -> List[Any]:
+    """Stable multi-key sort with documents missing a field placed last."""
+    for field, descending in reversed(sort):
+        if field in ("_score", "_doc"):
+            continue
+        present = [item for item in items if sort_value(source(item), field) is not None]
+        missing = [item for item in items if sort_value(source(item), field) is None]
+        present.sort(key=lambda item: sort_value(source(item), field), reverse=descending)
+        items = present + missing
+    return items
+
+def sort_value(doc: Dict[str, Any], field: str) -> Any:
+    values = get_values(doc, field)
+    if not values:
+        return None
+    return min(values, key=lambda v: (isinstance(v, str), v)) if len(values) > 1 else values[0]
+
+def ip_value(value: Any):
+    try:
+        return ip_address(str(value))
+    except ValueError:
+        return None
+
+def geotile(point: Any, precision: int) -> Optional[str]:
+    if isinstance(point, dict):
+        lat, lon = point.get("lat"), point.get("lon")
+    elif isinstance(point, (list, tuple)) and len(point) == 2:
+        lon, lat = point
+    elif isinstance(point, str) and "," in point:
+        lat, lon = (float(part) for part in point.split(","))
+    else:
+        return None
+    tiles = 1 << precision
+    x = min(tiles - 1, max(0, int((lon + 180.0) / 360.0 * tiles)))
+    lat_rad = math.radians(max(-85.05112878, min(85.05112878, lat)))
+    y = min(tiles - 1, max(0, int((1 - math.asinh(math.tan(lat_rad)) / math.pi) / 2 * tiles)))
+    return f"{precision}/{x}/{y}"
+
+class DateInterval:
+    """Bucketing for date_histogram calendar and fixed intervals."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        raw = spec.get("calendar_interval") or spec.get("fixed_interval") or spec.get("interval")
+        if raw is None:
+            raise UnsupportedQueryError("date_histogram needs an interval")
+        raw = CALENDAR_UNITS.get(raw, raw)
+        amount, unit = int(raw[:-1] or 1), raw[-1]
+        self.months = {"M": 1, "q": 3, "y": 12}.get(unit, 0) * amount
+        self.step = None if self.months else INTERVALS[unit] * amount
+        self.weekly = unit == "w" and "calendar_interval" in spec
+
+    def floor(self, moment: datetime) -> datetime:
+        if self.months:
+            index = (moment.year * 12 + moment.month - 1) // self.months * self.months
+            return datetime(index // 12, index % 12 + 1, 1)
+        if self.weekly:
+            day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+            return day - timedelta(days=day.weekday())
+        return EPOCH + ((moment - EPOCH) // self.step) * self.step
+
+    def next(self, moment: datetime) -> datetime:
+        if self.months:
+            index = moment.year * 12 + moment.month - 1 + self.months
+            return datetime(index // 12, index % 12 + 1, 1)
+        return moment + (timedelta(weeks=1) if self.weekly else self.step)
+
+def _values(doc: Dict[str, Any], field: str) -> List[Any]:
+    return get_values(doc, field)
+
+def aggregate(aggs: Dict[str, Any], docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {name: run_aggregation(spec, docs) for name, spec in aggs.items()}
+
+def _sub(spec: Dict[str, Any], docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    sub = spec.get("aggs") or spec.get("aggregations")
+    return aggregate(sub, docs) if sub else {}
+
+def run_aggregation(spec: Dict[str, Any], docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    kind = next(key for key in spec if key not in ("aggs", "aggregations", "meta"))
+    params = spec[kind]
+    handler = AGGREGATIONS.get(kind)
+    if handler is None:
+        raise UnsupportedQueryError(f"Unsupported aggregation: {kind}")
+    return handler(params, spec, docs)
+
+def _numbers(docs: Iterable[Dict[str, Any]], field: str) -> List[float]:
+    numbers = []
+    for doc in docs:
+        for value in _values(doc, field):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                numbers.append(value)
+            elif isinstance(value, str):
+                moment = to_datetime(value)
+                if moment is not None:
+                    numbers.append(epoch_millis(moment))
+    return numbers
+
+def _metric(reducer: Callable[[List[float]], Any]):
+    def handler(params, spec, docs):
+        numbers = _numbers(docs, params["field"])
+        return {"value": reducer(numbers) if numbers else None}
+    return handler
+
+def _value_count(params, spec, docs):
+    return {"value": sum(len(_values(doc, params["field"])) for doc in docs)}
+
+def _cardinality(params, spec, docs):
+    return {"value": len({str(v) for doc in docs for v in _values(doc, params["field"])})}
+
+def _stats(params, spec, docs):
+    numbers = _numbers(docs, params["field"])
+    return {
+        "count": len(numbers),
+        "min": min(numbers) if numbers else None,
+        "max": max(numbers) if numbers else None,
+        "avg": math.fsum(numbers) / len(numbers) if numbers else None,
+        "sum": math.fsum(numbers),
+    }
+
+def _percentiles(params, spec, docs):
+    numbers = sorted(_numbers(docs, params["field"]))
+    percents = params.get("percents", [1, 5, 25, 50, 75, 95, 99])
+    values = {}
+    for percent in percents:
+        if not numbers:
+            values[str(float(percent))] = None
+            continue
+        rank = percent / 100 * (len(numbers) - 1)
+        low, high = math.floor(rank), math.ceil(rank)
+        values[str(float(percent))] = numbers[low] + (numbers[high] - numbers[low]) * (rank - low)
+    return {"values": values}
+
+def _terms(params, spec, docs):
+    field = params["field"]
+    groups: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+    for doc in docs:
+        for value in dict.fromkeys(_values(doc, field)):
+            groups[value].append(doc)
+    include = params.get("include")
+    if isinstance(include, str):
+        pattern = re.compile(include)
+        groups = {key: group for key, group in groups.items() if pattern.fullmatch(str(key))}
+    elif isinstance(include, list):
+        groups = {key: group for key, group in groups.items() if key in include}
+    min_doc_count = params.get("min_doc_count", 1)
+    ordered = sorted(groups.items(), key=lambda item: (-len(item[1]), str(item[0])))
+    order = params.get("order")
+    if order:
+        key, direction = next(iter(order.items())) if isinstance(order, dict) else next(iter(order[0].items()))
+        if key == "_key":
+            ordered.sort(key=lambda item: item[0], reverse=direction == "desc")
+        elif key == "_count":
+            ordered.sort(key=lambda item: len(item[1]), reverse=direction == "desc")
+    size = params.get("size", 10)
+    kept = [(key, group) for key, group in ordered if len(group) >= min_doc_count]
+    buckets = []
+    for key, group in kept[:size]:
+        bucket = {"key": key, "doc_count": len(group), **_sub(spec, group)}
+        if isinstance(key, bool):
+            bucket["key"], bucket["key_as_string"] = int(key), str(key).lower()
+        buckets.append(bucket)
+    return {
+        "doc_count_error_upper_bound": 0,
+        "sum_other_doc_count": sum(len(group) for _, group in kept[size:]),
+        "buckets": buckets,
+    }
+
+def _date_histogram(params, spec, docs):
+    field = params["field"]
+    interval = DateInterval(params)
+    fmt = params.get("format")
+    groups: Dict[datetime, List[Dict[str, Any]]] = defaultdict(list)
+    for doc in docs:
+        seen = set()
+        for value in _values(doc, field):
+            moment = to_datetime(value)
+            if moment is None:
+                continue
+            key = interval.floor(moment)
+            if key not in seen:
+                seen.add(key)
+                groups[key].append(doc)
+    min_doc_count = params.get("min_doc_count", 0)
+    keys = set(groups)
+    bounds = params.get("extended_bounds") or {}
+    if min_doc_count == 0:
+        low = [interval.floor(to_datetime(bounds["min"]))] if "min" in bounds else []
+        high = [interval.floor(to_datetime(bounds["max"]))] if "max" in bounds else []
+        if keys or low or high:
+            start, end = min(list(keys) + low), max(list(keys) + high)
+            moment = start
+            while moment <= end:
+                keys.add(moment)
+                moment = interval.next(moment)
+    buckets = []
+    for key in sorted(keys):
+        group = groups.get(key, [])
+        if len(group) < min_doc_count:
+            continue
+        buckets.append({
+            "key_as_string": format_date(key, fmt),
+            "key": epoch_millis(key),
+            "doc_count": len(group),
+            **_sub(spec, group)
+        })
+    return {"buckets": buckets}
+
+def _composite(params, spec, docs):
+    sources = []
+    for source in params["sources"]:
+        name, definition = next(iter(source.items()))
+        kind, options = next(iter(definition.items()))
+        if kind != "terms":
+            raise UnsupportedQueryError(f"Unsupported composite source: {kind}")
+        sources.append((name, options["field"]))
+    groups: Dict[Tuple, List[Dict[str, Any]]] = defaultdict(list)
+    for doc in docs:
+        combos = [()]
+        for _, field in sources:
+            values = list(dict.fromkeys(_values(doc, field)))
+            combos = [combo + (value,) for combo in combos for value in values]
+        for combo in combos:
+            groups[combo].append(doc)
+    keys = sorted(groups, key=lambda combo: tuple((isinstance(v, str), v) for v in combo))
+    after = params.get("after")
+    if after:
+        marker = tuple((isinstance(after[name], str), after[name]) for name, _ in sources)
+        position = bisect_right([tuple((isinstance(v, str), v) for v in k) for k in keys], marker)
+        keys = keys[position:]
+    page = keys[:params.get("size", 10)]
+    buckets = [
+        {"key": dict(zip((name for name, _ in sources), combo)), "doc_count": len(groups[combo]), **_sub(spec, groups[combo])}
+        for combo in page
+    ]
+    result = {"buckets": buckets}
+    if buckets:
+        result["after_key"] = buckets[-1]["key"]
+    return result
+
+def _filter(params, spec, docs):
+    group = [doc for doc in docs if matches(params, doc)]
+    return {"doc_count": len(group), **_sub(spec, group)}
+
+def _filters(params, spec, docs):
+    filters = params["filters"]
+    if isinstance(filters, dict):
+        return {"buckets": {name: _filter(query, spec, docs) for name, query in filters.items()}}
+    return {"buckets": [_filter(query, spec, docs) for query in filters]}
+
+def _missing(params, spec, docs):
+    group = [doc for doc in docs if not _values(doc, params["field"])]
+    return {"doc_count": len(group), **_sub(spec, group)}
+
+def _ranges(convert: Callable[[Any], Any]):
+    def handler(params, spec, docs):
+        buckets = []
+        for bound in params["ranges"]:
+            if "mask" in bound:
+                # CIDR masks bound both ends inclusively, unlike from/to
+                network = ip_network(bound["mask"], strict=False)
+                contains = lambda value: value in network
+            else:
+                low = convert(bound["from"]) if "from" in bound else None
+                high = convert(bound["to"]) if "to" in bound else None
+                contains = lambda value: (low is None or value >= low) and (high is None or value < high)
+            group = []
+            for doc in docs:
+                for value in _values(doc, params["field"]):
+                    value = convert(value)
+                    if value is None:
+                        continue
+                    if contains(value):
+                        group.append(doc)
+                        break
+            key = bound.get("key") or bound.get("mask") or f"{bound.get('from', '*')}-{bound.get('to', '*')}"
+            buckets.append({
+                "key": key,
+                **{field: bound[field] for field in ("mask", "from", "to") if field in bound},
+                "doc_count": len(group),
+                **_sub(spec, group)
+            })
+        return {"buckets": buckets}
+    return handler
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _geotile_grid(params, spec, docs):
+    precision = params.get("precision", 7)
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for doc in docs:
+        point = doc
+        for part in params["field"].split("."):
+            point = point.get(part) if isinstance(point, dict) else None
+        tile = geotile(point, precision) if point is not None else None
+        if tile:
+            groups[tile].append(doc)
+    ordered = sorted(groups.items(), key=lambda item: (-len(item[1]), item[0]))
+    return {"buckets": [
+        {"key": tile, "doc_count": len(group), **_sub(spec, group)}
+        for tile, group in ordered[:params.get("size", 10000)]
+    ]}
+
+def _top_hits(params, spec, docs):
+    docs = sort_docs(list(docs), sort_spec(params.get("sort")), lambda doc: doc)
+    _, includes = source_includes(params.get("_source"))
+    return {"hits": {
+        "total": {"value": len(docs), "relation": "eq"},
+        "hits": [{"_source": project_source(doc, includes)} for doc in docs[:params.get("size", 3)]]
+    }}
+
+AGGREGATIONS = {
+    "terms": _terms,
+    "date_histogram": _date_histogram,
+    "composite": _composite,
+    "filter": _filter,
+    "filters": _filters,
+    "missing": _missing,
+    "range": _ranges(_number),
+    "ip_range": _ranges(ip_value),
+    "geotile_grid": _geotile_grid,
+    "top_hits": _top_hits,
+    "avg": _metric(lambda values: math.fsum(values) / len(values)),
+    "max": _metric(max),
+    "min": _metric(min),
+    "sum": lambda params, spec, docs: {"value": math.fsum(_numbers(docs, params["field"]))},
+    "value_count": _value_count,
+    "cardinality": _cardinality,
+    "stats": _stats,
+    "percentiles": _percentiles,
+}
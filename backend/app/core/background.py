@@ -0,0 +1,22 @@
+"""
+Helpers for the services' background tasks.
+"""
+from typing import Iterable
+import asyncio
+
+async def stop_tasks(tasks: Iterable[asyncio.Task]):
+    """
+    Cancel tasks and wait for them to finish.
+
+    asyncio.wait_for can swallow a cancellation that arrives just as the
+    awaited result does, so cancellation is repeated until each task ends.
+    """
+    tasks = list(tasks)
+    while True:
+        pending = [task for task in tasks if not task.done()]
+        if not pending:
+            break
+        for task in pending:
+            task.cancel()
+        await asyncio.wait(pending, timeout=0.1)
+    await asyncio.gather(*tasks, return_exceptions=True)
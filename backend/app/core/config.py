@@ -2,7 +2,7 @@
 Core configuration settings for the SIEM Dashboard.
 """
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import secrets
 
 class Settings(BaseSettings):
@@ -13,10 +13,19 @@ class Settings(BaseSettings):
     # Security
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    ADMIN_USERNAMES: List[str] = []  # token subjects allowed on /admin endpoints
     
     # CORS Settings
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8000"]
     
+    # Storage Settings
+    STORAGE_BACKEND: str = "elasticsearch"  # "elasticsearch" or "embedded"
+    EMBEDDED_STORAGE_PATH: Optional[str] = "data/embedded"  # None keeps everything in memory
+    EMBEDDED_SEGMENT_ROWS: int = 65536
+    EMBEDDED_STORAGE_FSYNC: bool = False
+    STORAGE_RETRY_INITIAL_SECONDS: float = 0.5  # startup retries back off up to the max
+    STORAGE_RETRY_MAX_SECONDS: float = 30.0
+    
     # Elasticsearch Settings
     ELASTICSEARCH_HOST: str = "localhost"
     ELASTICSEARCH_PORT: int = 9200
@@ -29,6 +38,131 @@ class Settings(BaseSettings):
     RABBITMQ_USER: str = "guest"
     RABBITMQ_PASSWORD: str = "guest"
     
+    # Alert Deduplication Settings
+    ALERT_FINGERPRINT_FIELDS: List[str] = ["title", "source", "source_ip", "affected_assets"]
+    ALERT_SUPPRESSION_WINDOW_SECONDS: int = 300
+    ALERT_DEDUP_FLUSH_INTERVAL_SECONDS: float = 2.0
+    
+    # Alert Write Buffer Settings
+    ALERT_WRITE_DURABILITY: str = "buffered"  # "buffered" or "wait_for"
+    ALERT_FLUSH_INTERVAL_SECONDS: float = 0.5
+    ALERT_FLUSH_MAX_OPS: int = 500
+    ALERT_INDEX_REFRESH_SECONDS: float = 1.0  # the alerts index's refresh_interval; written alerts stay in the overlay this long
+    ALERT_BULK_CHUNK_SIZE: int = 1000
+    ALERT_BULK_CONCURRENCY: int = 4
+    
+    # Alert Notification Settings
+    NOTIFICATION_SINKS: List[Dict[str, Any]] = []  # {"type": "webhook"|"smtp"|"syslog", "name": ..., **options}
+    NOTIFICATION_DIGEST_WINDOW_SECONDS: float = 5.0  # new alerts are sent to each sink together within this window
+    NOTIFICATION_DIGEST_MAX_ALERTS: int = 100  # a digest this large is sent at once
+    NOTIFICATION_SINK_CONCURRENCY: int = 2  # digests in delivery per sink, unless the sink sets "concurrency"
+    NOTIFICATION_MAX_QUEUED_DIGESTS: int = 1000  # per sink; further digests are dead-lettered
+    NOTIFICATION_RETRY_PATH: Optional[str] = "data/notifications/retries.jsonl"  # each process locks its own retries.N.jsonl beside it; None keeps retries in memory only
+    NOTIFICATION_RETRY_BASE_SECONDS: float = 1.0
+    NOTIFICATION_RETRY_MAX_SECONDS: float = 300.0
+    NOTIFICATION_MAX_ATTEMPTS: int = 10
+    NOTIFICATION_CLOSE_TIMEOUT_SECONDS: float = 5.0  # digests still unsent at shutdown are kept for retry
+    
+    # Alert Statistics Settings
+    ALERT_STATS_RECONCILE_SECONDS: float = 300.0
+    ALERT_STATS_TREND_DAYS: int = 30
+    ALERT_STATS_MAX_UNKNOWN_TRANSITIONS: int = 100
+    
+    # Metrics Settings
+    METRICS_CACHE_TTL_SECONDS: float = 30.0
+    METRICS_CACHE_MAX_ENTRIES: int = 1024
+    METRICS_COMPOSITE_PAGE_SIZE: int = 1000
+    DISTINCT_VALUES_PAGE_SIZE: int = 10000
+    DISTINCT_VALUES_SNAPSHOT_TTL_SECONDS: float = 60.0
+    
+    # Ingest Tracing Settings
+    INGEST_FRESHNESS_SLO_SECONDS: float = 5.0  # receipt until searchable and scored
+    INGEST_TRACE_SAMPLE_RATE: float = 0.001
+    INGEST_TRACE_BUFFER_SIZE: int = 512
+    INGEST_LINEAGE_MAX_SOURCES: int = 200  # further sources share the "other" label
+    INGEST_LINEAGE_OBSERVATIONS_PER_BATCH: int = 16  # logs whose stage latencies are observed per batch, split by source share
+    INGEST_STARTUP_BUFFER_SIZE: int = 50000  # logs accepted before storage is ready
+
+    # Ingest Scheduling Settings (per-source fair queueing of log processing)
+    INGEST_SOURCE_WEIGHTS: Dict[str, float] = {  # by source name or AlertSource category; others weigh 1
+        "firewall": 4.0, "authentication": 4.0, "ids": 4.0
+    }
+    INGEST_SOURCE_RATE_LIMITS: Dict[str, float] = {}  # logs/s processed, by source name or category
+    INGEST_DEFAULT_RATE_LIMIT: Optional[float] = None  # logs/s for sources without their own limit; None is unlimited
+    INGEST_RATE_LIMIT_BURST_SECONDS: float = 1.0  # a source's bucket holds this many seconds of its rate
+    INGEST_SCHEDULER_QUANTUM: int = 100  # logs a weight-1 source is served per round
+    
+    # Bulk Writer Settings
+    BULK_MAX_BYTES: int = 5 * 1024 * 1024  # estimated request body size
+    BULK_INITIAL_ITEMS: int = 500
+    BULK_MIN_ITEMS: int = 50
+    BULK_MAX_ITEMS: int = 5000
+    BULK_MAX_CONCURRENCY: int = 8  # bulk requests in flight per writer
+    BULK_TARGET_LATENCY_SECONDS: float = 1.0  # slower responses shrink batches like a rejection
+    BULK_MAX_RETRIES: int = 5
+    BULK_RETRY_BASE_SECONDS: float = 0.1
+    BULK_RETRY_MAX_SECONDS: float = 10.0
+    DEAD_LETTER_PATH: Optional[str] = "data/dead_letters"  # None keeps dead letters in memory only
+    
+    # Query Cache Settings (log and alert listings)
+    QUERY_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # per service; 0 disables the cache
+    QUERY_CACHE_OPEN_TTL_SECONDS: float = 2.0  # time ranges reaching past the ingest watermark
+    QUERY_CACHE_SEALED_TTL_SECONDS: float = 3600.0  # time ranges ending before it
+    QUERY_CACHE_WATERMARK_LAG_SECONDS: float = 300.0  # how late logs are expected to arrive
+    
+    # Field Extraction Settings (JSON, key=value, CEF and LEEF messages)
+    FIELD_EXTRACTION_ENABLED: bool = True
+    FIELD_EXTRACTION_MAX_SOURCES: int = 10000  # sources with a cached parse plan
+    FIELD_EXTRACTION_PLAN_MISSES: int = 20  # messages in a row not fitting a plan before it is recompiled
+    
+    # Hot Window Settings (in-process index of recent logs, INGEST_MODE=local only).
+    # A window holds only the logs its own process stored, so it is off by
+    # default: enable it only when a single worker both ingests and serves reads
+    HOT_WINDOW_SECONDS: float = 0.0  # 0 disables the hot window; e.g. 900 for 15 minutes
+    HOT_WINDOW_SEGMENT_SECONDS: float = 60.0
+    HOT_WINDOW_MAX_BYTES: int = 256 * 1024 * 1024
+    
+    # Security Score Settings
+    SECURITY_SCORE_LOOKBACK_DAYS: int = 30  # default window of the security score
+    SECURITY_SCORE_HALF_LIFE_DAYS: Optional[float] = None  # a day's weight halves per half-life of age; None weighs days equally
+    SECURITY_SCORE_MAX_LOOKBACK_DAYS: int = 365  # daily partials kept in memory
+    SECURITY_SCORE_FINALIZE_AFTER_SECONDS: float = 3600.0  # wait after a day ends, for late events, before persisting it
+
+    # Saved Search Settings
+    SAVED_SEARCH_REFRESH_SECONDS: float = 30.0  # reload searches saved by other processes
+    SAVED_SEARCH_MAX_SEARCHES: int = 10000
+    SAVED_SEARCH_NOTIFICATION_BUFFER: int = 1000
+    SAVED_SEARCH_MAX_LOG_IDS: int = 20  # log ids kept per notification and alert
+    
+    # Archive Settings
+    ARCHIVE_PATH: Optional[str] = "data/archive"  # None disables the cold tier
+    ARCHIVE_AFTER_DAYS: Optional[int] = None  # move older logs to the archive periodically
+    ARCHIVE_INTERVAL_SECONDS: float = 3600.0
+    ARCHIVE_BATCH_SIZE: int = 10000  # logs read and deleted per archival round
+    ARCHIVE_ROW_GROUP_ROWS: int = 8192
+    
+    # Correlation Settings
+    CORRELATION_WINDOW_SECONDS: float = 300.0
+    CORRELATION_THRESHOLDS: Dict[str, int] = {"authentication_failure": 5}  # pattern -> events per window
+    
+    # Ingest Partitioning Settings
+    PARTITION_KEY_FIELDS: List[str] = ["host", "source"]  # first non-empty field is the key
+    PARTITION_VIRTUAL_NODES: int = 256  # points per worker on the hash ring; more evens out load
+    PARTITION_WORKER_SOCKETS: Dict[str, str] = {}  # worker name -> its ingestion process's socket
+    
+    # Ingest Channel Settings (multi-worker deployments)
+    INGEST_MODE: str = "local"  # "local", "channel" (the node's ingestion process) or "partitioned"
+    INGEST_SOCKET_PATH: str = "/tmp/siem-ingest.sock"
+    INGEST_CHANNEL_MAX_BATCH: int = 1000  # logs per frame
+    INGEST_CHANNEL_LINGER_SECONDS: float = 0.002  # wait for more logs before sending a frame
+    INGEST_CHANNEL_MAX_INFLIGHT: int = 8
+    
+    # Profiler Settings
+    PROFILER_DEFAULT_INTERVAL_SECONDS: float = 0.01
+    PROFILER_MAX_SECONDS: float = 60.0
+    PROFILER_MAX_OVERHEAD: float = 0.02  # share of wall time spent sampling
+    PROFILER_REQUEST_MIN_INTERVAL_SECONDS: float = 1.0  # between ?profile=1 requests
+    
     # Logging Settings
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -0,0 +1,237 @@
+"""
+Internal metrics in the Prometheus text exposition format.
+
+Counters and histograms are plain Python numbers updated without locks:
+every update happens on the event loop thread, and an update is a few
+attribute writes, cheap enough to sit on the ingest hot path. Histograms
+use fixed bucket bounds chosen when they are declared.
+"""
+from bisect import bisect_left
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, "_Metric"] = {}
+        self._labels: Labels = ()
+
+    def labels(self, *values: str, **named: str) -> "_Metric":
+        """The child series for one set of label values, created on first use."""
+        key = tuple(values) if values else tuple(named[name] for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._child()
+            child._labels = tuple(zip(self.labelnames, map(str, key)))
+        return child
+
+    def _child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def series(self) -> Iterable["_Metric"]:
+        return self._children.values() if self.labelnames else [self]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for series in self.series():
+            lines.extend(series.samples())
+        return lines
+
+class Counter(_Metric):
+    """A monotonically increasing total."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.value = 0
+
+    def _child(self) -> "Counter":
+        return Counter(self.name, self.help)
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self._labels)} {_format_value(self.value)}"]
+
+class Gauge(_Metric):
+    """A value read from a callback at scrape time, or set directly."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(name, help, labelnames)
+        self.value = 0
+        self.callback = callback
+
+    def _child(self) -> "Gauge":
+        return Gauge(self.name, self.help)
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, callback: Callable[[], float]):
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        value = self.callback() if self.callback is not None else self.value
+        return [f"{self.name}{_format_labels(self._labels)} {_format_value(value)}"]
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _child(self) -> "Histogram":
+        return Histogram(self.name, self.help, buckets=self.bounds)
+
+    def observe(self, value: float, count: int = 1):
+        """Record ``value``; ``count`` records it that many times at once."""
+        self.counts[bisect_left(self.bounds, value)] += count
+        self.sum += value * count
+        self.count += count
+
+    def samples(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(self._labels, ('le', _format_value(bound)))} {cumulative}")
+        labels = _format_labels(self._labels)
+        lines.append(f"{self.name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count{labels} {self.count}")
+        return lines
+
+class Registry:
+    """Named metrics and their text rendering."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} is already registered with a different type or labels")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], float]] = None
+    ) -> Gauge:
+        return self._register(Gauge(name, help, labelnames, callback))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "siem_http_request_seconds", "API request latency by method, route template and status.",
+    ["method", "route", "status"]
+)
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request by its route template.
+
+    Routes are labelled by their template (``/api/v1/alerts/{alert_id}``),
+    never the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _template(scope) -> str:
+        route = scope.get("route")
+        if route is None:
+            return "unmatched"
+        # A route inside an included router knows only its own path; the
+        # router prefix is whatever precedes the route's part of the path
+        template = route.path_format
+        try:
+            concrete = template.format(**scope.get("path_params", {}))
+        except (KeyError, IndexError, ValueError):
+            return template
+        path = scope["path"]
+        return path[:len(path) - len(concrete)] + template if path.endswith(concrete) else template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], self._template(scope), str(status)
+            ).observe(time.perf_counter() - started)
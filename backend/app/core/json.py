@@ -0,0 +1,30 @@
+"""
+Compact JSON encoding shared by storage, ingestion and the API.
+
+orjson is used when installed; the standard library otherwise. Datetimes
+are encoded as ISO strings and enums as their values.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Any
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(document: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(document, default=_default)
+    return json.dumps(document, default=_default, separators=(",", ":")).encode()
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
@@ -0,0 +1,310 @@
+"""
+Statistical profiler for the live process.
+
+A daemon thread wakes at a fixed interval and records the stack of every
+thread and, optionally, the await chain of every suspended asyncio task.
+Nothing is hooked into the interpreter, so code runs at full speed between
+samples. The sampler measures its own cost and stretches the interval so
+it never takes more than ``max_overhead`` of wall time, which keeps it
+safe to run under full load.
+
+Output is either collapsed stacks (one ``frame;frame;frame count`` line per
+distinct stack, for flamegraph.pl and speedscope) or the speedscope JSON
+format with one profile per thread and one for asyncio tasks.
+"""
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+import asyncio
+import json
+import sys
+import threading
+import time
+
+Frame = Tuple[str, str, int]
+Stack = Tuple[Frame, ...]
+
+MIN_INTERVAL_SECONDS = 0.001
+MAX_STACK_DEPTH = 128
+TASKS_TRACK = "asyncio tasks"
+
+def _frame_key(frame) -> Frame:
+    code = frame.f_code
+    return (getattr(code, "co_qualname", code.co_name), code.co_filename, frame.f_lineno)
+
+def thread_stack(frame, limit: int = MAX_STACK_DEPTH) -> Stack:
+    """Frames from the outermost call down to ``frame``."""
+    frames = []
+    while frame is not None and len(frames) < limit:
+        frames.append(_frame_key(frame))
+        frame = frame.f_back
+    return tuple(reversed(frames))
+
+def task_stack(task: asyncio.Task, limit: int = MAX_STACK_DEPTH) -> Stack:
+    """
+    The await chain of a suspended task, outermost coroutine first.
+
+    Ends in the awaitable the task is parked on, usually a future.
+    """
+    frames = [(f"task {task.get_name()}", "", 0)]
+    awaitable = task.get_coro()
+    while awaitable is not None and len(frames) < limit:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            if not hasattr(awaitable, "cr_await") and not hasattr(awaitable, "gi_yieldfrom"):
+                # A bare future's __await__ iterator is FutureIter
+                kind = type(awaitable).__name__.replace("FutureIter", "Future")
+                frames.append((f"[awaiting {kind}]", "", 0))
+            break
+        frames.append(_frame_key(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return tuple(frames)
+
+class Profile:
+    """Sample counts per stack, grouped into tracks (threads and asyncio tasks)."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.tracks: Dict[str, Counter] = {}
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.sampling_seconds = 0.0
+
+    def add(self, track: str, stack: Stack):
+        counts = self.tracks.get(track)
+        if counts is None:
+            counts = self.tracks[track] = Counter()
+        counts[stack] += 1
+
+    @property
+    def overhead(self) -> float:
+        """Share of wall time the sampler spent taking samples."""
+        return self.sampling_seconds / self.duration if self.duration else 0.0
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format, the track as the root frame."""
+        lines = []
+        for track, counts in self.tracks.items():
+            for stack, count in counts.most_common():
+                names = [track] + [name if not file else f"{name} ({file}:{line})" for name, file, line in stack]
+                lines.append(";".join(name.replace(";", ":") for name in names) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str = "siem-dashboard") -> Dict[str, Any]:
+        """The speedscope file format: one sampled profile per track."""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        profiles = []
+        for track, counts in self.tracks.items():
+            samples, weights = [], []
+            for stack, count in counts.items():
+                ids = []
+                for frame in stack:
+                    if frame not in index:
+                        index[frame] = len(frames)
+                        entry = {"name": frame[0]}
+                        if frame[1]:
+                            entry.update(file=frame[1], line=frame[2])
+                        frames.append(entry)
+                    ids.append(index[frame])
+                samples.append(ids)
+                weights.append(count * self.interval)
+            profiles.append({
+                "type": "sampled",
+                "name": track,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "siem-dashboard sampling profiler",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "duration_seconds": round(self.duration, 3),
+            "interval_seconds": self.interval,
+            "overhead": round(self.overhead, 4),
+        }
+
+class SamplingProfiler:
+    """
+    Samples stacks from a background thread until stopped.
+
+    ``task`` restricts sampling to one asyncio task (per-request profiles);
+    otherwise every thread is sampled, plus every suspended task of ``loop``
+    when one is given.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.01,
+        max_overhead: float = 0.02,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        task: Optional[asyncio.Task] = None
+    ):
+        self.interval = max(interval, MIN_INTERVAL_SECONDS)
+        self.max_overhead = max_overhead
+        self.loop = loop
+        self.task = task
+        self.profile = Profile(self.interval)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread = threading.get_ident() if loop is not None else None
+
+    def start(self) -> "SamplingProfiler":
+        self.profile.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.profile.duration = time.perf_counter() - self.profile.started
+        return self.profile
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                self.sample(own)
+            except RuntimeError:
+                # A task set or frame changed under us; skip this tick
+                pass
+            cost = time.perf_counter() - started
+            self.profile.sampling_seconds += cost
+            self.profile.samples += 1
+            # Stretch the interval so sampling stays within the overhead budget
+            self._stop.wait(max(self.interval, cost / self.max_overhead - cost))
+
+    def sample(self, own: int):
+        frames = sys._current_frames()
+        if self.task is not None:
+            self._sample_task(frames)
+            return
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in frames.items():
+            if ident != own:
+                self.profile.add(f"thread {names.get(ident, ident)}", thread_stack(frame))
+        if self.loop is not None:
+            running = asyncio.current_task(self.loop)
+            for task in list(asyncio.all_tasks(self.loop)):
+                if task is not running and not task.done():
+                    self.profile.add(TASKS_TRACK, task_stack(task))
+
+    def _sample_task(self, frames):
+        if self.task.done():
+            return
+        if asyncio.current_task(self.loop) is self.task and self._loop_thread in frames:
+            self.profile.add(f"task {self.task.get_name()}", thread_stack(frames[self._loop_thread]))
+        else:
+            self.profile.add(f"task {self.task.get_name()}", task_stack(self.task))
+
+class ProfilerBusyError(RuntimeError):
+    """Another profile is already running."""
+
+_active = threading.Lock()
+
+async def profile_process(seconds: float, interval: float, max_overhead: float, include_tasks: bool = True) -> Profile:
+    """Profile the whole process for ``seconds``; one process profile at a time."""
+    if not _active.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+    try:
+        loop = asyncio.get_running_loop()
+        profiler = SamplingProfiler(interval, max_overhead, loop if include_tasks else None).start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile = profiler.stop()
+        return profile
+    finally:
+        _active.release()
+
+class RequestProfileLimiter:
+    """At most one profiled request at a time, and no more than one per ``min_interval`` seconds."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._busy = False
+        self._last = -float("inf")
+
+    def acquire(self) -> bool:
+        now = time.monotonic()
+        if self._busy or now - self._last < self.min_interval:
+            return False
+        self._busy = True
+        self._last = now
+        return True
+
+    def release(self):
+        self._busy = False
+
+class ProfileRequestMiddleware:
+    """
+    ASGI middleware for ``?profile=1`` on any route.
+
+    For an admin caller, the request's task is sampled while it runs and
+    the profile is returned in place of the route's response, with the
+    route's own status in ``X-Profiled-Status``. ``profile_format`` picks
+    ``speedscope`` (default) or ``collapsed``. Requests from anyone else,
+    or over the rate limit, run normally.
+    """
+
+    def __init__(self, app, is_admin, interval: float, max_overhead: float, min_interval: float):
+        self.app = app
+        self.is_admin = is_admin
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.limiter = RequestProfileLimiter(min_interval)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or b"profile=1" not in scope.get("query_string", b""):
+            return await self.app(scope, receive, send)
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        headers = dict(scope.get("headers", []))
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if query.get("profile") != ["1"] or not self.is_admin(authorization) or not self.limiter.acquire():
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        loop = asyncio.get_running_loop()
+        profiler = SamplingProfiler(self.interval, self.max_overhead, loop, asyncio.current_task()).start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profile = profiler.stop()
+            self.limiter.release()
+
+        if query.get("profile_format") == ["collapsed"]:
+            body, content_type = profile.collapsed().encode(), b"text/plain; charset=utf-8"
+        else:
+            document = profile.speedscope(f"{scope['method']} {scope['path']}")
+            document["summary"] = profile.summary()
+            body, content_type = json.dumps(document).encode(), b"application/json"
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(status).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,191 @@
+"""
+Local evaluation of the Elasticsearch query DSL subset used by the services.
+"""
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, Dict, Iterator, List
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+DATE_MATH_PATTERN = re.compile(r"^now(?:([+-])(\d+)([smhdw]))?$")
+DATE_MATH_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+class UnsupportedQueryError(ValueError):
+    """Raised for query clauses that cannot be evaluated locally."""
+
+def tokenize(text: Any) -> List[str]:
+    """Lower-case word tokens, roughly what the standard analyzer produces."""
+    if text is None:
+        return []
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+def get_values(doc: Dict[str, Any], path: str) -> List[Any]:
+    """Resolve a dotted field path to the list of values it holds."""
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                found = value[part]
+                if isinstance(found, list):
+                    next_values.extend(found)
+                else:
+                    next_values.append(found)
+        values = next_values
+    return [value for value in values if value is not None]
+
+def _scalar(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else value
+
+def parse_datetime(value: str) -> datetime:
+    """Parse an ISO timestamp or simple ``now-15m`` style date math."""
+    date_math = DATE_MATH_PATTERN.match(value)
+    if date_math:
+        now = datetime.utcnow()
+        sign, amount, unit = date_math.groups()
+        if not sign:
+            return now
+        delta = timedelta(**{DATE_MATH_UNITS[unit]: int(amount)})
+        return now + delta if sign == "+" else now - delta
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _comparable(value: Any, bound: Any):
+    """Coerce a document value and a query bound to a common type."""
+    value, bound = _scalar(value), _scalar(bound)
+    if isinstance(bound, str) and bound.startswith("now"):
+        bound = parse_datetime(bound)
+    if isinstance(value, datetime) or isinstance(bound, datetime):
+        if isinstance(value, str):
+            value = parse_datetime(value)
+        if isinstance(bound, str):
+            bound = parse_datetime(bound)
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        if bound.tzinfo is not None:
+            bound = bound.astimezone(timezone.utc).replace(tzinfo=None)
+    elif isinstance(value, (int, float)) and isinstance(bound, str):
+        bound = float(bound)
+    return value, bound
+
+def _equals(value: Any, expected: Any) -> bool:
+    value, expected = _scalar(value), _scalar(expected)
+    if isinstance(value, bool) or isinstance(expected, bool):
+        return str(value).lower() == str(expected).lower()
+    return value == expected or str(value) == str(expected)
+
+def _field_and_params(clause: Dict[str, Any], value_key: str):
+    field, params = next(iter(clause.items()))
+    if isinstance(params, dict) and value_key in params:
+        return field, params[value_key], params
+    return field, params, {}
+
+def _range_matches(values: List[Any], bounds: Dict[str, Any]) -> bool:
+    for value in values:
+        try:
+            ok = True
+            for op, bound in bounds.items():
+                if op in ("format", "time_zone", "boost"):
+                    continue
+                left, right = _comparable(value, bound)
+                if op == "gte":
+                    ok = left >= right
+                elif op == "gt":
+                    ok = left > right
+                elif op == "lte":
+                    ok = left <= right
+                elif op == "lt":
+                    ok = left < right
+                else:
+                    raise UnsupportedQueryError(f"Unsupported range operator: {op}")
+                if not ok:
+                    break
+            if ok:
+                return True
+        except UnsupportedQueryError:
+            raise
+        except (TypeError, ValueError):
+            continue
+    return False
+
+def _text_matches(values: List[Any], text: Any, operator: str = "or") -> bool:
+    wanted = tokenize(text)
+    if not wanted:
+        return False
+    tokens = set()
+    for value in values:
+        tokens.update(tokenize(value))
+    if operator.lower() == "and":
+        return all(token in tokens for token in wanted)
+    return any(token in tokens for token in wanted)
+
+def iter_fields(fields: List[str]) -> Iterator[str]:
+    """Strip per-field boosts such as ``message^2``."""
+    for field in fields:
+        yield field.split("^", 1)[0]
+
+def matches(query: Dict[str, Any], doc: Dict[str, Any]) -> bool:
+    """Return whether a document satisfies a query."""
+    if not query:
+        return True
+    if len(query) != 1:
+        return all(matches({key: value}, doc) for key, value in query.items())
+
+    kind, clause = next(iter(query.items()))
+
+    if kind == "match_all":
+        return True
+    if kind == "match_none":
+        return False
+    if kind == "bool":
+        return _bool_matches(clause, doc)
+    if kind == "term":
+        field, expected, _ = _field_and_params(clause, "value")
+        return any(_equals(value, expected) for value in get_values(doc, field))
+    if kind == "terms":
+        field, expected = next((k, v) for k, v in clause.items() if k != "boost")
+        return any(_equals(value, e) for value in get_values(doc, field) for e in expected)
+    if kind == "range":
+        field, bounds = next(iter(clause.items()))
+        return _range_matches(get_values(doc, field), bounds)
+    if kind == "prefix":
+        field, prefix, _ = _field_and_params(clause, "value")
+        return any(str(_scalar(value)).startswith(str(prefix)) for value in get_values(doc, field))
+    if kind == "exists":
+        return bool(get_values(doc, clause["field"]))
+    if kind == "ids":
+        return str(doc.get("id")) in {str(v) for v in clause.get("values", [])}
+    if kind in ("match", "match_phrase"):
+        field, text, params = _field_and_params(clause, "query")
+        operator = "and" if kind == "match_phrase" else params.get("operator", "or")
+        return _text_matches(get_values(doc, field), text, operator)
+    if kind == "multi_match":
+        operator = clause.get("operator", "or")
+        values = []
+        for field in iter_fields(clause.get("fields", [])):
+            values.extend(get_values(doc, field))
+        return _text_matches(values, clause["query"], operator)
+
+    raise UnsupportedQueryError(f"Unsupported query clause: {kind}")
+
+def _as_list(clauses: Any) -> List[Dict[str, Any]]:
+    if clauses is None:
+        return []
+    return clauses if isinstance(clauses, list) else [clauses]
+
+def _bool_matches(clause: Dict[str, Any], doc: Dict[str, Any]) -> bool:
+    required = _as_list(clause.get("must")) + _as_list(clause.get("filter"))
+    if not all(matches(q, doc) for q in required):
+        return False
+    if any(matches(q, doc) for q in _as_list(clause.get("must_not"))):
+        return False
+
+    should = _as_list(clause.get("should"))
+    if should:
+        minimum = clause.get("minimum_should_match", 0 if required else 1)
+        if isinstance(minimum, str):
+            minimum = int(minimum.rstrip("%")) * len(should) // 100 if minimum.endswith("%") else int(minimum)
+        return sum(1 for q in should if matches(q, doc)) >= minimum
+    return True
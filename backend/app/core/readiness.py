@@ -0,0 +1,129 @@
+"""
+Storage readiness and background bootstrap.
+
+The app starts serving as soon as its startup handler returns; connecting
+to storage, reconciling indices and initializing the services happen in a
+background task that retries until storage answers. ``/`` reports
+liveness and ``/ready`` reports whether that bootstrap has finished.
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from ..storage.base import StorageBackend
+from ..storage.mappings import ensure_indices
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class StorageNotReadyError(RuntimeError):
+    """Storage is not connected yet and a request cannot wait for it."""
+
+class Readiness:
+    """
+    Bootstrap state: idle, starting or ready.
+
+    ``idle`` means no bootstrap is managing storage, as when tests or
+    benchmarks wire the services up themselves, and does not gate requests.
+    """
+
+    IDLE = "idle"
+    STARTING = "starting"
+    READY = "ready"
+
+    def __init__(self):
+        self.state = self.IDLE
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.started: Optional[float] = None
+        self.ready_at: Optional[datetime] = None
+        self.startup_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.READY
+
+    @property
+    def gating(self) -> bool:
+        """Whether requests that need storage should be turned away."""
+        return self.state == self.STARTING
+
+    def begin(self):
+        self.state = self.STARTING
+        self.attempts = 0
+        self.error = None
+        self.started = time.perf_counter()
+
+    def failed(self, error: Exception):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def mark_ready(self):
+        self.state = self.READY
+        self.error = None
+        self.ready_at = datetime.utcnow()
+        if self.started is not None:
+            self.startup_seconds = time.perf_counter() - self.started
+
+    def status(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"status": self.state, "attempts": self.attempts}
+        if self.error:
+            status["error"] = self.error
+        if self.startup_seconds is not None:
+            status["startup_seconds"] = round(self.startup_seconds, 4)
+        return status
+
+readiness = Readiness()
+
+async def require_ready():
+    """Dependency for routes that need storage: 503 until the bootstrap finishes."""
+    if readiness.gating:
+        raise HTTPException(
+            status_code=503,
+            detail="Storage is not ready yet",
+            headers={"Retry-After": "1"}
+        )
+
+async def bootstrap_storage(
+    state: Readiness,
+    connect: Callable[[], StorageBackend],
+    services: List[Any],
+    retry_initial: float = 0.5,
+    retry_max: float = 30.0
+) -> StorageBackend:
+    """
+    Connect, reconcile every index concurrently and initialize the services,
+    retrying with exponential backoff until it all succeeds.
+
+    ``connect`` runs in a worker thread, since opening a backend (such as
+    embedded storage loading its segments) may block. A service that
+    initialized is not initialized again on a retry.
+    """
+    storage: Optional[StorageBackend] = None
+    pending = list(services)
+    delay = retry_initial
+    while True:
+        state.attempts += 1
+        try:
+            if storage is None:
+                storage = await asyncio.to_thread(connect)
+            if not await storage.ping():
+                raise ConnectionError("storage did not answer ping")
+            await ensure_indices(storage)
+            results = await asyncio.gather(
+                *(service.initialize(storage) for service in pending), return_exceptions=True
+            )
+            pending = [service for service, result in zip(pending, results) if isinstance(result, BaseException)]
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                raise errors[0]
+            state.mark_ready()
+            logger.info(f"Storage ready after {state.attempts} attempt(s) in {state.startup_seconds:.3f}s")
+            return storage
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            state.failed(e)
+            logger.warning(f"Storage not ready (attempt {state.attempts}): {e}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, retry_max)
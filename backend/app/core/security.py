@@ -2,12 +2,16 @@
 Security utilities for authentication and authorization.
 """
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Any, Optional, Union
 from jose import jwt
-from passlib.context import CryptContext
 from .config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def pwd_context():
+    """The bcrypt context, built on first use since passlib is slow to import."""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def create_access_token(
     subject: Union[str, Any], expires_delta: Optional[timedelta] = None
@@ -28,11 +32,11 @@ def create_access_token(
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Generate password hash."""
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 def verify_token(token: str) -> Optional[str]:
     """Verify JWT token and return username."""
@@ -42,4 +46,10 @@ def verify_token(token: str) -> Optional[str]:
         )
         return payload.get("sub")
     except jwt.JWTError:
-        return None
\ No newline at end of file
+        return None
+def is_admin(authorization: Optional[str]) -> bool:
+    """Whether an ``Authorization: Bearer <jwt>`` header belongs to an admin user."""
+    if not authorization or not authorization.startswith("Bearer "):
+        return False
+    username = verify_token(authorization[len("Bearer "):])
+    return username is not None and username in settings.ADMIN_USERNAMES
@@ -0,0 +1,66 @@
+"""
+The node's ingestion process for multi-worker deployments.
+
+    python -m app.ingest_server &
+    INGEST_MODE=channel uvicorn app.main:app --workers 8
+
+API workers hand logs over the ingest channel, so storing, enrichment and
+scoring run once per node rather than once per worker.
+"""
+from .core.background import stop_tasks
+from .core.config import settings
+from .core.readiness import Readiness, bootstrap_storage
+from .services.ingest_channel import IngestServer
+from .services.alert_manager import AlertManager
+from .services.log_ingestion import LogIngestionService
+from .services.saved_searches import SavedSearchService
+from .storage.backends import create_backend
+import asyncio
+import logging
+import signal
+
+logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+async def serve():
+    """Accept logs immediately, buffering them until storage is ready, until SIGINT or SIGTERM."""
+    service = LogIngestionService()
+    # Reads are served by the API workers
+    service.hot_window = None
+    # Saved searches are evaluated where logs are processed
+    service.saved_searches = SavedSearchService()
+    alert_manager = service.saved_searches.alert_manager = AlertManager()
+    server = await IngestServer(service, settings.INGEST_SOCKET_PATH).start()
+    state = Readiness()
+    state.begin()
+    bootstrap = asyncio.create_task(bootstrap_storage(
+        state,
+        lambda: create_backend(settings),
+        [service, service.saved_searches, alert_manager],
+        retry_initial=settings.STORAGE_RETRY_INITIAL_SECONDS,
+        retry_max=settings.STORAGE_RETRY_MAX_SECONDS
+    ))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+
+    logger.info("Shutting down ingestion process")
+    await server.close()
+    await stop_tasks([bootstrap])
+    if state.ready:
+        # Give logs already queued a chance to be processed
+        try:
+            await asyncio.wait_for(service.processing_queue.join(), timeout=10)
+        except asyncio.TimeoutError:
+            logger.warning(f"{service.processing_queue.qsize()} queued logs were not processed")
+    await service.close()
+    await service.saved_searches.close()
+    await alert_manager.close()
+    if service.es_client is not None:
+        await service.es_client.close()
+
+if __name__ == "__main__":
+    asyncio.run(serve())
@@ -1,10 +1,19 @@
 """
 Main FastAPI application instance and configuration.
 """
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from elasticsearch import Elasticsearch
+from fastapi.responses import JSONResponse
+from .core.background import stop_tasks
 from .core.config import settings
+from .core.instrumentation import RequestMetricsMiddleware
+from .core.profiler import ProfileRequestMiddleware
+from .core.readiness import bootstrap_storage, readiness, require_ready
+from .core.security import is_admin
+from .services.ingest_channel import IngestClient
+from .services.partitioning import ChannelTransport, PartitionRouter
+from .storage.backends import create_backend
+import asyncio
 import logging
 
 # Configure logging
@@ -27,48 +36,71 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Initialize Elasticsearch client
-es_client = Elasticsearch(
-    [f"http://{settings.ELASTICSEARCH_HOST}:{settings.ELASTICSEARCH_PORT}"],
-    basic_auth=(settings.ELASTICSEARCH_USERNAME, settings.ELASTICSEARCH_PASSWORD) 
-    if settings.ELASTICSEARCH_USERNAME else None
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(
+    ProfileRequestMiddleware,
+    is_admin=is_admin,
+    interval=settings.PROFILER_DEFAULT_INTERVAL_SECONDS,
+    max_overhead=settings.PROFILER_MAX_OVERHEAD,
+    min_interval=settings.PROFILER_REQUEST_MIN_INTERVAL_SECONDS,
 )
 
+# Storage backend, connected in the background after startup
+storage = None
+_bootstrap = None
+
+async def _connect_storage():
+    global storage
+    storage = await bootstrap_storage(
+        readiness,
+        lambda: create_backend(settings),
+        [alerts.alert_manager, logs.log_service, metrics.metrics_service, saved_searches.saved_search_service],
+        retry_initial=settings.STORAGE_RETRY_INITIAL_SECONDS,
+        retry_max=settings.STORAGE_RETRY_MAX_SECONDS
+    )
+    logger.info(f"Connected to {settings.STORAGE_BACKEND} storage")
+
+def _ingest_client(path: str) -> IngestClient:
+    return IngestClient(
+        path,
+        max_batch=settings.INGEST_CHANNEL_MAX_BATCH,
+        linger=settings.INGEST_CHANNEL_LINGER_SECONDS,
+        max_inflight=settings.INGEST_CHANNEL_MAX_INFLIGHT
+    )
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize services on startup."""
-    try:
-        if not es_client.ping():
-            raise Exception("Elasticsearch connection failed")
-        logger.info("Successfully connected to Elasticsearch")
-        
-        # Create necessary indices if they don't exist
-        if not es_client.indices.exists(index="logs"):
-            es_client.indices.create(
-                index="logs",
-                mappings={
-                    "properties": {
-                        "timestamp": {"type": "date"},
-                        "level": {"type": "keyword"},
-                        "source": {"type": "keyword"},
-                        "message": {"type": "text"},
-                        "host": {"type": "keyword"}
-                    }
-                }
-            )
-            logger.info("Created logs index")
-            
-    except Exception as e:
-        logger.error(f"Error during startup: {e}")
-        raise e
+    """
+    Start serving immediately; storage is connected, indices reconciled and
+    services initialized by a background task that retries until it works.
+    """
+    global _bootstrap
+    if settings.INGEST_MODE == "channel":
+        logs.log_service.channel = _ingest_client(settings.INGEST_SOCKET_PATH)
+    elif settings.INGEST_MODE == "partitioned":
+        logs.log_service.channel = PartitionRouter(
+            ChannelTransport({
+                worker: _ingest_client(path) for worker, path in settings.PARTITION_WORKER_SOCKETS.items()
+            }),
+            settings.PARTITION_WORKER_SOCKETS,
+            logs.log_service.partition_key,
+            vnodes=settings.PARTITION_VIRTUAL_NODES
+        )
+    readiness.begin()
+    _bootstrap = asyncio.create_task(_connect_storage())
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
     try:
-        es_client.close()
-        logger.info("Closed Elasticsearch connection")
+        if _bootstrap is not None:
+            await stop_tasks([_bootstrap])
+        await logs.log_service.close()
+        await alerts.alert_manager.close()
+        await saved_searches.saved_search_service.close()
+        if storage is not None:
+            await storage.close()
+        logger.info("Closed storage connection")
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
 
@@ -77,13 +109,23 @@ async def root():
     """Root endpoint for health check."""
     return {"status": "healthy", "service": settings.PROJECT_NAME}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once storage is connected and indices exist."""
+    return JSONResponse(readiness.status(), status_code=200 if not readiness.gating else 503)
+
 # Import and include API routers
-from .api.endpoints import alerts, logs, metrics
+from .api.endpoints import alerts, logs, metrics, dashboard, admin, saved_searches
+
+# Logs processed here are matched against saved searches, which raise alerts
+logs.log_service.saved_searches = saved_searches.saved_search_service
+saved_searches.saved_search_service.alert_manager = alerts.alert_manager
 
 app.include_router(
     alerts.router,
     prefix=f"{settings.API_V1_STR}/alerts",
-    tags=["alerts"]
+    tags=["alerts"],
+    dependencies=[Depends(require_ready)]
 )
 
 app.include_router(
@@ -96,4 +138,24 @@ app.include_router(
     metrics.router,
     prefix=f"{settings.API_V1_STR}/metrics",
     tags=["metrics"]
-)
\ No newline at end of file
+)
+
+app.include_router(
+    dashboard.router,
+    prefix=f"{settings.API_V1_STR}/dashboard",
+    tags=["dashboard"],
+    dependencies=[Depends(require_ready)]
+)
+
+app.include_router(
+    admin.router,
+    prefix=f"{settings.API_V1_STR}/admin",
+    tags=["admin"]
+)
+
+app.include_router(
+    saved_searches.router,
+    prefix=f"{settings.API_V1_STR}/saved-searches",
+    tags=["saved-searches"],
+    dependencies=[Depends(require_ready)]
+)
@@ -1,4 +1,7 @@
 # app/models/__init__.py
 """Data models package."""
-from .alert import Alert, AlertCreate, AlertUpdate, AlertSeverity, AlertStatus, AlertSource
+from .alert import (
+    Alert, AlertCreate, AlertUpdate, AlertSeverity, AlertStatus, AlertSource,
+    AlertFilter, AlertBulkRequest, BulkAlertAction
+)
 from .log_entry import LogEntry, LogCreate, LogLevel, LogStatistics, LogAnalysis
\ No newline at end of file
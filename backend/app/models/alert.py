@@ -49,6 +49,26 @@ class AlertUpdate(BaseModel):
     assigned_to: Optional[str] = None
     resolution: Optional[str] = None
 
+class BulkAlertAction(str, Enum):
+    ACKNOWLEDGE = "acknowledge"
+    ASSIGN = "assign"
+    RESOLVE = "resolve"
+    CLOSE = "close"
+
+class AlertFilter(BaseModel):
+    severity: Optional[AlertSeverity] = None
+    status: Optional[AlertStatus] = None
+    source: Optional[AlertSource] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+
+class AlertBulkRequest(BaseModel):
+    ids: List[str] = Field(default_factory=list)
+    filter: Optional[AlertFilter] = None
+    assigned_to: Optional[str] = None
+    notes: Optional[str] = None
+    resolution: Optional[str] = None
+
 class Alert(AlertBase):
     id: str
     timestamp: datetime
@@ -63,6 +83,10 @@ class Alert(AlertBase):
     acknowledged_at: Optional[datetime] = None
     resolved_at: Optional[datetime] = None
     closed_at: Optional[datetime] = None
+    fingerprint: Optional[str] = None
+    occurrence_count: int = 1
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
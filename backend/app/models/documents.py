@@ -0,0 +1,28 @@
+"""
+Stored documents of models.
+
+Documents in storage were validated when written, so read paths can return
+them as they are instead of building models. Documents written before a
+field was added to the model lack it; ``with_defaults`` fills those in.
+"""
+from typing import Any, Dict, List, Type
+from pydantic import BaseModel
+
+_DEFAULTS: Dict[Type[BaseModel], Dict[str, Any]] = {}
+
+def defaults(model: Type[BaseModel]) -> Dict[str, Any]:
+    """The defaults of ``model``'s optional fields."""
+    if model not in _DEFAULTS:
+        _DEFAULTS[model] = {
+            name: field.get_default(call_default_factory=True)
+            for name, field in model.model_fields.items()
+            if not field.is_required()
+        }
+    return _DEFAULTS[model]
+
+def with_defaults(model: Type[BaseModel], docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """``docs`` with any missing optional fields of ``model`` set to their defaults."""
+    filled = defaults(model)
+    # Extra keys do not make up for missing fields, so compare names
+    names = filled.keys()
+    return [doc if names <= doc.keys() else {**filled, **doc} for doc in docs]
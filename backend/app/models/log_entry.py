@@ -29,6 +29,8 @@ class LogEntry(LogBase):
     timestamp: datetime
     metadata: Dict[str, Any] = Field(default_factory=dict)
     tags: list[str] = Field(default_factory=list)
+    # Typed fields extracted from structured messages; see services/field_extraction.py
+    fields: Dict[str, Any] = Field(default_factory=dict)
     processed: bool = False
     correlation_id: Optional[str] = None
     
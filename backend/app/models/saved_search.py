@@ -0,0 +1,36 @@
+"""
+Saved search data models.
+"""
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from enum import Enum
+from .alert import AlertSeverity
+
+class SavedSearchAction(str, Enum):
+    NOTIFY = "notify"
+    ALERT = "alert"
+
+class SavedSearchBase(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    description: Optional[str] = None
+    query: Dict[str, Any]
+    action: SavedSearchAction = SavedSearchAction.NOTIFY
+    severity: AlertSeverity = AlertSeverity.MEDIUM
+    enabled: bool = True
+
+class SavedSearchCreate(SavedSearchBase):
+    pass
+
+class SavedSearch(SavedSearchBase):
+    id: str
+    created_at: datetime
+
+class SavedSearchNotification(BaseModel):
+    search_id: str
+    search_name: str
+    matched_at: datetime
+    match_count: int
+    log_ids: List[str] = Field(default_factory=list)
+    first_timestamp: datetime
+    last_timestamp: datetime
@@ -2,4 +2,5 @@
 """Services package."""
 from .alert_manager import AlertManager
 from .log_ingestion import LogIngestionService
-from .threat_detection import ThreatDetectionService
\ No newline at end of file
+from .threat_detection import ThreatDetectionService
+from .dashboard import DashboardService
@@ -0,0 +1,213 @@
+"""
+Write-behind buffer for alert documents.
+"""
+from typing import List, Optional, Dict, Any, Tuple
+from dataclasses import dataclass, field
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PendingWrite:
+    """A coalesced write waiting to be sent to storage."""
+    op: str  # "index", "update" or "delete"
+    doc: Optional[Dict[str, Any]] = None
+    waiters: List[asyncio.Future] = field(default_factory=list)
+
+def combine(older: PendingWrite, newer: PendingWrite) -> PendingWrite:
+    """Coalesce two writes to the same document into one."""
+    waiters = older.waiters + newer.waiters
+    if newer.op in ("index", "delete"):
+        return PendingWrite(newer.op, newer.doc, waiters)
+    if older.op == "delete":
+        # Updating a deleted document is a no-op
+        return PendingWrite("delete", None, waiters)
+    return PendingWrite(older.op, {**older.doc, **newer.doc}, waiters)
+
+class AlertWriteBuffer:
+    """
+    Batches alert writes into bulk requests.
+
+    Writes are acknowledged as soon as they are buffered; a read-your-writes
+    overlay keeps the latest version of every document that is not yet
+    searchable so lookups from this process see it immediately. A document
+    written without a refresh stays in the overlay for ``refresh_interval``
+    after its bulk request, until the index's periodic refresh has covered
+    it, or until ``mark_refreshed``.
+    """
+
+    def __init__(
+        self,
+        index: str,
+        max_ops: int = 500,
+        refresh: Optional[str] = None,
+        refresh_interval: float = 1.0
+    ):
+        self.index = index
+        self.max_ops = max_ops
+        self.refresh = refresh
+        self.refresh_interval = refresh_interval
+        self.wakeup = asyncio.Event()
+        self._pending: Dict[str, PendingWrite] = {}
+        self._overlay: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._versions: Dict[str, int] = {}
+        # Written but maybe not yet searchable: doc id -> (searchable by, version), in write order
+        self._unrefreshed: Dict[str, Tuple[float, int]] = {}
+        self._flush_lock = asyncio.Lock()
+
+    def index_doc(self, doc: Dict[str, Any], wait_for: bool = False) -> Optional[asyncio.Future]:
+        """Buffer a full document write."""
+        return self._enqueue(doc["id"], PendingWrite("index", doc), doc, wait_for)
+
+    def update_doc(
+        self,
+        doc_id: str,
+        partial: Dict[str, Any],
+        current: Dict[str, Any],
+        wait_for: bool = False
+    ) -> Optional[asyncio.Future]:
+        """Buffer a partial update; ``current`` is the full document after it."""
+        return self._enqueue(doc_id, PendingWrite("update", partial), current, wait_for)
+
+    def delete_doc(self, doc_id: str, wait_for: bool = False) -> Optional[asyncio.Future]:
+        """Buffer a delete."""
+        return self._enqueue(doc_id, PendingWrite("delete"), None, wait_for)
+
+    def lookup(self, doc_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Return (known, doc) from the overlay; doc is None for pending deletes."""
+        self._expire(time.monotonic())
+        if doc_id in self._overlay:
+            return True, self._overlay[doc_id]
+        return False, None
+
+    def overlay(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Snapshot of documents with writes not yet searchable."""
+        self._expire(time.monotonic())
+        return dict(self._overlay)
+
+    def is_written(self, doc_id: str) -> bool:
+        """Whether a document's writes are all stored, though maybe not yet searchable."""
+        return doc_id in self._unrefreshed
+
+    def replace_overlay(self, doc_id: str, doc: Dict[str, Any]):
+        """Show a written document's newer state, changed by storage-side updates, until it is searchable."""
+        if doc_id in self._unrefreshed:
+            self._overlay[doc_id] = doc
+
+    def mark_refreshed(self, started: float):
+        """Forget documents written before an explicit refresh issued at ``started`` (``time.monotonic``)."""
+        self._expire(started + self.refresh_interval)
+
+    def _expire(self, now: float):
+        while self._unrefreshed:
+            doc_id, (searchable_by, version) = next(iter(self._unrefreshed.items()))
+            if searchable_by > now:
+                break
+            del self._unrefreshed[doc_id]
+            if doc_id not in self._pending and self._versions.get(doc_id) == version:
+                self._overlay.pop(doc_id, None)
+                self._versions.pop(doc_id, None)
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def is_full(self) -> bool:
+        return len(self._pending) >= self.max_ops
+
+    def _enqueue(
+        self,
+        doc_id: str,
+        write: PendingWrite,
+        overlay_doc: Optional[Dict[str, Any]],
+        wait_for: bool
+    ) -> Optional[asyncio.Future]:
+        waiter = None
+        if wait_for:
+            waiter = asyncio.get_running_loop().create_future()
+            write.waiters.append(waiter)
+
+        existing = self._pending.pop(doc_id, None)
+        self._pending[doc_id] = combine(existing, write) if existing else write
+        self._unrefreshed.pop(doc_id, None)
+        self._overlay[doc_id] = overlay_doc
+        self._versions[doc_id] = self._versions.get(doc_id, 0) + 1
+
+        if wait_for or self.is_full():
+            self.wakeup.set()
+        return waiter
+
+    async def flush(self, es_client) -> int:
+        """Send all buffered writes as a single bulk request."""
+        async with self._flush_lock:
+            batch = self._pending
+            if not batch:
+                return 0
+            self._pending = {}
+            versions = {doc_id: self._versions[doc_id] for doc_id in batch}
+
+            operations = []
+            for doc_id, write in batch.items():
+                action = {"_index": self.index, "_id": doc_id}
+                if write.op == "delete":
+                    operations.append({"delete": action})
+                elif write.op == "update":
+                    operations.extend([{"update": action}, {"doc": write.doc}])
+                else:
+                    operations.extend([{"index": action}, write.doc])
+
+            # Only pay for a refresh when a caller is blocked on visibility
+            refresh = "wait_for" if any(w.waiters for w in batch.values()) else self.refresh
+            kwargs = {"refresh": refresh} if refresh else {}
+
+            try:
+                result = await es_client.bulk(operations=operations, **kwargs)
+                searchable_by = time.monotonic() + self.refresh_interval
+            except Exception as e:
+                self._requeue(batch)
+                for write in batch.values():
+                    self._fail_waiters(write, e)
+                raise
+
+            failed = {}
+            if result.get("errors"):
+                for (doc_id, write), item in zip(batch.items(), result["items"]):
+                    status = next(iter(item.values())).get("status", 200)
+                    # 404 on delete/update means the document is already gone
+                    if status >= 300 and status != 404:
+                        failed[doc_id] = write
+                if failed:
+                    logger.warning(f"Requeued {len(failed)} alert writes after bulk errors")
+                    self._requeue(failed)
+
+            for doc_id, write in batch.items():
+                if doc_id in failed:
+                    self._fail_waiters(write, RuntimeError(f"Bulk write failed for alert {doc_id}"))
+                    continue
+                for waiter in write.waiters:
+                    if not waiter.done():
+                        waiter.set_result(True)
+                if doc_id not in self._pending and self._versions.get(doc_id) == versions[doc_id]:
+                    if refresh in ("wait_for", "true", True):
+                        self._overlay.pop(doc_id, None)
+                        self._versions.pop(doc_id, None)
+                    else:
+                        self._unrefreshed[doc_id] = (searchable_by, versions[doc_id])
+
+            return len(batch)
+
+    def _requeue(self, batch: Dict[str, PendingWrite]):
+        """Put failed writes back ahead of anything buffered since."""
+        newer = self._pending
+        self._pending = {}
+        for doc_id, write in batch.items():
+            self._pending[doc_id] = PendingWrite(write.op, write.doc)
+        for doc_id, write in newer.items():
+            existing = self._pending.pop(doc_id, None)
+            self._pending[doc_id] = combine(existing, write) if existing else write
+
+    def _fail_waiters(self, write: PendingWrite, error: Exception):
+        for waiter in write.waiters:
+            if not waiter.done():
+                waiter.set_exception(error)
@@ -0,0 +1,167 @@
+"""
+Alert fingerprinting and duplicate suppression.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Dict, Any, Tuple
+from dataclasses import dataclass
+import asyncio
+import hashlib
+import json
+
+def naive_utc(value: Any) -> Any:
+    """A datetime or ISO string as a naive UTC datetime, so stored and posted timestamps compare."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@dataclass
+class AlertGroup:
+    """An open alert that repeats are folded into."""
+    alert_id: str
+    fingerprint: str
+    opened_at: datetime
+    snapshot: Dict[str, Any]
+
+@dataclass
+class PendingRepeat:
+    """Repeats of an alert that have not been written to storage yet."""
+    alert_id: str
+    count: int
+    last_seen: datetime
+
+class AlertDeduplicator:
+    """
+    Folds repeated alerts into a single open alert per fingerprint.
+
+    Repeats arriving inside the suppression window only bump an in-memory
+    counter; the counters are coalesced per alert and drained in batches.
+    """
+
+    def __init__(self, fields: List[str], window_seconds: int):
+        self.fields = list(fields)
+        self.window = timedelta(seconds=window_seconds)
+        self._groups: Dict[str, AlertGroup] = {}
+        self._by_alert_id: Dict[str, str] = {}
+        self._pending: Dict[str, PendingRepeat] = {}
+        # Fingerprint -> (lock, callers holding or waiting for it)
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    def fingerprint(self, alert: Dict[str, Any]) -> str:
+        """Compute a stable fingerprint over the configured fields."""
+        parts = {}
+        for field in self.fields:
+            value = alert.get(field)
+            if isinstance(value, (list, tuple, set)):
+                value = sorted(str(v) for v in value)
+            elif hasattr(value, "value"):
+                value = value.value
+            parts[field] = value
+        canonical = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+    def lock(self, fingerprint: str) -> asyncio.Lock:
+        """Lock serializing lookup-then-create for one fingerprint; pair every call with ``release_lock``."""
+        lock, users = self._locks.get(fingerprint) or (asyncio.Lock(), 0)
+        self._locks[fingerprint] = (lock, users + 1)
+        return lock
+
+    def release_lock(self, fingerprint: str):
+        """Drop the lock for a fingerprint once no caller holds or waits on it."""
+        entry = self._locks.get(fingerprint)
+        if entry is None:
+            return
+        lock, users = entry
+        if users <= 1:
+            del self._locks[fingerprint]
+        else:
+            self._locks[fingerprint] = (lock, users - 1)
+
+    def get_open(self, fingerprint: str, now: datetime) -> Optional[AlertGroup]:
+        """Return the open group for a fingerprint if its window is still open."""
+        group = self._groups.get(fingerprint)
+        if group is None:
+            return None
+        if naive_utc(now) - group.opened_at >= self.window:
+            self._close(fingerprint)
+            return None
+        return group
+
+    def open(self, alert_dict: Dict[str, Any], opened_at: datetime) -> AlertGroup:
+        """Register an alert as the target for subsequent repeats."""
+        for field in ("timestamp", "first_seen", "last_seen"):
+            if alert_dict.get(field) is not None:
+                alert_dict[field] = naive_utc(alert_dict[field])
+        group = AlertGroup(
+            alert_id=alert_dict["id"],
+            fingerprint=alert_dict["fingerprint"],
+            opened_at=naive_utc(opened_at),
+            snapshot=alert_dict
+        )
+        self._groups[group.fingerprint] = group
+        self._by_alert_id[group.alert_id] = group.fingerprint
+        return group
+
+    def record_repeat(self, group: AlertGroup, seen_at: datetime, coalesce: bool = True) -> Dict[str, Any]:
+        """Fold a repeat into its group, queueing the counter update unless told not to."""
+        seen_at = naive_utc(seen_at)
+        if coalesce:
+            pending = self._pending.get(group.alert_id)
+            if pending is None:
+                pending = self._pending[group.alert_id] = PendingRepeat(group.alert_id, 0, seen_at)
+            pending.count += 1
+            pending.last_seen = max(pending.last_seen, seen_at)
+
+        snapshot = group.snapshot
+        snapshot["occurrence_count"] = snapshot.get("occurrence_count", 1) + 1
+        snapshot["last_seen"] = max(snapshot.get("last_seen") or seen_at, seen_at)
+        return snapshot
+
+    def update_snapshot(self, alert_id: str, changes: Dict[str, Any]):
+        """Keep the cached copy of an open alert in step with updates."""
+        fingerprint = self._by_alert_id.get(alert_id)
+        if fingerprint is not None:
+            self._groups[fingerprint].snapshot.update(changes)
+
+    def release(self, alert_id: str):
+        """Stop folding into an alert, e.g. once it is resolved or deleted."""
+        fingerprint = self._by_alert_id.get(alert_id)
+        if fingerprint is not None:
+            self._close(fingerprint)
+
+    def release_where(self, predicate: Callable[[Dict[str, Any]], bool]):
+        """Stop folding into every open alert whose snapshot satisfies a predicate."""
+        for fingerprint in [f for f, group in self._groups.items() if predicate(group.snapshot)]:
+            self._close(fingerprint)
+
+    def drain(self) -> List[PendingRepeat]:
+        """Take all pending repeat counters, leaving the buffer empty."""
+        pending = list(self._pending.values())
+        self._pending = {}
+        return pending
+
+    def requeue(self, repeats: List[PendingRepeat]):
+        """Put back counters whose write failed so they are retried."""
+        for repeat in repeats:
+            pending = self._pending.get(repeat.alert_id)
+            if pending is None:
+                self._pending[repeat.alert_id] = repeat
+            else:
+                pending.count += repeat.count
+                pending.last_seen = max(pending.last_seen, repeat.last_seen)
+
+    def prune(self, now: datetime):
+        """Forget groups whose suppression window has elapsed."""
+        now = naive_utc(now)
+        expired = [
+            fingerprint for fingerprint, group in self._groups.items()
+            if now - group.opened_at >= self.window
+        ]
+        for fingerprint in expired:
+            self._close(fingerprint)
+
+    def _close(self, fingerprint: str):
+        group = self._groups.pop(fingerprint, None)
+        if group is not None:
+            self._by_alert_id.pop(group.alert_id, None)
@@ -2,178 +2,783 @@
 Alert management service.
 """
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from elasticsearch import NotFoundError
-from ..models.alert import Alert, AlertCreate, AlertUpdate, AlertStatus
+from ..models.alert import (
+    Alert, AlertCreate, AlertUpdate, AlertStatus, AlertFilter, BulkAlertAction
+)
+from ..core.aggregations import project_source
+from ..models.documents import with_defaults
 from ..core.config import settings
+from ..core.background import stop_tasks
+from ..core.instrumentation import REGISTRY
+from ..core.json import dumps, loads
+from ..storage.base import StorageBackend
+from ..storage.bulk_writer import DeadLetterStore
+from ..storage.mappings import ensure_index
+from ..storage.scripts import register_script
+from ..core.query_dsl import matches, parse_datetime, UnsupportedQueryError
+from .alert_dedup import AlertDeduplicator
+from .alert_buffer import AlertWriteBuffer
+from .alert_stats import AlertCounters
+from .distinct_values import DistinctValues
+from .notifications import NotificationDispatcher, build_sinks
+from .query_cache import QueryCache, query_key
 import logging
+import asyncio
+import os
+import time
 import uuid
 
 logger = logging.getLogger(__name__)
 
+BUFFERED_WRITES = REGISTRY.gauge("siem_alert_buffered_writes", "Alert writes waiting for the next bulk flush.")
+
+# Folds a batch of coalesced repeats into the stored alert
+REPEAT_SCRIPT = (
+    "ctx._source.occurrence_count = "
+    "(ctx._source.occurrence_count == null ? 1 : ctx._source.occurrence_count) + params.count; "
+    "ctx._source.last_seen = params.last_seen"
+)
+
+# Applies a state transition, skipping the write if nothing would change
+TRANSITION_SCRIPT = (
+    "boolean changed = false; "
+    "for (entry in params.changes.entrySet()) { "
+    "if (ctx._source[entry.getKey()] != entry.getValue()) { changed = true; } } "
+    "if (changed) { ctx._source.putAll(params.changes); ctx._source.putAll(params.stamps); } "
+    "else { ctx.op = 'noop'; }"
+)
+
+BULK_ACTION_STATUS = {
+    BulkAlertAction.ACKNOWLEDGE: AlertStatus.ACKNOWLEDGED,
+    BulkAlertAction.RESOLVE: AlertStatus.RESOLVED,
+    BulkAlertAction.CLOSE: AlertStatus.CLOSED,
+}
+
+STATUS_TIMESTAMPS = {
+    AlertStatus.ACKNOWLEDGED: "acknowledged_at",
+    AlertStatus.RESOLVED: "resolved_at",
+    AlertStatus.CLOSED: "closed_at",
+}
+
+Version = Tuple[int, int]  # (seq_no, primary_term)
+
+@register_script(REPEAT_SCRIPT)
+def _apply_repeat(ctx: Dict[str, Any], params: Dict[str, Any]):
+    source = ctx["_source"]
+    source["occurrence_count"] = (source.get("occurrence_count") or 1) + params["count"]
+    source["last_seen"] = params["last_seen"]
+
+@register_script(TRANSITION_SCRIPT)
+def _apply_transition(ctx: Dict[str, Any], params: Dict[str, Any]):
+    source = ctx["_source"]
+    if any(source.get(key) != value for key, value in params["changes"].items()):
+        source.update(params["changes"])
+        source.update(params["stamps"])
+    else:
+        ctx["op"] = "noop"
+
 class AlertManager:
+    # Keyword fields of alerts that can be listed in full
+    DISTINCT_FIELDS = ("assigned_to", "source", "tags", "affected_assets")
+
     def __init__(self):
         self.index = "alerts"
         self.es_client = None  # Will be initialized in startup
+        self.dedup = AlertDeduplicator(
+            settings.ALERT_FINGERPRINT_FIELDS,
+            settings.ALERT_SUPPRESSION_WINDOW_SECONDS
+        )
+        self.dedup_flush_interval = settings.ALERT_DEDUP_FLUSH_INTERVAL_SECONDS
+        self.buffer = AlertWriteBuffer(
+            self.index,
+            max_ops=settings.ALERT_FLUSH_MAX_OPS,
+            refresh_interval=settings.ALERT_INDEX_REFRESH_SECONDS
+        )
+        self.flush_interval = settings.ALERT_FLUSH_INTERVAL_SECONDS
+        self.wait_for_writes = settings.ALERT_WRITE_DURABILITY == "wait_for"
+        self.bulk_chunk_size = settings.ALERT_BULK_CHUNK_SIZE
+        self.bulk_concurrency = settings.ALERT_BULK_CONCURRENCY
+        self.counters = AlertCounters(trend_days=settings.ALERT_STATS_TREND_DAYS)
+        # Snapshots are dropped by writes that change the listed fields
+        self.distinct = DistinctValues(
+            page_size=settings.DISTINCT_VALUES_PAGE_SIZE,
+            snapshot_ttl=settings.DISTINCT_VALUES_SNAPSHOT_TTL_SECONDS
+        )
+        # Alerts change status at any age, so every write empties the cache
+        # and no range is sealed: other workers' updates show within open_ttl
+        self.query_cache = QueryCache(
+            max_bytes=settings.QUERY_CACHE_MAX_BYTES,
+            open_ttl=settings.QUERY_CACHE_OPEN_TTL_SECONDS,
+            sealed_ttl=settings.QUERY_CACHE_OPEN_TTL_SECONDS,
+            watermark_lag=settings.QUERY_CACHE_WATERMARK_LAG_SECONDS,
+            name=self.index
+        )
+        # New alerts are notified out of band, never inside create_alert
+        self.notifier = NotificationDispatcher(
+            build_sinks(settings.NOTIFICATION_SINKS, settings.NOTIFICATION_SINK_CONCURRENCY),
+            window=settings.NOTIFICATION_DIGEST_WINDOW_SECONDS,
+            max_alerts=settings.NOTIFICATION_DIGEST_MAX_ALERTS,
+            max_queued=settings.NOTIFICATION_MAX_QUEUED_DIGESTS,
+            retry_path=settings.NOTIFICATION_RETRY_PATH,
+            retry_base=settings.NOTIFICATION_RETRY_BASE_SECONDS,
+            retry_max=settings.NOTIFICATION_RETRY_MAX_SECONDS,
+            max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS,
+            close_timeout=settings.NOTIFICATION_CLOSE_TIMEOUT_SECONDS,
+            dead_letters=DeadLetterStore(
+                os.path.join(settings.DEAD_LETTER_PATH, "notifications.jsonl") if settings.DEAD_LETTER_PATH else None
+            )
+        )
+        self.reconcile_interval = settings.ALERT_STATS_RECONCILE_SECONDS
+        self.reconcile_requested = asyncio.Event()
+        self._reconcile_lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
         
-    async def initialize(self, es_client):
-        """Initialize the alert manager with elasticsearch client."""
+    async def initialize(self, es_client: StorageBackend):
+        """Initialize the alert manager with a storage backend."""
         self.es_client = es_client
         await self._ensure_index()
+        await self.notifier.initialize()
+        BUFFERED_WRITES.set_function(self.buffer.pending_count)
+        self._tasks = [
+            asyncio.create_task(self._flush_writes_loop()),
+            asyncio.create_task(self._flush_repeats_loop()),
+            asyncio.create_task(self._reconcile_loop())
+        ]
+    
+    async def close(self):
+        """Stop background tasks and write out anything still buffered."""
+        await stop_tasks(self._tasks)
+        self._tasks = []
+        if self.es_client is not None:
+            await self.flush()
+        await self.notifier.close()
     
     async def _ensure_index(self):
         """Ensure alert index exists with proper mappings."""
-        if not await self.es_client.indices.exists(index=self.index):
-            await self.es_client.indices.create(
-                index=self.index,
-                mappings={
-                    "properties": {
-                        "title": {"type": "text"},
-                        "description": {"type": "text"},
-                        "severity": {"type": "keyword"},
-                        "status": {"type": "keyword"},
-                        "source": {"type": "keyword"},
-                        "timestamp": {"type": "date"},
-                        "source_ip": {"type": "ip"},
-                        "destination_ip": {"type": "ip"},
-                        "affected_assets": {"type": "keyword"},
-                        "tags": {"type": "keyword"},
-                        "assigned_to": {"type": "keyword"},
-                        "acknowledged_at": {"type": "date"},
-                        "resolved_at": {"type": "date"},
-                        "closed_at": {"type": "date"}
-                    }
-                }
-            )
+        await ensure_index(self.es_client, self.index)
     
-    async def create_alert(self, alert: AlertCreate) -> Alert:
-        """Create a new alert."""
+    async def create_alert(self, alert: AlertCreate, wait_for: bool = False) -> Alert:
+        """Create a new alert, folding it into an open duplicate if one exists."""
         alert_dict = alert.model_dump()
-        alert_dict["id"] = str(uuid.uuid4())
+        fingerprint = self.dedup.fingerprint(alert_dict)
+        now = datetime.utcnow()
+        
+        try:
+            async with self.dedup.lock(fingerprint):
+                group = self.dedup.get_open(fingerprint, now)
+                if group is None:
+                    group = await self._find_open_alert(fingerprint, now)
+                if group is not None:
+                    return await self._record_repeat(group, alert_dict["timestamp"])
+                
+                alert_dict["id"] = str(uuid.uuid4())
+                alert_dict["status"] = AlertStatus.NEW
+                alert_dict["fingerprint"] = fingerprint
+                alert_dict["occurrence_count"] = 1
+                alert_dict["first_seen"] = alert_dict["timestamp"]
+                alert_dict["last_seen"] = alert_dict["timestamp"]
+                
+                self.dedup.open(dict(alert_dict), now)
+                self.counters.record_create(alert_dict)
+                waiter = self.buffer.index_doc(dict(alert_dict), wait_for or self.wait_for_writes)
+                self.query_cache.invalidate(self.index)
+                self.distinct.invalidate(self.index)
+                self.notifier.notify(dict(alert_dict))
+        finally:
+            self.dedup.release_lock(fingerprint)
         
-        await self.es_client.index(
+        await self._await_write(waiter)
+        return Alert(**alert_dict)
+    
+    async def _record_repeat(self, group, seen_at: datetime) -> Alert:
+        """Fold a repeat into an open alert."""
+        known, pending_doc = self.buffer.lookup(group.alert_id)
+        written = self.buffer.is_written(group.alert_id)
+        # Alerts still in the write buffer absorb the repeat directly
+        snapshot = self.dedup.record_repeat(group, seen_at, coalesce=not known or written)
+        self.query_cache.invalidate(self.index)
+        if known and pending_doc is not None:
+            counters = {
+                "occurrence_count": snapshot["occurrence_count"],
+                "last_seen": snapshot["last_seen"]
+            }
+            if written:
+                self.buffer.replace_overlay(group.alert_id, {**pending_doc, **counters})
+            else:
+                self.buffer.update_doc(group.alert_id, counters, {**pending_doc, **counters})
+                await self._await_write(None)
+        return Alert(**snapshot)
+    
+    async def _find_open_alert(self, fingerprint: str, now: datetime):
+        """Look up an open alert with this fingerprint written by an earlier run."""
+        window_start = now - self.dedup.window
+        result = await self.es_client.search(
             index=self.index,
-            id=alert_dict["id"],
-            document=alert_dict,
-            refresh=True
+            query={
+                "bool": {
+                    "filter": [
+                        {"term": {"fingerprint": fingerprint}},
+                        {"range": {"first_seen": {"gte": window_start.isoformat()}}}
+                    ],
+                    "must_not": [
+                        {"terms": {"status": [AlertStatus.RESOLVED.value, AlertStatus.CLOSED.value]}}
+                    ]
+                }
+            },
+            size=1,
+            sort=[{"first_seen": {"order": "desc"}}]
         )
+        hits = result["hits"]["hits"]
+        if not hits:
+            return None
         
-        return Alert(**alert_dict)
+        alert_dict = hits[0]["_source"]
+        first_seen = alert_dict.get("first_seen") or alert_dict["timestamp"]
+        if isinstance(first_seen, str):
+            first_seen = datetime.fromisoformat(first_seen)
+        return self.dedup.open(alert_dict, first_seen)
+    
+    async def _flush_writes_loop(self):
+        """Background task flushing buffered alert writes on an interval or size trigger."""
+        while True:
+            try:
+                await asyncio.wait_for(self.buffer.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.buffer.wakeup.clear()
+            try:
+                await self.buffer.flush(self.es_client)
+            except Exception as e:
+                logger.error(f"Error flushing alert writes: {e}")
+                await asyncio.sleep(1)  # Prevent tight loop on error
+    
+    async def _await_write(self, waiter: Optional[asyncio.Future]):
+        """Block on a durable write, or apply backpressure when the buffer overflows."""
+        if waiter is not None:
+            await self.buffer.flush(self.es_client)
+            await waiter
+        elif self.buffer.pending_count() >= self.buffer.max_ops * 4:
+            await self.buffer.flush(self.es_client)
+    
+    async def flush(self):
+        """Write everything buffered, including coalesced repeats."""
+        await self.buffer.flush(self.es_client)
+        await self.flush_repeats()
+    
+    async def _flush_repeats_loop(self):
+        """Background task writing coalesced repeat counters."""
+        while True:
+            await asyncio.sleep(self.dedup_flush_interval)
+            try:
+                await self.flush_repeats()
+            except Exception as e:
+                logger.error(f"Error flushing alert repeats: {e}")
+    
+    async def flush_repeats(self) -> int:
+        """Write pending repeat counters as one bulk request."""
+        self.dedup.prune(datetime.utcnow())
+        repeats = self.dedup.drain()
+        if not repeats:
+            return 0
+        
+        operations = []
+        for repeat in repeats:
+            operations.extend([
+                {"update": {"_index": self.index, "_id": repeat.alert_id, "retry_on_conflict": 3}},
+                {
+                    "script": {
+                        "source": REPEAT_SCRIPT,
+                        "lang": "painless",
+                        "params": {
+                            "count": repeat.count,
+                            "last_seen": repeat.last_seen.isoformat()
+                        }
+                    }
+                }
+            ])
+        
+        try:
+            result = await self.es_client.bulk(operations=operations)
+        except Exception:
+            self.dedup.requeue(repeats)
+            raise
+        self.query_cache.invalidate(self.index)
+        
+        if result.get("errors"):
+            failed = []
+            for repeat, item in zip(repeats, result["items"]):
+                status = item["update"].get("status", 200)
+                # A missing alert was deleted in the meantime; nothing to retry
+                if status >= 300 and status != 404:
+                    failed.append(repeat)
+            self.dedup.requeue(failed)
+            if failed:
+                logger.warning(f"Requeued {len(failed)} alert repeat updates after bulk errors")
+        
+        return len(repeats)
     
     async def get_alert(self, alert_id: str) -> Optional[Alert]:
         """Retrieve an alert by ID."""
+        alert, _ = await self.get_alert_versioned(alert_id)
+        return alert
+    
+    async def get_alert_versioned(self, alert_id: str) -> Tuple[Optional[Alert], Optional[Version]]:
+        """Retrieve an alert with its (seq_no, primary_term) for optimistic concurrency."""
+        known, pending_doc = self.buffer.lookup(alert_id)
+        if known:
+            return (Alert(**pending_doc) if pending_doc is not None else None), None
         try:
             result = await self.es_client.get(
                 index=self.index,
                 id=alert_id
             )
-            return Alert(**result["_source"])
+            self.counters.remember(result["_source"])
+            return Alert(**result["_source"]), _version_of(result)
         except NotFoundError:
-            return None
+            return None, None
     
     async def get_alerts(self, query: Dict[str, Any], limit: int = 50, skip: int = 0) -> List[Alert]:
-        """Retrieve multiple alerts based on query."""
+        """Retrieve multiple alerts based on query, from the query cache when possible."""
+        return [Alert(**doc) for doc in loads(await self.get_alerts_json(query, limit, skip))]
+
+    async def get_alerts_json(
+        self,
+        query: Dict[str, Any],
+        limit: int = 50,
+        skip: int = 0,
+        includes: Optional[List[str]] = None
+    ) -> bytes:
+        """The alerts ``get_alerts`` returns as a JSON array of their stored documents, optionally projected."""
+        key = query_key(self.index, query, sort="timestamp:desc", skip=skip, limit=limit, includes=includes)
+
+        async def search():
+            docs = await self._search_alerts(query, limit, skip, includes)
+            encoded = dumps(docs if includes is not None else with_defaults(Alert, docs))
+            return encoded, len(key) + len(encoded)
+
+        return await self.query_cache.get_or_compute(self.es_client, key, self.index, query, search)
+
+    async def _search_alerts(
+        self,
+        query: Dict[str, Any],
+        limit: int,
+        skip: int,
+        includes: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        overlay = self.buffer.overlay()
+        try:
+            buffered = [doc for doc in overlay.values() if doc is not None and matches(query, doc)]
+        except UnsupportedQueryError as e:
+            # Storage has to answer on its own: make every buffered alert visible to it
+            logger.debug(f"Serving alert listing from storage after a refresh: {e}")
+            await self._make_buffered_searchable()
+            overlay = {}
+        if not overlay:
+            result = await self.es_client.search(
+                index=self.index,
+                query=query,
+                size=limit,
+                from_=skip,
+                sort=[{"timestamp": {"order": "desc"}}],
+                **({} if includes is None else {"source_includes": includes})
+            )
+            docs = [hit["_source"] for hit in result["hits"]["hits"]]
+            if includes is None:
+                for doc in docs:
+                    self.counters.remember(doc)
+            return docs
+        
+        # Over-fetch so stale copies of buffered alerts can be swapped out
         result = await self.es_client.search(
             index=self.index,
             query=query,
-            size=limit,
-            from_=skip,
+            size=skip + limit + len(overlay),
+            from_=0,
             sort=[{"timestamp": {"order": "desc"}}]
         )
+        docs = [
+            hit["_source"] for hit in result["hits"]["hits"]
+            if hit["_id"] not in overlay
+        ]
+        for doc in docs:
+            self.counters.remember(doc)
+        docs.extend(buffered)
         
-        return [Alert(**hit["_source"]) for hit in result["hits"]["hits"]]
+        docs.sort(key=lambda doc: _as_datetime(doc["timestamp"]), reverse=True)
+        return [project_source(doc, includes) for doc in docs[skip:skip + limit]]
     
-    async def update_alert(self, alert_id: str, alert_update: AlertUpdate) -> Optional[Alert]:
+    async def _make_buffered_searchable(self):
+        """Write and refresh every buffered alert, so storage alone answers searches."""
+        await self.buffer.flush(self.es_client)
+        refresh_started = time.monotonic()
+        await self.es_client.indices.refresh(index=self.index)
+        self.buffer.mark_refreshed(refresh_started)
+
+    async def get_distinct_values(
+        self,
+        field: str,
+        prefix: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, int]]:
+        """Get every value of an alert field with its alert count, optionally by prefix."""
+        if field not in self.DISTINCT_FIELDS:
+            raise ValueError(f"Distinct values are not available for field: {field}")
+        if not self.distinct.has_snapshot(self.index, field) and self.buffer.overlay():
+            # A new snapshot walks storage, which has to include the buffered writes
+            await self._make_buffered_searchable()
+        values = await self.distinct.get(self.es_client, self.index, field, prefix)
+        return values[:limit] if limit else values
+
+    async def update_alert(
+        self,
+        alert_id: str,
+        alert_update: AlertUpdate,
+        wait_for: bool = False,
+        version: Optional[Version] = None
+    ) -> Optional[Alert]:
         """Update an existing alert."""
+        alert, _ = await self.update_alert_versioned(alert_id, alert_update, wait_for, version)
+        return alert
+    
+    async def update_alert_versioned(
+        self,
+        alert_id: str,
+        alert_update: AlertUpdate,
+        wait_for: bool = False,
+        version: Optional[Version] = None
+    ) -> Tuple[Optional[Alert], Optional[Version]]:
+        """
+        Update an alert in a single round trip, returning the stored result.
+        
+        When a version is given the write only succeeds if the alert has not
+        changed since it was read; otherwise ConflictError is raised.
+        """
+        update_dict = alert_update.model_dump(exclude_unset=True)
+        update_dict.update(_status_timestamps(update_dict.get("status")))
+        
+        known, pending_doc = self.buffer.lookup(alert_id)
+        if known and version is not None:
+            # Only storage can check a version, so buffered writes go first
+            await self.buffer.flush(self.es_client)
+            known = False
+        if known:
+            if pending_doc is None:
+                return None, None
+            self._after_update(alert_id, update_dict, previous=pending_doc.get("status"))
+            alert_dict = {**pending_doc, **update_dict}
+            waiter = self.buffer.update_doc(
+                alert_id, update_dict, alert_dict, wait_for or self.wait_for_writes
+            )
+            await self._await_write(waiter)
+            return Alert(**alert_dict), None
+        
+        kwargs = {}
+        if version is not None:
+            kwargs["if_seq_no"], kwargs["if_primary_term"] = version
+        if wait_for or self.wait_for_writes:
+            kwargs["refresh"] = "wait_for"
+        
         try:
-            alert = await self.get_alert(alert_id)
-            if not alert:
-                return None
-            
-            update_dict = alert_update.model_dump(exclude_unset=True)
-            
-            if "status" in update_dict:
-                if update_dict["status"] == AlertStatus.RESOLVED:
-                    update_dict["resolved_at"] = datetime.utcnow()
-                elif update_dict["status"] == AlertStatus.CLOSED:
-                    update_dict["closed_at"] = datetime.utcnow()
-            
-            await self.es_client.update(
+            result = await self.es_client.update(
                 index=self.index,
                 id=alert_id,
                 doc=update_dict,
-                refresh=True
+                source=True,
+                **kwargs
             )
-            
-            alert_dict = alert.model_dump()
-            alert_dict.update(update_dict)
-            return Alert(**alert_dict)
-            
         except NotFoundError:
-            return None
+            return None, None
+        
+        self._after_update(alert_id, update_dict)
+        self.buffer.replace_overlay(alert_id, result["get"]["_source"])
+        return Alert(**result["get"]["_source"]), _version_of(result)
+    
+    def _after_update(self, alert_id: str, update_dict: Dict[str, Any], previous: Any = None):
+        """Keep duplicate suppression, counters and the caches in step with an alert's state."""
+        self.query_cache.invalidate(self.index)
+        if "assigned_to" in update_dict:
+            self.distinct.invalidate(self.index)
+        status = update_dict.get("status")
+        if status in (AlertStatus.RESOLVED, AlertStatus.CLOSED):
+            self.dedup.release(alert_id)
+        else:
+            self.dedup.update_snapshot(alert_id, update_dict)
+        if status is not None and not self.counters.record_transition(alert_id, status, previous):
+            if self.counters.unknown_transitions >= settings.ALERT_STATS_MAX_UNKNOWN_TRANSITIONS:
+                self.reconcile_requested.set()
     
-    async def delete_alert(self, alert_id: str) -> bool:
+    @staticmethod
+    def build_filter_query(alert_filter: AlertFilter) -> Dict[str, Any]:
+        """Translate an alert filter into a bool query."""
+        filters = []
+        for field in ("severity", "status", "source"):
+            value = getattr(alert_filter, field)
+            if value is not None:
+                filters.append({"term": {field: value.value}})
+        if alert_filter.start_time or alert_filter.end_time:
+            time_range = {}
+            if alert_filter.start_time:
+                time_range["gte"] = alert_filter.start_time.isoformat()
+            if alert_filter.end_time:
+                time_range["lte"] = alert_filter.end_time.isoformat()
+            filters.append({"range": {"timestamp": time_range}})
+        return {"bool": {"filter": filters or [{"match_all": {}}]}}
+    
+    async def bulk_transition(
+        self,
+        action: BulkAlertAction,
+        ids: Optional[List[str]] = None,
+        query: Optional[Dict[str, Any]] = None,
+        assigned_to: Optional[str] = None,
+        notes: Optional[str] = None,
+        resolution: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Apply one state transition to many alerts, by ID list or by query."""
+        changes = {}
+        if action in BULK_ACTION_STATUS:
+            changes["status"] = BULK_ACTION_STATUS[action].value
+        elif not assigned_to:
+            raise ValueError("assigned_to is required to assign alerts")
+        if assigned_to is not None:
+            changes["assigned_to"] = assigned_to
+        if notes is not None:
+            changes["notes"] = notes
+        if resolution is not None:
+            changes["resolution"] = resolution
+        stamps = {
+            field: value.isoformat()
+            for field, value in _status_timestamps(changes.get("status")).items()
+        }
+        
+        started = time.perf_counter()
+        if query is not None:
+            summary = await self._transition_by_query(query, changes, stamps)
+        else:
+            summary = await self._transition_by_ids(ids or [], changes, stamps)
+        summary["action"] = action.value
+        summary["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return summary
+    
+    async def _transition_by_ids(
+        self,
+        ids: List[str],
+        changes: Dict[str, Any],
+        stamps: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Scripted _bulk updates, sent in concurrent chunks."""
+        ids = list(dict.fromkeys(ids))
+        summary = {"matched": len(ids), "updated": 0, "noops": 0, "not_found": [], "failed": []}
+        stored_ids = []
+        for alert_id in ids:
+            known, pending_doc = self.buffer.lookup(alert_id)
+            if not known:
+                stored_ids.append(alert_id)
+            elif pending_doc is None:
+                summary["not_found"].append(alert_id)
+            else:
+                update_dict = {**changes, **stamps}
+                self.buffer.update_doc(alert_id, update_dict, {**pending_doc, **update_dict})
+                self._after_update(alert_id, changes, previous=pending_doc.get("status"))
+                summary["updated"] += 1
+        
+        semaphore = asyncio.Semaphore(self.bulk_concurrency)
+        
+        async def send_chunk(chunk: List[str]):
+            operations = []
+            for alert_id in chunk:
+                operations.extend([
+                    {"update": {"_index": self.index, "_id": alert_id, "retry_on_conflict": 3}},
+                    {
+                        "script": {
+                            "source": TRANSITION_SCRIPT,
+                            "lang": "painless",
+                            "params": {"changes": changes, "stamps": stamps}
+                        }
+                    }
+                ])
+            async with semaphore:
+                return chunk, await self.es_client.bulk(operations=operations)
+        
+        chunks = [
+            stored_ids[i:i + self.bulk_chunk_size]
+            for i in range(0, len(stored_ids), self.bulk_chunk_size)
+        ]
+        for chunk, result in await asyncio.gather(*(send_chunk(chunk) for chunk in chunks)):
+            for alert_id, item in zip(chunk, result["items"]):
+                outcome = item["update"]
+                status = outcome.get("status", 200)
+                if status == 404:
+                    summary["not_found"].append(alert_id)
+                elif status >= 300:
+                    summary["failed"].append({"id": alert_id, "error": outcome.get("error")})
+                elif outcome.get("result") == "noop":
+                    summary["noops"] += 1
+                else:
+                    summary["updated"] += 1
+                    self._after_update(alert_id, changes)
+        
+        return summary
+    
+    async def _transition_by_query(
+        self,
+        query: Dict[str, Any],
+        changes: Dict[str, Any],
+        stamps: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Server-side update_by_query, parallelized across slices."""
+        # Buffered alerts have to be stored before the query can see them
+        await self.buffer.flush(self.es_client)
+        
+        result = await self.es_client.update_by_query(
+            index=self.index,
+            query=query,
+            script={
+                "source": TRANSITION_SCRIPT,
+                "lang": "painless",
+                "params": {"changes": changes, "stamps": stamps}
+            },
+            slices="auto",
+            conflicts="proceed",
+            wait_for_completion=True
+        )
+        self.query_cache.invalidate(self.index)
+        if "assigned_to" in changes:
+            self.distinct.invalidate(self.index)
+        
+        if changes.get("status") in (AlertStatus.RESOLVED.value, AlertStatus.CLOSED.value):
+            self.dedup.release_where(lambda snapshot: _safe_matches(query, snapshot))
+        if changes.get("status") and result.get("updated"):
+            # Which statuses the alerts moved out of is only known to storage
+            self.reconcile_requested.set()
+        
+        return {
+            "matched": result.get("total", 0),
+            "updated": result.get("updated", 0),
+            "noops": result.get("noops", 0),
+            "version_conflicts": result.get("version_conflicts", 0),
+            "failed": result.get("failures", [])
+        }
+    
+    async def delete_alert(self, alert_id: str, wait_for: bool = False) -> bool:
         """Delete an alert."""
-        try:
-            await self.es_client.delete(
-                index=self.index,
-                id=alert_id,
-                refresh=True
-            )
-            return True
-        except NotFoundError:
+        alert = await self.get_alert(alert_id)
+        if not alert:
             return False
+        
+        self.dedup.release(alert_id)
+        self.counters.record_delete(alert.model_dump())
+        waiter = self.buffer.delete_doc(alert_id, wait_for or self.wait_for_writes)
+        self.query_cache.invalidate(self.index)
+        self.distinct.invalidate(self.index)
+        await self._await_write(waiter)
+        return True
     
     async def acknowledge_alert(self, alert_id: str) -> Optional[Alert]:
         """Acknowledge an alert."""
-        update = AlertUpdate(
-            status=AlertStatus.ACKNOWLEDGED,
-            acknowledged_at=datetime.utcnow()
-        )
+        update = AlertUpdate(status=AlertStatus.ACKNOWLEDGED)
         return await self.update_alert(alert_id, update)
     
     async def get_statistics(self) -> Dict[str, Any]:
-        """Get alert statistics."""
-        result = await self.es_client.search(
-            index=self.index,
-            body={
-                "size": 0,
-                "aggs": {
-                    "severity_stats": {
-                        "terms": {"field": "severity"}
-                    },
-                    "status_stats": {
-                        "terms": {"field": "status"}
-                    },
-                    "source_stats": {
-                        "terms": {"field": "source"}
-                    },
-                    "recent_alerts": {
-                        "date_histogram": {
-                            "field": "timestamp",
-                            "calendar_interval": "day"
+        """Get alert statistics, served from in-memory counters."""
+        if not self.counters.ready:
+            await self.reconcile_statistics()
+        stats = self.counters.snapshot()
+        stats["reconciliation"] = {
+            "interval_seconds": self.reconcile_interval,
+            **self.counters.health()
+        }
+        return stats
+    
+    async def _reconcile_loop(self):
+        """Background task correcting counter drift from out-of-band writes."""
+        while True:
+            try:
+                await asyncio.wait_for(self.reconcile_requested.wait(), timeout=self.reconcile_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.reconcile_requested.clear()
+            try:
+                await self.reconcile_statistics()
+            except Exception as e:
+                logger.error(f"Error reconciling alert statistics: {e}")
+    
+    async def reconcile_statistics(self) -> int:
+        """Reset the counters from storage and return the drift that was corrected."""
+        async with self._reconcile_lock:
+            started = time.perf_counter()
+            await self.buffer.flush(self.es_client)
+            self.counters.begin_reconcile()
+            try:
+                refresh_started = time.monotonic()
+                await self.es_client.indices.refresh(index=self.index)
+                self.buffer.mark_refreshed(refresh_started)
+                result = await self.es_client.search(
+                    index=self.index,
+                    size=0,
+                    track_total_hits=True,
+                    aggs={
+                        "severity_stats": {
+                            "terms": {"field": "severity", "size": 50}
+                        },
+                        "status_stats": {
+                            "terms": {"field": "status", "size": 50}
+                        },
+                        "source_stats": {
+                            "terms": {"field": "source", "size": 50}
+                        },
+                        "recent": {
+                            "filter": {
+                                "range": {"timestamp": {"gte": self.counters.trend_start().isoformat()}}
+                            },
+                            "aggs": {
+                                "daily": {
+                                    "date_histogram": {
+                                        "field": "timestamp",
+                                        "calendar_interval": "day",
+                                        "format": "yyyy-MM-dd"
+                                    }
+                                }
+                            }
                         }
                     }
+                )
+            except Exception:
+                self.counters.abort_reconcile()
+                raise
+            
+            aggs = result["aggregations"]
+            stored = {
+                "total": result["hits"]["total"]["value"],
+                "by_severity": {b["key"]: b["doc_count"] for b in aggs["severity_stats"]["buckets"]},
+                "by_status": {b["key"]: b["doc_count"] for b in aggs["status_stats"]["buckets"]},
+                "by_source": {b["key"]: b["doc_count"] for b in aggs["source_stats"]["buckets"]},
+                "daily": {
+                    b["key_as_string"]: b["doc_count"]
+                    for b in aggs["recent"]["daily"]["buckets"] if b["doc_count"]
                 }
             }
-        )
-        
-        return {
-            "total_alerts": result["hits"]["total"]["value"],
-            "by_severity": {
-                bucket["key"]: bucket["doc_count"]
-                for bucket in result["aggregations"]["severity_stats"]["buckets"]
-            },
-            "by_status": {
-                bucket["key"]: bucket["doc_count"]
-                for bucket in result["aggregations"]["status_stats"]["buckets"]
-            },
-            "by_source": {
-                bucket["key"]: bucket["doc_count"]
-                for bucket in result["aggregations"]["source_stats"]["buckets"]
-            },
-            "recent_trend": [
-                {"date": bucket["key_as_string"], "count": bucket["doc_count"]}
-                for bucket in result["aggregations"]["recent_alerts"]["buckets"]
-            ]
-        }
\ No newline at end of file
+            drift = self.counters.finish_reconcile(stored, time.perf_counter() - started)
+            if drift:
+                logger.info(f"Corrected alert statistics drift of {drift}")
+            return drift
+
+def _as_datetime(value) -> datetime:
+    return parse_datetime(value) if isinstance(value, str) else value
+
+def _version_of(result: Dict[str, Any]) -> Optional[Version]:
+    if "_seq_no" in result and "_primary_term" in result:
+        return result["_seq_no"], result["_primary_term"]
+    return None
+
+def _status_timestamps(status: Optional[AlertStatus]) -> Dict[str, datetime]:
+    """Timestamps to stamp when an alert moves into a status."""
+    field = STATUS_TIMESTAMPS.get(AlertStatus(status)) if status else None
+    return {field: datetime.utcnow()} if field else {}
+
+def _safe_matches(query: Dict[str, Any], doc: Dict[str, Any]) -> bool:
+    try:
+        return matches(query, doc)
+    except UnsupportedQueryError:
+        return False
@@ -0,0 +1,189 @@
+"""
+Incrementally maintained alert statistics.
+"""
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple
+from enum import Enum
+
+def _key(value: Any) -> Optional[str]:
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+def _day(timestamp: Any) -> Optional[str]:
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime("%Y-%m-%d")
+    if isinstance(timestamp, str):
+        return timestamp[:10]
+    return None
+
+class AlertCounters:
+    """
+    In-process alert counts by severity, status, source and day.
+
+    Every create, status change and delete made through AlertManager is
+    applied here so statistics can be served without querying storage.
+    Writes made elsewhere are corrected by periodic reconciliation, which
+    records how far the counters had drifted.
+    """
+
+    def __init__(self, trend_days: int = 30, status_cache_size: int = 100000):
+        self.trend_days = trend_days
+        self.status_cache_size = status_cache_size
+        self.total = 0
+        self.by_severity: Counter = Counter()
+        self.by_status: Counter = Counter()
+        self.by_source: Counter = Counter()
+        self.daily: Counter = Counter()
+        self.unknown_transitions = 0
+        self.reconciliations = 0
+        self.last_reconciled_at: Optional[datetime] = None
+        self.last_reconcile_seconds: Optional[float] = None
+        self.last_drift = 0
+        self.total_drift = 0
+        self._statuses: "OrderedDict[str, str]" = OrderedDict()
+        self._journal: Optional[List[Tuple[str, Any, int]]] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.last_reconciled_at is not None
+
+    def remember(self, doc: Dict[str, Any]):
+        """Cache an alert's current status so later transitions can be counted."""
+        alert_id = doc.get("id")
+        status = _key(doc.get("status")) or "new"
+        if alert_id is None:
+            return
+        self._statuses[alert_id] = status
+        self._statuses.move_to_end(alert_id)
+        while len(self._statuses) > self.status_cache_size:
+            self._statuses.popitem(last=False)
+
+    def record_create(self, doc: Dict[str, Any]):
+        self._apply_doc(doc, 1)
+        self.remember(doc)
+
+    def record_delete(self, doc: Dict[str, Any]):
+        self._apply_doc(doc, -1)
+        self._statuses.pop(doc.get("id"), None)
+
+    def record_transition(self, alert_id: str, status: Any, previous: Any = None) -> bool:
+        """Move an alert between status buckets; returns False if the old status was unknown."""
+        status = _key(status)
+        previous = _key(previous) or self._statuses.get(alert_id)
+        if previous is None:
+            self.unknown_transitions += 1
+            return False
+        if previous != status:
+            self._bump("status", previous, -1)
+            self._bump("status", status, 1)
+        self._statuses[alert_id] = status
+        self._statuses.move_to_end(alert_id)
+        return True
+
+    def _apply_doc(self, doc: Dict[str, Any], sign: int):
+        self._bump("total", None, sign)
+        self._bump("severity", _key(doc.get("severity")), sign)
+        self._bump("status", _key(doc.get("status")) or "new", sign)
+        self._bump("source", _key(doc.get("source")), sign)
+        self._bump("day", _day(doc.get("timestamp")), sign)
+
+    def _bump(self, dimension: str, key: Any, delta: int):
+        if dimension == "total":
+            self.total += delta
+        elif key is None:
+            return
+        else:
+            counter = self._counter(dimension)
+            counter[key] += delta
+            if counter[key] == 0:
+                del counter[key]
+        if self._journal is not None:
+            self._journal.append((dimension, key, delta))
+
+    def _counter(self, dimension: str) -> Counter:
+        return {
+            "severity": self.by_severity,
+            "status": self.by_status,
+            "source": self.by_source,
+            "day": self.daily,
+        }[dimension]
+
+    def trend_start(self) -> datetime:
+        """Start of the rolling window the daily trend covers."""
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - timedelta(days=self.trend_days - 1)
+
+    def _prune_days(self):
+        cutoff = self.trend_start().strftime("%Y-%m-%d")
+        for day in [day for day in self.daily if day < cutoff]:
+            del self.daily[day]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Statistics in the shape AlertManager.get_statistics has always returned."""
+        self._prune_days()
+        return {
+            "total_alerts": self.total,
+            "by_severity": dict(self.by_severity),
+            "by_status": dict(self.by_status),
+            "by_source": dict(self.by_source),
+            "recent_trend": [
+                {"date": day, "count": self.daily[day]}
+                for day in sorted(self.daily)
+            ],
+        }
+
+    def health(self) -> Dict[str, Any]:
+        """Reconciliation metrics."""
+        return {
+            "last_reconciled_at": self.last_reconciled_at.isoformat() if self.last_reconciled_at else None,
+            "last_reconcile_seconds": self.last_reconcile_seconds,
+            "last_drift": self.last_drift,
+            "total_drift": self.total_drift,
+            "reconciliations": self.reconciliations,
+            "unknown_transitions": self.unknown_transitions,
+        }
+
+    def begin_reconcile(self):
+        """Start journaling changes made while the authoritative counts are fetched."""
+        self._journal = []
+
+    def abort_reconcile(self):
+        self._journal = None
+
+    def finish_reconcile(self, stored: Dict[str, Any], seconds: float) -> int:
+        """Replace the counters with stored counts plus changes made in the meantime."""
+        journal, self._journal = self._journal or [], None
+        fresh = {
+            "severity": Counter(stored["by_severity"]),
+            "status": Counter(stored["by_status"]),
+            "source": Counter(stored["by_source"]),
+            "day": Counter(stored["daily"]),
+        }
+        total = stored["total"]
+        for dimension, key, delta in journal:
+            if dimension == "total":
+                total += delta
+            else:
+                fresh[dimension][key] += delta
+
+        self._prune_days()
+        drift = abs(self.total - total)
+        for dimension, counter in fresh.items():
+            local = self._counter(dimension)
+            for key in set(local) | set(counter):
+                drift += abs(local.get(key, 0) - counter.get(key, 0))
+
+        self.total = total
+        self.by_severity = +fresh["severity"]
+        self.by_status = +fresh["status"]
+        self.by_source = +fresh["source"]
+        self.daily = +fresh["day"]
+        self.last_drift = drift
+        self.total_drift += drift
+        self.unknown_transitions = 0
+        self.reconciliations += 1
+        self.last_reconciled_at = datetime.utcnow()
+        self.last_reconcile_seconds = seconds
+        return drift
@@ -0,0 +1,90 @@
+"""
+Per-key correlation windows.
+
+Some findings only show across events: five authentication failures on
+one host within five minutes mean more than any single one. Each key
+(host, source, ...) keeps a sliding window of the patterns it produced,
+and a pattern that reaches its threshold inside the window adds a
+correlated finding to the log that crossed it.
+
+The windows are exact only if every event for a key reaches the same
+process, which is what ingest partitioning guarantees; when partitions
+move, the windows of the moved keys are exported and loaded elsewhere.
+"""
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Tuple
+from ..core.query_dsl import parse_datetime
+
+WindowState = Dict[str, List[Tuple[float, str]]]
+
+def event_time(log: Dict[str, Any]) -> float:
+    """A log's timestamp in epoch seconds; logs carry a datetime or, off the wire, an ISO string."""
+    timestamp = log.get("timestamp")
+    if isinstance(timestamp, str):
+        timestamp = parse_datetime(timestamp)
+    if isinstance(timestamp, datetime):
+        # Naive timestamps are UTC throughout the app
+        return (timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)).timestamp()
+    return 0.0
+
+class KeyWindows:
+    """Sliding windows of (event time, pattern) per key, for the thresholded patterns only."""
+
+    def __init__(self, window_seconds: float = 300.0, thresholds: Dict[str, int] = None):
+        self.window_seconds = window_seconds
+        self.thresholds = dict(thresholds or {})
+        self._windows: Dict[str, "deque[Tuple[float, str]]"] = {}
+        self._counts: Dict[str, Counter] = {}
+
+    def observe(self, key: str, at: float, patterns: Iterable[str]) -> List[str]:
+        """Record a log's patterns; returns the correlated findings it triggers."""
+        tracked = [pattern for pattern in patterns if pattern in self.thresholds]
+        if not tracked or not key:
+            return []
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = deque()
+            self._counts[key] = Counter()
+        counts = self._counts[key]
+        horizon = at - self.window_seconds
+        while window and window[0][0] <= horizon:
+            counts[window.popleft()[1]] -= 1
+        findings = []
+        for pattern in tracked:
+            window.append((at, pattern))
+            counts[pattern] += 1
+            # Fire once, on the event that reaches the threshold
+            if counts[pattern] == self.thresholds[pattern]:
+                findings.append(f"repeated_{pattern}")
+        return findings
+
+    def expire(self, now: float):
+        """Drop keys whose every event has left the window."""
+        horizon = now - self.window_seconds
+        for key in [key for key, window in self._windows.items() if not window or window[-1][0] <= horizon]:
+            del self._windows[key]
+            del self._counts[key]
+
+    def keys(self) -> List[str]:
+        return list(self._windows)
+
+    def export(self, keys: Iterable[str]) -> WindowState:
+        """Remove and return the windows of ``keys``, for hand-off to their new owner."""
+        state: WindowState = {}
+        for key in keys:
+            window = self._windows.pop(key, None)
+            self._counts.pop(key, None)
+            if window:
+                state[key] = list(window)
+        return state
+
+    def load(self, state: WindowState):
+        """Take over windows exported by another worker, merging in event-time order."""
+        for key, events in state.items():
+            merged = sorted(list(self._windows.get(key, ())) + [tuple(event) for event in events])
+            self._windows[key] = deque(merged)
+            self._counts[key] = Counter(pattern for _, pattern in merged)
+
+    def __len__(self) -> int:
+        return len(self._windows)
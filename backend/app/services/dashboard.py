@@ -0,0 +1,162 @@
+"""
+Composite dashboard service.
+"""
+from datetime import datetime
+from typing import Optional, Dict, Any, Callable, List, Tuple
+from .alert_manager import AlertManager
+from .log_ingestion import LogIngestionService
+from .threat_detection import ThreatDetectionService
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class DashboardService:
+    """
+    Assembles every dashboard panel concurrently.
+
+    The search-backed panels reuse the search bodies of the services that
+    own them. Where the backend runs msearch concurrently (Elasticsearch)
+    they are sent together as one _msearch; otherwise each panel is its own
+    search, so no panel waits on another. The threat panel's top sources,
+    the security score's day finalization and the alert statistics (from
+    AlertManager's in-memory counters) run alongside.
+    """
+
+    def __init__(
+        self,
+        threat_service: ThreatDetectionService,
+        log_service: LogIngestionService,
+        alert_manager: AlertManager
+    ):
+        self.threat_service = threat_service
+        self.log_service = log_service
+        self.alert_manager = alert_manager
+
+    def _search_panels(
+        self,
+        start_time: datetime,
+        end_time: datetime
+    ) -> List[Tuple[str, str, Dict[str, Any], Callable[..., Any]]]:
+        """(panel, index, body, parser) for every panel served by a search."""
+        threats = self.threat_service
+        logs = self.log_service
+        return [
+            (
+                "metrics",
+                threats.index,
+                threats.dashboard_metrics_body(start_time, end_time),
+                threats.parse_dashboard_metrics
+            ),
+            (
+                "threats",
+                threats.index,
+                threats.threat_summary_body(start_time, end_time, top_sources=0),
+                threats.parse_threat_summary
+            ),
+            (
+                "security_score",
+                threats.index,
+                threats.security_score_body(),
+                threats.parse_security_score
+            ),
+            (
+                "logs",
+                logs.index,
+                logs.statistics_body(start_time, end_time),
+                lambda result: logs.parse_statistics(result, start_time, end_time)
+            ),
+        ]
+
+    async def get_overview(self, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
+        """Build every dashboard panel with per-panel timings."""
+        started = time.perf_counter()
+        panels = self._search_panels(start_time, end_time)
+
+        # Days finalized meanwhile are also in the live search; either copy counts the same
+        searched, sources, prepared, alert_panel = await asyncio.gather(
+            self._search(panels),
+            self.threat_service.top_sources(start_time, end_time),
+            self.threat_service.prepare_security_score(),
+            self._alert_statistics(),
+            return_exceptions=True
+        )
+        if isinstance(prepared, Exception):
+            # The score is still built from the days finalized so far
+            logger.error(f"Finalizing security score days failed: {prepared}")
+
+        payload: Dict[str, Any] = {}
+        timings: Dict[str, Any] = {}
+
+        if isinstance(sources, Exception):
+            logger.error(f"Dashboard top sources failed: {sources}")
+        if isinstance(searched, Exception):
+            logger.error(f"Dashboard searches failed: {searched}")
+            for name, _, _, _ in panels:
+                payload[name] = None
+                timings[name] = {"error": str(searched)}
+        else:
+            responses, round_trips = searched
+            if len(round_trips) == 1:
+                timings["msearch_round_trip_ms"] = round_trips[0]
+            for i, ((name, _, _, parse), response) in enumerate(zip(panels, responses)):
+                if name == "threats" and isinstance(sources, Exception):
+                    response = {"error": str(sources)}
+                if "error" in response:
+                    payload[name] = None
+                    timings[name] = {"error": _error_reason(response["error"])}
+                    continue
+                payload[name] = parse(response, sources) if name == "threats" else parse(response)
+                timings[name] = {"took_ms": response.get("took")}
+                if len(round_trips) > 1:
+                    timings[name]["round_trip_ms"] = round_trips[i]
+
+        if isinstance(alert_panel, Exception):
+            logger.error(f"Dashboard alert statistics failed: {alert_panel}")
+            payload["alerts"] = None
+            timings["alerts"] = {"error": str(alert_panel)}
+        else:
+            payload["alerts"], timings["alerts"] = alert_panel["stats"], {"took_ms": alert_panel["took_ms"]}
+
+        timings["total_ms"] = _elapsed_ms(started)
+        payload["time_range"] = {"start": start_time, "end": end_time}
+        payload["timings"] = timings
+        return payload
+
+    async def _search(self, panels) -> Tuple[List[Dict[str, Any]], List[float]]:
+        """Responses in panel order, and the round trip of the msearch or of each search."""
+        client = self.threat_service.es_client
+        if getattr(client, "concurrent_msearch", True):
+            searches = []
+            for _, index, body, _ in panels:
+                searches.extend([{"index": index}, body])
+            started = time.perf_counter()
+            result = await client.msearch(searches=searches)
+            return result["responses"], [_elapsed_ms(started)]
+
+        async def search(index: str, body: Dict[str, Any]):
+            started = time.perf_counter()
+            try:
+                response = await client.search(index=index, body=body)
+            except Exception as e:
+                # An error answers this panel only, as it would inside an msearch
+                body = getattr(e, "body", None)
+                response = {"error": body["error"] if isinstance(body, dict) and "error" in body else str(e)}
+            return response, _elapsed_ms(started)
+
+        found = await asyncio.gather(*(search(index, body) for _, index, body, _ in panels))
+        return [response for response, _ in found], [round_trip for _, round_trip in found]
+
+    async def _alert_statistics(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        stats = await self.alert_manager.get_statistics()
+        return {"stats": stats, "took_ms": _elapsed_ms(started)}
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+def _error_reason(error: Any) -> str:
+    if isinstance(error, dict):
+        return error.get("reason") or error.get("type") or str(error)
+    return str(error)
@@ -0,0 +1,194 @@
+"""
+Complete distinct-value listings for keyword and IP fields.
+"""
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from ..storage.base import StorageBackend
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class DistinctSnapshot:
+    """Every value of one field with its document count, sorted by value."""
+
+    def __init__(self, values: List[Tuple[str, int]], seconds: float):
+        self.keys = [key for key, _ in values]
+        self.counts = [count for _, count in values]
+        self.taken_at = time.monotonic()
+        self.seconds = seconds
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def age(self) -> float:
+        return time.monotonic() - self.taken_at
+
+    def items(self, prefix: Optional[str] = None) -> List[Tuple[str, int]]:
+        """Values starting with prefix, found by bisecting the sorted keys."""
+        if not prefix:
+            return list(zip(self.keys, self.counts))
+        start = bisect_left(self.keys, prefix)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(prefix):
+            end += 1
+        return list(zip(self.keys[start:end], self.counts[start:end]))
+
+class DistinctValues:
+    """
+    Distinct values of a field, paged with composite aggregations.
+
+    A terms aggregation has to be given a size up front and silently drops
+    everything past it; composite aggregations walk the whole field with an
+    after_key cursor instead. Whole-index listings are kept as snapshots
+    that are served immediately and refreshed in the background once
+    older than snapshot_ttl, so callers never wait on a full walk twice.
+    """
+
+    def __init__(
+        self,
+        page_size: int = 10000,
+        snapshot_ttl: float = 60.0
+    ):
+        self.page_size = page_size
+        self.snapshot_ttl = snapshot_ttl
+        self._snapshots: Dict[Tuple[str, str], DistinctSnapshot] = {}
+        self._refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Bumped by invalidate, so walks started before it are not kept
+        self._generation = 0
+
+    async def scan(
+        self,
+        es_client: StorageBackend,
+        index: str,
+        field: str,
+        query: Optional[Dict[str, Any]] = None,
+        page_size: Optional[int] = None
+    ) -> AsyncIterator[Tuple[str, int]]:
+        """Yield (value, doc_count) for every value of field, in value order."""
+        page_size = page_size or self.page_size
+        after = None
+        while True:
+            composite = {"size": page_size, "sources": [{"value": {"terms": {"field": field}}}]}
+            if after:
+                composite["after"] = after
+            result = await es_client.search(
+                index=index,
+                size=0,
+                query=query or {"match_all": {}},
+                aggs={"values": {"composite": composite}}
+            )
+            page = result["aggregations"]["values"]
+            for bucket in page["buckets"]:
+                yield str(bucket["key"]["value"]), bucket["doc_count"]
+            after = page.get("after_key")
+            if len(page["buckets"]) < page_size or after is None:
+                return
+
+    async def collect(
+        self,
+        es_client: StorageBackend,
+        index: str,
+        field: str,
+        query: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, int]]:
+        return [item async for item in self.scan(es_client, index, field, query)]
+
+    async def get(
+        self,
+        es_client: StorageBackend,
+        index: str,
+        field: str,
+        prefix: Optional[str] = None
+    ) -> List[Tuple[str, int]]:
+        """Values across the whole index, served from the snapshot where possible."""
+        key = (index, field)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            snapshot = await self.refresh(es_client, index, field)
+        elif snapshot.age() > self.snapshot_ttl:
+            self._refresh_in_background(es_client, index, field)
+        return snapshot.items(prefix)
+
+    async def refresh(
+        self,
+        es_client: StorageBackend,
+        index: str,
+        field: str
+    ) -> DistinctSnapshot:
+        """Walk the field and replace its snapshot; concurrent callers share one walk."""
+        key = (index, field)
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._take_snapshot(es_client, index, field))
+            self._refreshing[key] = task
+            task.add_done_callback(
+                lambda done: self._refreshing.pop(key) if self._refreshing.get(key) is done else None
+            )
+        return await asyncio.shield(task)
+
+    def _refresh_in_background(self, es_client: StorageBackend, index: str, field: str):
+        if (index, field) in self._refreshing:
+            return
+
+        async def run():
+            try:
+                await self.refresh(es_client, index, field)
+            except Exception as e:
+                logger.warning(f"Error refreshing distinct {field} values of {index}: {e}")
+
+        asyncio.create_task(run())
+
+    async def _take_snapshot(
+        self,
+        es_client: StorageBackend,
+        index: str,
+        field: str
+    ) -> DistinctSnapshot:
+        generation = self._generation
+        started = time.monotonic()
+        values = await self.collect(es_client, index, field)
+        snapshot = DistinctSnapshot(values, time.monotonic() - started)
+        if generation == self._generation:
+            self._snapshots[(index, field)] = snapshot
+        return snapshot
+
+    def has_snapshot(self, index: str, field: str) -> bool:
+        return (index, field) in self._snapshots
+
+    def invalidate(self, index: Optional[str] = None):
+        """Drop the snapshots of an index, or all of them; the next get walks storage again."""
+        self._generation += 1
+        for key in [key for key in self._snapshots if index is None or key[0] == index]:
+            del self._snapshots[key]
+        # Later callers start their own walk rather than join one already under way
+        for key in [key for key in self._refreshing if index is None or key[0] == index]:
+            del self._refreshing[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            f"{index}.{field}": {
+                "values": len(snapshot),
+                "age_seconds": round(snapshot.age(), 3),
+                "walk_seconds": round(snapshot.seconds, 3)
+            }
+            for (index, field), snapshot in self._snapshots.items()
+        }
+
+def time_range_query(
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Filter on timestamp, or match_all when neither bound is given."""
+    if not (start_time or end_time):
+        return {"match_all": {}}
+    return {
+        "range": {
+            "timestamp": {
+                **({"gte": start_time.isoformat()} if start_time else {}),
+                **({"lte": end_time.isoformat()} if end_time else {})
+            }
+        }
+    }
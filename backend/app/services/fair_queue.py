@@ -0,0 +1,240 @@
+"""
+Per-source fair queueing of logs waiting to be processed.
+
+``FairQueue`` stands in for the processing queue's ``asyncio.Queue``. Each
+source gets its own sub-queue, and ``get`` serves them by deficit round
+robin: per round, a source may take ``quantum * weight`` logs, so a source
+flooding the pipeline only delays itself. A source may also have a token
+bucket limiting how many of its logs per second are processed; past it, its
+logs wait in its sub-queue while other sources are served.
+
+Weights and rates are looked up by source name first, then by the source's
+``AlertSource`` category: the category its name is, starts with (``firewall-01``)
+or that it is tagged with.
+
+Throttling only delays processing. Logs are stored and searchable before they
+are queued; what waits is their enrichment and saved-search evaluation.
+"""
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, Optional, Tuple
+from ..core.instrumentation import REGISTRY
+from ..models.alert import AlertSource
+import asyncio
+import re
+import time
+
+SOURCE_QUEUED = REGISTRY.gauge(
+    "siem_ingest_source_queued", "Logs waiting to be processed, by source.", ["source"]
+)
+THROTTLED_SECONDS = REGISTRY.counter(
+    "siem_ingest_throttled_seconds_total", "Time a source's queued logs waited on its rate limit, by source.",
+    ["source"]
+)
+THROTTLED = REGISTRY.counter(
+    "siem_ingest_throttled_total", "Times a source's queued logs had to wait on its rate limit, by source.",
+    ["source"]
+)
+
+CATEGORIES = {category.value for category in AlertSource}
+_NAME_PARTS = re.compile(r"[-_.:/\s]")
+
+def source_category(source: str, tags: Iterable[str] = ()) -> Optional[str]:
+    """The ``AlertSource`` category a log source belongs to, if any."""
+    name = source.lower()
+    if name in CATEGORIES:
+        return name
+    prefix = _NAME_PARTS.split(name, 1)[0]
+    if prefix in CATEGORIES:
+        return prefix
+    for tag in tags:
+        if tag.lower() in CATEGORIES:
+            return tag.lower()
+    return None
+
+class SourcePolicy:
+    """Scheduling weight and rate limit of each source, by name or category."""
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        rates: Optional[Dict[str, float]] = None,
+        default_rate: Optional[float] = None
+    ):
+        self.weights = weights or {}
+        self.rates = rates or {}
+        self.default_rate = default_rate
+
+    def _lookup(self, table: Dict[str, float], source: str, tags: Iterable[str]) -> Optional[float]:
+        if source in table:
+            return table[source]
+        category = source_category(source, tags)
+        return table.get(category) if category is not None else None
+
+    def weight(self, source: str, tags: Iterable[str] = ()) -> float:
+        weight = self._lookup(self.weights, source, tags)
+        return weight if weight is not None else 1.0
+
+    def rate(self, source: str, tags: Iterable[str] = ()) -> Optional[float]:
+        rate = self._lookup(self.rates, source, tags)
+        return rate if rate is not None else self.default_rate
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait(self) -> float:
+        """Seconds until the next token, as of the last ``take``."""
+        return (1 - self.tokens) / self.rate
+
+class _Flow:
+    __slots__ = ("label", "items", "quantum", "deficit", "bucket", "throttled_at", "throttled")
+
+    def __init__(self, label: str, quantum: float, bucket: Optional[TokenBucket]):
+        self.label = label
+        self.items: Deque[Any] = deque()
+        self.quantum = quantum
+        self.deficit = 0.0
+        self.bucket = bucket
+        # When the flow started waiting on its bucket, if it is
+        self.throttled_at: Optional[float] = None
+        self.throttled = THROTTLED_SECONDS.labels(label)
+
+class FairQueue:
+    """
+    Deficit round robin over per-source sub-queues, with the parts of the
+    ``asyncio.Queue`` interface the ingestion pipeline uses.
+
+    ``classify(item)`` returns ``(flow key, source, tags)``: items with the
+    same key share a sub-queue, and the source and tags of a flow's first item
+    give its weight and rate limit.
+    """
+
+    def __init__(
+        self,
+        classify: Callable[[Any], Tuple[Hashable, str, Iterable[str]]],
+        policy: Optional[SourcePolicy] = None,
+        quantum: int = 100,
+        burst_seconds: float = 1.0,
+        max_flows: int = 10000
+    ):
+        self.classify = classify
+        self.policy = policy or SourcePolicy()
+        self.quantum = quantum
+        self.burst_seconds = burst_seconds
+        self.max_flows = max_flows
+        self._flows: Dict[Hashable, _Flow] = {}
+        # Flows with queued items, in round robin order
+        self._active: Deque[_Flow] = deque()
+        self._size = 0
+        self._unfinished = 0
+        self._changed = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def put_nowait(self, item: Any):
+        key, source, tags = self.classify(item)
+        flow = self._flows.get(key)
+        if flow is None:
+            flow = self._flow(key, source, tags)
+        if not flow.items:
+            self._active.append(flow)
+        flow.items.append(item)
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._changed.set()
+
+    async def put(self, item: Any):
+        self.put_nowait(item)
+
+    def _flow(self, key: Hashable, source: str, tags: Iterable[str]) -> _Flow:
+        if len(self._flows) >= self.max_flows:
+            # Forget idle flows; their buckets start full again
+            for idle in [k for k, f in self._flows.items() if not f.items]:
+                del self._flows[idle]
+        rate = self.policy.rate(source, tags)
+        bucket = TokenBucket(rate, rate * self.burst_seconds, time.monotonic()) if rate else None
+        label = str(key)
+        quantum = max(1.0, self.quantum * self.policy.weight(source, tags))
+        flow = self._flows[key] = _Flow(label, quantum, bucket)
+        SOURCE_QUEUED.labels(label).set_function(lambda: len(flow.items))
+        return flow
+
+    def get_nowait(self) -> Any:
+        item, _ = self._next(time.monotonic())
+        if item is None:
+            raise asyncio.QueueEmpty()
+        return item[0]
+
+    async def get(self) -> Any:
+        while True:
+            self._changed.clear()
+            item, wait = self._next(time.monotonic())
+            if item is not None:
+                return item[0]
+            try:
+                # Until a put, or the first throttled source has a token again
+                await asyncio.wait_for(self._changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _next(self, now: float) -> Tuple[Optional[Tuple[Any]], Optional[float]]:
+        """The next item by deficit round robin, else the seconds until one may be ready."""
+        wait: Optional[float] = None
+        for _ in range(len(self._active)):
+            flow = self._active[0]
+            if flow.deficit < 1:
+                flow.deficit += flow.quantum
+            if flow.bucket is not None and not flow.bucket.take(now):
+                if flow.throttled_at is None:
+                    flow.throttled_at = now
+                    THROTTLED.labels(flow.label).inc()
+                flow_wait = flow.bucket.wait()
+                wait = flow_wait if wait is None else min(wait, flow_wait)
+                self._active.rotate(-1)
+                continue
+            if flow.throttled_at is not None:
+                flow.throttled.inc(now - flow.throttled_at)
+                flow.throttled_at = None
+            item = flow.items.popleft()
+            self._size -= 1
+            flow.deficit -= 1
+            if not flow.items:
+                flow.deficit = 0.0
+                self._active.popleft()
+            elif flow.deficit < 1:
+                self._active.rotate(-1)
+            return (item,), None
+        return None, wait
+
+    def task_done(self):
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self):
+        if self._unfinished:
+            await self._finished.wait()
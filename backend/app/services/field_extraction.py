@@ -0,0 +1,232 @@
+"""
+Structured field extraction from log messages.
+
+Messages in JSON, key=value, CEF or LEEF are parsed into the typed fields in
+``FIELDS``. The fields are stored under ``fields`` and mapped as ip, integer
+and keyword fields, so detection and queries use exact values instead of
+scanning the message text.
+
+Each source gets a parse plan, compiled from its first message: the format,
+and a cache resolving the message's keys to fields. Later messages of the
+source are parsed with the plan. Plain text sources get a plan that only
+checks messages still look like text. A message the plan does not fit is
+detected on its own, and after ``plan_misses`` such messages in a row the
+source's plan is compiled again.
+"""
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from ..core.instrumentation import REGISTRY
+from ..core.json import loads
+import ipaddress
+import re
+
+# Field -> message keys holding it, lower-cased, preferred first
+FIELDS: Dict[str, Tuple[str, ...]] = {
+    "src_ip": ("src_ip", "src", "srcip", "source_ip", "sourceip", "source.ip", "client_ip", "clientip", "sip"),
+    "dst_ip": ("dst_ip", "dst", "dstip", "destination_ip", "destinationip", "destination.ip", "server_ip", "dip"),
+    "src_port": ("src_port", "spt", "srcport", "source_port", "sourceport", "source.port", "sport"),
+    "dst_port": ("dst_port", "dpt", "dstport", "destination_port", "destinationport", "destination.port", "dport", "port"),
+    "user": ("user", "suser", "username", "user_name", "usrname", "user.name", "account", "duser"),
+    "action": ("action", "act", "event.action"),
+    "outcome": ("outcome", "event.outcome", "result"),
+}
+_ALIASES: Dict[str, Tuple[str, int]] = {
+    key: (field, rank) for field, keys in FIELDS.items() for rank, key in enumerate(keys)
+}
+
+OUTCOMES = {
+    "success": "success", "succeeded": "success", "successful": "success", "allow": "success",
+    "allowed": "success", "accept": "success", "accepted": "success", "permit": "success", "permitted": "success",
+    "failure": "failure", "fail": "failure", "failed": "failure", "deny": "failure", "denied": "failure",
+    "block": "failure", "blocked": "failure", "reject": "failure", "rejected": "failure", "drop": "failure",
+    "dropped": "failure",
+}
+
+FIELDS_EXTRACTED = REGISTRY.counter(
+    "siem_field_extraction_logs_total", "Logs by the format their fields were extracted from.", ["format"]
+)
+
+KV_PAIR = re.compile(r'([A-Za-z_][\w.\-]*)=("(?:[^"\\]|\\.)*"|\S*)')
+# Canonical dotted IPv4, accepted without building an address object
+IPV4 = re.compile(r"(?:(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)")
+CEF_KEY = re.compile(r"(?:^|\s)([A-Za-z_][\w.\[\]\-]*)=")
+CEF_UNESCAPE = re.compile(r"\\([\\=|nr])")
+_CEF_ESCAPES = {"n": "\n", "r": "\r"}
+
+Pairs = Iterable[Tuple[str, Any]]
+# Message keys whose resolution a plan caches, for sources with unbounded keys
+MAX_RESOLVED_KEYS = 1024
+
+def parse_json(message: str) -> Optional[Pairs]:
+    if not message.startswith("{"):
+        return None
+    try:
+        document = loads(message)
+    except ValueError:
+        return None
+    return _flatten(document, "") if isinstance(document, dict) else None
+
+def _flatten(document: Dict[str, Any], prefix: str) -> Pairs:
+    for key, value in document.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        else:
+            yield prefix + key, value
+
+def parse_kv(message: str) -> Optional[Pairs]:
+    pairs = KV_PAIR.findall(message)
+    if len(pairs) < 2:
+        return None
+    return ((key, value[1:-1] if value.startswith('"') else value.rstrip(",;")) for key, value in pairs)
+
+def _header(message: str, marker: str, fields: int) -> Optional[list]:
+    """Split a CEF or LEEF header on unescaped pipes, after any syslog prefix."""
+    start = message.find(marker)
+    if start < 0:
+        return None
+    parts = re.split(r"(?<!\\)\|", message[start:], maxsplit=fields)
+    return parts if len(parts) == fields + 1 else None
+
+def parse_cef(message: str) -> Optional[Pairs]:
+    parts = _header(message, "CEF:", 7)
+    if parts is None:
+        return None
+    extension = parts[7]
+    keys = list(CEF_KEY.finditer(extension))
+    pairs = []
+    for match, following in zip(keys, keys[1:] + [None]):
+        value = extension[match.end():following.start() if following else len(extension)]
+        if "\\" in value:
+            value = CEF_UNESCAPE.sub(lambda m: _CEF_ESCAPES.get(m.group(1), m.group(1)), value)
+        pairs.append((match.group(1), value))
+    return pairs
+
+def parse_leef(message: str) -> Optional[Pairs]:
+    parts = _header(message, "LEEF:", 5)
+    if parts is None:
+        return None
+    attributes = parts[5]
+    delimiter = "\t"
+    if parts[0].endswith("2.0"):
+        # LEEF 2.0 names its delimiter, as a character or hex, before the attributes
+        declared, _, attributes = attributes.partition("|")
+        if declared.lower().startswith(("x", "0x")):
+            delimiter = chr(int(declared.lower().lstrip("0x") or "0", 16))
+        elif declared:
+            delimiter = declared
+    return (attribute.partition("=")[::2] for attribute in attributes.split(delimiter) if "=" in attribute)
+
+def parse_text(message: str) -> Optional[Pairs]:
+    """No pairs, unless the message looks structured after all."""
+    return None if "=" in message or message.startswith("{") else ()
+
+# Tried in this order when detecting a message's format
+PARSERS: Dict[str, Callable[[str], Optional[Pairs]]] = {
+    "cef": parse_cef,
+    "leef": parse_leef,
+    "json": parse_json,
+    "kv": parse_kv,
+}
+
+def _ip(value: Any) -> Optional[str]:
+    if isinstance(value, str) and IPV4.fullmatch(value):
+        return value
+    try:
+        return str(ipaddress.ip_address(str(value).strip()))
+    except ValueError:
+        return None
+
+def _port(value: Any) -> Optional[int]:
+    try:
+        port = int(value)
+    except (TypeError, ValueError):
+        return None
+    return port if 0 <= port <= 65535 else None
+
+def _text(value: Any) -> Optional[str]:
+    text = str(value).strip()
+    return text or None
+
+def _outcome(value: Any) -> Optional[str]:
+    text = str(value).strip().lower()
+    return OUTCOMES.get(text, text) or None
+
+CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "src_ip": _ip,
+    "dst_ip": _ip,
+    "src_port": _port,
+    "dst_port": _port,
+    "user": _text,
+    "action": lambda value: (_text(value) or "").lower() or None,
+    "outcome": _outcome,
+}
+
+class ParsePlan:
+    """A source's message format and the fields its message keys resolve to."""
+
+    __slots__ = ("format", "parse", "resolved", "misses")
+
+    def __init__(self, format: str):
+        self.format = format
+        self.parse = PARSERS.get(format, parse_text)
+        self.resolved: Dict[str, Optional[Tuple[str, int]]] = {}
+        self.misses = 0
+
+    def fields(self, pairs: Pairs) -> Dict[str, Any]:
+        found: Dict[str, Tuple[int, Any]] = {}
+        resolved = self.resolved
+        for key, value in pairs:
+            alias = resolved.get(key, False)
+            if alias is False:
+                alias = _ALIASES.get(key.lower())
+                if len(resolved) < MAX_RESOLVED_KEYS:
+                    resolved[key] = alias
+            if alias is None or value is None or value == "" or isinstance(value, (list, dict)):
+                continue
+            field, rank = alias
+            if field not in found or rank < found[field][0]:
+                found[field] = (rank, value)
+        fields = {}
+        for field, (_, value) in found.items():
+            value = CONVERTERS[field](value)
+            if value is not None:
+                fields[field] = value
+        return fields
+
+def detect(message: str) -> Optional[Tuple[str, Pairs]]:
+    """The first format ``message`` parses as, and its pairs."""
+    for format, parse in PARSERS.items():
+        pairs = parse(message)
+        if pairs is not None:
+            return format, pairs
+    return None
+
+class FieldExtractor:
+    """Per-source parse plans, bounded to ``max_sources``."""
+
+    def __init__(self, max_sources: int = 10000, plan_misses: int = 20):
+        self.max_sources = max_sources
+        self.plan_misses = plan_misses
+        self.plans: Dict[str, ParsePlan] = {}
+
+    def extract(self, source: str, message: str) -> Dict[str, Any]:
+        """Typed fields of a message, empty when it is plain text."""
+        plan = self.plans.get(source) or self._compile(source, message)
+        pairs = plan.parse(message)
+        if pairs is not None:
+            plan.misses = 0
+        else:
+            plan.misses += 1
+            if plan.misses >= self.plan_misses:
+                del self.plans[source]
+            found = detect(message)
+            plan = ParsePlan(found[0] if found else "text")
+            pairs = found[1] if found else ()
+        FIELDS_EXTRACTED.labels(plan.format).inc()
+        return plan.fields(pairs) if pairs else {}
+
+    def _compile(self, source: str, message: str) -> ParsePlan:
+        found = detect(message)
+        if len(self.plans) >= self.max_sources:
+            self.plans.pop(next(iter(self.plans)))
+        plan = self.plans[source] = ParsePlan(found[0] if found else "text")
+        return plan
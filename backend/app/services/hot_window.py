@@ -0,0 +1,357 @@
+"""
+In-process index of the most recent logs.
+
+Logs are added as the ingestion pipeline stores them, so they are
+searchable at once, without waiting for a storage refresh. They are kept in
+segments of ``segment_seconds`` of event time. Each segment holds the
+documents, their timestamps, and an inverted index from keys to document
+numbers:
+
+- values of the keyword fields in ``TERM_FIELDS`` and of extracted ``fields``
+- tokens of the text fields in ``TEXT_FIELDS``
+
+Keys are the percolator's, so a query's anchors (the keys a matching log must
+hit, one set per required clause) select its candidates. Candidates are
+checked against the query's timestamp range on the stored times, then
+against the rest of the query with ``app.core.query_dsl.matches``.
+
+The window holds every log the process stored with a timestamp from
+``covered_from`` on, which starts at process start. Segments are dropped as
+the window slides past them, or oldest first when the window exceeds
+``max_bytes``, and ``covered_from`` moves up with them. A query is answered
+here when its time range starts inside the window. A query without a lower
+bound is answered here when the window alone has enough matches.
+"""
+from array import array
+from bisect import bisect_left, insort
+from heapq import merge
+from itertools import groupby
+from datetime import timedelta
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from ..core.aggregations import EPOCH, to_datetime
+from ..core.instrumentation import REGISTRY
+from ..core.json import dumps
+from ..core.query_dsl import UnsupportedQueryError, matches, tokenize
+from .percolator import Key, anchors, term_key
+import math
+import time
+
+TERM_FIELDS = ("id", "level", "source", "host", "processed", "tags", "correlation_id")
+TEXT_FIELDS = ("message", "host", "source")
+IP_FIELDS = ("fields.src_ip", "fields.dst_ip")
+# Approximate bytes per posting entry, on top of each document's JSON size
+POSTING_BYTES = 8
+
+HOT_WINDOW_LOGS = REGISTRY.gauge("siem_hot_window_logs", "Logs held in the hot window.")
+HOT_WINDOW_BYTES = REGISTRY.gauge("siem_hot_window_bytes", "Approximate size of the hot window.")
+HOT_WINDOW_QUERIES = REGISTRY.counter(
+    "siem_hot_window_queries_total",
+    "Log searches by whether the hot window answered them, or why storage did.",
+    ["result"]
+)
+
+MICROSECOND = timedelta(microseconds=1)
+
+def _micros(value: Any) -> Optional[int]:
+    moment = to_datetime(value)
+    return None if moment is None else (moment - EPOCH) // MICROSECOND
+
+def _time_bounds(clause: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """Inclusive bounds in epoch microseconds of a plain timestamp range clause."""
+    if list(clause) != ["range"] or list(clause["range"]) != ["timestamp"]:
+        return None
+    low, high = -math.inf, math.inf
+    for op, value in clause["range"]["timestamp"].items():
+        micros = _micros(value)
+        if op not in ("gte", "gt", "lte", "lt") or micros is None:
+            return None
+        if op == "gte":
+            low = max(low, micros)
+        elif op == "gt":
+            low = max(low, micros + 1)
+        elif op == "lte":
+            high = min(high, micros)
+        else:
+            high = min(high, micros - 1)
+    return low, high
+
+def split_time_range(query: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], float, float]:
+    """
+    The query's required clauses other than its timestamp range, and the
+    range as inclusive epoch microseconds.
+    """
+    clauses = [query]
+    if list(query) == ["bool"] and set(query["bool"]) <= {"must", "filter"}:
+        clauses = []
+        for occurrence in ("must", "filter"):
+            found = query["bool"].get(occurrence, [])
+            clauses.extend(found if isinstance(found, list) else [found])
+    low, high = -math.inf, math.inf
+    rest = []
+    for clause in clauses:
+        bounds = _time_bounds(clause)
+        if bounds is not None:
+            low, high = max(low, bounds[0]), min(high, bounds[1])
+        elif clause != {"match_all": {}}:
+            rest.append(clause)
+    return rest, low, high
+
+def _term_field(field: str) -> bool:
+    return field in TERM_FIELDS or field.startswith("fields.")
+
+def _posted_exactly(clause: Dict[str, Any]) -> bool:
+    """Whether the documents matching ``clause`` are exactly those posted under its anchor."""
+    kind, body = next(iter(clause.items()))
+    if len(clause) != 1 or not isinstance(body, dict):
+        return False
+    if kind in ("term", "terms"):
+        fields = [field for field in body if field != "boost"]
+        value = body.get(fields[0]) if len(fields) == 1 else None
+        if kind == "term" and isinstance(value, dict):
+            value = value.get("value") if set(value) <= {"value", "boost"} else None
+        return value is not None and _term_field(fields[0])
+    if kind == "match" and len(body) == 1:
+        field, params = next(iter(body.items()))
+        if isinstance(params, dict):
+            if not set(params) <= {"query", "operator"} or str(params.get("operator", "or")).lower() != "or":
+                return False
+        return field in TEXT_FIELDS
+    if kind == "multi_match":
+        return (
+            set(body) <= {"query", "fields", "operator"}
+            and str(body.get("operator", "or")).lower() == "or"
+            and all(field in TEXT_FIELDS for field in body.get("fields", []))
+        )
+    return False
+
+class _Segment:
+    __slots__ = ("start", "docs", "times", "monotonic", "order", "postings", "bytes")
+
+    def __init__(self, start: int):
+        self.start = start
+        # Deleted documents are set to None
+        self.docs: List[Optional[Dict[str, Any]]] = []
+        # Epoch microseconds
+        self.times = array("q")
+        # Whether documents were added in time order, as logs mostly are, so
+        # document numbers (and postings) are in time order too
+        self.monotonic = True
+        # Otherwise, document numbers by time, sorted when read
+        self.order: List[int] = []
+        self.postings: Dict[Key, List[int]] = {}
+        self.bytes = 0
+
+    def newest_first(self) -> Iterable[int]:
+        if self.monotonic:
+            return range(len(self.docs) - 1, -1, -1)
+        if len(self.order) != len(self.docs):
+            self.order = sorted(range(len(self.docs)), key=self.times.__getitem__)
+        return reversed(self.order)
+
+    def posted(self, key: Key) -> List[int]:
+        return self.postings.get(key, [])
+
+class HotWindow:
+    """Recent logs by event time, with term and token postings per segment."""
+
+    def __init__(self, window_seconds: float, segment_seconds: float, max_bytes: int):
+        self.window_ms = window_seconds * 1000
+        self.segment_ms = int(segment_seconds * 1000)
+        self.max_bytes = max_bytes
+        self.segments: Dict[int, _Segment] = {}
+        self._starts: List[int] = []
+        self._where: Dict[str, Tuple[_Segment, int]] = {}
+        self.bytes = 0
+        # Every stored log with an event time from here on is in the window
+        self.covered_from = int(time.time() * 1000)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    @staticmethod
+    def keys(doc: Dict[str, Any]) -> List[Key]:
+        keys = set()
+        for field in TERM_FIELDS:
+            value = doc.get(field)
+            if value is not None:
+                keys.update((field, "term", term_key(item)) for item in (value if isinstance(value, list) else [value]))
+        for field in TEXT_FIELDS:
+            value = doc.get(field)
+            if value is not None:
+                keys.update((field, "text", token) for token in tokenize(value))
+        for field, value in (doc.get("fields") or {}).items():
+            keys.add((f"fields.{field}", "term", term_key(value)))
+        return list(keys)
+
+    def add(self, docs: Iterable[Dict[str, Any]]):
+        """Add stored logs, replacing any earlier version of the same log."""
+        for doc in docs:
+            at = _micros(doc.get("timestamp"))
+            if at is None or at < self.covered_from * 1000:
+                continue
+            keys = self.keys(doc)
+            found = self._where.get(doc["id"])
+            if found is not None and found[0].times[found[1]] == at:
+                self._replace(found[0], found[1], doc, keys)
+                continue
+            self._discard(doc["id"])
+            segment = self._segment(at // 1000)
+            number = len(segment.docs)
+            if segment.times and at < segment.times[-1]:
+                segment.monotonic = False
+            segment.docs.append(doc)
+            segment.times.append(at)
+            for key in keys:
+                segment.postings.setdefault(key, []).append(number)
+            self._grow(segment, len(dumps(doc)) + POSTING_BYTES * len(keys))
+            self._where[doc["id"]] = (segment, number)
+        self._evict()
+
+    def _replace(self, segment: _Segment, number: int, doc: Dict[str, Any], keys: List[Key]):
+        """Update a log in place, such as once it is processed, moving it between postings."""
+        old = segment.docs[number]
+        segment.docs[number] = doc
+        keys, old_keys = set(keys), set(self.keys(old))
+        added = keys - old_keys
+        for key in added:
+            insort(segment.postings.setdefault(key, []), number)
+        for key in old_keys - keys:
+            posting = segment.postings[key]
+            del posting[bisect_left(posting, number)]
+        self._grow(segment, len(dumps(doc)) - len(dumps(old)) + POSTING_BYTES * len(added))
+
+    def _grow(self, segment: _Segment, size: int):
+        segment.bytes += size
+        self.bytes += size
+
+    def _segment(self, millis: int) -> _Segment:
+        start = millis - millis % self.segment_ms
+        segment = self.segments.get(start)
+        if segment is None:
+            segment = self.segments[start] = _Segment(start)
+            insort(self._starts, start)
+        return segment
+
+    def _discard(self, log_id: str):
+        found = self._where.pop(log_id, None)
+        if found is not None:
+            segment, number = found
+            segment.docs[number] = None
+
+    def _drop_oldest(self):
+        segment = self.segments.pop(self._starts.pop(0))
+        for doc in segment.docs:
+            if doc is not None:
+                del self._where[doc["id"]]
+        self.bytes -= segment.bytes
+        self.covered_from = max(self.covered_from, segment.start + self.segment_ms)
+
+    def _evict(self):
+        """Drop segments the window has slid past, then the oldest while over budget."""
+        cutoff = int(time.time() * 1000 - self.window_ms)
+        while self._starts and self._starts[0] + self.segment_ms <= cutoff:
+            self._drop_oldest()
+        while self._starts and self.bytes > self.max_bytes:
+            self._drop_oldest()
+        self.covered_from = max(self.covered_from, cutoff)
+
+    def drop_before(self, millis: float):
+        """Forget logs older than ``millis`` once they are deleted or archived."""
+        while self._starts and self._starts[0] + self.segment_ms <= millis:
+            self._drop_oldest()
+        for start in self._starts:
+            if start >= millis:
+                break
+            segment = self.segments[start]
+            for number, at in enumerate(segment.times):
+                doc = segment.docs[number]
+                if doc is not None and at < millis * 1000:
+                    self._discard(doc["id"])
+        self.covered_from = max(self.covered_from, millis)
+
+    def search(self, query: Dict[str, Any], limit: int, skip: int = 0) -> Optional[List[Dict[str, Any]]]:
+        """The newest matching logs, or None when storage has to answer."""
+        self._evict()
+        rest, low, high = split_time_range(query)
+        bounded = low >= self.covered_from * 1000
+        if high < self.covered_from * 1000:
+            HOT_WINDOW_QUERIES.labels("outside").inc()
+            return None
+        # Anchors usable here, with the clause each one is exactly, if any
+        options: List[Tuple[FrozenSet[Key], Optional[int]]] = []
+        for position, clause in enumerate(rest):
+            clause_anchors = anchors(clause)
+            if any(key[0] in IP_FIELDS and "/" in key[2] for anchor in clause_anchors for key in anchor):
+                # CIDR terms are left to storage
+                HOT_WINDOW_QUERIES.labels("unsupported").inc()
+                return None
+            found_anchors = [anchor for anchor in clause_anchors if all(self._indexed(key) for key in anchor)]
+            exact = position if len(found_anchors) == 1 and _posted_exactly(clause) else None
+            options.extend((anchor, exact) for anchor in found_anchors)
+        needed = skip + limit
+        found: List[Dict[str, Any]] = []
+        try:
+            if all(anchor for anchor, _ in options):
+                for start in reversed(self._starts):
+                    if len(found) >= needed:
+                        break
+                    if high >= start * 1000 and low < (start + self.segment_ms) * 1000:
+                        self._search_segment(self.segments[start], rest, low, high, options, needed, found)
+        except UnsupportedQueryError:
+            HOT_WINDOW_QUERIES.labels("unsupported").inc()
+            return None
+        if not bounded and len(found) < needed:
+            # Older logs in storage may match too
+            HOT_WINDOW_QUERIES.labels("outside").inc()
+            return None
+        HOT_WINDOW_QUERIES.labels("served").inc()
+        return found[skip:needed]
+
+    @staticmethod
+    def _indexed(key: Key) -> bool:
+        return _term_field(key[0]) if key[1] == "term" else key[0] in TEXT_FIELDS
+
+    def _search_segment(
+        self,
+        segment: _Segment,
+        rest: List[Dict[str, Any]],
+        low: float,
+        high: float,
+        options: List[Tuple[FrozenSet[Key], Optional[int]]],
+        needed: int,
+        found: List[Dict[str, Any]]
+    ):
+        numbers, exact = self._candidates(segment, options)
+        # A clause the candidates are posted exactly under needs no check
+        rest = [clause for position, clause in enumerate(rest) if position != exact]
+        check = None if not rest else rest[0] if len(rest) == 1 else {"bool": {"filter": rest}}
+        for number in numbers:
+            doc = segment.docs[number]
+            at = segment.times[number]
+            if doc is None or at < low or at > high:
+                continue
+            if check is None or matches(check, doc):
+                found.append(doc)
+                if len(found) >= needed:
+                    return
+
+    @staticmethod
+    def _candidates(
+        segment: _Segment,
+        options: List[Tuple[FrozenSet[Key], Optional[int]]]
+    ) -> Tuple[Iterable[int], Optional[int]]:
+        """
+        Document numbers, newest first, posted under the anchor with the
+        fewest postings, and the clause that anchor is exactly.
+        """
+        if not options:
+            return segment.newest_first(), None
+        anchor, exact = min(options, key=lambda option: sum(len(segment.posted(key)) for key in option[0]))
+        postings = [segment.posted(key) for key in anchor]
+        if not segment.monotonic:
+            numbers = {number for posting in postings for number in posting}
+            return sorted(numbers, key=segment.times.__getitem__, reverse=True), exact
+        # Postings are in time order: walk them backwards, lazily
+        if len(postings) == 1:
+            return reversed(postings[0]), exact
+        return (number for number, _ in groupby(merge(*map(reversed, postings), reverse=True))), exact
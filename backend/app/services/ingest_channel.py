@@ -0,0 +1,256 @@
+"""
+Hand-off of logs from API workers to one ingestion process per node.
+
+With several API workers, each would otherwise run its own processing
+queue and its own copy of every detector. Instead, workers validate and
+stamp logs and pass them over a local Unix socket to a single ingestion
+process that stores, enriches and scores them.
+
+Logs submitted close together are coalesced into one frame. A frame is a
+9-byte header (payload length, kind, sequence number) and a JSON payload.
+The header and payload are written without being joined, and the payload
+is decoded straight from the bytes read. The ingestion process answers
+every frame with an ack carrying the ids it stored, so a worker's
+response still means the logs are durable.
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+from ..core.instrumentation import BYTES_BUCKETS, REGISTRY, SIZE_BUCKETS
+from ..core.json import dumps, loads
+from ..core.readiness import StorageNotReadyError
+import asyncio
+import logging
+import os
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("!IBI")  # payload length, kind, sequence number
+LOGS = 1
+ACK = 2
+ERROR = 3
+# Partition rebalancing (see partitioning.py)
+DRAIN = 4
+KEYS = 5
+EXPORT = 6
+IMPORT = 7
+
+FRAME_LOGS = REGISTRY.histogram("siem_ingest_channel_frame_logs", "Logs per ingest channel frame.", buckets=SIZE_BUCKETS)
+FRAME_BYTES = REGISTRY.histogram(
+    "siem_ingest_channel_frame_bytes", "Payload bytes per ingest channel frame.", buckets=BYTES_BUCKETS
+)
+ROUND_TRIP_SECONDS = REGISTRY.histogram(
+    "siem_ingest_channel_round_trip_seconds", "Time from an ingest channel frame being sent to its ack."
+)
+
+Waiting = Tuple[List[Dict[str, Any]], float, asyncio.Future]
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    length, kind, sequence = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, sequence, await reader.readexactly(length)
+
+def write_frame(writer: asyncio.StreamWriter, kind: int, sequence: int, payload: bytes):
+    writer.writelines([HEADER.pack(len(payload), kind, sequence), payload])
+
+class IngestChannelError(RuntimeError):
+    """The ingestion process rejected or failed a frame."""
+
+class IngestServer:
+    """
+    Serves the ingest channel in the ingestion process.
+
+    Frames go straight to ``service.ingest_prepared``, which buffers them
+    while storage is still connecting.
+    """
+
+    def __init__(self, service, path: str):
+        self.service = service
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "IngestServer":
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info(f"Ingest channel listening on {self.path}")
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                kind, sequence, payload = await read_frame(reader)
+                try:
+                    write_frame(writer, ACK, sequence, dumps(await self._dispatch(kind, loads(payload))))
+                except StorageNotReadyError as e:
+                    write_frame(writer, ERROR, sequence, dumps({"error": str(e), "not_ready": True}))
+                except Exception as e:
+                    logger.error(f"Error ingesting frame {sequence}: {e}")
+                    write_frame(writer, ERROR, sequence, dumps({"error": str(e)}))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, kind: int, body: Dict[str, Any]) -> Dict[str, Any]:
+        service = self.service
+        if kind == LOGS:
+            stored = await service.ingest_prepared(body["logs"], body["received"])
+            return {"stored": [log["id"] for log in stored]}
+        if kind == DRAIN:
+            await service.processing_queue.join()
+            return {}
+        if kind == KEYS:
+            return {"keys": service.windows.keys()}
+        if kind == EXPORT:
+            return {"state": service.windows.export(body["keys"])}
+        if kind == IMPORT:
+            service.windows.load(body["state"])
+            return {}
+        raise IngestChannelError(f"unknown frame kind {kind}")
+
+class IngestClient:
+    """
+    Submits logs from an API worker to the ingestion process.
+
+    Submissions wait up to ``linger`` seconds, or until ``max_batch`` logs
+    are waiting, so that one frame carries many requests. At most
+    ``max_inflight`` frames await an ack at once.
+    """
+
+    def __init__(self, path: str, max_batch: int = 1000, linger: float = 0.002, max_inflight: int = 8):
+        self.path = path
+        self.max_batch = max_batch
+        self.linger = linger
+        self.max_inflight = max_inflight
+        self._waiting: List[Waiting] = []
+        self._waiting_logs = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._sending: Set[asyncio.Task] = set()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._ack_task: Optional[asyncio.Task] = None
+        self._connecting: Optional[asyncio.Lock] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._acks: Dict[int, Tuple[float, asyncio.Future]] = {}
+        self._sequence = 0
+
+    async def submit(self, logs: List[Dict[str, Any]], received: float) -> List[Dict[str, Any]]:
+        """Hand logs over; returns the ones the ingestion process stored."""
+        if not logs:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiting.append((logs, received, future))
+        self._waiting_logs += len(logs)
+        if self._waiting_logs >= self.max_batch:
+            self._flush_now()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.linger, self._flush_now)
+        stored = set(await future)
+        return [log for log in logs if log["id"] in stored]
+
+    def _flush_now(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        waiting, self._waiting, self._waiting_logs = self._waiting, [], 0
+        if waiting:
+            task = asyncio.create_task(self._send(waiting))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _connect(self):
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+            self._inflight = asyncio.Semaphore(self.max_inflight)
+        async with self._connecting:
+            if self._writer is None or self._writer.is_closing():
+                try:
+                    self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                except OSError as e:
+                    raise StorageNotReadyError(f"Ingestion process unavailable: {e}")
+                self._ack_task = asyncio.create_task(self._read_acks(self._reader))
+
+    async def _send(self, waiting: List[Waiting]):
+        logs: List[Dict[str, Any]] = []
+        received: List[float] = []
+        for batch, at, _ in waiting:
+            logs.extend(batch)
+            received.extend([at] * len(batch))
+        try:
+            payload = dumps({"logs": logs, "received": received})
+            FRAME_LOGS.observe(len(logs))
+            FRAME_BYTES.observe(len(payload))
+            stored = (await self._round_trip(LOGS, payload))["stored"]
+        except Exception as e:
+            for _, _, future in waiting:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, _, future in waiting:
+            if not future.done():
+                future.set_result(stored)
+
+    async def request(self, kind: int, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one control frame right away and return the ack's body."""
+        return await self._round_trip(kind, dumps(body))
+
+    async def _round_trip(self, kind: int, payload: bytes) -> Dict[str, Any]:
+        await self._connect()
+        async with self._inflight:
+            self._sequence = (self._sequence + 1) & 0xFFFFFFFF
+            sequence = self._sequence
+            acked = asyncio.get_running_loop().create_future()
+            self._acks[sequence] = (time.perf_counter(), acked)
+            write_frame(self._writer, kind, sequence, payload)
+            await self._writer.drain()
+            return await acked
+
+    async def _read_acks(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                kind, sequence, payload = await read_frame(reader)
+                sent_at, future = self._acks.pop(sequence, (None, None))
+                if future is None or future.done():
+                    continue
+                ROUND_TRIP_SECONDS.observe(time.perf_counter() - sent_at)
+                body = loads(payload)
+                if kind == ACK:
+                    future.set_result(body)
+                elif body.get("not_ready"):
+                    future.set_exception(StorageNotReadyError(body["error"]))
+                else:
+                    future.set_exception(IngestChannelError(body["error"]))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            # Fail everything in flight; the next submit reconnects
+            for _, future in self._acks.values():
+                if not future.done():
+                    future.set_exception(StorageNotReadyError(f"Ingestion process disconnected: {e}"))
+            self._acks.clear()
+            self._writer.close()
+
+    async def close(self):
+        if self._flush_handle is not None:
+            self._flush_now()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._writer = None
+        if self._ack_task is not None:
+            self._ack_task.cancel()
+            await asyncio.gather(self._ack_task, return_exceptions=True)
+            self._ack_task = None
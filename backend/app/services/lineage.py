@@ -0,0 +1,193 @@
+"""
+Per-log lineage through the ingest pipeline.
+
+Every log carries the wall-clock time it was received, enqueued and
+dequeued. The batch it is processed in adds when enrichment started and
+finished, when the processing update was sent to storage and when storage
+acknowledged it. Completed lineages feed per-stage latency histograms
+labelled by source, a freshness SLO counter, and a ring of sampled traces.
+
+The batch stages are the same for every log of a batch, so they are observed
+once per source with a count. The per-log stages are observed for an evenly
+spaced sample of about ``observations_per_batch`` logs per batch, split
+between sources by their share of the batch. A source whose share is under
+one log carries it, and the logs it stands for, to its next batches. Each
+sampled log is counted for its share of the logs its source has not had
+observed, so counts stay exact and the distribution and sums are estimates.
+Freshness and SLO breaches use every log.
+
+Stages:
+
+- ``store``: received to enqueued (initial write and queue put)
+- ``queue``: enqueued to dequeued (waiting for the processing task)
+- ``batch_fill``: dequeued to the batch starting (waiting for batch mates)
+- ``enrich``: pattern detection and risk scoring
+- ``bulk``: the processing update's storage round trip
+"""
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from ..core.instrumentation import REGISTRY
+import random
+import time
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "siem_ingest_stage_seconds", "Per-log time spent in each ingest stage, by source.", ["stage", "source"]
+)
+END_TO_END_SECONDS = REGISTRY.histogram(
+    "siem_ingest_end_to_end_seconds", "Time from a log's receipt until it is stored and scored, by source.",
+    ["source"]
+)
+FRESHNESS_SECONDS = REGISTRY.gauge(
+    "siem_ingest_freshness_seconds", "End-to-end latency of the slowest log in the last batch, by source.",
+    ["source"]
+)
+SLO_BREACHES = REGISTRY.counter(
+    "siem_ingest_freshness_slo_breaches_total", "Logs that took longer than the freshness SLO, by source.",
+    ["source"]
+)
+
+STAGES = ("received", "enqueued", "dequeued", "enrich_started", "enriched", "bulk_sent", "acked")
+OTHER_SOURCE = "other"
+
+class Lineage:
+    """Timestamps one log collects on its own; batch stages are added on completion."""
+
+    __slots__ = ("source", "received", "enqueued", "dequeued", "sampled")
+
+    def __init__(self, source: str, received: float, sampled: bool = False):
+        self.source = source
+        self.received = received
+        self.enqueued = received
+        self.dequeued = received
+        self.sampled = sampled
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+class LineageTracker:
+    """Turns completed lineages into metrics and sampled traces."""
+
+    def __init__(
+        self,
+        freshness_slo: float = 5.0,
+        sample_rate: float = 0.001,
+        max_traces: int = 512,
+        max_sources: int = 200,
+        observations_per_batch: int = 16
+    ):
+        self.freshness_slo = freshness_slo
+        self.sample_rate = sample_rate
+        self.max_sources = max_sources
+        self.observations_per_batch = max(1, observations_per_batch)
+        self._traces: "deque[Dict[str, Any]]" = deque(maxlen=max_traces)
+        self._sources: Dict[str, str] = {}
+        # Label -> its metric series, looked up once per label
+        self._series: Dict[str, Tuple] = {}
+        # Label -> (logs not yet counted in the per-log stages, share of observations carried over)
+        self._carried: Dict[str, Tuple[int, float]] = {}
+
+    def _label(self, source: str) -> str:
+        """Bound label cardinality: the first ``max_sources`` sources get their own series."""
+        label = self._sources.get(source)
+        if label is None:
+            label = source if len(self._sources) < self.max_sources else OTHER_SOURCE
+            self._sources[source] = label
+        return label
+
+    def received(self, source: str, now: Optional[float] = None) -> Lineage:
+        label = self._sources.get(source) or self._label(source)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        return Lineage(label, time.time() if now is None else now, sampled)
+
+    def complete(
+        self,
+        lineages: List[Lineage],
+        enrich_started: float,
+        enriched: float,
+        bulk_sent: float,
+        acked: float,
+        ids: Optional[List[str]] = None
+    ):
+        """Record a processed batch; ``ids`` label sampled traces."""
+        by_source: Dict[str, List[int]] = {}
+        traced = []
+        for position, lineage in enumerate(lineages):
+            by_source.setdefault(lineage.source, []).append(position)
+            if lineage.sampled:
+                traced.append(position)
+
+        budget = self.observations_per_batch
+        for source, positions in by_source.items():
+            series = self._series.get(source)
+            if series is None:
+                series = self._series[source] = (
+                    STAGE_SECONDS.labels("enrich", source),
+                    STAGE_SECONDS.labels("bulk", source),
+                    STAGE_SECONDS.labels("store", source),
+                    STAGE_SECONDS.labels("queue", source),
+                    STAGE_SECONDS.labels("batch_fill", source),
+                    END_TO_END_SECONDS.labels(source),
+                    FRESHNESS_SECONDS.labels(source),
+                    SLO_BREACHES.labels(source)
+                )
+            enrich, bulk, store, queue, batch_fill, end_to_end, freshness, slo_breaches = series
+            count = len(positions)
+            enrich.observe(enriched - enrich_started, count)
+            bulk.observe(acked - bulk_sent, count)
+            unobserved, credit = self._carried.get(source, (0, 0.0))
+            unobserved += count
+            credit += count * budget / len(lineages)
+            observed = min(count, int(credit))
+            if observed:
+                share, extra = divmod(unobserved, observed)
+                for i in range(observed):
+                    lineage = lineages[positions[i * count // observed]]
+                    weight = share + (i < extra)
+                    store.observe(lineage.enqueued - lineage.received, weight)
+                    queue.observe(lineage.dequeued - lineage.enqueued, weight)
+                    batch_fill.observe(enrich_started - lineage.dequeued, weight)
+                    end_to_end.observe(acked - lineage.received, weight)
+                unobserved, credit = 0, credit - observed
+            self._carried[source] = (unobserved, credit)
+
+            slowest = acked - min(lineages[position].received for position in positions)
+            freshness.set(slowest)
+            if slowest > self.freshness_slo:
+                late = acked - self.freshness_slo
+                slo_breaches.inc(sum(1 for position in positions if lineages[position].received < late))
+
+        for position in traced:
+            self._traces.append(self._trace(
+                lineages[position], enrich_started, enriched, bulk_sent, acked,
+                ids[position] if ids is not None else None
+            ))
+
+    def _trace(
+        self,
+        lineage: Lineage,
+        enrich_started: float,
+        enriched: float,
+        bulk_sent: float,
+        acked: float,
+        log_id: Optional[str]
+    ) -> Dict[str, Any]:
+        times = (lineage.received, lineage.enqueued, lineage.dequeued, enrich_started, enriched, bulk_sent, acked)
+        return {
+            "id": log_id,
+            "source": lineage.source,
+            "timestamps": {stage: _isoformat(value) for stage, value in zip(STAGES, times)},
+            "stage_seconds": {
+                "store": lineage.enqueued - lineage.received,
+                "queue": lineage.dequeued - lineage.enqueued,
+                "batch_fill": enrich_started - lineage.dequeued,
+                "enrich": enriched - enrich_started,
+                "bulk": acked - bulk_sent,
+            },
+            "end_to_end_seconds": acked - lineage.received,
+        }
+
+    def traces(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Sampled traces, newest first."""
+        traces = list(reversed(self._traces))
+        return traces[:limit] if limit is not None else traces
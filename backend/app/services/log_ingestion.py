@@ -1,108 +1,389 @@
 """
 Log ingestion and processing service.
 """
-from datetime import datetime
-from typing import List, Optional, Dict, Any
-from elasticsearch import AsyncElasticsearch
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Dict, Any, Set, Tuple
+from ..storage.archive import ColdArchive
+from ..storage.base import StorageBackend
+from ..storage.bulk_writer import create_bulk_writer
+from ..storage.mappings import ensure_index
+from ..models.documents import with_defaults
 from ..models.log_entry import LogEntry, LogCreate, LogStatistics, LogAnalysis
+from ..core.aggregations import epoch_millis, project_source
+from ..core.config import settings
+from ..core.background import stop_tasks
+from ..core.readiness import StorageNotReadyError
+from ..core.instrumentation import REGISTRY, SIZE_BUCKETS
+from ..core.json import dumps, loads
+from .distinct_values import DistinctValues
+from .fair_queue import FairQueue, SourcePolicy
+from .correlation import KeyWindows, event_time
+from .ingest_channel import IngestChannelError, IngestClient
+from .lineage import Lineage, LineageTracker
+from .field_extraction import FieldExtractor
+from .hot_window import HOT_WINDOW_BYTES, HOT_WINDOW_LOGS, HotWindow
+from .query_cache import QueryCache, query_key
+from .saved_searches import SavedSearchService
 import logging
 import uuid
 import json
 import asyncio
-from collections import defaultdict
+import time
+from collections import defaultdict, deque
+from heapq import merge
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
+QUEUE_DEPTH = REGISTRY.gauge("siem_log_queue_depth", "Logs waiting in the processing queue.")
+BATCH_SIZE = REGISTRY.histogram("siem_log_batch_size", "Logs per processing batch.", buckets=SIZE_BUCKETS)
+BATCH_FILL_SECONDS = REGISTRY.histogram(
+    "siem_log_batch_fill_seconds", "Time from a batch's first log being dequeued to the batch being processed."
+)
+ENRICHMENT_SECONDS = REGISTRY.histogram(
+    "siem_log_enrichment_seconds", "Time per processing batch spent in each enrichment stage.", ["stage"]
+)
+PROCESSING_ERRORS = REGISTRY.counter(
+    "siem_log_processing_errors_total", "Processing batches that failed."
+)
+
 class LogIngestionService:
+    DISTINCT_FIELDS = ("source", "host", "tags", "fields.user", "fields.action", "fields.outcome")
+    # Actions of extracted fields that are logins
+    AUTH_ACTIONS = ("login", "logon", "auth", "signin", "sign-in")
+
     def __init__(self):
         self.index = "logs"
-        self.es_client = None
         self.batch_size = 1000
-        self.processing_queue = asyncio.Queue()
+        # Sub-queue per source, served by weighted deficit round robin
+        self.processing_queue = FairQueue(
+            self._classify,
+            SourcePolicy(
+                settings.INGEST_SOURCE_WEIGHTS,
+                settings.INGEST_SOURCE_RATE_LIMITS,
+                settings.INGEST_DEFAULT_RATE_LIMIT
+            ),
+            quantum=settings.INGEST_SCHEDULER_QUANTUM,
+            burst_seconds=settings.INGEST_RATE_LIMIT_BURST_SECONDS
+        )
+        self._tasks: List[asyncio.Task] = []
+        # Stores and processing updates both go through the adaptive writer;
+        # enough batches are kept outstanding for it to fill its requests
+        self.writer = create_bulk_writer(self.index, settings)
+        self.es_client = None
+        self._batches: Set[asyncio.Task] = set()
+        self._batch_slots = asyncio.Semaphore(settings.BULK_MAX_CONCURRENCY + 1)
+        # Logs accepted before storage is ready, written once it is
+        self.startup_buffer_size = settings.INGEST_STARTUP_BUFFER_SIZE
+        self._pending: List[Tuple[Dict[str, Any], Lineage]] = []
+        # In an API worker of a multi-process deployment, logs are handed to
+        # the node's ingestion process, or to a PartitionRouter spreading them
+        # over several, instead of being stored here
+        self.channel: Optional[IngestClient] = None
+        # Where logs are processed, processed batches are matched against
+        # saved searches
+        self.saved_searches: Optional[SavedSearchService] = None
+        self.extractor = (
+            FieldExtractor(settings.FIELD_EXTRACTION_MAX_SOURCES, settings.FIELD_EXTRACTION_PLAN_MISSES)
+            if settings.FIELD_EXTRACTION_ENABLED else None
+        )
+        self.distinct = DistinctValues(
+            page_size=settings.DISTINCT_VALUES_PAGE_SIZE,
+            snapshot_ttl=settings.DISTINCT_VALUES_SNAPSHOT_TTL_SECONDS
+        )
+        self.key_fields = list(settings.PARTITION_KEY_FIELDS)
+        self.windows = KeyWindows(settings.CORRELATION_WINDOW_SECONDS, settings.CORRELATION_THRESHOLDS)
+        self._windows_expired_at = 0.0
+        self.lineage = LineageTracker(
+            freshness_slo=settings.INGEST_FRESHNESS_SLO_SECONDS,
+            sample_rate=settings.INGEST_TRACE_SAMPLE_RATE,
+            max_traces=settings.INGEST_TRACE_BUFFER_SIZE,
+            max_sources=settings.INGEST_LINEAGE_MAX_SOURCES,
+            observations_per_batch=settings.INGEST_LINEAGE_OBSERVATIONS_PER_BATCH
+        )
+        self.query_cache = QueryCache(
+            max_bytes=settings.QUERY_CACHE_MAX_BYTES,
+            open_ttl=settings.QUERY_CACHE_OPEN_TTL_SECONDS,
+            sealed_ttl=settings.QUERY_CACHE_SEALED_TTL_SECONDS,
+            watermark_lag=settings.QUERY_CACHE_WATERMARK_LAG_SECONDS,
+            name=self.index
+        )
+        # The last HOT_WINDOW_SECONDS of logs stored here, searchable at once.
+        # Only used without a channel, when every log is stored by this process.
+        self.hot_window = (
+            HotWindow(settings.HOT_WINDOW_SECONDS, settings.HOT_WINDOW_SEGMENT_SECONDS, settings.HOT_WINDOW_MAX_BYTES)
+            if settings.HOT_WINDOW_SECONDS else None
+        )
+        # Logs past the hot retention are moved to columnar files on disk;
+        # reads union both tiers
+        self.archive = (
+            ColdArchive(settings.ARCHIVE_PATH, settings.ARCHIVE_ROW_GROUP_ROWS) if settings.ARCHIVE_PATH else None
+        )
         
-    async def initialize(self, es_client: AsyncElasticsearch):
-        """Initialize the service with elasticsearch client."""
+    @staticmethod
+    def _classify(item: Tuple[Dict[str, Any], Lineage]):
+        """Queued logs share a sub-queue per source label, bounded like the lineage metrics."""
+        log, lineage = item
+        return lineage.source, log.get("source", ""), log.get("tags") or ()
+
+    @property
+    def es_client(self) -> Optional[StorageBackend]:
+        return self.writer.client
+
+    @es_client.setter
+    def es_client(self, client: Optional[StorageBackend]):
+        # The writer always uses the service's current client
+        self.writer.client = client
+
+    async def initialize(self, es_client: StorageBackend):
+        """Initialize the service with a storage backend, writing any logs buffered until now."""
+        await ensure_index(es_client, self.index)
         self.es_client = es_client
-        await self._ensure_index()
-        asyncio.create_task(self._process_queue())
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            await self._store_and_enqueue([log for log, _ in batch], [lineage for _, lineage in batch])
+            del self._pending[:len(batch)]
+        if self.channel is None:
+            QUEUE_DEPTH.set_function(self.processing_queue.qsize)
+            if self.hot_window is not None:
+                HOT_WINDOW_LOGS.set_function(lambda: len(self.hot_window))
+                HOT_WINDOW_BYTES.set_function(lambda: self.hot_window.bytes)
+            self._tasks = [asyncio.create_task(self._process_queue())]
+            if self.archive is not None and settings.ARCHIVE_AFTER_DAYS is not None:
+                self._tasks.append(asyncio.create_task(self._archive_periodically()))
+    
+    async def close(self):
+        """Stop background processing."""
+        await stop_tasks(self._tasks)
+        self._tasks = []
+        await stop_tasks(self._batches)
+        await self.writer.close()
+        if self.channel is not None:
+            await self.channel.close()
+        if self.archive is not None:
+            self.archive.close()
     
     async def _ensure_index(self):
         """Ensure log index exists with proper mappings."""
-        if not await self.es_client.indices.exists(index=self.index):
-            await self.es_client.indices.create(
-                index=self.index,
-                mappings={
-                    "properties": {
-                        "message": {"type": "text"},
-                        "level": {"type": "keyword"},
-                        "source": {"type": "keyword"},
-                        "host": {"type": "keyword"},
-                        "timestamp": {"type": "date"},
-                        "metadata": {"type": "object"},
-                        "tags": {"type": "keyword"},
-                        "processed": {"type": "boolean"},
-                        "correlation_id": {"type": "keyword"}
-                    }
-                }
-            )
+        await ensure_index(self.es_client, self.index)
     
     async def _process_queue(self):
         """Background task to process logs."""
         while True:
             try:
                 logs_to_process = []
+                lineages = []
+                first_at = 0.0
                 try:
                     while len(logs_to_process) < self.batch_size:
-                        log = await asyncio.wait_for(
+                        log, lineage = await asyncio.wait_for(
                             self.processing_queue.get(),
                             timeout=1.0
                         )
+                        if not logs_to_process:
+                            first_at = time.perf_counter()
+                        lineage.dequeued = time.time()
                         logs_to_process.append(log)
+                        lineages.append(lineage)
                 except asyncio.TimeoutError:
                     if not logs_to_process:
                         continue
 
-                # Process the batch of logs
-                await self._process_logs_batch(logs_to_process)
-                
-                # Mark tasks as done
-                for _ in range(len(logs_to_process)):
-                    self.processing_queue.task_done()
+                BATCH_FILL_SECONDS.observe(time.perf_counter() - first_at)
+                BATCH_SIZE.observe(len(logs_to_process))
+
+                # Batches run concurrently so their writes can share bulk
+                # requests. Tasks start in order and enrich before their first
+                # await, so correlation still sees logs in queue order.
+                await self._batch_slots.acquire()
+                task = asyncio.create_task(self._finish_batch(logs_to_process, lineages))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
                     
             except Exception as e:
+                PROCESSING_ERRORS.inc()
                 logger.error(f"Error processing log queue: {e}")
                 await asyncio.sleep(1)  # Prevent tight loop on error
 
-    async def _process_logs_batch(self, logs: List[Dict]):
+    async def _finish_batch(self, logs: List[Dict], lineages: List[Lineage]):
+        try:
+            await self._process_logs_batch(logs, lineages)
+        except Exception as e:
+            PROCESSING_ERRORS.inc()
+            logger.error(f"Error processing log batch: {e}")
+        finally:
+            self._batch_slots.release()
+            # Mark tasks as done
+            for _ in range(len(logs)):
+                self.processing_queue.task_done()
+
+    async def _process_logs_batch(self, logs: List[Dict], lineages: Optional[List[Lineage]] = None):
         """Process a batch of logs for patterns and correlations."""
-        bulk_updates = []
+        updates = []
+        processed_logs = []
+        enrich_started = time.time()
         
-        for log in logs:
+        # Each enrichment stage runs over the whole batch so it is timed once
+        started = time.perf_counter()
+        patterns = [self._detect_patterns(log) for log in logs]
+        self._correlate(logs, patterns)
+        detected = time.perf_counter()
+        risk_scores = [self._calculate_risk_score(log) for log in logs]
+        ENRICHMENT_SECONDS.labels("patterns").observe(detected - started)
+        ENRICHMENT_SECONDS.labels("risk_score").observe(time.perf_counter() - detected)
+        enriched = time.time()
+        
+        for log, patterns_detected, risk_score in zip(logs, patterns, risk_scores):
             # Add processing logic here, for example:
             processed_data = {
                 "processed": True,
                 "metadata": {
                     "processed_at": datetime.utcnow().isoformat(),
-                    "patterns_detected": self._detect_patterns(log),
-                    "risk_score": self._calculate_risk_score(log)
+                    "patterns_detected": patterns_detected,
+                    "risk_score": risk_score
                 }
             }
             
-            bulk_updates.extend([
-                {"update": {"_index": self.index, "_id": log["id"]}},
-                {"doc": processed_data}
-            ])
+            updates.append(({"update": {"_index": self.index, "_id": log["id"]}}, {"doc": processed_data}))
+            processed_logs.append({
+                **log,
+                "processed": True,
+                "metadata": {**(log.get("metadata") or {}), **processed_data["metadata"]}
+            })
         
-        if bulk_updates:
-            await self.es_client.bulk(operations=bulk_updates)
+        if updates:
+            bulk_sent = time.time()
+            await self.writer.write(updates)
+            self._invalidate(logs, processed_logs)
+            if lineages:
+                self.lineage.complete(
+                    lineages, enrich_started, enriched, bulk_sent, time.time(),
+                    ids=[log["id"] for log in logs]
+                )
+        
+        if self.saved_searches is not None:
+            try:
+                await self.saved_searches.evaluate(logs)
+            except Exception as e:
+                logger.error(f"Error evaluating saved searches: {e}")
+
+    def partition_key(self, log: Dict[str, Any]) -> str:
+        """The key a log's correlation state is kept under: its first non-empty key field."""
+        for field in self.key_fields:
+            value = log.get(field)
+            if value:
+                return str(value)
+        return ""
+
+    def _correlate(self, logs: List[Dict], patterns: List[List[str]]):
+        """Add findings that span logs sharing a partition key to each log's patterns."""
+        for log, found in zip(logs, patterns):
+            if found:
+                found.extend(self.windows.observe(self.partition_key(log), event_time(log), found))
+        now = time.time()
+        if now - self._windows_expired_at >= self.windows.window_seconds:
+            self.windows.expire(now)
+            self._windows_expired_at = now
+
+    async def create_log(self, log: LogCreate) -> LogEntry:
+        """Store a log entry and queue it for processing."""
+        if self.channel is not None:
+            stored = await self.channel.submit([self._new_log(log)], time.time())
+            if not stored:
+                raise IngestChannelError("The ingestion process did not store the log")
+            self._invalidate(stored)
+            return LogEntry(**stored[0])
+        lineage = self.lineage.received(log.source)
+        log_dict = self._new_log(log)
+        if self.es_client is None:
+            self._buffer([log_dict], [lineage])
+            return LogEntry(**log_dict)
+        await self.es_client.index(
+            index=self.index,
+            id=log_dict["id"],
+            document=log_dict
+        )
+        self._invalidate([log_dict], [log_dict])
+        lineage.enqueued = time.time()
+        await self.processing_queue.put((log_dict, lineage))
+        return LogEntry(**log_dict)
+
+    async def create_logs_batch(self, logs: List[LogCreate]) -> List[LogEntry]:
+        """Store many log entries in one bulk request and queue them for processing."""
+        received = time.time()
+        log_dicts = [self._new_log(log) for log in logs]
+        if self.channel is not None:
+            log_dicts = await self.channel.submit(log_dicts, received)
+            self._invalidate(log_dicts)
+        else:
+            log_dicts = await self.ingest_prepared(log_dicts, [received] * len(log_dicts))
+        return [LogEntry(**log_dict) for log_dict in log_dicts]
+
+    async def ingest_prepared(self, log_dicts: List[Dict[str, Any]], received: List[float]) -> List[Dict[str, Any]]:
+        """Store and queue logs already stamped by _new_log; the ingest channel's entry point."""
+        lineages = [self.lineage.received(log_dict["source"], at) for log_dict, at in zip(log_dicts, received)]
+        if self.es_client is None:
+            self._buffer(log_dicts, lineages)
+            return log_dicts
+        return await self._store_and_enqueue(log_dicts, lineages)
+
+    def _buffer(self, log_dicts: List[Dict[str, Any]], lineages: List[Lineage]):
+        """Hold logs until storage is ready, up to ``startup_buffer_size``."""
+        if len(self._pending) + len(log_dicts) > self.startup_buffer_size:
+            raise StorageNotReadyError("Storage is not ready and the startup buffer is full")
+        self._pending.extend(zip(log_dicts, lineages))
+
+    async def _store_and_enqueue(self, log_dicts: List[Dict[str, Any]], lineages: List[Lineage]) -> List[Dict[str, Any]]:
+        """Bulk-store logs and queue the ones stored for processing."""
+        stored = await self.writer.write([
+            ({"index": {"_index": self.index, "_id": log_dict["id"]}}, log_dict)
+            for log_dict in log_dicts
+        ])
+        if not all(stored):
+            logger.warning(f"Failed to store {stored.count(False)} of {len(log_dicts)} logs")
+            kept = [i for i, ok in enumerate(stored) if ok]
+            log_dicts = [log_dicts[i] for i in kept]
+            lineages = [lineages[i] for i in kept]
+        self._invalidate(log_dicts, log_dicts)
+        
+        enqueued = time.time()
+        for log_dict, lineage in zip(log_dicts, lineages):
+            lineage.enqueued = enqueued
+            await self.processing_queue.put((log_dict, lineage))
+        return log_dicts
+
+    def _invalidate(self, logs: List[Dict[str, Any]], stored: Optional[List[Dict[str, Any]]] = None):
+        """Drop cached results the logs' timestamps fall in, adding the stored versions to the hot window."""
+        if logs:
+            times = [event_time(log) * 1000 for log in logs]
+            self.query_cache.invalidate(self.index, min(times), max(times))
+        if stored and self._serves_hot_window():
+            self.hot_window.add(stored)
+
+    def _serves_hot_window(self) -> bool:
+        return self.hot_window is not None and self.channel is None
+
+    def _new_log(self, log: LogCreate) -> Dict[str, Any]:
+        log_dict = log.model_dump()
+        log_dict["id"] = str(uuid.uuid4())
+        log_dict["metadata"] = log_dict.get("metadata") or {}
+        log_dict["processed"] = False
+        if self.extractor is not None:
+            log_dict["fields"] = self.extractor.extract(log_dict["source"], log_dict["message"])
+        return log_dict
 
     def _detect_patterns(self, log: Dict) -> List[str]:
         """Detect patterns in log entry."""
         patterns = []
         message = log.get("message", "").lower()
+        fields = log.get("fields") or {}
         
-        # Example pattern detection
-        if "failed login" in message:
+        # Structured logs say what happened; others are scanned for it
+        if "action" in fields or "outcome" in fields:
+            action = fields.get("action", "")
+            if fields.get("outcome") == "failure" and any(word in action for word in self.AUTH_ACTIONS):
+                patterns.append("authentication_failure")
+        elif "failed login" in message:
             patterns.append("authentication_failure")
         if "error" in message:
             patterns.append("error_occurrence")
@@ -129,7 +410,11 @@ class LogIngestionService:
         message = log.get("message", "").lower()
         if any(term in message for term in ["attack", "breach", "vulnerability"]):
             score += 0.5
-        if any(term in message for term in ["failed", "error", "exception"]):
+        fields = log.get("fields") or {}
+        if "outcome" in fields:
+            if fields["outcome"] == "failure":
+                score += 0.3
+        elif any(term in message for term in ["failed", "error", "exception"]):
             score += 0.3
             
         return min(1.0, score)
@@ -140,38 +425,93 @@ class LogIngestionService:
         limit: int = 50,
         skip: int = 0
     ) -> List[LogEntry]:
-        """Retrieve logs based on query."""
-        result = await self.es_client.search(
-            index=self.index,
-            query=query,
-            size=limit,
-            from_=skip,
-            sort=[{"timestamp": {"order": "desc"}}]
+        """Retrieve logs based on query, from the hot window or the query cache when possible."""
+        return [LogEntry(**log) for log in loads(await self.get_logs_json(query, limit, skip))]
+
+    async def get_logs_json(
+        self,
+        query: Dict[str, Any],
+        limit: int = 50,
+        skip: int = 0,
+        includes: Optional[List[str]] = None
+    ) -> bytes:
+        """
+        The logs ``get_logs`` returns as a JSON array of their stored
+        documents, optionally projected to ``includes`` like _source includes.
+        The query cache keeps the encoded array, so a cached listing is
+        returned without decoding, validating or encoding any log.
+        """
+        if self._serves_hot_window():
+            recent = self.hot_window.search(query, limit, skip)
+            if recent is not None:
+                return dumps([project_source(log, includes) for log in recent])
+        key = query_key(self.index, query, sort="timestamp:desc", skip=skip, limit=limit, includes=includes)
+
+        async def search():
+            logs = await self._search_logs(query, limit, skip, includes)
+            encoded = dumps(logs if includes is not None else with_defaults(LogEntry, logs))
+            return encoded, len(key) + len(encoded)
+
+        return await self.query_cache.get_or_compute(self.es_client, key, self.index, query, search)
+
+    async def _search_logs(
+        self,
+        query: Dict[str, Any],
+        limit: int,
+        skip: int,
+        includes: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        if not self._reaches_archive(query):
+            result = await self.es_client.search(
+                index=self.index,
+                query=query,
+                size=limit,
+                from_=skip,
+                sort=[{"timestamp": {"order": "desc"}}],
+                **({} if includes is None else {"source_includes": includes})
+            )
+            return [hit["_source"] for hit in result["hits"]["hits"]]
+
+        # Each tier returns its newest skip + limit, then the two are merged
+        result, archived = await asyncio.gather(
+            self.es_client.search(
+                index=self.index,
+                query=query,
+                size=skip + limit,
+                sort=[{"timestamp": {"order": "desc"}}]
+            ),
+            asyncio.to_thread(self.archive.search, self.index, query, skip + limit)
         )
-        
-        return [LogEntry(**hit["_source"]) for hit in result["hits"]["hits"]]
+        hot = [hit["_source"] for hit in result["hits"]["hits"]]
+        return [project_source(log, includes) for log in islice(self._union(hot, archived), skip, skip + limit)]
 
-    async def get_unique_sources(self) -> List[str]:
+    def _reaches_archive(self, query: Optional[Dict[str, Any]]) -> bool:
+        return self.archive is not None and self.archive.reaches(self.index, query)
+
+    @staticmethod
+    def _union(hot: List[Dict[str, Any]], archived: List[Dict[str, Any]]):
+        """Merge two newest-first lists of logs, dropping logs present in both."""
+        seen = set()
+        for log in merge(hot, archived, key=lambda log: -event_time(log)):
+            if log["id"] not in seen:
+                seen.add(log["id"])
+                yield log
+
+    async def get_unique_sources(self, prefix: Optional[str] = None) -> List[str]:
         """Get list of unique log sources."""
-        result = await self.es_client.search(
-            index=self.index,
-            body={
-                "size": 0,
-                "aggs": {
-                    "unique_sources": {
-                        "terms": {
-                            "field": "source",
-                            "size": 1000
-                        }
-                    }
-                }
-            }
-        )
-        
-        return [
-            bucket["key"]
-            for bucket in result["aggregations"]["unique_sources"]["buckets"]
-        ]
+        return [value for value, _ in await self.get_distinct_values("source", prefix)]
+
+    async def get_distinct_values(
+        self,
+        field: str,
+        prefix: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, int]]:
+        """Get every value of a keyword field with its log count, optionally by prefix."""
+        if field not in self.DISTINCT_FIELDS:
+            raise ValueError(f"Distinct values are not available for field: {field}")
+        values = await self.distinct.get(self.es_client, self.index, field, prefix)
+        return values[:limit] if limit else values
 
     async def get_statistics(
         self,
@@ -179,6 +519,32 @@ class LogIngestionService:
         end_time: Optional[datetime] = None
     ) -> LogStatistics:
         """Get log statistics and aggregations."""
+        result = await self.es_client.search(
+            index=self.index,
+            body=self.statistics_body(start_time, end_time)
+        )
+        statistics = self.parse_statistics(result, start_time, end_time)
+        query = self.statistics_body(start_time, end_time)["query"]
+        if self._reaches_archive(query):
+            total, counts = await asyncio.to_thread(
+                self.archive.count_by, self.index, query, ("level", "source", "processed")
+            )
+            statistics.total_logs += total
+            for field, counter in (("logs_by_level", counts["level"]), ("logs_by_source", counts["source"])):
+                buckets = getattr(statistics, field)
+                for value, count in counter.items():
+                    buckets[value] = buckets.get(value, 0) + count
+            processed = counts["processed"][True]
+            statistics.processing_status["processed"] += processed
+            statistics.processing_status["unprocessed"] += total - processed
+        return statistics
+
+    def statistics_body(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Search body behind get_statistics."""
         query = {"bool": {"must": [{"match_all": {}}]}}
         
         if start_time or end_time:
@@ -191,25 +557,29 @@ class LogIngestionService:
                 }
             })
 
-        result = await self.es_client.search(
-            index=self.index,
-            body={
-                "size": 0,
-                "query": query,
-                "aggs": {
-                    "by_level": {
-                        "terms": {"field": "level"}
-                    },
-                    "by_source": {
-                        "terms": {"field": "source"}
-                    },
-                    "by_processing": {
-                        "terms": {"field": "processed"}
-                    }
+        return {
+            "size": 0,
+            "query": query,
+            "aggs": {
+                "by_level": {
+                    "terms": {"field": "level"}
+                },
+                "by_source": {
+                    "terms": {"field": "source"}
+                },
+                "by_processing": {
+                    "terms": {"field": "processed"}
                 }
             }
-        )
-        
+        }
+
+    def parse_statistics(
+        self,
+        result: Dict[str, Any],
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> LogStatistics:
+        """Shape a statistics_body response."""
         return LogStatistics(
             total_logs=result["hits"]["total"]["value"],
             logs_by_level={
@@ -382,8 +752,124 @@ class LogIngestionService:
         
         return recommendations
 
+    async def export_logs(self, query: Dict[str, Any], page_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """Every log matching ``query`` from both tiers, newest first."""
+        hot, cold = self._hot_pages(query, page_size), self._archived_pages(query, page_size)
+        hot_rows, cold_rows = deque(), deque()
+        hot_done = cold_done = False
+        boundary, ids = None, set()
+        while True:
+            if not hot_rows and not hot_done:
+                page = await _next_page(hot)
+                hot_done = page is None
+                hot_rows.extend(page or ())
+            if not cold_rows and not cold_done:
+                page = await _next_page(cold)
+                cold_done = page is None
+                cold_rows.extend(page or ())
+            if not hot_rows and not cold_rows:
+                return
+            rows = hot_rows if not cold_rows or (hot_rows and hot_rows[0][0] >= cold_rows[0][0]) else cold_rows
+            moment, log = rows.popleft()
+            # A log in both tiers (archived, not yet deleted) has the same timestamp
+            if moment != boundary:
+                boundary, ids = moment, set()
+            if log["id"] in ids:
+                continue
+            ids.add(log["id"])
+            yield log
+
+    async def _hot_pages(self, query: Dict[str, Any], page_size: int) -> AsyncIterator[List[Tuple[float, Dict[str, Any]]]]:
+        """
+        Indexed logs matching ``query`` as (epoch seconds, log) pages, newest first.
+
+        Logs have no sortable unique field to search after, so each page
+        starts at the previous page's oldest timestamp and excludes the ids
+        already returned at it.
+        """
+        upper, returned = None, []
+        while True:
+            page_query = query
+            if upper is not None:
+                page_query = {
+                    "bool": {
+                        "must": [query, {"range": {"timestamp": {"lte": upper}}}],
+                        "must_not": [{"ids": {"values": returned}}]
+                    }
+                }
+            result = await self.es_client.search(
+                index=self.index,
+                query=page_query,
+                size=page_size,
+                sort=[{"timestamp": {"order": "desc"}}]
+            )
+            hits = result["hits"]["hits"]
+            if not hits:
+                return
+            yield [(event_time(hit["_source"]), hit["_source"]) for hit in hits]
+            if len(hits) < page_size:
+                return
+            oldest = hits[-1]["_source"]["timestamp"]
+            if oldest != upper:
+                upper, returned = oldest, []
+            returned.extend(hit["_id"] for hit in hits if hit["_source"]["timestamp"] == oldest)
+
+    async def _archived_pages(self, query: Dict[str, Any], page_size: int) -> AsyncIterator[List[Tuple[float, Dict[str, Any]]]]:
+        """Archived logs matching ``query`` as (epoch seconds, log) pages, newest first."""
+        if not self._reaches_archive(query):
+            return
+        rows = self.archive.scan(self.index, query)
+        while True:
+            page = await asyncio.to_thread(
+                lambda: [(event_time(log), log) for _, log in islice(rows, page_size)]
+            )
+            if not page:
+                return
+            yield page
+
+    async def archive_old_logs(self, older_than: datetime) -> int:
+        """Move logs older than ``older_than`` from the index to the cold archive."""
+        if self.archive is None:
+            raise ValueError("The archive is disabled; set ARCHIVE_PATH")
+        archived = 0
+        while True:
+            result = await self.es_client.search(
+                index=self.index,
+                query={"range": {"timestamp": {"lt": older_than.isoformat()}}},
+                size=settings.ARCHIVE_BATCH_SIZE,
+                sort=[{"timestamp": {"order": "asc"}}]
+            )
+            hits = result["hits"]["hits"]
+            if not hits:
+                return archived
+            await asyncio.to_thread(self.archive.write, self.index, [hit["_source"] for hit in hits])
+            # Logs are deleted only once archived: an interruption leaves
+            # logs in both tiers, which reads drop, never in neither
+            deleted = await self.writer.write(
+                [({"delete": {"_index": self.index, "_id": hit["_id"]}}, None) for hit in hits]
+            )
+            archived += len(hits)
+            if not all(deleted):
+                logger.warning(f"{deleted.count(False)} archived logs could not be deleted from {self.index}")
+                return archived
+            if len(hits) < settings.ARCHIVE_BATCH_SIZE:
+                return archived
+            await self.es_client.indices.refresh(index=self.index)
+
+    async def _archive_periodically(self):
+        """Background task moving logs older than ARCHIVE_AFTER_DAYS to the archive."""
+        while True:
+            try:
+                cutoff = datetime.utcnow() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+                archived = await self.archive_old_logs(cutoff)
+                if archived:
+                    logger.info(f"Archived {archived} logs older than {cutoff.isoformat()}")
+            except Exception as e:
+                logger.error(f"Error archiving logs: {e}")
+            await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+
     async def delete_old_logs(self, older_than: datetime) -> int:
-        """Delete logs older than specified date."""
+        """Delete logs older than specified date, from the archive too."""
         result = await self.es_client.delete_by_query(
             index=self.index,
             body={
@@ -396,5 +882,16 @@ class LogIngestionService:
                 }
             }
         )
-        
-        return result["deleted"]
\ No newline at end of file
+        self.query_cache.invalidate(self.index)
+        if self.hot_window is not None:
+            self.hot_window.drop_before(epoch_millis(older_than))
+        dropped = 0
+        if self.archive is not None:
+            dropped = await asyncio.to_thread(self.archive.drop_before, self.index, epoch_millis(older_than))
+        return result["deleted"] + dropped
+
+async def _next_page(pages: AsyncIterator[Any]) -> Optional[Any]:
+    try:
+        return await pages.__anext__()
+    except StopAsyncIteration:
+        return None
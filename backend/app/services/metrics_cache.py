@@ -0,0 +1,91 @@
+"""
+Short-lived cache for computed security metrics.
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from ..core.instrumentation import REGISTRY
+import asyncio
+import time
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "siem_cache_requests_total", "Cache lookups by cache and result (hit, shared, miss).", ["cache", "result"]
+)
+
+class MetricsCache:
+    """
+    TTL cache with single-flight computation.
+
+    Concurrent requests for the same key share one computation, so a burst
+    of dashboard refreshes costs a single aggregation.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 1024, name: str = "metrics"):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = CACHE_REQUESTS.labels(name, "hit")
+        self._shared_counter = CACHE_REQUESTS.labels(name, "shared")
+        self._miss_counter = CACHE_REQUESTS.labels(name, "miss")
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl_seconds), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """Return a cached value, computing it at most once per key at a time."""
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            self._hit_counter.inc()
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            self._shared_counter.inc()
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        self._miss_counter.inc()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so an unawaited future does not log a warning
+            future.exception()
+            raise
+        else:
+            self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
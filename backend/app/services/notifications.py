@@ -0,0 +1,567 @@
+"""
+Alert notifications.
+
+``AlertManager`` hands every new alert to ``NotificationDispatcher.notify``,
+which only appends it to each sink's pending digest, so creating an alert
+never waits on a receiver. A digest is sent once it has waited ``window``
+seconds or holds ``max_alerts`` alerts, and each sink delivers at most its
+``concurrency`` digests at a time; the rest wait for a slot, up to
+``max_queued`` digests per sink.
+
+A digest that fails is put in a retry queue and sent again after a jittered
+exponential backoff. With ``retry_path`` set the queue is a JSON-lines file,
+so retries survive a restart; a digest is delivered at least once. Each
+process locks a file of its own next to ``retry_path`` and, on start, takes
+over the files no running process holds. A digest
+still failing after ``max_attempts``, rejected with an error retrying will
+not fix, or past a sink's backlog goes to the dead-letter store.
+"""
+from collections import defaultdict
+from datetime import datetime
+from email.message import EmailMessage
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from ..core.background import stop_tasks
+from ..core.instrumentation import REGISTRY
+from ..core.json import dumps, loads
+from ..storage.bulk_writer import DeadLetterStore
+import aiohttp
+import asyncio
+import fcntl
+import heapq
+import logging
+import os
+import random
+import re
+import smtplib
+import socket
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SENT = REGISTRY.counter("siem_notifications_sent_total", "Alerts delivered, by sink.", ["sink"])
+DIGESTS = REGISTRY.histogram(
+    "siem_notification_delivery_seconds", "Time to deliver one digest, by sink.", ["sink"]
+)
+FAILURES = REGISTRY.counter("siem_notification_failures_total", "Digest deliveries that failed, by sink.", ["sink"])
+DEAD_LETTERS = REGISTRY.counter(
+    "siem_notification_dead_letters_total", "Digests given up on, by sink.", ["sink"]
+)
+QUEUED = REGISTRY.gauge(
+    "siem_notification_queued_digests", "Digests waiting for or in delivery, by sink.", ["sink"]
+)
+RETRY_QUEUE = REGISTRY.gauge("siem_notification_retry_queue", "Digests waiting to be retried.")
+
+# Statuses a webhook may answer with that are worth retrying; other 4xx are not
+RETRYABLE_STATUSES = {408, 425, 429}
+SYSLOG_SEVERITIES = {"critical": 2, "high": 3, "medium": 4, "low": 5, "info": 6}
+
+Alert = Dict[str, Any]
+
+class DeliveryError(Exception):
+    """A digest could not be delivered; ``permanent`` when retrying will not help."""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+def _value(value: Any) -> Any:
+    return getattr(value, "value", value)
+
+def _timestamp(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value or "-")
+
+class NotificationSink:
+    """A destination for alert digests."""
+
+    def __init__(self, name: str, concurrency: int = 2):
+        self.name = name
+        self.concurrency = concurrency
+        self.slots = asyncio.Semaphore(concurrency)
+        self.queued = 0
+        QUEUED.labels(name).set_function(lambda: self.queued)
+
+    async def send(self, alerts: Sequence[Alert]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class WebhookSink(NotificationSink):
+    """POSTs each digest as ``{"sink", "count", "alerts"}`` JSON."""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10.0,
+        concurrency: int = 2
+    ):
+        super().__init__(name, concurrency)
+        self.url = url
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def send(self, alerts: Sequence[Alert]):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        body = dumps({"sink": self.name, "count": len(alerts), "alerts": alerts})
+        try:
+            async with self._session.post(self.url, data=body, headers=self.headers) as response:
+                if response.status >= 300:
+                    permanent = response.status < 500 and response.status not in RETRYABLE_STATUSES
+                    raise DeliveryError(f"{self.url} answered {response.status}", permanent=permanent)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise DeliveryError(f"{self.url}: {e!r}") from e
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+class SmtpSink(NotificationSink):
+    """Mails each digest to ``recipients``, through smtplib in a worker thread."""
+
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        recipients: Sequence[str],
+        port: int = 25,
+        sender: str = "siem@localhost",
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        timeout: float = 10.0,
+        concurrency: int = 2
+    ):
+        super().__init__(name, concurrency)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = list(recipients)
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def message(self, alerts: Sequence[Alert]) -> EmailMessage:
+        message = EmailMessage()
+        if len(alerts) == 1:
+            message["Subject"] = f"[SIEM] {_value(alerts[0].get('severity'))}: {alerts[0].get('title')}"
+        else:
+            message["Subject"] = f"[SIEM] {len(alerts)} new alerts"
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content("\n\n".join(
+            f"[{_value(alert.get('severity'))}] {alert.get('title')} "
+            f"({_value(alert.get('source'))}, {_timestamp(alert.get('timestamp'))}, id {alert.get('id')})\n"
+            f"{alert.get('description', '')}"
+            for alert in alerts
+        ))
+        return message
+
+    async def send(self, alerts: Sequence[Alert]):
+        message = self.message(alerts)
+        try:
+            await asyncio.to_thread(self._send, message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise DeliveryError(f"{self.host}: recipients refused", permanent=True) from e
+        except smtplib.SMTPResponseException as e:
+            raise DeliveryError(f"{self.host} answered {e.smtp_code}", permanent=e.smtp_code >= 500) from e
+        except (smtplib.SMTPException, OSError) as e:
+            raise DeliveryError(f"{self.host}: {e!r}") from e
+
+    def _send(self, message: EmailMessage):
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as client:
+            if self.starttls:
+                client.starttls()
+            if self.username:
+                client.login(self.username, self.password or "")
+            client.send_message(message)
+
+class SyslogSink(NotificationSink):
+    """
+    Forwards each alert of a digest as an RFC 5424 message with the alert as
+    JSON, over UDP or over TCP with octet-counted framing.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        port: int = 514,
+        protocol: str = "udp",
+        facility: int = 16,  # local0
+        app_name: str = "siem-dashboard",
+        timeout: float = 10.0,
+        concurrency: int = 2
+    ):
+        super().__init__(name, concurrency)
+        if protocol not in ("udp", "tcp"):
+            raise ValueError(f"Unsupported syslog protocol: {protocol}")
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.facility = facility
+        self.app_name = app_name
+        self.timeout = timeout
+        self.hostname = socket.gethostname() or "-"
+
+    def message(self, alert: Alert) -> bytes:
+        priority = self.facility * 8 + SYSLOG_SEVERITIES.get(_value(alert.get("severity")), 6)
+        header = f"<{priority}>1 {_timestamp(alert.get('timestamp'))} {self.hostname} {self.app_name} - alert - "
+        return header.encode() + dumps(alert)
+
+    async def send(self, alerts: Sequence[Alert]):
+        messages = [self.message(alert) for alert in alerts]
+        try:
+            if self.protocol == "udp":
+                transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                    asyncio.DatagramProtocol, remote_addr=(self.host, self.port)
+                )
+                try:
+                    for message in messages:
+                        transport.sendto(message)
+                finally:
+                    transport.close()
+                return
+            _, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            try:
+                writer.write(b"".join(b"%d %s" % (len(message), message) for message in messages))
+                await asyncio.wait_for(writer.drain(), self.timeout)
+            finally:
+                writer.close()
+        except (OSError, asyncio.TimeoutError) as e:
+            raise DeliveryError(f"{self.host}:{self.port}: {e!r}") from e
+
+SINK_TYPES = {"webhook": WebhookSink, "smtp": SmtpSink, "syslog": SyslogSink}
+
+def build_sinks(configs: Iterable[Dict[str, Any]], concurrency: int = 2) -> List[NotificationSink]:
+    """
+    Sinks from ``{"type": ..., "name": ..., **options}`` entries; raises
+    ValueError for an unknown type or a repeated name.
+    """
+    sinks = []
+    for config in configs:
+        options = {"concurrency": concurrency, **config}
+        kind = options.pop("type", None)
+        if kind not in SINK_TYPES:
+            raise ValueError(f"Unknown notification sink type: {kind}")
+        if any(sink.name == options.get("name") for sink in sinks):
+            raise ValueError(f"Duplicate notification sink name: {options.get('name')}")
+        sinks.append(SINK_TYPES[kind](**options))
+    return sinks
+
+class RetryQueue:
+    """
+    Digests waiting to be sent again, by when they are due. Every change is
+    appended to a JSON-lines file when ``path`` is set; ``load`` replays it
+    and rewrites it with only the digests still waiting.
+
+    Processes sharing ``path`` never write the same file. ``load`` locks the
+    first free slot (``retries.jsonl``, then ``retries.1.jsonl`` and so on)
+    and takes over the digests of every slot no running process holds.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.base_path = path
+        # The slot this process holds, once loaded
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._due: List[Tuple[float, str]] = []
+        self._file = None
+        self._lock = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self):
+        if self.base_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.base_path) or ".", exist_ok=True)
+            self._lock, self.path = self._claim()
+        except OSError as e:
+            logger.error(f"Could not lock a notification retry file next to {self.base_path}: {e}")
+            # Keep retries in memory rather than write a file another process may own
+            self.path = None
+            return
+        adopted = []
+        for path in [self.path] + self._slots():
+            if path == self.path:
+                self._read(path)
+                continue
+            lock = self._try_lock(path)
+            if lock is not None:
+                self._read(path)
+                adopted.append((path, lock))
+        self._due = [(entry["due_at"], entry_id) for entry_id, entry in self.entries.items()]
+        heapq.heapify(self._due)
+        self._rewrite()
+        # Only once their digests are in this process's file
+        for path, lock in adopted:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"Could not remove adopted notification retries {path}: {e}")
+            lock.close()
+
+    def _slot(self, number: int) -> str:
+        if number == 0:
+            return self.base_path
+        root, extension = os.path.splitext(self.base_path)
+        return f"{root}.{number}{extension}"
+
+    def _slots(self) -> List[str]:
+        """Retry files of every slot, in slot order."""
+        directory = os.path.dirname(self.base_path) or "."
+        root, extension = os.path.splitext(os.path.basename(self.base_path))
+        pattern = re.compile(rf"{re.escape(root)}(?:\.(\d+))?{re.escape(extension)}")
+        numbers = []
+        for name in os.listdir(directory):
+            found = pattern.fullmatch(name)
+            if found:
+                numbers.append(int(found.group(1) or 0))
+        return [self._slot(number) for number in sorted(numbers)]
+
+    @staticmethod
+    def _try_lock(path: str):
+        """An open lock file for ``path``, or None while another process holds it."""
+        lock = open(f"{path}.lock", "ab")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    def _claim(self) -> Tuple[Any, str]:
+        number = 0
+        while True:
+            path = self._slot(number)
+            lock = self._try_lock(path)
+            if lock is not None:
+                return lock, path
+            number += 1
+
+    def _read(self, path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as file:
+            for line in file:
+                try:
+                    record = loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+                if record.get("done"):
+                    self.entries.pop(record["id"], None)
+                else:
+                    self.entries[record["id"]] = record
+
+    def push(self, entry: Dict[str, Any]):
+        self.entries[entry["id"]] = entry
+        heapq.heappush(self._due, (entry["due_at"], entry["id"]))
+        self._append(entry)
+
+    def done(self, entry_id: str):
+        if self.entries.pop(entry_id, None) is not None:
+            self._append({"id": entry_id, "done": True})
+
+    def due(self, now: float) -> List[Dict[str, Any]]:
+        """Digests due by ``now``; each is handed out once per ``push``."""
+        found = []
+        while self._due and self._due[0][0] <= now:
+            due_at, entry_id = heapq.heappop(self._due)
+            entry = self.entries.get(entry_id)
+            if entry is not None and entry["due_at"] == due_at:
+                found.append(entry)
+        return found
+
+    def next_due(self) -> Optional[float]:
+        return self._due[0][0] if self._due else None
+
+    def _append(self, record: Dict[str, Any]):
+        if self.path is None:
+            return
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "ab")
+            self._file.write(dumps(record) + b"\n")
+            self._file.flush()
+        except OSError as e:
+            logger.error(f"Could not persist notification retry to {self.path}: {e}")
+
+    def _rewrite(self):
+        self._close_file()
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "wb") as file:
+                for entry in self.entries.values():
+                    file.write(dumps(entry) + b"\n")
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.error(f"Could not compact notification retries in {self.path}: {e}")
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        """Close the file and give up the slot."""
+        self._close_file()
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+class NotificationDispatcher:
+    """Digests new alerts per sink and delivers them out of band."""
+
+    def __init__(
+        self,
+        sinks: Sequence[NotificationSink] = (),
+        window: float = 5.0,
+        max_alerts: int = 100,
+        max_queued: int = 1000,
+        retry_path: Optional[str] = None,
+        retry_base: float = 1.0,
+        retry_max: float = 300.0,
+        max_attempts: int = 10,
+        close_timeout: float = 5.0,
+        dead_letters: Optional[DeadLetterStore] = None
+    ):
+        self.sinks = {sink.name: sink for sink in sinks}
+        self.window = window
+        self.max_alerts = max_alerts
+        self.max_queued = max_queued
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self.close_timeout = close_timeout
+        self.retries = RetryQueue(retry_path)
+        self.dead_letters = dead_letters if dead_letters is not None else DeadLetterStore()
+        self._pending: Dict[str, List[Alert]] = defaultdict(list)
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # Delivery tasks and the digest each is sending
+        self._deliveries: Dict[asyncio.Task, Dict[str, Any]] = {}
+        self._retry_changed = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def initialize(self):
+        """Load retries left by the last run and start the retry loop."""
+        if not self.sinks:
+            return
+        self.retries.load()
+        if self.retries:
+            logger.info(f"Loaded {len(self.retries)} notification digests to retry")
+        RETRY_QUEUE.set_function(lambda: len(self.retries))
+        self._tasks = [asyncio.create_task(self._retry_loop())]
+
+    async def close(self):
+        """Send pending digests, waiting up to ``close_timeout``; the rest are kept for retry."""
+        for name in list(self._pending):
+            self._flush(name)
+        if self._deliveries:
+            await asyncio.wait(list(self._deliveries), timeout=self.close_timeout)
+        unfinished = dict(self._deliveries)
+        await stop_tasks(self._tasks + list(unfinished))
+        self._tasks = []
+        for entry in unfinished.values():
+            if entry["id"] not in self.retries.entries:
+                self.retries.push({**entry, "due_at": time.time()})
+        for sink in self.sinks.values():
+            await sink.close()
+        self.retries.close()
+        self.dead_letters.close()
+
+    def notify(self, alert: Alert):
+        """Add an alert to every sink's digest; never waits."""
+        for name in self.sinks:
+            pending = self._pending[name]
+            pending.append(alert)
+            if len(pending) >= self.max_alerts:
+                self._flush(name)
+            elif len(pending) == 1:
+                self._timers[name] = asyncio.get_running_loop().call_later(self.window, self._flush, name)
+
+    def _flush(self, name: str):
+        timer = self._timers.pop(name, None)
+        if timer is not None:
+            timer.cancel()
+        alerts = self._pending.pop(name, None)
+        if not alerts:
+            return
+        entry = {"id": str(uuid.uuid4()), "sink": name, "alerts": alerts, "attempts": 0}
+        sink = self.sinks[name]
+        if sink.queued >= self.max_queued:
+            self._dead_letter(entry, f"{sink.queued} digests already queued")
+            return
+        self._start(sink, entry)
+
+    def _start(self, sink: NotificationSink, entry: Dict[str, Any]):
+        sink.queued += 1
+        task = asyncio.create_task(self._deliver(sink, entry))
+        self._deliveries[task] = entry
+        task.add_done_callback(self._delivered)
+
+    def _delivered(self, task: asyncio.Task):
+        entry = self._deliveries.pop(task, None)
+        if entry is not None:
+            self.sinks[entry["sink"]].queued -= 1
+
+    async def _deliver(self, sink: NotificationSink, entry: Dict[str, Any]):
+        async with sink.slots:
+            started = time.perf_counter()
+            try:
+                await sink.send(entry["alerts"])
+            except DeliveryError as e:
+                error, permanent = str(e), e.permanent
+            except Exception as e:
+                error, permanent = repr(e), False
+                logger.exception(f"Unexpected error notifying sink {sink.name}")
+            else:
+                DIGESTS.labels(sink.name).observe(time.perf_counter() - started)
+                SENT.labels(sink.name).inc(len(entry["alerts"]))
+                self.retries.done(entry["id"])
+                return
+        FAILURES.labels(sink.name).inc()
+        attempts = entry["attempts"] + 1
+        if permanent or attempts >= self.max_attempts:
+            self.retries.done(entry["id"])
+            self._dead_letter({**entry, "attempts": attempts}, error)
+            return
+        # Full jitter, so digests that failed together do not come back together
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (attempts - 1)))
+        self.retries.push({**entry, "attempts": attempts, "due_at": time.time() + delay, "error": error})
+        self._retry_changed.set()
+        logger.warning(f"Notification to {sink.name} failed ({error}); retry {attempts} in {delay:.1f}s")
+
+    def _dead_letter(self, entry: Dict[str, Any], error: str):
+        DEAD_LETTERS.labels(entry["sink"]).inc()
+        self.dead_letters.add(
+            "notifications", {"sink": entry["sink"]}, entry["alerts"], None, error, entry["attempts"]
+        )
+        logger.error(f"Gave up notifying {entry['sink']} of {len(entry['alerts'])} alerts: {error}")
+
+    async def _retry_loop(self):
+        """Background task resending digests as they come due."""
+        while True:
+            due_at = self.retries.next_due()
+            timeout = None if due_at is None else max(0.0, due_at - time.time())
+            try:
+                await asyncio.wait_for(self._retry_changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._retry_changed.clear()
+            for entry in self.retries.due(time.time()):
+                sink = self.sinks.get(entry["sink"])
+                if sink is None:
+                    self.retries.done(entry["id"])
+                    self._dead_letter(entry, "sink no longer configured")
+                else:
+                    self._start(sink, entry)
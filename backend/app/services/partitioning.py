@@ -0,0 +1,232 @@
+"""
+Consistent-hash partitioning of logs across ingest workers.
+
+Correlation state is kept per partition key (host, then source), so every
+log for a key has to reach the same worker. A hash ring with virtual nodes
+maps keys to workers; adding or removing a worker moves only the keys
+whose arc changed owner, about 1/N of them.
+
+Rebalancing pauses routing, waits for the workers to process what they
+already have, hands the correlation windows of moved keys from their old
+owner to their new one, and then resumes. No key is ever processed by two
+workers with split state.
+
+Workers are reached through a transport. ``ChannelTransport`` talks to
+ingestion processes over their ingest channels and ``LocalTransport``
+runs them in this process. A broker transport would publish each worker's
+share under ``routing_key(worker)`` to a direct exchange with one queue
+per worker.
+"""
+from abc import ABC, abstractmethod
+from bisect import bisect
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from ..core.instrumentation import REGISTRY
+from .correlation import WindowState
+from .ingest_channel import DRAIN, EXPORT, IMPORT, KEYS, IngestClient
+import asyncio
+import hashlib
+
+ROUTED_LOGS = REGISTRY.counter("siem_partition_routed_logs_total", "Logs routed to each ingest worker.", ["worker"])
+KEYS_MOVED = REGISTRY.counter(
+    "siem_partition_keys_moved_total", "Correlation windows handed to a new owner while rebalancing."
+)
+
+ROUTING_KEY_PREFIX = "siem.ingest"
+
+def routing_key(worker: str) -> str:
+    return f"{ROUTING_KEY_PREFIX}.{worker}"
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """Consistent hashing with ``vnodes`` points per node."""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 256):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        self._rebuild()
+
+    def remove(self, node: str):
+        self.nodes.remove(node)
+        self._rebuild()
+
+    def _rebuild(self):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(self.vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("The hash ring has no nodes")
+        position = bisect(self._points, _hash(key))
+        return self._owners[position % len(self._owners)]
+
+    def copy(self) -> "HashRing":
+        return HashRing(self.nodes, self.vnodes)
+
+class PartitionTransport(ABC):
+    """Delivers logs to ingest workers and moves correlation state between them."""
+
+    @abstractmethod
+    async def send(self, worker: str, logs: List[Dict[str, Any]], received: List[float]) -> List[Dict[str, Any]]:
+        """Hand logs to a worker; returns the ones it stored."""
+
+    @abstractmethod
+    async def drain(self, worker: str):
+        """Wait until a worker has processed everything sent to it."""
+
+    @abstractmethod
+    async def keys(self, worker: str) -> List[str]:
+        """Keys a worker holds correlation state for."""
+
+    @abstractmethod
+    async def export_state(self, worker: str, keys: List[str]) -> WindowState:
+        """Remove and return a worker's state for ``keys``."""
+
+    @abstractmethod
+    async def import_state(self, worker: str, state: WindowState):
+        """Give a worker state exported by another."""
+
+class LocalTransport(PartitionTransport):
+    """Ingest workers as LogIngestionService instances in this process."""
+
+    def __init__(self, workers: Optional[Dict[str, Any]] = None):
+        self.workers: Dict[str, Any] = dict(workers or {})
+
+    async def send(self, worker: str, logs: List[Dict[str, Any]], received: List[float]) -> List[Dict[str, Any]]:
+        return await self.workers[worker].ingest_prepared(logs, received)
+
+    async def drain(self, worker: str):
+        await self.workers[worker].processing_queue.join()
+
+    async def keys(self, worker: str) -> List[str]:
+        return self.workers[worker].windows.keys()
+
+    async def export_state(self, worker: str, keys: List[str]) -> WindowState:
+        return self.workers[worker].windows.export(keys)
+
+    async def import_state(self, worker: str, state: WindowState):
+        self.workers[worker].windows.load(state)
+
+class ChannelTransport(PartitionTransport):
+    """Ingestion processes (``python -m app.ingest_server``), one ingest channel each."""
+
+    def __init__(self, clients: Dict[str, IngestClient]):
+        self.clients = dict(clients)
+
+    async def send(self, worker: str, logs: List[Dict[str, Any]], received: List[float]) -> List[Dict[str, Any]]:
+        # Logs of one call share a receipt time; the channel batches per call
+        return await self.clients[worker].submit(logs, received[0] if received else 0.0)
+
+    async def drain(self, worker: str):
+        await self.clients[worker].request(DRAIN, {})
+
+    async def keys(self, worker: str) -> List[str]:
+        return (await self.clients[worker].request(KEYS, {}))["keys"]
+
+    async def export_state(self, worker: str, keys: List[str]) -> WindowState:
+        return (await self.clients[worker].request(EXPORT, {"keys": keys}))["state"]
+
+    async def import_state(self, worker: str, state: WindowState):
+        await self.clients[worker].request(IMPORT, {"state": state})
+
+    async def close(self):
+        await asyncio.gather(*(client.close() for client in self.clients.values()))
+
+class PartitionRouter:
+    """Routes logs to ingest workers by partition key, and rebalances them."""
+
+    def __init__(
+        self,
+        transport: PartitionTransport,
+        workers: Iterable[str],
+        key: Callable[[Dict[str, Any]], str],
+        vnodes: int = 256
+    ):
+        self.transport = transport
+        self.key = key
+        self.ring = HashRing(workers, vnodes)
+        self._open = asyncio.Event()
+        self._open.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._inflight = 0
+        self._rebalancing = asyncio.Lock()
+
+    def partition(self, logs: List[Dict[str, Any]], received: List[float]) -> Dict[str, Tuple[List, List]]:
+        """Group logs, with their receipt times, by owning worker."""
+        shares: Dict[str, Tuple[List, List]] = defaultdict(lambda: ([], []))
+        node_for = self.ring.node_for
+        for log, at in zip(logs, received):
+            share = shares[node_for(self.key(log))]
+            share[0].append(log)
+            share[1].append(at)
+        return shares
+
+    async def submit(self, logs: List[Dict[str, Any]], received: float) -> List[Dict[str, Any]]:
+        """
+        Send each log to its key's worker; returns the logs stored.
+
+        Takes the place of an IngestClient in a log service.
+        """
+        await self._open.wait()
+        self._inflight += 1
+        self._idle.clear()
+        try:
+            shares = self.partition(logs, [received] * len(logs))
+            results = await asyncio.gather(*(
+                self.transport.send(worker, share_logs, share_received)
+                for worker, (share_logs, share_received) in shares.items()
+            ))
+        finally:
+            self._inflight -= 1
+            if not self._inflight:
+                self._idle.set()
+        for worker, (share_logs, _) in shares.items():
+            ROUTED_LOGS.labels(worker).inc(len(share_logs))
+        return [log for stored in results for log in stored]
+
+    async def close(self):
+        close = getattr(self.transport, "close", None)
+        if close is not None:
+            await close()
+
+    async def add_worker(self, worker: str):
+        await self._rebalance(lambda ring: ring.add(worker))
+
+    async def remove_worker(self, worker: str):
+        await self._rebalance(lambda ring: ring.remove(worker))
+
+    async def _rebalance(self, change: Callable[[HashRing], None]):
+        async with self._rebalancing:
+            self._open.clear()
+            try:
+                await self._idle.wait()
+                old = self.ring
+                await asyncio.gather(*(self.transport.drain(worker) for worker in old.nodes))
+                new = old.copy()
+                change(new)
+                for worker in old.nodes:
+                    moved: Dict[str, List[str]] = defaultdict(list)
+                    for key in await self.transport.keys(worker):
+                        owner = new.node_for(key)
+                        if owner != worker:
+                            moved[owner].append(key)
+                    for owner, keys in moved.items():
+                        state = await self.transport.export_state(worker, keys)
+                        await self.transport.import_state(owner, state)
+                        KEYS_MOVED.inc(len(state))
+                self.ring = new
+            finally:
+                self._open.set()
@@ -0,0 +1,244 @@
+"""
+In-memory percolator for standing queries.
+
+Each query has *anchors*: key sets that every document it matches must
+contain a key of, one set per required clause. A key is a field value
+(``term``/``terms``) or a token of a field (``match``/``multi_match``).
+
+Anchors are ranked, preferring field values over tokens and then the keys
+that currently have the fewest queries. A query is posted in an inverted
+index under every pair of keys from its two best anchors, or under the keys
+of its only anchor. A document's keys, and pairs of them, are looked up
+there, and a query found is only evaluated in full if the document also
+hits its remaining anchors. Selecting candidates therefore costs about the
+square of the document's key count, however many queries are registered.
+
+Queries with no anchor (such as a bare ``range``, ``prefix``, ``exists`` or
+``must_not``) cannot be indexed: each one is evaluated against every
+document, so their cost grows with their number.
+"""
+from collections import Counter
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from ..core.query_dsl import get_values, iter_fields, matches, tokenize
+
+Key = Tuple[str, str, str]  # (field, "term" or "text", value)
+
+# Pairs of keys a query is posted under at most; past it, under its best anchor alone
+MAX_PAIRS = 256
+
+SUPPORTED_CLAUSES = {
+    "match_all", "match_none", "bool", "term", "terms", "range", "prefix", "exists",
+    "match", "match_phrase", "multi_match",
+}
+
+def validate(query: Dict[str, Any]):
+    """Raise ValueError unless every clause of ``query`` can be percolated."""
+    if not isinstance(query, dict) or not query:
+        raise ValueError("A standing query must be a non-empty query object")
+    for kind, clause in query.items():
+        if kind not in SUPPORTED_CLAUSES:
+            raise ValueError(f"Unsupported clause in a standing query: {kind}")
+        if kind == "bool":
+            for occurrence in ("must", "filter", "should", "must_not"):
+                for item in _as_list(clause.get(occurrence)):
+                    validate(item)
+
+def _as_list(clauses: Any) -> List[Dict[str, Any]]:
+    if clauses is None:
+        return []
+    return clauses if isinstance(clauses, list) else [clauses]
+
+def term_key(value: Any) -> str:
+    """A term's key, equal for values that query_dsl considers equal."""
+    value = getattr(value, "value", value)
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def anchors(query: Dict[str, Any]) -> List[FrozenSet[Key]]:
+    """Alternative anchors for ``query``: key sets a matching document has at least one key of."""
+    if len(query) != 1:
+        return [anchor for kind, clause in query.items() for anchor in anchors({kind: clause})]
+    kind, clause = next(iter(query.items()))
+
+    if kind == "term":
+        field, value = next(iter(clause.items()))
+        if isinstance(value, dict):
+            value = value.get("value")
+        return [frozenset({(field, "term", term_key(value))})]
+    if kind == "terms":
+        field, values = next((k, v) for k, v in clause.items() if k != "boost")
+        return [frozenset((field, "term", term_key(value)) for value in values)]
+    if kind in ("match", "match_phrase", "multi_match"):
+        if kind == "multi_match":
+            fields, text, operator = list(iter_fields(clause.get("fields", []))), clause["query"], clause.get("operator", "or")
+        else:
+            field, params = next(iter(clause.items()))
+            text = params.get("query") if isinstance(params, dict) else params
+            operator = "and" if kind == "match_phrase" else (params.get("operator", "or") if isinstance(params, dict) else "or")
+            fields = [field]
+        tokens = tokenize(text)
+        if not tokens or not fields:
+            return []
+        if str(operator).lower() == "and":
+            return [frozenset((field, "text", token) for field in fields) for token in tokens]
+        return [frozenset((field, "text", token) for field in fields for token in tokens)]
+    if kind == "bool":
+        required = _as_list(clause.get("must")) + _as_list(clause.get("filter"))
+        found = [anchor for item in required for anchor in anchors(item)]
+        should = _as_list(clause.get("should"))
+        minimum = clause.get("minimum_should_match", 0 if required else 1)
+        if should and minimum not in (0, "0", "0%"):
+            # One of the should clauses has to match: the union of their anchors
+            union: Set[Key] = set()
+            for item in should:
+                options = anchors(item)
+                if not options:
+                    return found
+                union |= min(options, key=len)
+            found.append(frozenset(union))
+        return found
+    if kind == "match_none":
+        return [frozenset()]
+    return []
+
+class Percolator:
+    """Standing queries by id, with an inverted index from keys and pairs of keys to query ids."""
+
+    def __init__(self):
+        self.queries: Dict[str, Dict[str, Any]] = {}
+        # The posted anchors first, then the others a document must also hit
+        self._anchors: Dict[str, Tuple[FrozenSet[Key], ...]] = {}
+        # Key -> second key (None when posted under one anchor) -> query ids
+        self._postings: Dict[Key, Dict[Optional[Key], Set[str]]] = {}
+        # Anchors of each query that posting does not check
+        self._remaining: Dict[str, Tuple[FrozenSet[Key], ...]] = {}
+        # Queries posted under each key, alone or in a pair
+        self._load: Counter = Counter()
+        self._unanchored: Set[str] = set()
+        # Fields and kinds of key some anchor uses, with anchor counts
+        self._fields: Dict[str, Counter] = {}
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def add(self, query_id: str, query: Dict[str, Any]):
+        validate(query)
+        if query_id in self.queries:
+            self.remove(query_id)
+        found = list(dict.fromkeys(anchors(query)))
+        self.queries[query_id] = query
+        if not found:
+            self._unanchored.add(query_id)
+            self._anchors[query_id] = ()
+            return
+        if not all(found):
+            # An empty anchor (match_none) can never be hit
+            self._anchors[query_id] = ()
+            return
+        found.sort(key=self._cost)
+        self._anchors[query_id] = tuple(found)
+        for key, second in self._posting_keys(query_id):
+            self._postings.setdefault(key, {}).setdefault(second, set()).add(query_id)
+        for anchor in found[:len(found) - len(self._remaining[query_id])]:
+            self._load.update(anchor)
+        for anchor in found:
+            for field, kind, _ in anchor:
+                self._fields.setdefault(field, Counter())[kind] += 1
+
+    def _posting_keys(self, query_id: str) -> List[Tuple[Key, Optional[Key]]]:
+        """The (key, second key) pairs ``query_id`` is posted under; sets what is left to check."""
+        found = self._anchors[query_id]
+        if len(found) > 1 and len(found[0]) * len(found[1]) <= MAX_PAIRS:
+            self._remaining[query_id] = found[2:]
+            # A key both anchors share satisfies them on its own
+            return list({
+                (first, None) if first == second else (min(first, second), max(first, second))
+                for first in found[0]
+                for second in found[1]
+            })
+        self._remaining[query_id] = found[1:]
+        return [(key, None) for key in found[0]]
+
+    def _cost(self, anchor: FrozenSet[Key]) -> Tuple[bool, int, int]:
+        """Field values before tokens, which far more documents share, then queries already posted, then size."""
+        text = any(kind == "text" for _, kind, _ in anchor)
+        return text, sum(self._load[key] for key in anchor), len(anchor)
+
+    def remove(self, query_id: str) -> bool:
+        if query_id not in self.queries:
+            return False
+        del self.queries[query_id]
+        self._unanchored.discard(query_id)
+        if not self._anchors[query_id]:
+            del self._anchors[query_id]
+            return True
+        posted = self._posting_keys(query_id)
+        found = self._anchors.pop(query_id)
+        for key, second in posted:
+            nested = self._postings[key]
+            posting = nested[second]
+            posting.discard(query_id)
+            if not posting:
+                del nested[second]
+                if not nested:
+                    del self._postings[key]
+        for anchor in found[:len(found) - len(self._remaining.pop(query_id))]:
+            self._load.subtract(anchor)
+            for key in anchor:
+                if not self._load[key]:
+                    del self._load[key]
+        for anchor in found:
+            for field, kind, _ in anchor:
+                kinds = self._fields[field]
+                kinds[kind] -= 1
+                if not kinds[kind]:
+                    del kinds[kind]
+                    if not kinds:
+                        del self._fields[field]
+        return True
+
+    def keys(self, doc: Dict[str, Any]) -> Set[Key]:
+        """The document's keys, for the fields some anchor uses."""
+        keys = set()
+        for field, kinds in self._fields.items():
+            values = get_values(doc, field)
+            if "term" in kinds:
+                keys.update((field, "term", term_key(value)) for value in values)
+            if "text" in kinds:
+                for value in values:
+                    keys.update((field, "text", token) for token in tokenize(value))
+        return keys
+
+    def candidates(self, doc: Dict[str, Any]) -> Set[str]:
+        """Queries whose every anchor the document hits, and the unanchored ones."""
+        keys = self.keys(doc)
+        posted: Set[str] = set()
+        for key in keys:
+            nested = self._postings.get(key)
+            if not nested:
+                continue
+            for second in (None, *keys):
+                posting = nested.get(second)
+                if posting:
+                    posted |= posting
+        found = set(self._unanchored)
+        for query_id in posted:
+            if all(not anchor.isdisjoint(keys) for anchor in self._remaining[query_id]):
+                found.add(query_id)
+        return found
+
+    def percolate(self, doc: Dict[str, Any]) -> List[str]:
+        """Ids of the standing queries ``doc`` matches."""
+        return [query_id for query_id in self.candidates(doc) if matches(self.queries[query_id], doc)]
+
+    def percolate_many(self, docs: Iterable[Dict[str, Any]]) -> Tuple[List[List[str]], int]:
+        """Matching query ids per document, and how many candidates were checked in all."""
+        results, checked = [], 0
+        for doc in docs:
+            candidates = self.candidates(doc)
+            checked += len(candidates)
+            results.append([query_id for query_id in candidates if matches(self.queries[query_id], doc)])
+        return results, checked
@@ -0,0 +1,227 @@
+"""
+Result cache for log and alert listings.
+
+Entries are keyed on a canonical form of the query, so the same filters
+built in a different order, or with a redundant ``match_all``, share one
+entry. The cache is an LRU bounded by the estimated size of the results.
+
+How long an entry lives depends on its time range. Ranges ending before the
+ingest watermark (``watermark_lag`` seconds ago) are not expected to change
+and are kept for ``sealed_ttl``. Ranges reaching past it are kept for
+``open_ttl`` only. Writes made by this process drop the entries whose
+range they fall in, so the TTLs only bound staleness from writes made by
+other processes.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from ..core.instrumentation import REGISTRY
+from ..storage.archive import pushdown
+from .metrics_cache import CACHE_REQUESTS
+import asyncio
+import json
+import time
+
+CACHE_BYTES = REGISTRY.gauge("siem_query_cache_bytes", "Estimated size of cached query results.", ["cache"])
+CACHE_EVICTIONS = REGISTRY.counter(
+    "siem_query_cache_evictions_total", "Query cache entries dropped, by reason (size, expired, write).", ["cache", "reason"]
+)
+
+BOOL_OCCURRENCES = ("must", "filter", "should", "must_not")
+MATCH_ALL = {"match_all": {}}
+
+def normalize_query(query: Any) -> Any:
+    """A query with bool clauses in a stable order and redundant match_all clauses removed."""
+    if isinstance(query, Enum):
+        return query.value
+    if isinstance(query, datetime):
+        return query.isoformat()
+    if isinstance(query, list):
+        return [normalize_query(item) for item in query]
+    if not isinstance(query, dict):
+        return query
+    normalized = {key: normalize_query(value) for key, value in query.items()}
+    clause = normalized.get("bool")
+    if len(normalized) != 1 or not isinstance(clause, dict):
+        return normalized
+
+    for occurrence in BOOL_OCCURRENCES:
+        if occurrence not in clause:
+            continue
+        clauses = clause[occurrence] if isinstance(clause[occurrence], list) else [clause[occurrence]]
+        # Clause order never changes the result. Duplicates do not either,
+        # except should clauses counted against minimum_should_match
+        if occurrence == "should" and "minimum_should_match" in clause:
+            clause[occurrence] = sorted(clauses, key=_text)
+        else:
+            clause[occurrence] = [item for _, item in sorted({_text(item): item for item in clauses}.items())]
+    required = clause.get("must", []) + clause.get("filter", [])
+    if MATCH_ALL in required and len(required) > 1:
+        for occurrence in ("must", "filter"):
+            if occurrence in clause:
+                clause[occurrence] = [item for item in clause[occurrence] if item != MATCH_ALL]
+                if not clause[occurrence]:
+                    del clause[occurrence]
+    if list(clause) == ["must"] and len(clause["must"]) == 1:
+        return clause["must"][0]
+    return normalized
+
+def _text(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+def query_key(index: str, query: Dict[str, Any], **page: Any) -> str:
+    """Cache key for a search of ``index``; ``page`` holds the sort, offset and size."""
+    return _text({"index": index, "query": normalize_query(query), **page})
+
+class _Span:
+    """The index and time range (epoch ms) a cached or in-flight result covers."""
+
+    __slots__ = ("index", "low", "high", "stale")
+
+    def __init__(self, index: str, low: float, high: float):
+        self.index = index
+        self.low = low
+        self.high = high
+        self.stale = False
+
+    def overlaps(self, index: Optional[str], low: float, high: float) -> bool:
+        return (index is None or self.index == index) and self.high >= low and self.low <= high
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "span")
+
+    def __init__(self, value: Any, size: int, expires_at: float, span: _Span):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.span = span
+
+class QueryCache:
+    """
+    Byte-bounded LRU of search results with single-flight computation.
+
+    Entries are only valid for the storage client they were read from;
+    switching clients empties the cache.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        open_ttl: float = 2.0,
+        sealed_ttl: float = 3600.0,
+        watermark_lag: float = 300.0,
+        name: str = "queries"
+    ):
+        self.max_bytes = max_bytes
+        self.open_ttl = open_ttl
+        self.sealed_ttl = sealed_ttl
+        self.watermark_lag = watermark_lag
+        self.name = name
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = CACHE_REQUESTS.labels(name, "hit")
+        self._shared_counter = CACHE_REQUESTS.labels(name, "shared")
+        self._miss_counter = CACHE_REQUESTS.labels(name, "miss")
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, Tuple[asyncio.Future, _Span]] = {}
+        self._client: Any = None
+        CACHE_BYTES.labels(name).set_function(lambda: self.bytes)
+
+    def watermark(self) -> float:
+        """Epoch milliseconds before which no more writes are expected."""
+        return (time.time() - self.watermark_lag) * 1000
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry.expires_at <= time.monotonic():
+            self._drop(key, "expired")
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry.value
+
+    def set(self, key: Hashable, value: Any, size: int, span: _Span):
+        if size > self.max_bytes:
+            return
+        ttl = self.sealed_ttl if span.high < self.watermark() else self.open_ttl
+        if key in self._entries:
+            self._drop(key, None)
+        self._entries[key] = _Entry(value, size, time.monotonic() + ttl, span)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)), "size")
+
+    def _drop(self, key: Hashable, reason: Optional[str]):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        if reason is not None:
+            CACHE_EVICTIONS.labels(self.name, reason).inc()
+
+    def bind(self, client: Any):
+        """Use results read from ``client`` from now on."""
+        if client is not self._client:
+            self._client = client
+            self.invalidate()
+
+    async def get_or_compute(
+        self,
+        client: Any,
+        key: Hashable,
+        index: str,
+        query: Optional[Dict[str, Any]],
+        compute: Callable[[], Awaitable[Tuple[Any, int]]]
+    ) -> Any:
+        """Return a cached result, computing ``(result, size in bytes)`` at most once per key at a time."""
+        self.bind(client)
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            self._hit_counter.inc()
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            self._shared_counter.inc()
+            return await asyncio.shield(inflight[0])
+
+        self.misses += 1
+        self._miss_counter.inc()
+        predicate = pushdown(query)
+        span = _Span(index, predicate.low, predicate.high)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (future, span)
+        try:
+            value, size = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so an unawaited future does not log a warning
+            future.exception()
+            raise
+        else:
+            # A write the read may have missed keeps the result out of the cache
+            if not span.stale:
+                self.set(key, value, size, span)
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key, (None,))[0] is future:
+                del self._inflight[key]
+
+    def invalidate(self, index: Optional[str] = None, low: float = float("-inf"), high: float = float("inf")):
+        """Drop the entries of ``index`` (or every index) whose time range overlaps ``low``..``high`` (epoch ms)."""
+        stale = [key for key, entry in self._entries.items() if entry.span.overlaps(index, low, high)]
+        for key in stale:
+            self._drop(key, "write")
+        # Reads in flight may have missed the write: they are not stored, and
+        # later requests do not share them
+        for key, (_, span) in list(self._inflight.items()):
+            if span.overlaps(index, low, high):
+                span.stale = True
+                del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
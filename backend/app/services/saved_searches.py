@@ -0,0 +1,179 @@
+"""
+Saved searches that fire as matching logs are ingested.
+
+Saved searches live in the ``saved_searches`` index and are compiled into a
+Percolator. Every processed batch of logs is percolated, and each saved
+search that matched gets one notification for the batch, plus one alert if
+its action is ``alert`` (deduplicated like any other alert).
+
+Every process reloads the saved searches every
+``SAVED_SEARCH_REFRESH_SECONDS``, so searches created through an API worker
+reach the ingestion process that evaluates them.
+"""
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from elasticsearch import NotFoundError
+from ..core.aggregations import to_datetime
+from ..core.background import stop_tasks
+from ..core.config import settings
+from ..core.instrumentation import REGISTRY, SIZE_BUCKETS
+from ..models.alert import AlertCreate, AlertSource
+from ..models.saved_search import SavedSearch, SavedSearchAction, SavedSearchCreate, SavedSearchNotification
+from ..storage.base import StorageBackend
+from ..storage.mappings import ensure_index
+from .percolator import Percolator, validate
+import asyncio
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STANDING_QUERIES = REGISTRY.gauge("siem_saved_searches", "Enabled saved searches evaluated on ingest.")
+PERCOLATE_SECONDS = REGISTRY.histogram(
+    "siem_saved_search_percolate_seconds", "Time per processing batch spent matching logs to saved searches."
+)
+CANDIDATES = REGISTRY.histogram(
+    "siem_saved_search_candidates", "Saved searches a log was checked against.", buckets=SIZE_BUCKETS
+)
+MATCHES = REGISTRY.counter("siem_saved_search_matches_total", "Logs that matched a saved search.")
+
+class SavedSearchService:
+    def __init__(self):
+        self.index = "saved_searches"
+        self.es_client: Optional[StorageBackend] = None
+        self.percolator = Percolator()
+        self.searches: Dict[str, SavedSearch] = {}
+        # Set where matches should raise alerts
+        self.alert_manager = None
+        self.notifications: deque = deque(maxlen=settings.SAVED_SEARCH_NOTIFICATION_BUFFER)
+        self.refresh_interval = settings.SAVED_SEARCH_REFRESH_SECONDS
+        self._tasks: List[asyncio.Task] = []
+
+    async def initialize(self, es_client: StorageBackend):
+        """Load the saved searches and keep reloading them."""
+        self.es_client = es_client
+        await ensure_index(es_client, self.index)
+        await self.reload()
+        STANDING_QUERIES.set_function(lambda: len(self.percolator))
+        if self.refresh_interval:
+            self._tasks = [asyncio.create_task(self._reload_loop())]
+
+    async def close(self):
+        await stop_tasks(self._tasks)
+        self._tasks = []
+
+    async def _reload_loop(self):
+        """Background task picking up searches saved or deleted by other processes."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Error reloading saved searches: {e}")
+
+    async def reload(self) -> int:
+        """Replace the saved searches with the stored ones, recompiling only those that changed."""
+        result = await self.es_client.search(
+            index=self.index,
+            query={"match_all": {}},
+            size=settings.SAVED_SEARCH_MAX_SEARCHES
+        )
+        stored = {hit["_id"]: SavedSearch(**hit["_source"]) for hit in result["hits"]["hits"]}
+        for search_id in set(self.searches) - set(stored):
+            self.percolator.remove(search_id)
+        for search_id, search in stored.items():
+            if self.searches.get(search_id) != search:
+                self._compile(search)
+        self.searches = stored
+        return len(stored)
+
+    def _compile(self, search: SavedSearch):
+        if search.enabled:
+            self.percolator.add(search.id, search.query)
+        else:
+            self.percolator.remove(search.id)
+
+    async def create_search(self, search: SavedSearchCreate) -> SavedSearch:
+        """Save a search; raises ValueError if its query cannot be evaluated on ingest."""
+        validate(search.query)
+        if len(self.searches) >= settings.SAVED_SEARCH_MAX_SEARCHES:
+            raise ValueError(f"At most {settings.SAVED_SEARCH_MAX_SEARCHES} saved searches are allowed")
+        saved = SavedSearch(id=str(uuid.uuid4()), created_at=datetime.utcnow(), **search.model_dump())
+        await self.es_client.index(index=self.index, id=saved.id, document=saved.model_dump(mode="json"))
+        self._compile(saved)
+        self.searches[saved.id] = saved
+        return saved
+
+    def get_searches(self) -> List[SavedSearch]:
+        return sorted(self.searches.values(), key=lambda search: search.created_at)
+
+    def get_search(self, search_id: str) -> Optional[SavedSearch]:
+        return self.searches.get(search_id)
+
+    async def delete_search(self, search_id: str) -> bool:
+        try:
+            await self.es_client.delete(index=self.index, id=search_id)
+        except NotFoundError:
+            return False
+        self.percolator.remove(search_id)
+        self.searches.pop(search_id, None)
+        return True
+
+    def get_notifications(self, limit: int = 100, search_id: Optional[str] = None) -> List[SavedSearchNotification]:
+        """Latest notifications, newest first, optionally for one saved search."""
+        found = [n for n in self.notifications if search_id is None or n.search_id == search_id]
+        return found[:limit]
+
+    async def evaluate(self, logs: List[Dict[str, Any]]) -> List[SavedSearchNotification]:
+        """Match a batch of logs against every saved search and notify the ones that matched."""
+        if not len(self.percolator):
+            return []
+        started = time.perf_counter()
+        matched_ids, checked = self.percolator.percolate_many(logs)
+        PERCOLATE_SECONDS.observe(time.perf_counter() - started)
+        CANDIDATES.observe(checked / len(logs))
+
+        matched: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for log, search_ids in zip(logs, matched_ids):
+            for search_id in search_ids:
+                matched[search_id].append(log)
+
+        notifications = []
+        now = datetime.utcnow()
+        for search_id, search_logs in matched.items():
+            search = self.searches.get(search_id)
+            if search is None:
+                continue
+            MATCHES.inc(len(search_logs))
+            times = [to_datetime(log.get("timestamp")) or now for log in search_logs]
+            notification = SavedSearchNotification(
+                search_id=search_id,
+                search_name=search.name,
+                matched_at=now,
+                match_count=len(search_logs),
+                log_ids=[log["id"] for log in search_logs[:settings.SAVED_SEARCH_MAX_LOG_IDS]],
+                first_timestamp=min(times),
+                last_timestamp=max(times)
+            )
+            self.notifications.appendleft(notification)
+            notifications.append(notification)
+            if search.action == SavedSearchAction.ALERT and self.alert_manager is not None:
+                await self.alert_manager.create_alert(self._alert(search, notification))
+        return notifications
+
+    @staticmethod
+    def _alert(search: SavedSearch, notification: SavedSearchNotification) -> AlertCreate:
+        return AlertCreate(
+            title=f"Saved search matched: {search.name}",
+            description=search.description or f"{notification.match_count} logs matched saved search {search.name}",
+            severity=search.severity,
+            source=AlertSource.CUSTOM,
+            tags=["saved_search"],
+            raw_data={
+                "saved_search_id": search.id,
+                "match_count": notification.match_count,
+                "log_ids": notification.log_ids
+            }
+        )
@@ -0,0 +1,182 @@
+"""
+Security score from daily partial aggregates.
+
+The score over a lookback window is a weighted mix of per-day partials:
+event counts by severity and the sum and count of threat scores. Once a day
+has ended, plus ``SECURITY_SCORE_FINALIZE_AFTER_SECONDS`` for late events,
+its partial is computed once and persisted to ``security_score_days``. Only
+the days not yet finalized, normally just today, are aggregated per request,
+so the score costs the same however much history the events index keeps.
+
+Events that arrive for a day after it was finalized are not counted.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+from ..core.instrumentation import REGISTRY
+from ..storage.base import StorageBackend
+from ..storage.mappings import ensure_index
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_WEIGHTS = {
+    "critical": 1.0,
+    "high": 0.8,
+    "medium": 0.5,
+    "low": 0.2
+}
+
+FINALIZED_DAYS = REGISTRY.counter(
+    "siem_security_score_finalized_days_total", "Daily security score partials computed and persisted."
+)
+
+Partial = Dict[str, Any]
+
+def partial_aggs() -> Dict[str, Any]:
+    """Aggregations computing a partial per day."""
+    return {
+        "days": {
+            "date_histogram": {"field": "timestamp", "calendar_interval": "day", "format": "yyyy-MM-dd"},
+            "aggs": {
+                "severity": {"terms": {"field": "severity", "size": 10}},
+                "threat_score_sum": {"sum": {"field": "threat_score"}},
+                "threat_score_count": {"value_count": {"field": "threat_score"}}
+            }
+        }
+    }
+
+def parse_partials(result: Dict[str, Any]) -> Dict[str, Partial]:
+    """Day (ISO date) -> partial, from a response to ``partial_aggs``."""
+    return {
+        bucket["key_as_string"][:10]: {
+            "day": bucket["key_as_string"][:10],
+            "events": bucket["doc_count"],
+            "severity": {b["key"]: b["doc_count"] for b in bucket["severity"]["buckets"]},
+            "threat_score_sum": bucket["threat_score_sum"]["value"] or 0.0,
+            "threat_score_count": bucket["threat_score_count"]["value"] or 0
+        }
+        for bucket in result["aggregations"]["days"]["buckets"]
+    }
+
+def empty_partial(day: date) -> Partial:
+    return {"day": day.isoformat(), "events": 0, "severity": {}, "threat_score_sum": 0.0, "threat_score_count": 0}
+
+def combine(
+    partials: Dict[str, Partial],
+    today: date,
+    days: int,
+    half_life_days: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    The score over the ``days`` ending today. With ``half_life_days``, a
+    day's events weigh half as much for every half-life of its age.
+    """
+    weighted_events = weighted_severity = weighted_sum = weighted_count = 0.0
+    severity_counts: Dict[str, int] = {}
+    trend = []
+    for age in range(days - 1, -1, -1):
+        day = (today - timedelta(days=age)).isoformat()
+        partial = partials.get(day)
+        trend.append({"date": day, "count": partial["events"] if partial else 0})
+        if not partial:
+            continue
+        weight = 0.5 ** (age / half_life_days) if half_life_days else 1.0
+        for severity, count in partial["severity"].items():
+            severity_counts[severity] = severity_counts.get(severity, 0) + count
+            weighted_severity += weight * count * SEVERITY_WEIGHTS.get(severity, 0)
+        weighted_events += weight * partial["events"]
+        weighted_sum += weight * partial["threat_score_sum"]
+        weighted_count += weight * partial["threat_score_count"]
+    return {
+        "overall_score": 100 * (1 - weighted_severity / (weighted_events or 1)),
+        "threat_score": weighted_sum / weighted_count if weighted_count else None,
+        "severity_distribution": severity_counts,
+        "trend": trend,
+        "lookback_days": days,
+        "half_life_days": half_life_days
+    }
+
+class DailyPartials:
+    """Finalized daily partials of the events index, persisted and kept in memory."""
+
+    def __init__(self, events_index: str, max_days: int = 365, finalize_after: timedelta = timedelta(hours=1)):
+        self.index = "security_score_days"
+        self.events_index = events_index
+        self.max_days = max_days
+        self.finalize_after = finalize_after
+        self.partials: Dict[str, Partial] = {}
+        # Last day finalized, or None before the first refresh
+        self.finalized_through: Optional[date] = None
+        self._lock = asyncio.Lock()
+
+    async def initialize(self, es_client: StorageBackend):
+        await ensure_index(es_client, self.index)
+
+    def live_since(self, now: datetime) -> date:
+        """First day not finalized at ``now``; partials from it on are aggregated per request."""
+        return (now - self.finalize_after).date()
+
+    async def refresh(self, es_client: StorageBackend, now: datetime):
+        """Finalize every day that has closed since the last refresh."""
+        through = self.live_since(now) - timedelta(days=1)
+        if self.finalized_through == through:
+            return
+        async with self._lock:
+            if self.finalized_through == through:
+                return
+            first = through - timedelta(days=self.max_days - 1)
+            # Days another process finalized are read rather than aggregated again
+            since = max(first, self.finalized_through + timedelta(days=1)) if self.finalized_through else first
+            await self._load(es_client, since, through)
+            missing = [
+                day for day in (first + timedelta(days=offset) for offset in range(self.max_days))
+                if day.isoformat() not in self.partials
+            ]
+            if missing:
+                await self._finalize(es_client, missing, now)
+            for day in [day for day in self.partials if day < first.isoformat()]:
+                del self.partials[day]
+            self.finalized_through = through
+
+    async def _load(self, es_client: StorageBackend, first: date, through: date):
+        result = await es_client.search(
+            index=self.index,
+            query={"range": {"day": {"gte": first.isoformat(), "lte": through.isoformat()}}},
+            size=(through - first).days + 1
+        )
+        for hit in result["hits"]["hits"]:
+            partial = dict(hit["_source"])
+            partial.pop("finalized_at", None)
+            self.partials[partial["day"]] = partial
+
+    async def _finalize(self, es_client: StorageBackend, days: List[date], now: datetime):
+        """Aggregate the missing days in one search and persist a partial for each, empty days included."""
+        result = await es_client.search(
+            index=self.events_index,
+            size=0,
+            query={"range": {"timestamp": {
+                "gte": days[0].isoformat(), "lt": (days[-1] + timedelta(days=1)).isoformat()
+            }}},
+            aggs=partial_aggs()
+        )
+        found = parse_partials(result)
+        operations = []
+        for day in days:
+            partial = found.get(day.isoformat()) or empty_partial(day)
+            self.partials[partial["day"]] = partial
+            operations.extend([
+                {"index": {"_index": self.index, "_id": partial["day"]}},
+                {**partial, "finalized_at": now.isoformat()}
+            ])
+        await es_client.bulk(operations=operations)
+        FINALIZED_DAYS.inc(len(days))
+        logger.info(f"Finalized security score partials for {len(days)} days through {days[-1]}")
+
+def live_body(since: date) -> Dict[str, Any]:
+    """Search body aggregating the partials of days not yet finalized."""
+    return {
+        "size": 0,
+        "query": {"range": {"timestamp": {"gte": since.isoformat()}}},
+        "aggs": partial_aggs()
+    }
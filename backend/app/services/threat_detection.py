@@ -1,19 +1,75 @@
 """
 Threat detection and analysis service.
 """
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
-from elasticsearch import AsyncElasticsearch
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any, Tuple
+from ..storage.base import StorageBackend
+from ..storage.mappings import ensure_index
+from ..core.config import settings
+from .metrics_cache import MetricsCache
+from .distinct_values import DistinctValues, time_range_query
+from .security_score import DailyPartials, combine, live_body, parse_partials
 import logging
 import json
+import heapq
+import asyncio
 from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
+TREND_INTERVALS = {
+    "1h": (timedelta(hours=1), timedelta(hours=24)),
+    "1d": (timedelta(days=1), timedelta(days=30)),
+    "1w": (timedelta(weeks=1), timedelta(weeks=12)),
+}
+
+# Masks rather than from/to: an ip_range's "to" is exclusive and would drop each range's last address
+PRIVATE_RANGES = [
+    {"key": "private", "mask": "10.0.0.0/8"},
+    {"key": "private", "mask": "172.16.0.0/12"},
+    {"key": "private", "mask": "192.168.0.0/16"},
+    {"key": "loopback", "mask": "127.0.0.0/8"},
+]
+
+def _align(moment: datetime, step: timedelta) -> datetime:
+    """Round a timestamp down to a multiple of step since the epoch."""
+    epoch = datetime(1970, 1, 1)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return epoch + ((moment - epoch) // step) * step
+
+def _time_filter(start_time: datetime, end_time: datetime) -> Dict[str, Any]:
+    return {
+        "range": {
+            "timestamp": {
+                "gte": start_time.isoformat(),
+                "lt": end_time.isoformat()
+            }
+        }
+    }
+
 class ThreatDetectionService:
+    # Keyword and IP fields of security events that can be listed in full
+    DISTINCT_FIELDS = ("source_ip", "destination_ip", "event_type", "indicators")
+
     def __init__(self):
         self.index = "security_events"
+        self.alerts_index = "alerts"
         self.es_client = None
+        self.cache = MetricsCache(
+            ttl_seconds=settings.METRICS_CACHE_TTL_SECONDS,
+            max_entries=settings.METRICS_CACHE_MAX_ENTRIES
+        )
+        self.composite_page_size = settings.METRICS_COMPOSITE_PAGE_SIZE
+        self.distinct = DistinctValues(
+            page_size=settings.DISTINCT_VALUES_PAGE_SIZE,
+            snapshot_ttl=settings.DISTINCT_VALUES_SNAPSHOT_TTL_SECONDS
+        )
+        self.score_partials = DailyPartials(
+            self.index,
+            max_days=settings.SECURITY_SCORE_MAX_LOOKBACK_DAYS,
+            finalize_after=timedelta(seconds=settings.SECURITY_SCORE_FINALIZE_AFTER_SECONDS)
+        )
         self.threat_patterns = {
             "authentication_failure": r"failed\s+login|authentication\s+failure",
             "network_scan": r"port\s+scan|network\s+sweep",
@@ -22,37 +78,30 @@ class ThreatDetectionService:
             "privilege_escalation": r"sudo|privilege\s+elevation|permission\s+change"
         }
         
-    async def initialize(self, es_client: AsyncElasticsearch):
-        """Initialize the service with elasticsearch client."""
+    async def initialize(self, es_client: StorageBackend):
+        """Initialize the service with a storage backend."""
         self.es_client = es_client
         await self._ensure_index()
     
     async def _ensure_index(self):
         """Ensure security events index exists with proper mappings."""
-        if not await self.es_client.indices.exists(index=self.index):
-            await self.es_client.indices.create(
-                index=self.index,
-                mappings={
-                    "properties": {
-                        "timestamp": {"type": "date"},
-                        "event_type": {"type": "keyword"},
-                        "severity": {"type": "keyword"},
-                        "source_ip": {"type": "ip"},
-                        "destination_ip": {"type": "ip"},
-                        "description": {"type": "text"},
-                        "raw_data": {"type": "object"},
-                        "threat_score": {"type": "float"},
-                        "indicators": {"type": "keyword"}
-                    }
-                }
-            )
-
+        await ensure_index(self.es_client, self.index)
+        await self.score_partials.initialize(self.es_client)
+    
     async def get_dashboard_metrics(
         self,
         start_time: datetime,
         end_time: datetime
     ) -> Dict[str, Any]:
         """Get aggregated metrics for dashboard display."""
+        result = await self.es_client.search(
+            index=self.index,
+            body=self.dashboard_metrics_body(start_time, end_time)
+        )
+        return self.parse_dashboard_metrics(result)
+
+    def dashboard_metrics_body(self, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
+        """Search body behind get_dashboard_metrics."""
         query = {
             "bool": {
                 "must": [
@@ -68,31 +117,30 @@ class ThreatDetectionService:
             }
         }
         
-        result = await self.es_client.search(
-            index=self.index,
-            body={
-                "size": 0,
-                "query": query,
-                "aggs": {
-                    "event_types": {
-                        "terms": {"field": "event_type"}
-                    },
-                    "severity_levels": {
-                        "terms": {"field": "severity"}
-                    },
-                    "timeline": {
-                        "date_histogram": {
-                            "field": "timestamp",
-                            "calendar_interval": "hour"
-                        }
-                    },
-                    "avg_threat_score": {
-                        "avg": {"field": "threat_score"}
+        return {
+            "size": 0,
+            "query": query,
+            "aggs": {
+                "event_types": {
+                    "terms": {"field": "event_type"}
+                },
+                "severity_levels": {
+                    "terms": {"field": "severity"}
+                },
+                "timeline": {
+                    "date_histogram": {
+                        "field": "timestamp",
+                        "calendar_interval": "hour"
                     }
+                },
+                "avg_threat_score": {
+                    "avg": {"field": "threat_score"}
                 }
             }
-        )
-        
+        }
+
+    def parse_dashboard_metrics(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a dashboard_metrics_body response."""
         return {
             "event_distribution": {
                 bucket["key"]: bucket["doc_count"]
@@ -115,9 +163,59 @@ class ThreatDetectionService:
     async def get_threat_summary(
         self,
         start_time: Optional[datetime] = None,
-        end_time: Optional[datetime] = None
+        end_time: Optional[datetime] = None,
+        top_sources: int = 10
+    ) -> Dict[str, Any]:
+        """
+        Get summary of detected threats.
+
+        top_sources lists the ``top_sources`` most active source IPs in the
+        range, counted exactly by paging composite aggregations alongside the
+        summary search.
+        """
+        result, sources = await asyncio.gather(
+            self.es_client.search(
+                index=self.index,
+                body=self.threat_summary_body(start_time, end_time, top_sources=0)
+            ),
+            self.top_sources(start_time, end_time, top_sources)
+        )
+        return self.parse_threat_summary(result, sources)
+
+    async def top_sources(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: int = 10
+    ) -> List[Tuple[str, int]]:
+        """The ``limit`` most active source IPs in the range as (ip, count), counted exactly."""
+        sources = await self.distinct.collect(
+            self.es_client,
+            self.index,
+            "source_ip",
+            time_range_query(start_time, end_time)
+        )
+        return heapq.nsmallest(limit, sources, key=lambda item: (-item[1], item[0]))
+
+    async def get_distinct_values(
+        self,
+        field: str,
+        prefix: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, int]]:
+        """Get every value of a security event field with its event count, optionally by prefix."""
+        if field not in self.DISTINCT_FIELDS:
+            raise ValueError(f"Distinct values are not available for field: {field}")
+        values = await self.distinct.get(self.es_client, self.index, field, prefix)
+        return values[:limit] if limit else values
+
+    def threat_summary_body(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        top_sources: int = 10
     ) -> Dict[str, Any]:
-        """Get summary of detected threats."""
+        """Search body behind get_threat_summary; top_sources=0 leaves source IPs out."""
         query = {"bool": {"must": [{"match_all": {}}]}}
         
         if start_time or end_time:
@@ -130,25 +228,36 @@ class ThreatDetectionService:
                 }
             })
         
-        result = await self.es_client.search(
-            index=self.index,
-            body={
-                "size": 0,
-                "query": query,
-                "aggs": {
-                    "threat_types": {
-                        "terms": {"field": "event_type"}
-                    },
-                    "top_sources": {
-                        "terms": {"field": "source_ip"}
-                    },
-                    "severity_levels": {
-                        "terms": {"field": "severity"}
-                    }
-                }
+        aggs = {
+            "threat_types": {
+                "terms": {"field": "event_type"}
+            },
+            "severity_levels": {
+                "terms": {"field": "severity"}
+            }
+        }
+        if top_sources:
+            aggs["top_sources"] = {
+                "terms": {"field": "source_ip", "size": top_sources}
             }
-        )
         
+        return {
+            "size": 0,
+            "query": query,
+            "aggs": aggs
+        }
+
+    def parse_threat_summary(
+        self,
+        result: Dict[str, Any],
+        sources: Optional[List] = None
+    ) -> Dict[str, Any]:
+        """Shape a threat_summary_body response, with sources as (ip, count) pairs if paged separately."""
+        if sources is None:
+            sources = [
+                (bucket["key"], bucket["doc_count"])
+                for bucket in result["aggregations"]["top_sources"]["buckets"]
+            ]
         return {
             "total_threats": result["hits"]["total"]["value"],
             "by_type": {
@@ -156,8 +265,8 @@ class ThreatDetectionService:
                 for bucket in result["aggregations"]["threat_types"]["buckets"]
             },
             "top_sources": [
-                {"ip": bucket["key"], "count": bucket["doc_count"]}
-                for bucket in result["aggregations"]["top_sources"]["buckets"]
+                {"ip": ip, "count": count}
+                for ip, count in sources
             ],
             "severity_distribution": {
                 bucket["key"]: bucket["doc_count"]
@@ -165,60 +274,42 @@ class ThreatDetectionService:
             }
         }
 
-    async def calculate_security_score(self) -> Dict[str, Any]:
-        """Calculate overall security score based on various metrics."""
+    async def calculate_security_score(
+        self,
+        days: Optional[int] = None,
+        half_life_days: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Calculate the security score over the last ``days`` from daily
+        partials, only aggregating the days not yet finalized.
+        """
+        await self.prepare_security_score()
         result = await self.es_client.search(
             index=self.index,
-            body={
-                "size": 0,
-                "aggs": {
-                    "avg_threat_score": {
-                        "avg": {"field": "threat_score"}
-                    },
-                    "severity_distribution": {
-                        "terms": {"field": "severity"}
-                    },
-                    "recent_threats": {
-                        "date_histogram": {
-                            "field": "timestamp",
-                            "calendar_interval": "day"
-                        }
-                    }
-                }
-            }
+            body=self.security_score_body()
         )
-        
-        # Calculate weighted score
-        severity_weights = {
-            "critical": 1.0,
-            "high": 0.8,
-            "medium": 0.5,
-            "low": 0.2
-        }
-        
-        severity_counts = {
-            bucket["key"]: bucket["doc_count"]
-            for bucket in result["aggregations"]["severity_distribution"]["buckets"]
-        }
-        
-        total_events = sum(severity_counts.values())
-        weighted_score = sum(
-            count * severity_weights.get(severity, 0)
-            for severity, count in severity_counts.items()
-        ) / (total_events if total_events > 0 else 1)
-        
-        return {
-            "overall_score": 100 * (1 - weighted_score),
-            "threat_score": result["aggregations"]["avg_threat_score"]["value"],
-            "severity_distribution": severity_counts,
-            "trend": [
-                {
-                    "date": bucket["key_as_string"],
-                    "count": bucket["doc_count"]
-                }
-                for bucket in result["aggregations"]["recent_threats"]["buckets"]
-            ]
-        }
+        return self.parse_security_score(result, days, half_life_days)
+
+    async def prepare_security_score(self):
+        """Finalize the days closed since the last score, before security_score_body is used."""
+        await self.score_partials.refresh(self.es_client, datetime.utcnow())
+
+    def security_score_body(self) -> Dict[str, Any]:
+        """Search body behind calculate_security_score, aggregating the days not yet finalized."""
+        return live_body(self.score_partials.live_since(datetime.utcnow()))
+
+    def parse_security_score(
+        self,
+        result: Dict[str, Any],
+        days: Optional[int] = None,
+        half_life_days: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Combine a security_score_body response with the finalized days into a weighted score."""
+        days = min(days or settings.SECURITY_SCORE_LOOKBACK_DAYS, self.score_partials.max_days)
+        if half_life_days is None:
+            half_life_days = settings.SECURITY_SCORE_HALF_LIFE_DAYS
+        partials = {**self.score_partials.partials, **parse_partials(result)}
+        return combine(partials, datetime.utcnow().date(), days, half_life_days)
 
     async def detect_anomalies(
         self,
@@ -291,4 +382,317 @@ class ThreatDetectionService:
                     "description": f"Suspicious activity from IP {ip}"
                 })
         
-        return anomalies
\ No newline at end of file
+        return anomalies
+
+    def _window(
+        self,
+        start_time: Optional[datetime],
+        end_time: Optional[datetime],
+        default_span: timedelta,
+        step: timedelta = timedelta(minutes=1)
+    ):
+        """Resolve an optional time range, aligned to step so it can be cached."""
+        end = end_time or datetime.utcnow()
+        start = start_time or end - default_span
+        return _align(start, step), _align(end, step) + step
+
+    async def get_alert_trends(
+        self,
+        interval: str = "1h",
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Get alert counts per interval, split by severity."""
+        step, default_span = TREND_INTERVALS[interval]
+        start, end = self._window(start_time, end_time, default_span, step)
+        return await self.cache.get_or_compute(
+            ("alert_trends", interval, start, end),
+            lambda: self._compute_alert_trends(interval, step, start, end)
+        )
+
+    async def _compute_alert_trends(
+        self,
+        interval: str,
+        step: timedelta,
+        start: datetime,
+        end: datetime
+    ) -> Dict[str, Any]:
+        result = await self.es_client.search(
+            index=self.alerts_index,
+            size=0,
+            query={"bool": {"filter": [_time_filter(start, end)]}},
+            aggs={
+                "trend": {
+                    "date_histogram": {
+                        "field": "timestamp",
+                        "fixed_interval": f"{int(step.total_seconds())}s",
+                        "min_doc_count": 0,
+                        "extended_bounds": {
+                            "min": start.isoformat(),
+                            "max": (end - step).isoformat()
+                        }
+                    },
+                    "aggs": {
+                        "by_severity": {"terms": {"field": "severity", "size": 10}}
+                    }
+                }
+            }
+        )
+        
+        return {
+            "interval": interval,
+            "start": start,
+            "end": end,
+            "buckets": [
+                {
+                    "timestamp": bucket["key_as_string"],
+                    "count": bucket["doc_count"],
+                    "by_severity": {
+                        severity["key"]: severity["doc_count"]
+                        for severity in bucket["by_severity"]["buckets"]
+                    }
+                }
+                for bucket in result["aggregations"]["trend"]["buckets"]
+            ]
+        }
+
+    async def get_top_threats(
+        self,
+        limit: int = 10,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Get the most active threat sources and indicators."""
+        start, end = self._window(start_time, end_time, timedelta(hours=24))
+        return await self.cache.get_or_compute(
+            ("top_threats", limit, start, end),
+            lambda: self._compute_top_threats(limit, start, end)
+        )
+
+    async def _compute_top_threats(self, limit: int, start: datetime, end: datetime) -> Dict[str, Any]:
+        """
+        Exact top-N over every source IP and indicator.
+
+        Both fields are paged with composite aggregations in the same
+        requests, so high-cardinality fields are never truncated the way a
+        terms aggregation would be; only the running top-N is kept in memory.
+        """
+        sources = {
+            "source_ip": {
+                "sources": [{"ip": {"terms": {"field": "source_ip"}}}],
+                "aggs": {
+                    "max_threat_score": {"max": {"field": "threat_score"}},
+                    "event_types": {"terms": {"field": "event_type", "size": 3}}
+                }
+            },
+            "indicators": {
+                "sources": [{"indicator": {"terms": {"field": "indicators"}}}],
+                "aggs": {
+                    "max_threat_score": {"max": {"field": "threat_score"}}
+                }
+            }
+        }
+        after: Dict[str, Optional[Dict[str, Any]]] = {name: None for name in sources}
+        top: Dict[str, List] = {name: [] for name in sources}
+        active = set(sources)
+        
+        while active:
+            aggs = {}
+            for name in active:
+                composite = {"size": self.composite_page_size, "sources": sources[name]["sources"]}
+                if after[name]:
+                    composite["after"] = after[name]
+                aggs[name] = {"composite": composite, "aggs": sources[name]["aggs"]}
+            
+            result = await self.es_client.search(
+                index=self.index,
+                size=0,
+                query={"bool": {"filter": [_time_filter(start, end)]}},
+                aggs=aggs
+            )
+            
+            for name in list(active):
+                page = result["aggregations"][name]
+                for bucket in page["buckets"]:
+                    entry = (bucket["doc_count"], bucket["max_threat_score"]["value"] or 0.0, bucket)
+                    if len(top[name]) < limit:
+                        heapq.heappush(top[name], _Ranked(entry))
+                    elif entry[:2] > top[name][0].entry[:2]:
+                        heapq.heapreplace(top[name], _Ranked(entry))
+                after[name] = page.get("after_key")
+                if len(page["buckets"]) < self.composite_page_size or after[name] is None:
+                    active.discard(name)
+        
+        def ranked(name: str) -> List[Dict[str, Any]]:
+            return [item.entry[2] for item in sorted(top[name], reverse=True)]
+        
+        return {
+            "start": start,
+            "end": end,
+            "sources": [
+                {
+                    "ip": bucket["key"]["ip"],
+                    "count": bucket["doc_count"],
+                    "max_threat_score": bucket["max_threat_score"]["value"],
+                    "event_types": [b["key"] for b in bucket["event_types"]["buckets"]]
+                }
+                for bucket in ranked("source_ip")
+            ],
+            "indicators": [
+                {
+                    "indicator": bucket["key"]["indicator"],
+                    "count": bucket["doc_count"],
+                    "max_threat_score": bucket["max_threat_score"]["value"]
+                }
+                for bucket in ranked("indicators")
+            ]
+        }
+
+    async def get_compliance_metrics(self, days: int = 30) -> Dict[str, Any]:
+        """Get security compliance metrics over a trailing window."""
+        start, end = self._window(None, None, timedelta(days=days), timedelta(minutes=5))
+        return await self.cache.get_or_compute(
+            ("compliance", start, end),
+            lambda: self._compute_compliance(start, end)
+        )
+
+    async def _compute_compliance(self, start: datetime, end: datetime) -> Dict[str, Any]:
+        """All compliance controls as filter buckets of one search over both indices."""
+        alerts = {"term": {"_index": self.alerts_index}}
+        events = {"term": {"_index": self.index}}
+        closed = {"terms": {"status": ["resolved", "closed"]}}
+        
+        result = await self.es_client.search(
+            index=f"{self.alerts_index},{self.index}",
+            size=0,
+            query={"bool": {"filter": [_time_filter(start, end)]}},
+            aggs={
+                "controls": {
+                    "filters": {
+                        "filters": {
+                            "alerts_total": alerts,
+                            "alerts_closed": {"bool": {"filter": [alerts, closed]}},
+                            "alerts_acknowledged": {
+                                "bool": {"filter": [alerts, {"exists": {"field": "acknowledged_at"}}]}
+                            },
+                            "alerts_assigned": {
+                                "bool": {"filter": [alerts, {"exists": {"field": "assigned_to"}}]}
+                            },
+                            "critical_open": {
+                                "bool": {
+                                    "filter": [alerts, {"term": {"severity": "critical"}}],
+                                    "must_not": [closed]
+                                }
+                            },
+                            "events_total": events,
+                            "events_high_risk": {
+                                "bool": {"filter": [events, {"range": {"threat_score": {"gte": 0.8}}}]}
+                            },
+                            "authentication_failures": {
+                                "bool": {"filter": [events, {"term": {"event_type": "authentication_failure"}}]}
+                            }
+                        }
+                    }
+                }
+            }
+        )
+        
+        counts = {
+            name: bucket["doc_count"]
+            for name, bucket in result["aggregations"]["controls"]["buckets"].items()
+        }
+        
+        def ratio(part: str, whole: str) -> float:
+            return round(counts[part] / counts[whole], 4) if counts[whole] else 1.0
+        
+        controls = {
+            "alert_resolution_rate": ratio("alerts_closed", "alerts_total"),
+            "alert_acknowledgement_rate": ratio("alerts_acknowledged", "alerts_total"),
+            "alert_assignment_rate": ratio("alerts_assigned", "alerts_total"),
+            "low_risk_event_rate": round(1 - ratio("events_high_risk", "events_total"), 4)
+                if counts["events_total"] else 1.0,
+        }
+        
+        return {
+            "start": start,
+            "end": end,
+            "compliance_score": round(100 * sum(controls.values()) / len(controls), 2),
+            "controls": controls,
+            "open_critical_alerts": counts["critical_open"],
+            "authentication_failures": counts["authentication_failures"],
+            "counts": counts
+        }
+
+    async def get_geographic_metrics(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Get the geographic distribution of security event sources."""
+        start, end = self._window(start_time, end_time, timedelta(hours=24))
+        return await self.cache.get_or_compute(
+            ("geographic", start, end),
+            lambda: self._compute_geographic(start, end)
+        )
+
+    async def _compute_geographic(self, start: datetime, end: datetime) -> Dict[str, Any]:
+        """
+        Country, map tile and network-zone breakdowns in one search.
+
+        Country and location come from source_geo, filled in by enrichment
+        when available; every event can still be placed in a network zone
+        from its source IP.
+        """
+        result = await self.es_client.search(
+            index=self.index,
+            size=0,
+            query={"bool": {"filter": [_time_filter(start, end)]}},
+            aggs={
+                "countries": {
+                    "terms": {"field": "source_geo.country_iso_code", "size": 250}
+                },
+                "unlocated": {
+                    "missing": {"field": "source_geo.country_iso_code"}
+                },
+                "tiles": {
+                    "geotile_grid": {"field": "source_geo.location", "precision": 4, "size": 1000}
+                },
+                "zones": {
+                    "ip_range": {"field": "source_ip", "ranges": PRIVATE_RANGES}
+                },
+                "with_ip": {
+                    "value_count": {"field": "source_ip"}
+                }
+            }
+        )
+        
+        aggs = result["aggregations"]
+        zones = defaultdict(int)
+        for bucket in aggs["zones"]["buckets"]:
+            zones[bucket["key"]] += bucket["doc_count"]
+        zones["public"] = max(0, aggs["with_ip"]["value"] - sum(zones.values()))
+        
+        return {
+            "start": start,
+            "end": end,
+            "by_country": {
+                bucket["key"]: bucket["doc_count"]
+                for bucket in aggs["countries"]["buckets"]
+            },
+            "locations": [
+                {"tile": bucket["key"], "count": bucket["doc_count"]}
+                for bucket in aggs["tiles"]["buckets"]
+            ],
+            "network_zones": dict(zones),
+            "unlocated": aggs["unlocated"]["doc_count"]
+        }
+
+class _Ranked:
+    """Heap entry ordered by (doc_count, max_threat_score) only."""
+    __slots__ = ("entry",)
+
+    def __init__(self, entry):
+        self.entry = entry
+
+    def __lt__(self, other: "_Ranked") -> bool:
+        return self.entry[:2] < other.entry[:2]
@@ -0,0 +1,8 @@
+# app/storage/__init__.py
+"""Storage backends."""
+from .base import StorageBackend, StorageIndices
+from .backends import create_backend
+from .elasticsearch import ElasticsearchBackend
+from .embedded import EmbeddedBackend
+from .instrumented import InstrumentedBackend
+from .mappings import INDEX_MAPPINGS, ensure_index, ensure_indices
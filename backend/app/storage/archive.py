@@ -0,0 +1,432 @@
+"""
+Cold-tier archive of aged logs.
+
+Logs older than the hot retention are moved out of the search backend into
+day-partitioned columnar files:
+
+    <ARCHIVE_PATH>/<index>/<YYYY-MM-DD>/<run>.col
+    <ARCHIVE_PATH>/<index>/manifest.json
+
+Rows in a file are sorted by timestamp and cut into row groups. A row group
+stores its timestamps as packed epoch milliseconds, the dictionary codes of
+the keyword fields in ``DICTIONARY_FIELDS``, and the documents as JSON lines.
+Each of those chunks is compressed on its own. The file footer holds the
+dictionaries and, per row group, the min/max timestamp and the codes it
+contains; the manifest holds every file's time bounds.
+
+Queries push their timestamp range and keyword terms down. Days and files
+are skipped using the manifest, row groups using their statistics, and rows
+using the decoded columns, all before a document is decompressed. Files are
+memory mapped so only the chunks a query touches are read. Whatever the
+pushdown cannot express is checked on the decoded documents with
+``app.core.query_dsl.matches``.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from heapq import heappush, heappushpop, merge
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from ..core.aggregations import epoch_millis, to_datetime
+from ..core.instrumentation import REGISTRY
+from ..core.json import dumps, loads
+from ..core.query_dsl import matches
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SIEMCOL1"
+TAIL = struct.Struct("<I8s")
+DICTIONARY_FIELDS = ("level", "source", "host", "processed")
+
+ROW_GROUPS_READ = REGISTRY.counter(
+    "siem_archive_row_groups_total", "Archive row groups considered by queries, by whether they were read.", ["result"]
+)
+
+class Predicate:
+    """The part of a query the archive evaluates on its columns."""
+
+    __slots__ = ("low", "high", "terms", "exact")
+
+    def __init__(self):
+        self.low = -math.inf
+        self.high = math.inf
+        self.terms: Dict[str, Set[Any]] = {}
+        # False when matching rows must still be checked against the query
+        self.exact = True
+
+    def overlaps(self, low: float, high: float) -> bool:
+        return high >= self.low and low <= self.high
+
+def pushdown(query: Optional[Dict[str, Any]]) -> Predicate:
+    """Extract the timestamp range and keyword terms every match must satisfy."""
+    predicate = Predicate()
+    if query:
+        _collect(query, predicate)
+    return predicate
+
+def _collect(query: Dict[str, Any], predicate: Predicate):
+    if len(query) != 1:
+        for kind, clause in query.items():
+            _collect({kind: clause}, predicate)
+        return
+    kind, clause = next(iter(query.items()))
+    if kind == "match_all":
+        return
+    if kind == "bool":
+        if set(clause) - {"must", "filter"}:
+            predicate.exact = False
+        for occurrence in ("must", "filter"):
+            clauses = clause.get(occurrence, [])
+            for item in clauses if isinstance(clauses, list) else [clauses]:
+                _collect(item, predicate)
+        return
+    if kind == "range" and list(clause) == ["timestamp"]:
+        for op, value in clause["timestamp"].items():
+            moment = to_datetime(value)
+            if op not in ("gte", "gt", "lte", "lt") or moment is None:
+                predicate.exact = False
+                continue
+            # Exclusive bounds are widened to the millisecond and re-checked
+            millis = epoch_millis(moment)
+            if op in ("gt", "lt"):
+                predicate.exact = False
+            if op in ("gte", "gt"):
+                predicate.low = max(predicate.low, millis)
+            else:
+                predicate.high = min(predicate.high, millis)
+        return
+    if kind in ("term", "terms") and len(clause) == 1:
+        field, value = next(iter(clause.items()))
+        if field in DICTIONARY_FIELDS:
+            if kind == "term":
+                value = [value.get("value") if isinstance(value, dict) else value]
+            values = {getattr(item, "value", item) for item in value}
+            current = predicate.terms.get(field)
+            predicate.terms[field] = values if current is None else current & values
+            return
+    predicate.exact = False
+
+def _timestamp(document: Dict[str, Any]) -> float:
+    moment = to_datetime(document.get("timestamp"))
+    return float(epoch_millis(moment)) if moment is not None else 0.0
+
+def write_file(path: Path, documents: List[Dict[str, Any]], row_group_rows: int, level: int = 6) -> Dict[str, Any]:
+    """Write ``documents`` as one columnar file and return its manifest entry."""
+    rows = sorted(((_timestamp(doc), doc) for doc in documents), key=lambda row: row[0])
+    dictionaries: Dict[str, List[Any]] = {field: [] for field in DICTIONARY_FIELDS}
+    codes: Dict[str, Dict[Any, int]] = {field: {} for field in DICTIONARY_FIELDS}
+    groups = []
+    chunks = [MAGIC]
+    offset = len(MAGIC)
+
+    for start in range(0, len(rows), row_group_rows):
+        group = rows[start:start + row_group_rows]
+        times = array("d", (millis for millis, _ in group))
+        columns = {"timestamp": times.tobytes()}
+        present = {}
+        for field in DICTIONARY_FIELDS:
+            lookup = codes[field]
+            column = array("I")
+            for _, doc in group:
+                value = doc.get(field)
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(dictionaries[field])
+                    dictionaries[field].append(value)
+                column.append(code)
+            columns[field] = column.tobytes()
+            present[field] = sorted(set(column))
+        columns["_source"] = b"\n".join(dumps(doc) for _, doc in group)
+
+        spans = {}
+        for name, data in columns.items():
+            blob = zlib.compress(data, level)
+            spans[name] = [offset, len(blob)]
+            chunks.append(blob)
+            offset += len(blob)
+        groups.append({"rows": len(group), "min": times[0], "max": times[-1], "present": present, "columns": spans})
+
+    footer = zlib.compress(dumps({"byteorder": sys.byteorder, "dictionaries": dictionaries, "groups": groups}))
+    chunks.extend([footer, TAIL.pack(len(footer), MAGIC)])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(".tmp")
+    temporary.write_bytes(b"".join(chunks))
+    os.replace(temporary, path)
+    return {
+        "rows": len(rows),
+        "min": rows[0][0] if rows else 0.0,
+        "max": rows[-1][0] if rows else 0.0,
+        "bytes": offset + len(footer) + TAIL.size,
+    }
+
+class ArchiveFile:
+    """A memory-mapped columnar file; chunks are decompressed on demand."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(self._map) - TAIL.size
+        footer_length, magic = TAIL.unpack_from(self._map, end)
+        if magic != MAGIC or self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f"Not an archive file: {path}")
+        footer = loads(zlib.decompress(self._map[end - footer_length:end]))
+        self._swap = footer["byteorder"] != sys.byteorder
+        self.dictionaries: Dict[str, List[Any]] = footer["dictionaries"]
+        self.groups: List[Dict[str, Any]] = footer["groups"]
+        self._codes = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in self.dictionaries.items()
+        }
+
+    def close(self):
+        self._map.close()
+
+    def _chunk(self, group: Dict[str, Any], name: str) -> bytes:
+        offset, length = group["columns"][name]
+        return zlib.decompress(self._map[offset:offset + length])
+
+    def _array(self, group: Dict[str, Any], name: str, typecode: str) -> array:
+        values = array(typecode, self._chunk(group, name))
+        if self._swap:
+            values.byteswap()
+        return values
+
+    def times(self, group: Dict[str, Any]) -> array:
+        return self._array(group, "timestamp", "d")
+
+    def codes(self, group: Dict[str, Any], field: str) -> array:
+        return self._array(group, field, "I")
+
+    def sources(self, group: Dict[str, Any]) -> List[bytes]:
+        return self._chunk(group, "_source").split(b"\n")
+
+    def allowed(self, predicate: Predicate) -> Optional[Dict[str, Set[int]]]:
+        """Dictionary codes that can match per term field, or None when no row in the file can."""
+        allowed = {}
+        for field, values in predicate.terms.items():
+            lookup = self._codes[field]
+            allowed[field] = {lookup[value] for value in values if value in lookup}
+            if not allowed[field]:
+                return None
+        return allowed
+
+    def candidates(self, predicate: Predicate, allowed: Dict[str, Set[int]]) -> Iterator[Tuple[Dict[str, Any], array, List[int]]]:
+        """(row group, timestamps, matching rows) for the row groups the predicate reaches, newest first."""
+        for group in reversed(self.groups):
+            if not predicate.overlaps(group["min"], group["max"]) or any(
+                not codes.intersection(group["present"][field]) for field, codes in allowed.items()
+            ):
+                ROW_GROUPS_READ.labels("skipped").inc()
+                continue
+            ROW_GROUPS_READ.labels("read").inc()
+            times = self.times(group)
+            # Rows are in timestamp order, so the range is a slice
+            rows = range(bisect_left(times, predicate.low), bisect_right(times, predicate.high))
+            for field, codes in allowed.items():
+                column = self.codes(group, field)
+                rows = [row for row in rows if column[row] in codes]
+            if rows:
+                yield group, times, list(rows)
+
+class ColdArchive:
+    """Day-partitioned columnar archive of one or more indices under ``path``."""
+
+    def __init__(self, path: str, row_group_rows: int = 8192, max_open_files: int = 64):
+        self.path = Path(path)
+        self.row_group_rows = row_group_rows
+        self.max_open_files = max_open_files
+        self._manifests: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._open: "OrderedDict[Path, ArchiveFile]" = OrderedDict()
+        # Queries run in worker threads, and archival may write concurrently
+        self._lock = threading.RLock()
+
+    def close(self):
+        with self._lock:
+            for archive_file in self._open.values():
+                archive_file.close()
+            self._open.clear()
+
+    def _manifest_path(self, index: str) -> Path:
+        return self.path / index / "manifest.json"
+
+    def manifest(self, index: str) -> Dict[str, Any]:
+        """The index's manifest, reloaded when another process has replaced it."""
+        path = self._manifest_path(index)
+        try:
+            version = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {"files": [], "next": 1}
+        cached = self._manifests.get(index)
+        if cached is None or cached[0] != version:
+            cached = self._manifests[index] = (version, loads(path.read_bytes()))
+        return cached[1]
+
+    def _save_manifest(self, index: str, manifest: Dict[str, Any]):
+        path = self._manifest_path(index)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(".tmp")
+        temporary.write_bytes(dumps(manifest))
+        os.replace(temporary, path)
+        self._manifests.pop(index, None)
+
+    def bounds(self, index: str) -> Optional[Tuple[float, float]]:
+        """Oldest and newest archived timestamp in epoch milliseconds."""
+        files = self.manifest(index)["files"]
+        if not files:
+            return None
+        return min(entry["min"] for entry in files), max(entry["max"] for entry in files)
+
+    def reaches(self, index: str, query: Optional[Dict[str, Any]]) -> bool:
+        """Whether the query's time range overlaps anything archived."""
+        bounds = self.bounds(index)
+        return bounds is not None and pushdown(query).overlaps(*bounds)
+
+    def write(self, index: str, documents: List[Dict[str, Any]]) -> int:
+        """Archive ``documents``, one new file per day they span."""
+        days: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in documents:
+            moment = to_datetime(doc.get("timestamp"))
+            days.setdefault(moment.date().isoformat() if moment else "_", []).append(doc)
+        with self._lock:
+            manifest = self.manifest(index)
+            manifest = {"files": list(manifest["files"]), "next": manifest["next"]}
+            for day, day_documents in sorted(days.items()):
+                name = f"{day}/{manifest['next']:06d}.col"
+                manifest["next"] += 1
+                entry = write_file(self.path / index / name, day_documents, self.row_group_rows)
+                manifest["files"].append({"path": name, "day": day, **entry})
+            self._save_manifest(index, manifest)
+        return len(documents)
+
+    def drop_before(self, index: str, older_than: float) -> int:
+        """Remove files whose every row is older than ``older_than`` (epoch ms); returns rows removed."""
+        with self._lock:
+            manifest = self.manifest(index)
+            dropped = [entry for entry in manifest["files"] if entry["max"] < older_than]
+            if not dropped:
+                return 0
+            kept = [entry for entry in manifest["files"] if entry["max"] >= older_than]
+            self._save_manifest(index, {"files": kept, "next": manifest["next"]})
+            for entry in dropped:
+                path = self.path / index / entry["path"]
+                archive_file = self._open.pop(path, None)
+                if archive_file is not None:
+                    archive_file.close()
+                path.unlink(missing_ok=True)
+                try:
+                    path.parent.rmdir()
+                except OSError:
+                    pass
+        return sum(entry["rows"] for entry in dropped)
+
+    def _file(self, index: str, entry: Dict[str, Any]) -> ArchiveFile:
+        path = self.path / index / entry["path"]
+        with self._lock:
+            archive_file = self._open.get(path)
+            if archive_file is None:
+                archive_file = self._open[path] = ArchiveFile(path)
+                if len(self._open) > self.max_open_files:
+                    self._open.popitem(last=False)[1].close()
+            else:
+                self._open.move_to_end(path)
+            return archive_file
+
+    def _files(self, index: str, predicate: Predicate) -> List[Dict[str, Any]]:
+        files = [entry for entry in self.manifest(index)["files"] if predicate.overlaps(entry["min"], entry["max"])]
+        return sorted(files, key=lambda entry: entry["max"], reverse=True)
+
+    def _matching(
+        self, index: str, entry: Dict[str, Any], query: Optional[Dict[str, Any]], predicate: Predicate
+    ) -> Iterator[Tuple[ArchiveFile, Dict[str, Any], array, List[int], Optional[List[Dict[str, Any]]]]]:
+        """(file, row group, timestamps, matching rows, documents or None) per row group, newest first."""
+        archive_file = self._file(index, entry)
+        allowed = archive_file.allowed(predicate)
+        if allowed is None:
+            return
+        for group, times, rows in archive_file.candidates(predicate, allowed):
+            documents = None
+            if not predicate.exact:
+                sources = archive_file.sources(group)
+                documents = [None] * group["rows"]
+                kept = []
+                for row in rows:
+                    doc = loads(sources[row])
+                    if matches(query, doc):
+                        documents[row] = doc
+                        kept.append(row)
+                rows = kept
+            if rows:
+                yield archive_file, group, times, rows, documents
+
+    def search(self, index: str, query: Optional[Dict[str, Any]], size: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """The ``offset``..``offset + size`` newest matching documents, newest first."""
+        predicate = pushdown(query)
+        wanted = offset + size
+        top: List[Tuple[float, int, int]] = []
+        groups: List[Tuple[ArchiveFile, Dict[str, Any], Optional[List[Dict[str, Any]]]]] = []
+        for entry in self._files(index, predicate):
+            # Files are visited newest first, so the rest cannot beat a full top
+            if len(top) >= wanted and entry["max"] < top[0][0]:
+                break
+            for archive_file, group, times, rows, documents in self._matching(index, entry, query, predicate):
+                if len(top) >= wanted and group["max"] < top[0][0]:
+                    break
+                slot = len(groups)
+                groups.append((archive_file, group, documents))
+                for row in rows:
+                    item = (times[row], slot, row)
+                    if len(top) < wanted:
+                        heappush(top, item)
+                    elif item > top[0]:
+                        heappushpop(top, item)
+
+        ranked = sorted(top, reverse=True)[offset:]
+        sources: Dict[int, List[bytes]] = {}
+        results = []
+        for _, slot, row in ranked:
+            archive_file, group, documents = groups[slot]
+            if documents is not None:
+                results.append(documents[row])
+                continue
+            if slot not in sources:
+                sources[slot] = archive_file.sources(group)
+            results.append(loads(sources[slot][row]))
+        return results
+
+    def count_by(self, index: str, query: Optional[Dict[str, Any]], fields: Iterable[str]) -> Tuple[int, Dict[str, Counter]]:
+        """Matching rows and their value counts per dictionary field, read from the code columns."""
+        predicate = pushdown(query)
+        total = 0
+        counts = {field: Counter() for field in fields}
+        for entry in self._files(index, predicate):
+            for archive_file, group, _, rows, _ in self._matching(index, entry, query, predicate):
+                total += len(rows)
+                for field, counter in counts.items():
+                    column = archive_file.codes(group, field)
+                    values = archive_file.dictionaries[field]
+                    for code, count in Counter(column[row] for row in rows).items():
+                        counter[values[code]] += count
+        return total, counts
+
+    def scan(self, index: str, query: Optional[Dict[str, Any]]) -> Iterator[Tuple[float, Dict[str, Any]]]:
+        """Every matching (epoch ms, document), newest first, reading one row group per file at a time."""
+        predicate = pushdown(query)
+
+        def rows_of(entry: Dict[str, Any]) -> Iterator[Tuple[float, Dict[str, Any]]]:
+            for archive_file, group, times, rows, documents in self._matching(index, entry, query, predicate):
+                sources = archive_file.sources(group) if documents is None else None
+                for row in reversed(rows):
+                    yield times[row], documents[row] if documents is not None else loads(sources[row])
+
+        # Files from separate archival runs can overlap in time
+        return merge(*(rows_of(entry) for entry in self._files(index, predicate)), key=lambda item: -item[0])
@@ -0,0 +1,28 @@
+"""
+Storage backend selection.
+"""
+from elasticsearch import AsyncElasticsearch
+from ..core.config import Settings
+from .base import StorageBackend
+from .elasticsearch import ElasticsearchBackend
+from .embedded import EmbeddedBackend
+from .instrumented import InstrumentedBackend
+
+def create_backend(settings: Settings) -> StorageBackend:
+    """The backend named by STORAGE_BACKEND: "elasticsearch" or "embedded", instrumented."""
+    return InstrumentedBackend(_create(settings))
+
+def _create(settings: Settings) -> StorageBackend:
+    if settings.STORAGE_BACKEND == "embedded":
+        return EmbeddedBackend(
+            path=settings.EMBEDDED_STORAGE_PATH or None,
+            segment_rows=settings.EMBEDDED_SEGMENT_ROWS,
+            fsync=settings.EMBEDDED_STORAGE_FSYNC
+        )
+    if settings.STORAGE_BACKEND != "elasticsearch":
+        raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
+    return ElasticsearchBackend(AsyncElasticsearch(
+        [f"http://{settings.ELASTICSEARCH_HOST}:{settings.ELASTICSEARCH_PORT}"],
+        basic_auth=(settings.ELASTICSEARCH_USERNAME, settings.ELASTICSEARCH_PASSWORD)
+        if settings.ELASTICSEARCH_USERNAME else None
+    ))
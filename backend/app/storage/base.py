@@ -0,0 +1,87 @@
+"""
+Storage backend interface.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+class StorageIndices(ABC):
+    """Index management calls, mirroring ``AsyncElasticsearch.indices``."""
+
+    @abstractmethod
+    async def exists(self, index: str, **kwargs) -> bool:
+        ...
+
+    @abstractmethod
+    async def create(self, index: str, mappings: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def delete(self, index: str, **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def refresh(self, index: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        ...
+
+class StorageBackend(ABC):
+    """
+    Where the services keep logs, alerts and security events.
+
+    The interface is the subset of the ``AsyncElasticsearch`` API the
+    services use, with the same keyword arguments and response shapes, so
+    queries and aggregations are written once in the Elasticsearch DSL.
+    Failures are raised as the elasticsearch client's exceptions
+    (``NotFoundError``, ``ConflictError``, ``BadRequestError``).
+    """
+
+    indices: StorageIndices
+    # Whether msearch runs its searches concurrently, as Elasticsearch does
+    concurrent_msearch = True
+
+    @abstractmethod
+    async def ping(self, **kwargs) -> bool:
+        ...
+
+    @abstractmethod
+    async def close(self):
+        ...
+
+    @abstractmethod
+    async def index(self, index: str, document: Dict[str, Any], id: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def bulk(self, operations: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def get(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def update(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def delete(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def search(self, index: Optional[str] = None, body: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def msearch(self, searches: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def count(self, index: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def update_by_query(self, index: str, **kwargs) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def delete_by_query(self, index: str, **kwargs) -> Dict[str, Any]:
+        ...
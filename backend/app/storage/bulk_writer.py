@@ -0,0 +1,356 @@
+"""
+Adaptive bulk writes.
+
+A fixed batch size is either too small to keep the cluster busy or large
+enough to be rejected once it is loaded. The writer sizes each bulk
+request by bytes and by an item limit, and keeps several requests in
+flight. The item limit and the concurrency follow AIMD:
+
+- They grow additively while requests come back within the target
+  latency and more items were waiting.
+- They are cut multiplicatively on a 429, an
+  ``es_rejected_execution_exception`` or a slow response.
+
+Only the items that failed are retried. A request's failed items are
+requeued together after a jittered exponential backoff. An item that
+fails permanently goes to a dead-letter store instead of being dropped.
+A permanent failure is a status that retrying will not fix, or a
+retryable one past ``max_retries``.
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Sequence, Set, Tuple
+from ..core.instrumentation import BYTES_BUCKETS, REGISTRY, SIZE_BUCKETS
+from ..core.json import dumps
+import asyncio
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+REJECTION_TYPES = {"es_rejected_execution_exception"}
+ACTION_BYTES = 64  # allowance for an action line, which is never serialized just to be measured
+
+BATCH_ITEMS = REGISTRY.histogram(
+    "siem_bulk_batch_items", "Items per adaptive bulk request.", ["writer"], buckets=SIZE_BUCKETS
+)
+BATCH_BYTES = REGISTRY.histogram(
+    "siem_bulk_batch_bytes", "Estimated bytes per adaptive bulk request.", ["writer"], buckets=BYTES_BUCKETS
+)
+REQUEST_SECONDS = REGISTRY.histogram("siem_bulk_request_seconds", "Adaptive bulk request latency.", ["writer"])
+LIMITS = REGISTRY.gauge("siem_bulk_limit", "Current adaptive bulk limits.", ["writer", "limit"])
+REJECTIONS = REGISTRY.counter(
+    "siem_bulk_rejections_total", "Bulk requests storage pushed back on (429 or rejected execution).", ["writer"]
+)
+RETRIES = REGISTRY.counter("siem_bulk_item_retries_total", "Bulk items retried after failing.", ["writer"])
+DEAD_LETTERS = REGISTRY.counter("siem_bulk_dead_letters_total", "Bulk items given up on.", ["writer"])
+
+class DeadLetterStore:
+    """
+    Bulk items given up on: the most recent in memory, and every one
+    appended to a JSON-lines file when ``path`` is set.
+    """
+
+    def __init__(self, path: Optional[str] = None, keep: int = 1000):
+        self.path = path
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self.count = 0
+        self._file = None
+
+    def add(self, writer: str, action: Dict[str, Any], source: Any, status: Optional[int], error: str, attempts: int):
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "writer": writer,
+            "action": action,
+            "source": source,
+            "status": status,
+            "error": error,
+            "attempts": attempts,
+        }
+        self.recent.append(entry)
+        self.count += 1
+        if self.path is None:
+            return
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "ab")
+            self._file.write(dumps(entry) + b"\n")
+            self._file.flush()
+        except OSError as e:
+            logger.error(f"Could not persist dead letter to {self.path}: {e}")
+
+    def entries(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """The most recent dead letters, newest first."""
+        return list(reversed(self.recent))[:limit]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class BulkItem:
+    """One action and its source, waiting to be written."""
+
+    __slots__ = ("action", "source", "size", "attempts", "submission", "position")
+
+    def __init__(self, action: Dict[str, Any], source: Any, submission: "_Submission", position: int):
+        self.action = action
+        self.source = source
+        self.size = ACTION_BYTES + (len(dumps(source)) if source is not None else 0)
+        self.attempts = 0
+        self.submission = submission
+        self.position = position
+
+class _Submission:
+    __slots__ = ("results", "remaining", "future")
+
+    def __init__(self, size: int):
+        self.results = [False] * size
+        self.remaining = size
+        self.future = asyncio.get_running_loop().create_future()
+
+def _error_of(response: Dict[str, Any]) -> Tuple[Optional[str], str]:
+    error = response.get("error")
+    if isinstance(error, dict):
+        return error.get("type"), f"{error.get('type')}: {error.get('reason')}"
+    return None, str(error)
+
+class AdaptiveBulkWriter:
+    """
+    Writes (action, source) pairs in adaptively sized, concurrent bulk requests.
+
+    ``write`` returns once every item is either stored or dead-lettered.
+    Items written while requests are in flight are coalesced into the next
+    requests, so callers do not need to batch.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client=None,
+        max_bytes: int = 5 * 1024 * 1024,
+        initial_batch: int = 500,
+        min_batch: int = 50,
+        max_batch: int = 5000,
+        max_concurrency: int = 8,
+        target_latency: float = 1.0,
+        increase: int = 100,
+        decrease: float = 0.5,
+        max_retries: int = 5,
+        retry_base: float = 0.1,
+        retry_max: float = 10.0,
+        dead_letters: Optional[DeadLetterStore] = None
+    ):
+        self.name = name
+        self.client = client
+        self.max_bytes = max_bytes
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.dead_letters = dead_letters if dead_letters is not None else DeadLetterStore()
+        self.batch_limit = float(min(max(initial_batch, min_batch), max_batch))
+        self.concurrency = 1.0
+        self._queue: Deque[BulkItem] = deque()
+        self._inflight = 0
+        self._sending: Set[asyncio.Task] = set()
+        self._retrying: Dict[int, Tuple[asyncio.TimerHandle, List[BulkItem]]] = {}
+        self._retry_ids = 0
+        # Cuts happen at most once per generation of requests, so responses to
+        # requests sent before a cut do not cut again for the same overload
+        self._epoch = 0
+        self._idle: Optional[asyncio.Event] = None
+        LIMITS.labels(name, "batch_items").set_function(lambda: self.batch_limit)
+        LIMITS.labels(name, "concurrency").set_function(lambda: self.concurrency)
+
+    async def write(self, pairs: Sequence[Tuple[Dict[str, Any], Any]]) -> List[bool]:
+        """Write (action, source) pairs; returns whether each was stored. Delete actions take a None source."""
+        if not pairs:
+            return []
+        submission = _Submission(len(pairs))
+        self._queue.extend(BulkItem(action, source, submission, i) for i, (action, source) in enumerate(pairs))
+        self._pump()
+        return await submission.future
+
+    async def flush(self):
+        """Wait until everything written so far is stored or dead-lettered."""
+        while not self._is_idle():
+            if self._idle is None:
+                self._idle = asyncio.Event()
+            self._idle.clear()
+            await self._idle.wait()
+
+    async def close(self, timeout: float = 10.0):
+        """Finish outstanding writes for up to ``timeout`` seconds, then dead-letter the rest."""
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Bulk writer {self.name} closed with writes outstanding")
+        leftover = list(self._queue)
+        for handle, items in self._retrying.values():
+            handle.cancel()
+            leftover.extend(items)
+        self._retrying.clear()
+        self._queue.clear()
+        for task in list(self._sending):
+            task.cancel()
+        await asyncio.gather(*self._sending, return_exceptions=True)
+        for item in leftover:
+            self._dead_letter(item, None, "writer closed")
+        self.dead_letters.close()
+
+    def _is_idle(self) -> bool:
+        return not (self._queue or self._inflight or self._retrying)
+
+    def _pump(self):
+        if self.client is None:
+            return
+        while self._queue and self._inflight < int(self.concurrency):
+            batch, size = self._take()
+            self._inflight += 1
+            task = asyncio.create_task(self._send(batch, size, saturated=bool(self._queue)))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+        if self._idle is not None and self._is_idle():
+            self._idle.set()
+
+    def _take(self) -> Tuple[List[BulkItem], int]:
+        limit = int(self.batch_limit)
+        batch: List[BulkItem] = []
+        size = 0
+        while self._queue and len(batch) < limit:
+            item = self._queue[0]
+            if batch and size + item.size > self.max_bytes:
+                break
+            batch.append(self._queue.popleft())
+            size += item.size
+        return batch, size
+
+    async def _send(self, batch: List[BulkItem], size: int, saturated: bool):
+        operations: List[Dict[str, Any]] = []
+        for item in batch:
+            operations.append(item.action)
+            if item.source is not None:
+                operations.append(item.source)
+        BATCH_ITEMS.labels(self.name).observe(len(batch))
+        BATCH_BYTES.labels(self.name).observe(size)
+        epoch = self._epoch
+        dead_before = self.dead_letters.count
+        retry: List[BulkItem] = []
+        rejected = False
+        started = time.perf_counter()
+        try:
+            try:
+                result = await self.client.bulk(operations=operations)
+            except asyncio.CancelledError:
+                for item in batch:
+                    self._dead_letter(item, None, "writer closed")
+                raise
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                rejected = status == 429
+                retry = [item for item in batch if self._failed(item, status, None, f"{type(e).__name__}: {e}")]
+            else:
+                if result.get("errors"):
+                    for item, response in zip(batch, result["items"]):
+                        body = next(iter(response.values()))
+                        status = body.get("status", 200)
+                        if status < 300 or (status == 404 and "delete" in item.action):
+                            self._resolve(item, True)
+                            continue
+                        error_type, error = _error_of(body)
+                        rejected = rejected or status == 429 or error_type in REJECTION_TYPES
+                        if self._failed(item, status, error_type, error):
+                            retry.append(item)
+                else:
+                    for item in batch:
+                        self._resolve(item, True)
+            latency = time.perf_counter() - started
+            if retry:
+                self._schedule_retry(retry)
+            if self.dead_letters.count > dead_before:
+                logger.warning(
+                    f"Bulk writer {self.name} dead-lettered {self.dead_letters.count - dead_before} "
+                    f"of {len(batch)} items"
+                )
+            REQUEST_SECONDS.labels(self.name).observe(latency)
+            self._adapt(latency, rejected, saturated, epoch)
+        finally:
+            self._inflight -= 1
+            self._pump()
+
+    def _adapt(self, latency: float, rejected: bool, saturated: bool, epoch: int):
+        if rejected:
+            REJECTIONS.labels(self.name).inc()
+        if rejected or latency > self.target_latency:
+            if epoch == self._epoch:
+                self._epoch += 1
+                self.batch_limit = max(self.min_batch, self.batch_limit * self.decrease)
+                self.concurrency = max(1.0, self.concurrency * self.decrease)
+        elif saturated:
+            # Grow only when the limits were what held items back
+            self.batch_limit = min(self.max_batch, self.batch_limit + self.increase)
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def _failed(self, item: BulkItem, status: Optional[int], error_type: Optional[str], error: str) -> bool:
+        """Dead-letter an item that failed for good; returns whether to retry it."""
+        # No status means the request never got an answer, e.g. a connection error
+        retryable = status is None or status in RETRYABLE_STATUSES or error_type in REJECTION_TYPES
+        if not retryable or item.attempts >= self.max_retries:
+            self._dead_letter(item, status, error)
+            return False
+        item.attempts += 1
+        return True
+
+    def _schedule_retry(self, items: List[BulkItem]):
+        """Requeue the failed items of one request together, after a jittered backoff."""
+        RETRIES.labels(self.name).inc(len(items))
+        attempts = max(item.attempts for item in items)
+        # Full jitter, so requests rejected together do not come back together
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempts))
+        self._retry_ids += 1
+        handle = asyncio.get_running_loop().call_later(delay, self._retry, self._retry_ids)
+        self._retrying[self._retry_ids] = (handle, items)
+
+    def _retry(self, retry_id: int):
+        _, items = self._retrying.pop(retry_id)
+        self._queue.extendleft(reversed(items))
+        self._pump()
+
+    def _dead_letter(self, item: BulkItem, status: Optional[int], error: str):
+        DEAD_LETTERS.labels(self.name).inc()
+        self.dead_letters.add(self.name, item.action, item.source, status, error, item.attempts)
+        self._resolve(item, False)
+
+    def _resolve(self, item: BulkItem, stored: bool):
+        submission = item.submission
+        submission.results[item.position] = stored
+        submission.remaining -= 1
+        if not submission.remaining and not submission.future.done():
+            submission.future.set_result(submission.results)
+
+def create_bulk_writer(name: str, settings) -> AdaptiveBulkWriter:
+    """A writer configured from settings, dead-lettering to ``<DEAD_LETTER_PATH>/<name>.jsonl``."""
+    path = os.path.join(settings.DEAD_LETTER_PATH, f"{name}.jsonl") if settings.DEAD_LETTER_PATH else None
+    return AdaptiveBulkWriter(
+        name,
+        max_bytes=settings.BULK_MAX_BYTES,
+        initial_batch=settings.BULK_INITIAL_ITEMS,
+        min_batch=settings.BULK_MIN_ITEMS,
+        max_batch=settings.BULK_MAX_ITEMS,
+        max_concurrency=settings.BULK_MAX_CONCURRENCY,
+        target_latency=settings.BULK_TARGET_LATENCY_SECONDS,
+        max_retries=settings.BULK_MAX_RETRIES,
+        retry_base=settings.BULK_RETRY_BASE_SECONDS,
+        retry_max=settings.BULK_RETRY_MAX_SECONDS,
+        dead_letters=DeadLetterStore(path)
+    )
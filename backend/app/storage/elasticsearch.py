@@ -0,0 +1,65 @@
+"""
+Elasticsearch storage backend.
+"""
+from typing import Any, Dict, List, Optional
+from elasticsearch import AsyncElasticsearch
+from .base import StorageBackend, StorageIndices
+
+class ElasticsearchIndices(StorageIndices):
+    def __init__(self, client: AsyncElasticsearch):
+        self.client = client
+
+    async def exists(self, index: str, **kwargs) -> bool:
+        return bool(await self.client.indices.exists(index=index, **kwargs))
+
+    async def create(self, index: str, mappings: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        return await self.client.indices.create(index=index, mappings=mappings, **kwargs)
+
+    async def delete(self, index: str, **kwargs) -> Dict[str, Any]:
+        return await self.client.indices.delete(index=index, **kwargs)
+
+    async def refresh(self, index: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        return await self.client.indices.refresh(index=index, **kwargs)
+
+class ElasticsearchBackend(StorageBackend):
+    """Passes every call through to an ``AsyncElasticsearch`` client."""
+
+    def __init__(self, client: AsyncElasticsearch):
+        self.client = client
+        self.indices = ElasticsearchIndices(client)
+
+    async def ping(self, **kwargs) -> bool:
+        return await self.client.ping(**kwargs)
+
+    async def close(self):
+        await self.client.close()
+
+    async def index(self, index: str, document: Dict[str, Any], id: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        return await self.client.index(index=index, document=document, id=id, **kwargs)
+
+    async def bulk(self, operations: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        return await self.client.bulk(operations=operations, **kwargs)
+
+    async def get(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        return await self.client.get(index=index, id=id, **kwargs)
+
+    async def update(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        return await self.client.update(index=index, id=id, **kwargs)
+
+    async def delete(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        return await self.client.delete(index=index, id=id, **kwargs)
+
+    async def search(self, index: Optional[str] = None, body: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        return await self.client.search(index=index, body=body, **kwargs)
+
+    async def msearch(self, searches: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        return await self.client.msearch(searches=searches, **kwargs)
+
+    async def count(self, index: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        return await self.client.count(index=index, **kwargs)
+
+    async def update_by_query(self, index: str, **kwargs) -> Dict[str, Any]:
+        return await self.client.update_by_query(index=index, **kwargs)
+
+    async def delete_by_query(self, index: str, **kwargs) -> Dict[str, Any]:
+        return await self.client.delete_by_query(index=index, **kwargs)
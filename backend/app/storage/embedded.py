@@ -0,0 +1,1395 @@
+"""
+Embedded columnar storage backend.
+
+Documents are appended to segments partitioned by day of their timestamp.
+Each segment keeps the serialized _source of every row plus columns for
+the fields queries touch:
+
+* keyword, ip and boolean fields are dictionary encoded, with a row bitmap
+  per distinct value;
+* text fields are tokenized into the same dictionary/bitmap layout;
+* numeric and date fields are packed into ``array('d')``, dates as epoch
+  milliseconds.
+
+Filters evaluate to row bitmaps (Python ints), so bool queries are bitwise
+AND/OR/ANDNOT and terms aggregations are popcounts of bitmap intersections.
+Clauses and aggregations with no columnar plan fall back to the reference
+implementations in ``app.core.query_dsl`` and ``app.core.aggregations``
+over the matching rows only.
+
+Updates and deletes never modify a segment in place: the old row is
+tombstoned and the new version appended. With a data path, sealed segments
+are written as compressed column files and writes since the last seal are
+kept in a write-ahead log that is replayed on open.
+"""
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime
+from enum import Enum
+from heapq import nlargest, nsmallest
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from ..core.aggregations import (
+    DateInterval, epoch_millis, format_date, project_source,
+    run_aggregation, sort_spec, sort_value, source_includes, to_datetime
+)
+from ..core.json import dumps, loads
+from ..core.query_dsl import iter_fields, matches, tokenize, UnsupportedQueryError
+from .base import StorageBackend, StorageIndices
+from .errors import bad_request, conflict, not_found
+from .scripts import merge_partial, run_script
+import json
+import logging
+import math
+import re
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+KEYWORD_TYPES = {"keyword", "ip", "boolean", "constant_keyword"}
+NUMERIC_TYPES = {"long", "integer", "short", "byte", "double", "float", "half_float", "scaled_float", "date"}
+UNINDEXED_TYPES = {"geo_point", "binary", "flattened"}
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}")
+MAX_TRACKED_HITS = 10000
+PARTITION_FIELD = "timestamp"
+
+def _scalar(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else value
+
+def bitmap(rows: List[int]) -> int:
+    """Row numbers to a bitmap."""
+    if not rows:
+        return 0
+    buffer = bytearray((max(rows) >> 3) + 1)
+    for row in rows:
+        buffer[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(buffer, "little")
+
+BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Row numbers set in a bitmap, ascending."""
+    data = mask.to_bytes((mask.bit_length() + 7) >> 3, "little")
+    for index, byte in enumerate(data):
+        if byte:
+            base = index << 3
+            for bit in BYTE_BITS[byte]:
+                yield base + bit
+
+class KeywordColumn:
+    """Dictionary-encoded values with a row bitmap per distinct value."""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+        self.rows: List[List[int]] = []
+        self.present: List[int] = []
+        self._postings: List[int] = []
+        self._built: List[int] = []
+        self._present_bits = 0
+        self._present_built = 0
+        self._row_codes: Dict[int, List[int]] = {}
+        self._row_codes_built = 0
+
+    def append(self, row: int, values: List[Any]):
+        added = False
+        for value in values:
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+                self.rows.append([])
+                self._postings.append(0)
+                self._built.append(0)
+            rows = self.rows[code]
+            if not rows or rows[-1] != row:
+                rows.append(row)
+                added = True
+        if added:
+            self.present.append(row)
+
+    def code_of(self, value: Any) -> Optional[int]:
+        value = _scalar(value)
+        code = self.codes.get(value)
+        if code is None and isinstance(value, str) and value in ("true", "false"):
+            code = self.codes.get(value == "true")
+        if code is None and isinstance(value, bool):
+            code = self.codes.get(str(value).lower())
+        return code
+
+    def posting(self, code: int) -> int:
+        rows = self.rows[code]
+        built = self._built[code]
+        if built < len(rows):
+            self._postings[code] |= bitmap(rows[built:])
+            self._built[code] = len(rows)
+        return self._postings[code]
+
+    def postings(self) -> Iterator[Tuple[int, int]]:
+        for code in range(len(self.values)):
+            yield code, self.posting(code)
+
+    def row_codes(self) -> Dict[int, List[int]]:
+        """Row → codes, the forward index for small selections."""
+        if self._row_codes_built < sum(map(len, self.rows)):
+            lookup: Dict[int, List[int]] = {}
+            for code, rows in enumerate(self.rows):
+                for row in rows:
+                    lookup.setdefault(row, []).append(code)
+            self._row_codes = lookup
+            self._row_codes_built = sum(map(len, self.rows))
+        return self._row_codes
+
+    def exists(self) -> int:
+        if self._present_built < len(self.present):
+            self._present_bits |= bitmap(self.present[self._present_built:])
+            self._present_built = len(self.present)
+        return self._present_bits
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"values": self.values, "rows": self.rows}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "KeywordColumn":
+        column = cls()
+        column.values = data["values"]
+        column.codes = {value: code for code, value in enumerate(column.values)}
+        column.rows = data["rows"]
+        column._postings = [0] * len(column.values)
+        column._built = [0] * len(column.values)
+        column.present = sorted({row for rows in column.rows for row in rows})
+        return column
+
+class NumericColumn:
+    """Packed doubles, NaN where a row has no value; dates as epoch millis."""
+
+    def __init__(self):
+        self.values = array("d")
+        self.multi = False
+        self.low = math.inf
+        self.high = -math.inf
+
+    def append(self, row: int, values: List[float]):
+        while len(self.values) < row:
+            self.values.append(math.nan)
+        if values:
+            value = values[0]
+            self.values.append(value)
+            self.low = min(self.low, value)
+            self.high = max(self.high, value)
+        else:
+            self.values.append(math.nan)
+        if len(values) > 1:
+            self.multi = True
+
+    def value(self, row: int) -> float:
+        return self.values[row] if row < len(self.values) else math.nan
+
+    def where(self, predicate: Callable[[float], bool], rows: int) -> int:
+        values = self.values
+        return bitmap([row for row in range(min(rows, len(values))) if predicate(values[row])])
+
+    def exists(self, rows: int) -> int:
+        return self.where(lambda value: value == value, rows)
+
+    def bounds(self) -> Tuple[float, float]:
+        return (self.low, self.high) if self.low <= self.high else (math.nan, math.nan)
+
+    def reset_bounds(self):
+        present = [value for value in self.values if value == value]
+        if present:
+            self.low, self.high = min(present), max(present)
+
+class Segment:
+    """An append-only run of rows from one time partition."""
+
+    def __init__(self, name: str, partition: str):
+        self.name = name
+        self.partition = partition
+        self.ids: List[str] = []
+        self.sources: List[bytes] = []
+        self.keywords: Dict[str, KeywordColumn] = {}
+        self.tokens: Dict[str, KeywordColumn] = {}
+        self.numbers: Dict[str, NumericColumn] = {}
+        self.deleted = 0
+        self.deleted_dirty = False
+        self.sealed = False
+
+    @property
+    def rows(self) -> int:
+        return len(self.ids)
+
+    def live(self) -> int:
+        return ((1 << self.rows) - 1) & ~self.deleted
+
+    def doc(self, row: int) -> Dict[str, Any]:
+        return loads(self.sources[row])
+
+    def tombstone(self, row: int):
+        self.deleted |= 1 << row
+        self.deleted_dirty = True
+
+    def bounds(self, field: str) -> Tuple[float, float]:
+        """Min and max of a numeric column, for pruning."""
+        column = self.numbers.get(field)
+        return column.bounds() if column is not None else (math.nan, math.nan)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "partition": self.partition,
+            "ids": self.ids,
+            "sources": [source.decode() for source in self.sources],
+            "keywords": {field: column.to_json() for field, column in self.keywords.items()},
+            "tokens": {field: column.to_json() for field, column in self.tokens.items()},
+            "numbers": {
+                field: [None if value != value else value for value in column.values]
+                for field, column in self.numbers.items()
+            },
+            "multi": [field for field, column in self.numbers.items() if column.multi],
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Segment":
+        segment = cls(data["name"], data["partition"])
+        segment.ids = data["ids"]
+        segment.sources = [source.encode() for source in data["sources"]]
+        segment.keywords = {f: KeywordColumn.from_json(c) for f, c in data["keywords"].items()}
+        segment.tokens = {f: KeywordColumn.from_json(c) for f, c in data["tokens"].items()}
+        for field, values in data["numbers"].items():
+            column = NumericColumn()
+            column.values = array("d", (math.nan if value is None else value for value in values))
+            column.multi = field in data["multi"]
+            column.reset_bounds()
+            segment.numbers[field] = column
+        segment.sealed = True
+        return segment
+
+class EmbeddedIndex:
+    """Segments, mappings and the id → row map of one index."""
+
+    def __init__(self, name: str, mappings: Optional[Dict[str, Any]] = None, directory: Optional[Path] = None):
+        self.name = name
+        self.mappings = mappings or {"properties": {}}
+        self.types: Dict[str, str] = {}
+        self._flatten(self.mappings.get("properties", {}), "")
+        self.directory = directory
+        self.segments: List[Segment] = []
+        self.active: Dict[str, Segment] = {}
+        self.locations: Dict[str, Tuple[Segment, int]] = {}
+        self.versions: Dict[str, int] = {}
+        self.seq_no = -1
+        self._next_segment = 0
+        self._wal = None
+
+    def _flatten(self, properties: Dict[str, Any], prefix: str):
+        for field, spec in properties.items():
+            path = f"{prefix}{field}"
+            if "properties" in spec:
+                self._flatten(spec["properties"], f"{path}.")
+            if "type" in spec:
+                self.types[path] = spec["type"]
+
+    def field_type(self, path: str, value: Any) -> Optional[str]:
+        """Mapped type of a field, detecting and recording it like dynamic mapping."""
+        mapped = self.types.get(path)
+        if mapped is not None:
+            return mapped
+        if isinstance(value, bool):
+            detected = "boolean"
+        elif isinstance(value, (int, float)):
+            detected = "double"
+        elif isinstance(value, str):
+            detected = "date" if DATE_PATTERN.match(value) else "keyword"
+        else:
+            return None
+        self.types[path] = detected
+        return detected
+
+    def new_segment(self, partition: str) -> Segment:
+        segment = Segment(f"{self._next_segment:08d}", partition)
+        self._next_segment += 1
+        self.segments.append(segment)
+        self.active[partition] = segment
+        return segment
+
+def _partition(source: Dict[str, Any]) -> str:
+    value = source.get(PARTITION_FIELD)
+    return value[:10] if isinstance(value, str) and len(value) >= 10 else "_"
+
+def _leaves(document: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, List[Any]]]:
+    """(dotted path, scalar values) for every leaf field."""
+    for key, value in document.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield path, [value]
+            yield from _leaves(value, f"{path}.")
+        elif isinstance(value, list):
+            scalars = [item for item in value if not isinstance(item, (dict, list)) and item is not None]
+            if scalars:
+                yield path, scalars
+            for item in value:
+                if isinstance(item, dict):
+                    yield from _leaves(item, f"{path}.")
+        elif value is not None:
+            yield path, [value]
+
+def _as_number(value: Any, field_type: str) -> Optional[float]:
+    if field_type == "date":
+        moment = to_datetime(value)
+        return float(epoch_millis(moment)) if moment is not None else None
+    if isinstance(value, bool):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class Fallback(Exception):
+    """A clause or aggregation has no columnar plan for this segment."""
+
+class EmbeddedIndices(StorageIndices):
+    def __init__(self, backend: "EmbeddedBackend"):
+        self.backend = backend
+
+    async def exists(self, index: str, **kwargs) -> bool:
+        return all(name in self.backend._indices for name in index.split(","))
+
+    async def create(self, index: str, mappings: Optional[Dict[str, Any]] = None, body=None, **kwargs) -> Dict[str, Any]:
+        if index in self.backend._indices:
+            raise bad_request(f"index [{index}] already exists", "resource_already_exists_exception")
+        self.backend._create_index(index, mappings or (body or {}).get("mappings"))
+        return {"acknowledged": True, "index": index}
+
+    async def delete(self, index: str, **kwargs) -> Dict[str, Any]:
+        for name in self.backend._resolve(index):
+            self.backend._drop_index(name)
+        return {"acknowledged": True}
+
+    async def refresh(self, index: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        # Writes are searchable as soon as they are applied
+        return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+class EmbeddedBackend(StorageBackend):
+    """
+    In-process columnar storage for single-node and edge deployments.
+
+    With ``path`` set, data survives restarts; without it everything is
+    kept in memory. ``segment_rows`` bounds how many rows a segment takes
+    before it is sealed and a new one started.
+    """
+
+    # msearch runs its searches one after another
+    concurrent_msearch = False
+
+    def __init__(self, path: Optional[str] = None, segment_rows: int = 65536, fsync: bool = False):
+        self.path = Path(path) if path else None
+        self.segment_rows = segment_rows
+        self.fsync = fsync
+        self.indices = EmbeddedIndices(self)
+        self._indices: Dict[str, EmbeddedIndex] = {}
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            for directory in sorted(p for p in self.path.iterdir() if p.is_dir()):
+                self._open_index(directory)
+
+    # Persistence
+
+    def _create_index(self, name: str, mappings: Optional[Dict[str, Any]]) -> EmbeddedIndex:
+        directory = self.path / name if self.path is not None else None
+        index = EmbeddedIndex(name, mappings, directory)
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / "mappings.json").write_text(json.dumps(index.mappings))
+        self._indices[name] = index
+        return index
+
+    def _drop_index(self, name: str):
+        index = self._indices.pop(name)
+        if index._wal is not None:
+            index._wal.close()
+        if index.directory is not None:
+            for file in index.directory.iterdir():
+                file.unlink()
+            index.directory.rmdir()
+
+    def _open_index(self, directory: Path):
+        mappings_file = directory / "mappings.json"
+        mappings = json.loads(mappings_file.read_text()) if mappings_file.exists() else None
+        index = EmbeddedIndex(directory.name, mappings, directory)
+        self._indices[index.name] = index
+        for file in sorted(directory.glob("*.seg")):
+            segment = Segment.from_json(loads(zlib.decompress(file.read_bytes())))
+            deleted = file.with_suffix(".del")
+            if deleted.exists():
+                segment.deleted = int.from_bytes(deleted.read_bytes(), "little")
+            index.segments.append(segment)
+            index._next_segment = max(index._next_segment, int(segment.name) + 1)
+            for row, doc_id in enumerate(segment.ids):
+                if not segment.deleted >> row & 1:
+                    index.seq_no += 1
+                    index.locations[doc_id] = (segment, row)
+                    index.versions[doc_id] = index.seq_no
+        wal = directory / "wal.log"
+        if wal.exists():
+            with wal.open("rb") as lines:
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = loads(line)
+                    except ValueError:
+                        logger.warning(f"Ignoring truncated write-ahead log record in {wal}")
+                        break
+                    if "d" in record:
+                        self._store(index, record["i"], record["d"], log=False)
+                    else:
+                        self._remove(index, record["i"], log=False)
+        logger.info(f"Opened embedded index {index.name} with {len(index.locations)} documents")
+
+    def _log(self, index: EmbeddedIndex, record: Dict[str, Any]):
+        if index.directory is None:
+            return
+        if index._wal is None:
+            index._wal = (index.directory / "wal.log").open("ab")
+        index._wal.write(dumps(record) + b"\n")
+
+    def _sync(self, index: EmbeddedIndex):
+        if index._wal is not None:
+            index._wal.flush()
+            if self.fsync:
+                import os
+                os.fsync(index._wal.fileno())
+
+    def _seal(self, index: EmbeddedIndex, segment: Segment):
+        segment.sealed = True
+        index.active.pop(segment.partition, None)
+        if index.directory is None:
+            return
+        (index.directory / f"{segment.name}.seg").write_bytes(zlib.compress(dumps(segment.to_json()), 1))
+        for sealed in index.segments:
+            if sealed.sealed and sealed.deleted_dirty:
+                (index.directory / f"{sealed.name}.del").write_bytes(
+                    sealed.deleted.to_bytes((sealed.deleted.bit_length() + 7) >> 3, "little")
+                )
+                sealed.deleted_dirty = False
+        # Everything not yet in a sealed segment is rewritten as the new log
+        if index._wal is not None:
+            index._wal.close()
+            index._wal = None
+        temporary = index.directory / "wal.log.tmp"
+        with temporary.open("wb") as log:
+            for active in index.active.values():
+                live = active.live()
+                for row in iter_bits(live):
+                    log.write(dumps({"i": active.ids[row], "d": loads(active.sources[row])}) + b"\n")
+        temporary.replace(index.directory / "wal.log")
+
+    # Writes
+
+    def _resolve(self, index: Optional[str], must_exist: bool = True) -> List[str]:
+        if index is None or index in ("_all", "*"):
+            return list(self._indices)
+        names = []
+        for name in index.split(","):
+            if "*" in name:
+                prefix = name.rstrip("*")
+                names.extend(n for n in self._indices if n.startswith(prefix))
+            elif name in self._indices:
+                names.append(name)
+            elif must_exist:
+                raise not_found(f"no such index [{name}]", "index_not_found_exception")
+        return names
+
+    def _index_for_write(self, name: str) -> EmbeddedIndex:
+        index = self._indices.get(name)
+        return index if index is not None else self._create_index(name, None)
+
+    def _store(self, index: EmbeddedIndex, doc_id: str, source: Dict[str, Any], log: bool = True) -> int:
+        """Append a document version, tombstoning the previous one."""
+        encoded = dumps(source)
+        if log:
+            self._log(index, {"i": doc_id, "d": source})
+        source = loads(encoded)
+        previous = index.locations.get(doc_id)
+        if previous is not None:
+            previous[0].tombstone(previous[1])
+
+        partition = _partition(source)
+        segment = index.active.get(partition) or index.new_segment(partition)
+        row = segment.rows
+        segment.ids.append(doc_id)
+        segment.sources.append(encoded)
+        for path, values in _leaves(source):
+            field_type = index.field_type(path, values[0])
+            if field_type is None or field_type in UNINDEXED_TYPES or field_type == "object":
+                continue
+            if field_type == "text":
+                column = segment.tokens.get(path)
+                if column is None:
+                    column = segment.tokens[path] = KeywordColumn()
+                column.append(row, list(dict.fromkeys(t for value in values for t in tokenize(value))))
+            elif field_type in NUMERIC_TYPES:
+                numbers = [n for n in (_as_number(v, field_type) for v in values) if n is not None]
+                column = segment.numbers.get(path)
+                if column is None:
+                    column = segment.numbers[path] = NumericColumn()
+                column.append(row, numbers)
+            else:
+                column = segment.keywords.get(path)
+                if column is None:
+                    column = segment.keywords[path] = KeywordColumn()
+                column.append(row, [v for v in values if not isinstance(v, dict)])
+
+        index.seq_no += 1
+        index.locations[doc_id] = (segment, row)
+        index.versions[doc_id] = index.seq_no
+        if segment.rows >= self.segment_rows:
+            self._seal(index, segment)
+        return index.seq_no
+
+    def _remove(self, index: EmbeddedIndex, doc_id: str, log: bool = True) -> bool:
+        location = index.locations.pop(doc_id, None)
+        if location is None:
+            return False
+        if log:
+            self._log(index, {"i": doc_id})
+        location[0].tombstone(location[1])
+        index.versions.pop(doc_id, None)
+        index.seq_no += 1
+        return True
+
+    def _source_of(self, index: EmbeddedIndex, doc_id: str) -> Optional[Dict[str, Any]]:
+        location = index.locations.get(doc_id)
+        return location[0].doc(location[1]) if location else None
+
+    async def ping(self, **kwargs) -> bool:
+        return True
+
+    async def close(self):
+        for index in self._indices.values():
+            if index._wal is not None:
+                self._sync(index)
+                index._wal.close()
+                index._wal = None
+
+    async def index(self, index: str, document: Dict[str, Any], id: Optional[str] = None, op_type=None, **kwargs) -> Dict[str, Any]:
+        target = self._index_for_write(index)
+        result = self._index_one(target, id, document, op_type == "create")
+        self._sync(target)
+        return result
+
+    def _index_one(self, index: EmbeddedIndex, doc_id: Optional[str], document: Dict[str, Any], create: bool) -> Dict[str, Any]:
+        doc_id = str(doc_id) if doc_id is not None else f"{index.name}-{time.time_ns()}-{index.seq_no + 1}"
+        exists = doc_id in index.locations
+        if create and exists:
+            raise conflict(f"[{doc_id}]: document already exists")
+        seq_no = self._store(index, doc_id, document)
+        return {
+            "_index": index.name, "_id": doc_id, "result": "updated" if exists else "created",
+            "_seq_no": seq_no, "_primary_term": 1
+        }
+
+    async def get(self, index: str, id: str, _source=None, source=None, **kwargs) -> Dict[str, Any]:
+        for name in self._resolve(index):
+            target = self._indices[name]
+            doc = self._source_of(target, str(id))
+            if doc is not None:
+                wanted, includes = source_includes(kwargs.get("source_includes") or _source or source)
+                return {
+                    "_index": name, "_id": str(id), "found": True,
+                    "_seq_no": target.versions[str(id)], "_primary_term": 1,
+                    **({"_source": project_source(doc, includes)} if wanted else {})
+                }
+        raise not_found(f"[{id}] not found")
+
+    async def update(
+        self,
+        index: str,
+        id: str,
+        doc=None,
+        script=None,
+        upsert=None,
+        doc_as_upsert=False,
+        source=None,
+        _source=None,
+        if_seq_no=None,
+        body=None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        body = body or {}
+        target = self._index_for_write(index)
+        item = self._update_one(
+            target, str(id),
+            doc if doc is not None else body.get("doc"),
+            script or body.get("script"),
+            upsert if upsert is not None else body.get("upsert"),
+            doc_as_upsert, if_seq_no
+        )
+        self._sync(target)
+        if "error" in item:
+            error = item["error"]
+            if item["status"] == 404:
+                raise not_found(error["reason"], error["type"])
+            if item["status"] == 409:
+                raise conflict(error["reason"])
+            raise bad_request(error["reason"], error["type"])
+        result = {key: value for key, value in item.items() if key != "status"}
+        requested = source if source is not None else _source
+        wanted, includes = source_includes(requested)
+        if requested is not None and wanted:
+            result["get"] = {"_source": project_source(self._source_of(target, str(id)), includes), "found": True}
+        return result
+
+    def _update_one(
+        self,
+        index: EmbeddedIndex,
+        doc_id: str,
+        doc: Optional[Dict[str, Any]],
+        script: Optional[Dict[str, Any]],
+        upsert: Optional[Dict[str, Any]],
+        doc_as_upsert: bool,
+        if_seq_no: Optional[int] = None
+    ) -> Dict[str, Any]:
+        current = self._source_of(index, doc_id)
+        base = {"_index": index.name, "_id": doc_id, "_primary_term": 1}
+        if if_seq_no is not None and (current is None or index.versions[doc_id] != if_seq_no):
+            return {**base, "status": 409, "error": {
+                "type": "version_conflict_engine_exception",
+                "reason": f"[{doc_id}]: version conflict, required seqNo [{if_seq_no}]"
+            }}
+        if current is None:
+            seed = doc if doc_as_upsert else upsert
+            if seed is None:
+                return {**base, "status": 404, "error": {
+                    "type": "document_missing_exception", "reason": f"[{doc_id}]: document missing"
+                }}
+            return {**base, "status": 201, "result": "created", "_seq_no": self._store(index, doc_id, seed)}
+
+        updated = loads(dumps(current))
+        if script is not None:
+            ctx = {"_source": updated, "op": "index"}
+            try:
+                run_script({**script, "params": loads(dumps(script.get("params", {})))}, ctx)
+            except Exception as e:
+                return {**base, "status": 400, "error": {"type": "script_exception", "reason": str(e)}}
+            if ctx["op"] == "noop":
+                return {**base, "status": 200, "result": "noop", "_seq_no": index.versions[doc_id]}
+            if ctx["op"] == "delete":
+                self._remove(index, doc_id)
+                return {**base, "status": 200, "result": "deleted", "_seq_no": index.seq_no}
+        if doc is not None:
+            merge_partial(updated, loads(dumps(doc)))
+        if updated == current:
+            return {**base, "status": 200, "result": "noop", "_seq_no": index.versions[doc_id]}
+        return {**base, "status": 200, "result": "updated", "_seq_no": self._store(index, doc_id, updated)}
+
+    async def delete(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        target = self._index_for_write(index)
+        if not self._remove(target, str(id)):
+            raise not_found(f"[{id}] not found")
+        self._sync(target)
+        return {"_index": index, "_id": str(id), "result": "deleted"}
+
+    async def bulk(self, operations: List[Dict[str, Any]] = None, body=None, index=None, **kwargs) -> Dict[str, Any]:
+        started = time.perf_counter()
+        operations = operations if operations is not None else body
+        if isinstance(operations, (str, bytes)):
+            operations = [loads(line) for line in operations.splitlines() if line.strip()]
+        items = []
+        touched = set()
+        position = 0
+        while position < len(operations):
+            action, meta = next(iter(operations[position].items()))
+            position += 1
+            target = self._index_for_write(meta.get("_index") or index)
+            touched.add(target.name)
+            doc_id = meta.get("_id")
+            if action in ("index", "create"):
+                payload = operations[position]
+                position += 1
+                try:
+                    item = self._index_one(target, doc_id, payload, action == "create")
+                    item["status"] = 201 if item["result"] == "created" else 200
+                except Exception as e:
+                    item = {"_index": target.name, "_id": doc_id, "status": 409, "error": getattr(e, "body", {}).get("error")}
+            elif action == "update":
+                payload = operations[position]
+                position += 1
+                item = self._update_one(
+                    target, str(doc_id), payload.get("doc"), payload.get("script"),
+                    payload.get("upsert"), payload.get("doc_as_upsert", False), meta.get("if_seq_no")
+                )
+            elif action == "delete":
+                removed = self._remove(target, str(doc_id))
+                item = {
+                    "_index": target.name, "_id": doc_id,
+                    "status": 200 if removed else 404,
+                    "result": "deleted" if removed else "not_found"
+                }
+            else:
+                raise bad_request(f"Malformed action [{action}]")
+            items.append({action: item})
+        for name in touched:
+            self._sync(self._indices[name])
+        return {
+            "took": int((time.perf_counter() - started) * 1000),
+            "errors": any(next(iter(item.values()))["status"] >= 300 for item in items),
+            "items": items
+        }
+
+    # Queries
+
+    def _select(self, index: Optional[str], query: Optional[Dict[str, Any]]) -> List[Tuple[EmbeddedIndex, Segment, int]]:
+        """(index, segment, row bitmap) for every segment with matching rows."""
+        query = query or {"match_all": {}}
+        selection = []
+        for name in self._resolve(index):
+            target = self._indices[name]
+            for segment in target.segments:
+                live = segment.live()
+                if not live:
+                    continue
+                mask = self._eval(query, target, segment, live)
+                if mask:
+                    selection.append((target, segment, mask))
+        return selection
+
+    def _eval(self, query: Dict[str, Any], index: EmbeddedIndex, segment: Segment, within: int) -> int:
+        """Rows of ``within`` matching query, columnar where possible."""
+        try:
+            return self._columnar(query, index, segment, within)
+        except Fallback:
+            return self._scan(query, index, segment, within)
+
+    def _scan(self, query: Dict[str, Any], index: EmbeddedIndex, segment: Segment, within: int) -> int:
+        needs_meta = "_index" in repr(query)
+        rows = []
+        for row in iter_bits(within):
+            doc = segment.doc(row)
+            if needs_meta:
+                doc["_index"] = index.name
+            if matches(query, doc):
+                rows.append(row)
+        return bitmap(rows)
+
+    def _columnar(self, query: Dict[str, Any], index: EmbeddedIndex, segment: Segment, within: int) -> int:
+        if not query:
+            return within
+        if len(query) != 1:
+            for key, value in query.items():
+                within = self._eval({key: value}, index, segment, within)
+            return within
+        kind, clause = next(iter(query.items()))
+
+        if kind == "match_all":
+            return within
+        if kind == "match_none":
+            return 0
+        if kind == "bool":
+            return self._bool(clause, index, segment, within)
+        if kind in ("term", "terms"):
+            if kind == "term":
+                field, value = next(iter(clause.items()))
+                wanted = [value["value"] if isinstance(value, dict) else value]
+            else:
+                field, wanted = next((k, v) for k, v in clause.items() if k != "boost")
+            if field == "_index":
+                return within if any(str(v) == index.name for v in wanted) else 0
+            return self._terms_mask(index, segment, field, wanted) & within
+        if kind == "range":
+            field, bounds = next(iter(clause.items()))
+            return self._range_mask(index, segment, field, bounds, within)
+        if kind == "exists":
+            field = clause["field"]
+            if field in segment.keywords:
+                return segment.keywords[field].exists() & within
+            if field in segment.numbers:
+                return segment.numbers[field].exists(segment.rows) & within
+            if field in segment.tokens:
+                return segment.tokens[field].exists() & within
+            if index.types.get(field) in NUMERIC_TYPES | KEYWORD_TYPES | {"text"}:
+                return 0
+            raise Fallback()
+        if kind == "prefix":
+            field, value = next(iter(clause.items()))
+            prefix = str(value["value"] if isinstance(value, dict) else value)
+            column = self._keyword_column(index, segment, field)
+            mask = 0
+            for code, item in enumerate(column.values):
+                if str(item).startswith(prefix):
+                    mask |= column.posting(code)
+            return mask & within
+        if kind == "ids":
+            rows = []
+            for doc_id in clause.get("values", []):
+                location = index.locations.get(str(doc_id))
+                if location is not None and location[0] is segment:
+                    rows.append(location[1])
+            return bitmap(rows) & within
+        if kind in ("match", "match_phrase"):
+            field, text = next(iter(clause.items()))
+            operator = "or"
+            if isinstance(text, dict):
+                operator = text.get("operator", "or")
+                text = text["query"]
+            if kind == "match_phrase":
+                operator = "and"
+            return self._text_mask(index, segment, [field], text, operator) & within
+        if kind == "multi_match":
+            fields = list(iter_fields(clause.get("fields", [])))
+            return self._text_mask(index, segment, fields, clause["query"], clause.get("operator", "or")) & within
+        raise Fallback()
+
+    def _bool(self, clause: Dict[str, Any], index: EmbeddedIndex, segment: Segment, within: int) -> int:
+        def clauses(name):
+            value = clause.get(name)
+            return [] if value is None else value if isinstance(value, list) else [value]
+
+        required = clauses("must") + clauses("filter")
+        mask = within
+        # Columnar clauses first so row scans only see the survivors
+        deferred = []
+        for query in required:
+            try:
+                mask = self._columnar(query, index, segment, mask)
+            except Fallback:
+                deferred.append(query)
+            if not mask:
+                return 0
+        for query in deferred:
+            mask = self._scan(query, index, segment, mask)
+            if not mask:
+                return 0
+        for query in clauses("must_not"):
+            mask &= ~self._eval(query, index, segment, mask)
+            if not mask:
+                return 0
+        should = clauses("should")
+        if should:
+            minimum = clause.get("minimum_should_match", 0 if required else 1)
+            if isinstance(minimum, str):
+                minimum = int(minimum.rstrip("%")) * len(should) // 100 if minimum.endswith("%") else int(minimum)
+            if minimum <= 0:
+                return mask
+            if minimum == 1:
+                matched = 0
+                for query in should:
+                    matched |= self._eval(query, index, segment, mask)
+                return mask & matched
+            counts = Counter()
+            for query in should:
+                for row in iter_bits(self._eval(query, index, segment, mask)):
+                    counts[row] += 1
+            return bitmap([row for row, count in counts.items() if count >= minimum])
+        return mask
+
+    def _keyword_column(self, index: EmbeddedIndex, segment: Segment, field: str) -> KeywordColumn:
+        column = segment.keywords.get(field)
+        if column is not None:
+            return column
+        if index.types.get(field) in KEYWORD_TYPES:
+            return KeywordColumn()
+        raise Fallback()
+
+    def _terms_mask(self, index: EmbeddedIndex, segment: Segment, field: str, wanted: List[Any]) -> int:
+        numbers = segment.numbers.get(field)
+        if numbers is not None and not numbers.multi:
+            field_type = index.types.get(field, "double")
+            targets = {_as_number(_scalar(value), field_type) for value in wanted}
+            return numbers.where(lambda value: value in targets, segment.rows)
+        column = self._keyword_column(index, segment, field)
+        mask = 0
+        for value in wanted:
+            code = column.code_of(value)
+            if code is not None:
+                mask |= column.posting(code)
+        return mask
+
+    def _range_mask(self, index: EmbeddedIndex, segment: Segment, field: str, bounds: Dict[str, Any], within: int) -> int:
+        column = segment.numbers.get(field)
+        if column is None or column.multi:
+            if index.types.get(field) in NUMERIC_TYPES and column is None:
+                return 0
+            raise Fallback()
+        field_type = index.types.get(field, "double")
+        low, high = -math.inf, math.inf
+        low_open = high_open = False
+        for op, bound in bounds.items():
+            if op in ("format", "time_zone", "boost"):
+                continue
+            value = _as_number(_scalar(bound), field_type)
+            if value is None:
+                raise Fallback()
+            if op == "gte":
+                low = max(low, value)
+            elif op == "gt":
+                low, low_open = max(low, value), True
+            elif op == "lte":
+                high = min(high, value)
+            elif op == "lt":
+                high, high_open = min(high, value), True
+            else:
+                raise UnsupportedQueryError(f"Unsupported range operator: {op}")
+        smallest, largest = segment.bounds(field)
+        if smallest != smallest:
+            return 0
+        above = smallest > low or (smallest == low and not low_open)
+        below = largest < high or (largest == high and not high_open)
+        if above and below:
+            return within & column.exists(segment.rows)
+        if largest < low or smallest > high:
+            return 0
+
+        def predicate(value: float) -> bool:
+            return (value > low if low_open else value >= low) and (value < high if high_open else value <= high)
+
+        return column.where(predicate, segment.rows) & within
+
+    def _text_mask(self, index: EmbeddedIndex, segment: Segment, fields: List[str], text: Any, operator: str) -> int:
+        columns = []
+        for field in fields:
+            if index.types.get(field) != "text":
+                raise Fallback()
+            if field in segment.tokens:
+                columns.append(segment.tokens[field])
+        wanted = tokenize(text)
+        if not wanted:
+            return 0
+        per_token = []
+        for token in wanted:
+            mask = 0
+            for column in columns:
+                code = column.codes.get(token)
+                if code is not None:
+                    mask |= column.posting(code)
+            per_token.append(mask)
+        result = per_token[0]
+        for mask in per_token[1:]:
+            result = result & mask if operator.lower() == "and" else result | mask
+        return result
+
+    async def search(self, index: Optional[str] = None, body: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        return self._search(index, {**(body or {}), **kwargs})
+
+    def _search(self, index: Optional[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            selection = self._select(index, params.get("query"))
+            total = sum(mask.bit_count() for _, _, mask in selection)
+            size = params.get("size", 10)
+            offset = params.get("from_", params.get("from", 0)) or 0
+            sort = [(field, descending) for field, descending in sort_spec(params.get("sort")) if field not in ("_score", "_doc")]
+            page = self._top_rows(selection, sort, offset + size, params.get("search_after"))[offset:]
+
+            wanted, includes = source_includes(
+                params.get("_source_includes") or params.get("source_includes")
+                or params.get("_source", params.get("source"))
+            )
+            hits = []
+            for target, segment, row, doc in page:
+                hit = {"_index": target.name, "_id": segment.ids[row], "_score": None if sort else 1.0}
+                doc = doc if doc is not None else segment.doc(row)
+                if wanted:
+                    hit["_source"] = project_source(doc, includes)
+                if sort:
+                    hit["sort"] = [sort_value(doc, field) for field, _ in sort]
+                if params.get("seq_no_primary_term"):
+                    hit["_seq_no"] = target.versions.get(segment.ids[row])
+                    hit["_primary_term"] = 1
+                hits.append(hit)
+
+            track = params.get("track_total_hits", MAX_TRACKED_HITS)
+            limit = MAX_TRACKED_HITS if track is None else (math.inf if track is True else track)
+            result = {"took": 0, "timed_out": False, "hits": {"max_score": None, "hits": hits}}
+            if track is not False:
+                result["hits"]["total"] = (
+                    {"value": limit, "relation": "gte"} if total > limit else {"value": total, "relation": "eq"}
+                )
+            aggs = params.get("aggs") or params.get("aggregations")
+            if aggs:
+                result["aggregations"] = self._aggregate(aggs, [(s, m) for _, s, m in selection], selection)
+            result["took"] = int((time.perf_counter() - started) * 1000)
+            return result
+        except UnsupportedQueryError as e:
+            raise bad_request(str(e), "parsing_exception")
+
+    def _top_rows(self, selection, sort, count: int, search_after=None):
+        """The first ``count`` matching rows in sort order as (index, segment, row, doc or None)."""
+        if count <= 0 and search_after is None:
+            return []
+        if not sort:
+            rows = []
+            for target, segment, mask in selection:
+                for row in iter_bits(mask):
+                    rows.append((target, segment, row, None))
+                    if len(rows) >= count:
+                        return rows
+            return rows
+
+        field, descending = sort[0]
+        numeric = len(sort) == 1 and search_after is None and all(
+            field in segment.numbers and not segment.numbers[field].multi or
+            field not in segment.keywords and field not in segment.tokens and target.types.get(field) in NUMERIC_TYPES
+            for target, segment, _ in selection
+        )
+        if numeric:
+            return self._top_numeric(selection, field, descending, count)
+
+        # General case: sort materialized documents with the reference ordering
+        rows = [
+            (target, segment, row, segment.doc(row))
+            for target, segment, mask in selection for row in iter_bits(mask)
+        ]
+        for key, desc in reversed(sort):
+            present = [r for r in rows if sort_value(r[3], key) is not None]
+            missing = [r for r in rows if sort_value(r[3], key) is None]
+            present.sort(key=lambda r: sort_value(r[3], key), reverse=desc)
+            rows = present + missing
+        if search_after is not None:
+            after = list(search_after)
+            rows = [r for r in rows if _after(r[3], sort, after)]
+        return rows[:count]
+
+    def _top_numeric(self, selection, field: str, descending: bool, count: int):
+        """Top rows by one numeric column, skipping segments whose bounds cannot compete."""
+        ordered = sorted(
+            selection,
+            key=lambda item: item[1].bounds(field)[1 if descending else 0] if field in item[1].numbers else math.nan,
+            reverse=descending
+        )
+        best: List[Tuple[float, int, Any]] = []
+        missing = []
+        sequence = 0
+        pick = nlargest if descending else nsmallest
+        for target, segment, mask in ordered:
+            column = segment.numbers.get(field)
+            if column is None:
+                missing.extend((target, segment, row, None) for row in iter_bits(mask))
+                continue
+            smallest, largest = segment.bounds(field)
+            if len(best) >= count and best:
+                cutoff = best[-1][0]
+                if (descending and largest < cutoff) or (not descending and smallest > cutoff):
+                    continue
+            candidates = []
+            for row in iter_bits(mask):
+                value = column.value(row)
+                if value != value:
+                    missing.append((target, segment, row, None))
+                    continue
+                # Ties keep insertion order, like a stable sort
+                candidates.append((value, -sequence if descending else sequence, (target, segment, row, None)))
+                sequence += 1
+            best = pick(count, best + candidates, key=lambda item: (item[0], item[1]))
+        return [item[2] for item in best] + missing[:max(0, count - len(best))]
+
+    async def msearch(self, searches: List[Dict[str, Any]] = None, body=None, index=None, **kwargs) -> Dict[str, Any]:
+        lines = searches if searches is not None else body
+        responses = []
+        for header, search_body in zip(lines[::2], lines[1::2]):
+            try:
+                response = self._search(header.get("index", index), dict(search_body))
+                response["status"] = 200
+            except Exception as e:
+                if not hasattr(e, "body"):
+                    raise
+                response = {"error": e.body["error"], "status": e.meta.status}
+            responses.append(response)
+        return {"took": 0, "responses": responses}
+
+    async def count(self, index: Optional[str] = None, query=None, body=None, **kwargs) -> Dict[str, Any]:
+        selection = self._select(index, query or (body or {}).get("query"))
+        return {"count": sum(mask.bit_count() for _, _, mask in selection)}
+
+    async def delete_by_query(self, index: str, query=None, body=None, **kwargs) -> Dict[str, Any]:
+        selection = self._select(index, query or (body or {}).get("query"))
+        deleted = 0
+        for target, segment, mask in selection:
+            for row in iter_bits(mask):
+                deleted += self._remove(target, segment.ids[row])
+            self._sync(target)
+        return {"total": deleted, "deleted": deleted, "failures": []}
+
+    async def update_by_query(self, index: str, query=None, script=None, body=None, **kwargs) -> Dict[str, Any]:
+        body = body or {}
+        script = script or body.get("script")
+        selection = self._select(index, query or body.get("query"))
+        ids = [(target, segment.ids[row]) for target, segment, mask in selection for row in iter_bits(mask)]
+        summary = {"total": len(ids), "updated": 0, "noops": 0, "deleted": 0, "version_conflicts": 0, "failures": []}
+        for target, doc_id in ids:
+            if script is None:
+                summary["updated"] += 1
+                continue
+            item = self._update_one(target, doc_id, None, script, None, False)
+            if item["status"] >= 300:
+                summary["failures"].append(item["error"])
+            else:
+                summary["noops" if item["result"] == "noop" else item["result"]] += 1
+        for target in {target.name: target for target, _ in ids}.values():
+            self._sync(target)
+        return summary
+
+    # Aggregations
+
+    def _aggregate(self, aggs: Dict[str, Any], selection: List[Tuple[Segment, int]], indexed=None) -> Dict[str, Any]:
+        owners = {id(segment): target for target, segment, _ in indexed} if indexed else self._owners(selection)
+        return {name: self._agg(spec, selection, owners) for name, spec in aggs.items()}
+
+    def _owners(self, selection) -> Dict[int, EmbeddedIndex]:
+        owners = {}
+        for target in self._indices.values():
+            for segment in target.segments:
+                owners[id(segment)] = target
+        return owners
+
+    def _sub(self, spec: Dict[str, Any], selection, owners) -> Dict[str, Any]:
+        sub = spec.get("aggs") or spec.get("aggregations")
+        if not sub:
+            return {}
+        return {name: self._agg(child, selection, owners) for name, child in sub.items()}
+
+    def _agg(self, spec: Dict[str, Any], selection, owners) -> Dict[str, Any]:
+        kind = next(key for key in spec if key not in ("aggs", "aggregations", "meta"))
+        params = spec[kind]
+        handler = getattr(self, f"_agg_{kind}", None)
+        if handler is not None:
+            try:
+                return handler(params, spec, selection, owners)
+            except Fallback:
+                pass
+        docs = [segment.doc(row) for segment, mask in selection for row in iter_bits(mask)]
+        if "_index" in repr(spec):
+            names = [owners[id(segment)].name for segment, mask in selection for _ in range(mask.bit_count())]
+            docs = [{**doc, "_index": name} for doc, name in zip(docs, names)]
+        return run_aggregation(spec, docs)
+
+    def _columns(self, selection, field: str, kind: str):
+        """The column of field in each selected segment, or Fallback if one is not columnar."""
+        columns = []
+        for segment, mask in selection:
+            column = getattr(segment, kind).get(field)
+            if column is None:
+                if field in segment.keywords or field in segment.numbers or field in segment.tokens:
+                    raise Fallback()
+                continue
+            if kind == "numbers" and column.multi:
+                raise Fallback()
+            columns.append((segment, mask, column))
+        return columns
+
+    def _agg_terms(self, params, spec, selection, owners):
+        if params.get("include") is not None or params.get("script"):
+            raise Fallback()
+        field = params["field"]
+        groups: Dict[Any, List[Tuple[Segment, int]]] = defaultdict(list)
+        counts: Counter = Counter()
+        needs_masks = bool(spec.get("aggs") or spec.get("aggregations"))
+        for segment, mask, column in self._columns(selection, field, "keywords"):
+            if mask.bit_count() < len(column.values) and not needs_masks:
+                # Few rows over a large dictionary: look their values up instead
+                lookup = column.row_codes()
+                for row in iter_bits(mask):
+                    for code in lookup.get(row, ()):
+                        counts[column.values[code]] += 1
+                continue
+            for code, posting in column.postings():
+                hit = posting & mask
+                if hit:
+                    value = column.values[code]
+                    counts[value] += hit.bit_count()
+                    if needs_masks:
+                        groups[value].append((segment, hit))
+        ordered = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+        order = params.get("order")
+        if order:
+            key, direction = next(iter(order.items())) if isinstance(order, dict) else next(iter(order[0].items()))
+            if key == "_key":
+                ordered.sort(key=lambda item: item[0], reverse=direction == "desc")
+            elif key == "_count":
+                ordered.sort(key=lambda item: item[1], reverse=direction == "desc")
+            else:
+                raise Fallback()
+        size = params.get("size", 10)
+        kept = [(key, count) for key, count in ordered if count >= params.get("min_doc_count", 1)]
+        buckets = []
+        for key, count in kept[:size]:
+            bucket = {"key": key, "doc_count": count, **self._sub(spec, groups.get(key, []), owners)}
+            if isinstance(key, bool):
+                bucket["key"], bucket["key_as_string"] = int(key), str(key).lower()
+            buckets.append(bucket)
+        return {
+            "doc_count_error_upper_bound": 0,
+            "sum_other_doc_count": sum(count for _, count in kept[size:]),
+            "buckets": buckets,
+        }
+
+    def _agg_date_histogram(self, params, spec, selection, owners):
+        field = params["field"]
+        interval = DateInterval(params)
+        fixed_ms = None if interval.months or interval.weekly else interval.step.total_seconds() * 1000
+        needs_masks = bool(spec.get("aggs") or spec.get("aggregations"))
+        counts: Counter = Counter()
+        rows_by_key: Dict[datetime, Dict[int, Tuple[Segment, List[int]]]] = defaultdict(dict)
+        floor_cache: Dict[float, datetime] = {}
+        for segment, mask, column in self._columns(selection, field, "numbers"):
+            values = column.values
+            for row in iter_bits(mask):
+                value = values[row] if row < len(values) else math.nan
+                if value != value:
+                    continue
+                if fixed_ms:
+                    bucket_ms = value - value % fixed_ms
+                    key = floor_cache.get(bucket_ms)
+                    if key is None:
+                        key = floor_cache[bucket_ms] = to_datetime(bucket_ms)
+                else:
+                    key = interval.floor(to_datetime(value))
+                counts[key] += 1
+                if needs_masks:
+                    rows_by_key[key].setdefault(id(segment), (segment, []))[1].append(row)
+        min_doc_count = params.get("min_doc_count", 0)
+        keys = set(counts)
+        bounds = params.get("extended_bounds") or {}
+        if min_doc_count == 0:
+            low = [interval.floor(to_datetime(bounds["min"]))] if "min" in bounds else []
+            high = [interval.floor(to_datetime(bounds["max"]))] if "max" in bounds else []
+            if keys or low or high:
+                start, end = min(list(keys) + low), max(list(keys) + high)
+                moment = start
+                while moment <= end:
+                    keys.add(moment)
+                    moment = interval.next(moment)
+        buckets = []
+        for key in sorted(keys):
+            if counts[key] < min_doc_count:
+                continue
+            sub_selection = [(segment, bitmap(rows)) for segment, rows in rows_by_key.get(key, {}).values()]
+            buckets.append({
+                "key_as_string": format_date(key, params.get("format")),
+                "key": epoch_millis(key),
+                "doc_count": counts[key],
+                **self._sub(spec, sub_selection, owners)
+            })
+        return {"buckets": buckets}
+
+    def _agg_composite(self, params, spec, selection, owners):
+        sources = params["sources"]
+        if len(sources) != 1:
+            raise Fallback()
+        name, definition = next(iter(sources[0].items()))
+        kind, options = next(iter(definition.items()))
+        if kind != "terms":
+            raise Fallback()
+        field = options["field"]
+        columns = self._columns(selection, field, "keywords")
+        counts: Counter = Counter()
+        for segment, mask, column in columns:
+            for code, posting in column.postings():
+                hit = posting & mask
+                if hit:
+                    counts[column.values[code]] += hit.bit_count()
+        keys = sorted(counts, key=lambda value: (isinstance(value, str), value))
+        after = params.get("after")
+        if after:
+            marker = (isinstance(after[name], str), after[name])
+            keys = [key for key in keys if (isinstance(key, str), key) > marker]
+        page = keys[:params.get("size", 10)]
+        buckets = []
+        for key in page:
+            sub_selection = []
+            if spec.get("aggs") or spec.get("aggregations"):
+                for segment, mask, column in columns:
+                    code = column.codes.get(key)
+                    hit = column.posting(code) & mask if code is not None else 0
+                    if hit:
+                        sub_selection.append((segment, hit))
+            buckets.append({"key": {name: key}, "doc_count": counts[key], **self._sub(spec, sub_selection, owners)})
+        result = {"buckets": buckets}
+        if buckets:
+            result["after_key"] = buckets[-1]["key"]
+        return result
+
+    def _filtered(self, query, selection, owners):
+        filtered = []
+        for segment, mask in selection:
+            hit = self._eval(query, owners[id(segment)], segment, mask)
+            if hit:
+                filtered.append((segment, hit))
+        return filtered
+
+    def _agg_filter(self, params, spec, selection, owners):
+        filtered = self._filtered(params, selection, owners)
+        return {"doc_count": sum(mask.bit_count() for _, mask in filtered), **self._sub(spec, filtered, owners)}
+
+    def _agg_filters(self, params, spec, selection, owners):
+        filters = params["filters"]
+        if isinstance(filters, dict):
+            return {"buckets": {name: self._agg_filter(query, spec, selection, owners) for name, query in filters.items()}}
+        return {"buckets": [self._agg_filter(query, spec, selection, owners) for query in filters]}
+
+    def _agg_missing(self, params, spec, selection, owners):
+        field = params["field"]
+        missing = []
+        for segment, mask in selection:
+            if field in segment.keywords:
+                hit = mask & ~segment.keywords[field].exists()
+            elif field in segment.numbers:
+                hit = mask & ~segment.numbers[field].exists(segment.rows)
+            elif field in segment.tokens:
+                hit = mask & ~segment.tokens[field].exists()
+            elif owners[id(segment)].types.get(field) in KEYWORD_TYPES | NUMERIC_TYPES:
+                hit = mask
+            else:
+                raise Fallback()
+            if hit:
+                missing.append((segment, hit))
+        return {"doc_count": sum(mask.bit_count() for _, mask in missing), **self._sub(spec, missing, owners)}
+
+    def _numbers(self, selection, field: str) -> List[float]:
+        numbers = []
+        for segment, mask, column in self._columns(selection, field, "numbers"):
+            values = column.values
+            numbers.extend(v for v in (values[row] for row in iter_bits(mask) if row < len(values)) if v == v)
+        return numbers
+
+    def _agg_avg(self, params, spec, selection, owners):
+        numbers = self._numbers(selection, params["field"])
+        return {"value": math.fsum(numbers) / len(numbers) if numbers else None}
+
+    def _agg_max(self, params, spec, selection, owners):
+        numbers = self._numbers(selection, params["field"])
+        return {"value": max(numbers) if numbers else None}
+
+    def _agg_min(self, params, spec, selection, owners):
+        numbers = self._numbers(selection, params["field"])
+        return {"value": min(numbers) if numbers else None}
+
+    def _agg_sum(self, params, spec, selection, owners):
+        return {"value": math.fsum(self._numbers(selection, params["field"]))}
+
+    def _agg_value_count(self, params, spec, selection, owners):
+        field = params["field"]
+        if any(field in segment.numbers for segment, _ in selection):
+            return {"value": len(self._numbers(selection, field))}
+        total = 0
+        for segment, mask, column in self._columns(selection, field, "keywords"):
+            total += sum((posting & mask).bit_count() for _, posting in column.postings())
+        return {"value": total}
+
+    def _agg_cardinality(self, params, spec, selection, owners):
+        seen = set()
+        for segment, mask, column in self._columns(selection, params["field"], "keywords"):
+            seen.update(str(column.values[code]) for code, posting in column.postings() if posting & mask)
+        return {"value": len(seen)}
+
+def _after(doc: Dict[str, Any], sort: List[Tuple[str, bool]], after: List[Any]) -> bool:
+    for (field, descending), bound in zip(sort, after):
+        value = sort_value(doc, field)
+        if value == bound:
+            continue
+        if value is None:
+            return True
+        return value < bound if descending else value > bound
+    return False
@@ -0,0 +1,28 @@
+"""
+Storage errors.
+
+Backends report failures with the elasticsearch client's exception types
+so services handle every backend the same way.
+"""
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import ApiError, BadRequestError, ConflictError, NotFoundError
+
+def api_error(cls, status: int, error_type: str, reason: str) -> ApiError:
+    meta = ApiResponseMeta(
+        status=status,
+        http_version="1.1",
+        headers=HttpHeaders(),
+        duration=0.0,
+        node=NodeConfig("http", "localhost", 9200)
+    )
+    body = {"error": {"type": error_type, "reason": reason}, "status": status}
+    return cls(error_type, meta, body)
+
+def not_found(reason: str, error_type: str = "not_found") -> NotFoundError:
+    return api_error(NotFoundError, 404, error_type, reason)
+
+def conflict(reason: str) -> ConflictError:
+    return api_error(ConflictError, 409, "version_conflict_engine_exception", reason)
+
+def bad_request(reason: str, error_type: str = "illegal_argument_exception") -> BadRequestError:
+    return api_error(BadRequestError, 400, error_type, reason)
@@ -0,0 +1,129 @@
+"""
+Request metrics for any storage backend.
+"""
+from typing import Any, Dict, List, Optional
+from ..core.instrumentation import REGISTRY, SIZE_BUCKETS
+from .base import StorageBackend, StorageIndices
+import time
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "siem_storage_request_seconds", "Storage request latency by operation.", ["operation"]
+)
+REQUEST_ERRORS = REGISTRY.counter(
+    "siem_storage_request_errors_total", "Storage requests that raised, by operation.", ["operation"]
+)
+BULK_ACTIONS = REGISTRY.histogram(
+    "siem_storage_bulk_actions", "Actions per bulk request.", buckets=SIZE_BUCKETS
+)
+BULK_ITEM_ERRORS = REGISTRY.counter(
+    "siem_storage_bulk_item_errors_total", "Bulk items that failed, by status.", ["status"]
+)
+
+def _count_actions(operations: List[Dict[str, Any]]) -> int:
+    """Actions in a bulk body; every action but delete is followed by a source line."""
+    count = position = 0
+    while position < len(operations):
+        position += 1 if "delete" in operations[position] else 2
+        count += 1
+    return count
+
+class _Timed:
+    """Times one request into the operation's histogram and error counter."""
+
+    __slots__ = ("seconds", "errors", "started")
+
+    def __init__(self, operation: str):
+        self.seconds = REQUEST_SECONDS.labels(operation)
+        self.errors = REQUEST_ERRORS.labels(operation)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        self.seconds.observe(time.perf_counter() - self.started)
+        if kind is not None:
+            self.errors.inc()
+        return False
+
+class InstrumentedIndices(StorageIndices):
+    def __init__(self, inner: StorageIndices):
+        self.inner = inner
+
+    async def exists(self, index: str, **kwargs) -> bool:
+        with _Timed("indices.exists"):
+            return await self.inner.exists(index=index, **kwargs)
+
+    async def create(self, index: str, mappings: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        with _Timed("indices.create"):
+            return await self.inner.create(index=index, mappings=mappings, **kwargs)
+
+    async def delete(self, index: str, **kwargs) -> Dict[str, Any]:
+        with _Timed("indices.delete"):
+            return await self.inner.delete(index=index, **kwargs)
+
+    async def refresh(self, index: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        with _Timed("indices.refresh"):
+            return await self.inner.refresh(index=index, **kwargs)
+
+class InstrumentedBackend(StorageBackend):
+    """Wraps a backend, recording latency and errors per operation and bulk item failures."""
+
+    def __init__(self, inner: StorageBackend):
+        self.inner = inner
+        self.indices = InstrumentedIndices(inner.indices)
+        self.concurrent_msearch = getattr(inner, "concurrent_msearch", True)
+
+    async def ping(self, **kwargs) -> bool:
+        with _Timed("ping"):
+            return await self.inner.ping(**kwargs)
+
+    async def close(self):
+        await self.inner.close()
+
+    async def index(self, index: str, document: Dict[str, Any], id: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        with _Timed("index"):
+            return await self.inner.index(index=index, document=document, id=id, **kwargs)
+
+    async def bulk(self, operations: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        BULK_ACTIONS.observe(_count_actions(operations))
+        with _Timed("bulk"):
+            result = await self.inner.bulk(operations=operations, **kwargs)
+        if result.get("errors"):
+            for item in result["items"]:
+                status = next(iter(item.values())).get("status", 200)
+                if status >= 300:
+                    BULK_ITEM_ERRORS.labels(str(status)).inc()
+        return result
+
+    async def get(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        with _Timed("get"):
+            return await self.inner.get(index=index, id=id, **kwargs)
+
+    async def update(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        with _Timed("update"):
+            return await self.inner.update(index=index, id=id, **kwargs)
+
+    async def delete(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        with _Timed("delete"):
+            return await self.inner.delete(index=index, id=id, **kwargs)
+
+    async def search(self, index: Optional[str] = None, body: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        with _Timed("search"):
+            return await self.inner.search(index=index, body=body, **kwargs)
+
+    async def msearch(self, searches: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        with _Timed("msearch"):
+            return await self.inner.msearch(searches=searches, **kwargs)
+
+    async def count(self, index: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        with _Timed("count"):
+            return await self.inner.count(index=index, **kwargs)
+
+    async def update_by_query(self, index: str, **kwargs) -> Dict[str, Any]:
+        with _Timed("update_by_query"):
+            return await self.inner.update_by_query(index=index, **kwargs)
+
+    async def delete_by_query(self, index: str, **kwargs) -> Dict[str, Any]:
+        with _Timed("delete_by_query"):
+            return await self.inner.delete_by_query(index=index, **kwargs)
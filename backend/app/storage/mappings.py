@@ -0,0 +1,113 @@
+"""
+Index mappings, shared by the services and scripts/setup_elasticsearch.py.
+"""
+from typing import Any, Dict, Iterable, Optional
+from elasticsearch import BadRequestError
+from .base import StorageBackend
+import asyncio
+
+INDEX_MAPPINGS: Dict[str, Dict[str, Any]] = {
+    "alerts": {
+        "properties": {
+            "timestamp": {"type": "date"},
+            "title": {"type": "text"},
+            "description": {"type": "text"},
+            "severity": {"type": "keyword"},
+            "status": {"type": "keyword"},
+            "source": {"type": "keyword"},
+            "source_ip": {"type": "ip"},
+            "destination_ip": {"type": "ip"},
+            "affected_assets": {"type": "keyword"},
+            "tags": {"type": "keyword"},
+            "assigned_to": {"type": "keyword"},
+            "acknowledged_at": {"type": "date"},
+            "resolved_at": {"type": "date"},
+            "closed_at": {"type": "date"},
+            "fingerprint": {"type": "keyword"},
+            "occurrence_count": {"type": "integer"},
+            "first_seen": {"type": "date"},
+            "last_seen": {"type": "date"}
+        }
+    },
+    "logs": {
+        "properties": {
+            "timestamp": {"type": "date"},
+            "message": {"type": "text"},
+            "level": {"type": "keyword"},
+            "source": {"type": "keyword"},
+            "host": {"type": "keyword"},
+            "metadata": {"type": "object"},
+            "fields": {
+                "properties": {
+                    "src_ip": {"type": "ip"},
+                    "dst_ip": {"type": "ip"},
+                    "src_port": {"type": "integer"},
+                    "dst_port": {"type": "integer"},
+                    "user": {"type": "keyword"},
+                    "action": {"type": "keyword"},
+                    "outcome": {"type": "keyword"}
+                }
+            },
+            "tags": {"type": "keyword"},
+            "correlation_id": {"type": "keyword"},
+            "processed": {"type": "boolean"}
+        }
+    },
+    "saved_searches": {
+        "properties": {
+            "name": {"type": "keyword"},
+            "description": {"type": "text"},
+            "query": {"type": "object", "enabled": False},
+            "action": {"type": "keyword"},
+            "severity": {"type": "keyword"},
+            "enabled": {"type": "boolean"},
+            "created_at": {"type": "date"}
+        }
+    },
+    "security_score_days": {
+        "properties": {
+            "day": {"type": "date"},
+            "events": {"type": "long"},
+            "severity": {"type": "object"},
+            "threat_score_sum": {"type": "double"},
+            "threat_score_count": {"type": "long"},
+            "finalized_at": {"type": "date"}
+        }
+    },
+    "security_events": {
+        "properties": {
+            "timestamp": {"type": "date"},
+            "event_type": {"type": "keyword"},
+            "severity": {"type": "keyword"},
+            "source_ip": {"type": "ip"},
+            "destination_ip": {"type": "ip"},
+            "description": {"type": "text"},
+            "raw_data": {"type": "object"},
+            "threat_score": {"type": "float"},
+            "indicators": {"type": "keyword"},
+            "source_geo": {
+                "properties": {
+                    "country_iso_code": {"type": "keyword"},
+                    "location": {"type": "geo_point"}
+                }
+            }
+        }
+    }
+}
+
+async def ensure_index(storage: StorageBackend, index: str) -> bool:
+    """Create ``index`` with its mappings unless it exists; True if it was created."""
+    if await storage.indices.exists(index=index):
+        return False
+    try:
+        await storage.indices.create(index=index, mappings=INDEX_MAPPINGS[index])
+    except BadRequestError as e:
+        # Another worker created it between the check and the create
+        if e.error != "resource_already_exists_exception":
+            raise
+        return False
+    return True
+
+async def ensure_indices(storage: StorageBackend, indices: Optional[Iterable[str]] = None):
+    """Reconcile several indices concurrently, all of them by default."""
+    await asyncio.gather(*(ensure_index(storage, index) for index in (indices or INDEX_MAPPINGS)))
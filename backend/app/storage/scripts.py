@@ -0,0 +1,33 @@
+"""
+Python equivalents of the Painless scripts the services send.
+
+Backends without a scripting engine look scripts up here by their source.
+"""
+from typing import Any, Callable, Dict
+from .errors import bad_request
+
+ScriptHandler = Callable[[Dict[str, Any], Dict[str, Any]], None]
+
+SCRIPTS: Dict[str, ScriptHandler] = {}
+
+def register_script(source: str):
+    """Register the Python version of a Painless script: ``handler(ctx, params)``."""
+    def decorator(handler: ScriptHandler) -> ScriptHandler:
+        SCRIPTS[source] = handler
+        return handler
+    return decorator
+
+def run_script(script: Dict[str, Any], ctx: Dict[str, Any]):
+    """Apply a script to ctx (``{"_source": ..., "op": "index"}``) in place."""
+    handler = SCRIPTS.get(script.get("source"))
+    if handler is None:
+        raise bad_request("script is not supported by this storage backend", "script_exception")
+    handler(ctx, script.get("params", {}))
+
+def merge_partial(target: Dict[str, Any], partial: Dict[str, Any]):
+    """Merge a partial document the way a doc update does, recursing into objects."""
+    for key, value in partial.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_partial(target[key], value)
+        else:
+            target[key] = value
@@ -0,0 +1,494 @@
+"""
+In-process stand-in for the Elasticsearch endpoints the services call.
+
+Documents are serialized the way the real client serializes them, queries
+are evaluated with app.core.query_dsl and the aggregations the services
+use are computed in Python, so services can be exercised and benchmarked
+without a cluster.
+"""
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from elasticsearch import BadRequestError, ConflictError, NotFoundError
+from elasticsearch.serializer import JsonSerializer
+from app.core.aggregations import (
+    aggregate, project_source, sort_docs, sort_spec, sort_value, source_includes
+)
+from app.core.query_dsl import matches, UnsupportedQueryError
+from app.storage.errors import api_error, bad_request, conflict, not_found
+from app.storage.scripts import merge_partial, run_script
+import app.services.alert_manager  # registers the alert scripts
+import asyncio
+import math
+import time
+
+MAX_TRACKED_HITS = 10000
+
+class _Index:
+    def __init__(self, mappings: Optional[Dict[str, Any]] = None):
+        self.mappings = mappings or {}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.versions: Dict[str, int] = {}
+        self.seq_no = -1
+
+    def store(self, doc_id: str, source: Dict[str, Any]) -> int:
+        self.seq_no += 1
+        self.docs[doc_id] = source
+        self.versions[doc_id] = self.seq_no
+        return self.seq_no
+
+    def remove(self, doc_id: str) -> bool:
+        self.versions.pop(doc_id, None)
+        return self.docs.pop(doc_id, None) is not None
+
+class FakeIndices:
+    def __init__(self, client: "FakeElasticsearch"):
+        self.client = client
+
+    async def exists(self, index: str, **kwargs) -> bool:
+        await self.client._call("indices.exists")
+        return all(name in self.client._indices for name in index.split(","))
+
+    async def create(self, index: str, mappings=None, settings=None, body=None, **kwargs):
+        await self.client._call("indices.create")
+        if index in self.client._indices:
+            raise bad_request(f"index [{index}] already exists", "resource_already_exists_exception")
+        mappings = mappings or (body or {}).get("mappings")
+        self.client._indices[index] = _Index(mappings)
+        return {"acknowledged": True, "index": index}
+
+    async def delete(self, index: str, **kwargs):
+        await self.client._call("indices.delete")
+        for name in self.client._resolve(index):
+            del self.client._indices[name]
+        return {"acknowledged": True}
+
+    async def refresh(self, index: Optional[str] = None, **kwargs):
+        await self.client._call("indices.refresh")
+        return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+    async def put_mapping(self, index: str, properties=None, body=None, **kwargs):
+        await self.client._call("indices.put_mapping")
+        for name in self.client._resolve(index):
+            mapping = self.client._indices[name].mappings.setdefault("properties", {})
+            mapping.update(properties or (body or {}).get("properties", {}))
+        return {"acknowledged": True}
+
+    async def get_mapping(self, index: str, **kwargs):
+        await self.client._call("indices.get_mapping")
+        return {name: {"mappings": self.client._indices[name].mappings} for name in self.client._resolve(index)}
+
+class FakeElasticsearch:
+    """
+    Async Elasticsearch client double holding every index in memory.
+
+    ``latency`` adds a fixed delay to every call to approximate a network
+    round trip; ``calls`` counts requests per endpoint.
+    """
+
+    # msearch runs its searches one after another
+    concurrent_msearch = False
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.indices = FakeIndices(self)
+        self.serializer = JsonSerializer()
+        self._indices: Dict[str, _Index] = {}
+
+    async def _call(self, endpoint: str):
+        self.calls[endpoint] += 1
+        await asyncio.sleep(self.latency)
+
+    def _roundtrip(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        return self.serializer.loads(self.serializer.dumps(document))
+
+    def _resolve(self, index: Optional[str], must_exist: bool = True) -> List[str]:
+        if index is None or index in ("_all", "*"):
+            return list(self._indices)
+        names = []
+        for name in index.split(","):
+            if "*" in name:
+                prefix = name.rstrip("*")
+                names.extend(n for n in self._indices if n.startswith(prefix))
+            elif name in self._indices:
+                names.append(name)
+            elif must_exist:
+                raise not_found(f"no such index [{name}]", "index_not_found_exception")
+        return names
+
+    def _index_for_write(self, index: str) -> _Index:
+        if index not in self._indices:
+            self._indices[index] = _Index()
+        return self._indices[index]
+
+    def _doc_count(self) -> int:
+        return sum(len(index.docs) for index in self._indices.values())
+
+    async def ping(self, **kwargs) -> bool:
+        await self._call("ping")
+        return True
+
+    async def close(self):
+        pass
+
+    async def info(self, **kwargs):
+        await self._call("info")
+        return {"version": {"number": "8.11.0"}, "tagline": "You Know, for Search"}
+
+    # Document APIs
+
+    async def index(self, index: str, document=None, id=None, body=None, op_type=None, refresh=None, **kwargs):
+        await self._call("index")
+        return self._index_one(index, id, document if document is not None else body, op_type == "create")
+
+    async def create(self, index: str, id: str, document=None, body=None, **kwargs):
+        await self._call("create")
+        return self._index_one(index, id, document if document is not None else body, True)
+
+    def _index_one(self, index: str, doc_id: Optional[str], document: Dict[str, Any], create: bool) -> Dict[str, Any]:
+        target = self._index_for_write(index)
+        doc_id = str(doc_id) if doc_id is not None else f"{index}-{target.seq_no + 1}"
+        if create and doc_id in target.docs:
+            raise conflict(f"[{doc_id}]: document already exists")
+        result = "updated" if doc_id in target.docs else "created"
+        seq_no = target.store(doc_id, self._roundtrip(document))
+        return {"_index": index, "_id": doc_id, "result": result, "_seq_no": seq_no, "_primary_term": 1}
+
+    async def get(self, index: str, id: str, _source=None, source=None, **kwargs):
+        await self._call("get")
+        for name in self._resolve(index):
+            doc = self._indices[name].docs.get(str(id))
+            if doc is not None:
+                found, includes = source_includes(kwargs.get("source_includes") or _source or source)
+                return {
+                    "_index": name,
+                    "_id": str(id),
+                    "found": True,
+                    "_seq_no": self._indices[name].versions[str(id)],
+                    "_primary_term": 1,
+                    **({"_source": project_source(doc, includes)} if found else {})
+                }
+        raise not_found(f"[{id}] not found", "not_found")
+
+    async def update(
+        self,
+        index: str,
+        id: str,
+        doc=None,
+        script=None,
+        upsert=None,
+        doc_as_upsert=False,
+        source=None,
+        _source=None,
+        if_seq_no=None,
+        if_primary_term=None,
+        body=None,
+        **kwargs
+    ):
+        await self._call("update")
+        body = body or {}
+        doc = doc if doc is not None else body.get("doc")
+        script = script or body.get("script")
+        upsert = upsert if upsert is not None else body.get("upsert")
+        item = self._update_one(index, str(id), doc, script, upsert, doc_as_upsert, if_seq_no)
+        if "error" in item:
+            error = item["error"]
+            cls = {404: NotFoundError, 409: ConflictError}.get(item["status"], BadRequestError)
+            raise api_error(cls, item["status"], error["type"], error["reason"])
+        result = {key: value for key, value in item.items() if key != "status"}
+        wanted, includes = source_includes(source if source is not None else _source)
+        if (source is not None or _source is not None) and wanted:
+            result["get"] = {"_source": project_source(self._indices[index].docs[str(id)], includes), "found": True}
+        return result
+
+    def _update_one(
+        self,
+        index: str,
+        doc_id: str,
+        doc: Optional[Dict[str, Any]],
+        script: Optional[Dict[str, Any]],
+        upsert: Optional[Dict[str, Any]],
+        doc_as_upsert: bool,
+        if_seq_no: Optional[int] = None
+    ) -> Dict[str, Any]:
+        target = self._index_for_write(index)
+        current = target.docs.get(doc_id)
+        base = {"_index": index, "_id": doc_id, "_primary_term": 1}
+        if if_seq_no is not None and (current is None or target.versions[doc_id] != if_seq_no):
+            return {**base, "status": 409, "error": {
+                "type": "version_conflict_engine_exception",
+                "reason": f"[{doc_id}]: version conflict, required seqNo [{if_seq_no}]"
+            }}
+        if current is None:
+            seed = doc if doc_as_upsert else upsert
+            if seed is None:
+                return {**base, "status": 404, "error": {
+                    "type": "document_missing_exception",
+                    "reason": f"[{doc_id}]: document missing"
+                }}
+            seq_no = target.store(doc_id, self._roundtrip(seed))
+            return {**base, "status": 201, "result": "created", "_seq_no": seq_no}
+
+        updated = self._roundtrip(current)
+        if script is not None:
+            ctx = {"_source": updated, "op": "index"}
+            run_script({**script, "params": self._roundtrip(script.get("params", {}))}, ctx)
+            if ctx["op"] == "noop":
+                return {**base, "status": 200, "result": "noop", "_seq_no": target.versions[doc_id]}
+            if ctx["op"] == "delete":
+                target.remove(doc_id)
+                return {**base, "status": 200, "result": "deleted", "_seq_no": target.seq_no}
+        if doc is not None:
+            merge_partial(updated, self._roundtrip(doc))
+        if updated == current:
+            return {**base, "status": 200, "result": "noop", "_seq_no": target.versions[doc_id]}
+        seq_no = target.store(doc_id, updated)
+        return {**base, "status": 200, "result": "updated", "_seq_no": seq_no}
+
+    async def delete(self, index: str, id: str, **kwargs):
+        await self._call("delete")
+        if not self._index_for_write(index).remove(str(id)):
+            raise not_found(f"[{id}] not found", "not_found")
+        return {"_index": index, "_id": str(id), "result": "deleted"}
+
+    async def bulk(self, operations=None, body=None, index=None, refresh=None, **kwargs):
+        await self._call("bulk")
+        started = time.perf_counter()
+        operations = operations if operations is not None else body
+        if isinstance(operations, (str, bytes)):
+            operations = [self.serializer.loads(line) for line in operations.splitlines() if line.strip()]
+        items = []
+        position = 0
+        while position < len(operations):
+            action, meta = next(iter(operations[position].items()))
+            position += 1
+            target = meta.get("_index") or index
+            doc_id = meta.get("_id")
+            if action in ("index", "create"):
+                payload = operations[position]
+                position += 1
+                try:
+                    item = self._index_one(target, doc_id, payload, action == "create")
+                    item["status"] = 201 if item["result"] == "created" else 200
+                except ConflictError as e:
+                    item = {"_index": target, "_id": doc_id, "status": 409, "error": e.body["error"]}
+            elif action == "update":
+                payload = operations[position]
+                position += 1
+                try:
+                    item = self._update_one(
+                        target, str(doc_id), payload.get("doc"), payload.get("script"),
+                        payload.get("upsert"), payload.get("doc_as_upsert", False), meta.get("if_seq_no")
+                    )
+                except BadRequestError as e:
+                    item = {"_index": target, "_id": doc_id, "status": 400, "error": e.body["error"]}
+            elif action == "delete":
+                removed = self._index_for_write(target).remove(str(doc_id))
+                item = {
+                    "_index": target, "_id": doc_id,
+                    "status": 200 if removed else 404,
+                    "result": "deleted" if removed else "not_found"
+                }
+            else:
+                raise bad_request(f"Malformed action [{action}]", "illegal_argument_exception")
+            items.append({action: item})
+        return {
+            "took": int((time.perf_counter() - started) * 1000),
+            "errors": any(next(iter(item.values()))["status"] >= 300 for item in items),
+            "items": items
+        }
+
+    # Search APIs
+
+    def _matching(self, index: Optional[str], query: Optional[Dict[str, Any]]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """(index, id, source) for every document matching query."""
+        query = query or {"match_all": {}}
+        needs_meta = "_index" in repr(query)
+        found = []
+        for name in self._resolve(index):
+            for doc_id, doc in self._indices[name].docs.items():
+                candidate = {**doc, "_index": name, "_id": doc_id} if needs_meta else doc
+                if matches(query, candidate):
+                    found.append((name, doc_id, doc))
+        return found
+
+    async def search(self, index=None, body=None, **kwargs):
+        await self._call("search")
+        return self._search(index, {**(body or {}), **kwargs})
+
+    def _search(self, index: Optional[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            found = self._matching(index, params.get("query"))
+            size = params.get("size", 10)
+            offset = params.get("from_", params.get("from", 0)) or 0
+            sort = sort_spec(params.get("sort"))
+            found = sort_docs(found, sort, lambda hit: hit[2])
+            if params.get("search_after") is not None and sort:
+                after = list(params["search_after"])
+                found = [hit for hit in found if self._after(hit, sort, after)]
+
+            wanted, includes = source_includes(
+                params.get("_source_includes") or params.get("source_includes")
+                or params.get("_source", params.get("source"))
+            )
+            hits = []
+            for name, doc_id, doc in found[offset:offset + size]:
+                hit = {"_index": name, "_id": doc_id, "_score": None if sort else 1.0}
+                if wanted:
+                    hit["_source"] = project_source(doc, includes)
+                if sort:
+                    hit["sort"] = [sort_value(doc, field) for field, _ in sort]
+                if params.get("seq_no_primary_term"):
+                    hit["_seq_no"] = self._indices[name].versions[doc_id]
+                    hit["_primary_term"] = 1
+                hits.append(hit)
+
+            track = params.get("track_total_hits", MAX_TRACKED_HITS)
+            limit = MAX_TRACKED_HITS if track is None else (math.inf if track is True else track)
+            total = {"value": len(found), "relation": "eq"}
+            if track is not False and len(found) > limit:
+                total = {"value": limit, "relation": "gte"}
+
+            result = {
+                "took": 0,
+                "timed_out": False,
+                "hits": {"total": total, "max_score": None, "hits": hits}
+            }
+            if track is False:
+                del result["hits"]["total"]
+            aggs = params.get("aggs") or params.get("aggregations")
+            if aggs:
+                if "_index" in repr(aggs):
+                    found = [(name, doc_id, {**doc, "_index": name}) for name, doc_id, doc in found]
+                result["aggregations"] = aggregate(aggs, [doc for _, _, doc in found])
+            result["took"] = int((time.perf_counter() - started) * 1000)
+            return result
+        except UnsupportedQueryError as e:
+            raise bad_request(str(e), "parsing_exception")
+
+    @staticmethod
+    def _after(hit, sort: List[Tuple[str, bool]], after: List[Any]) -> bool:
+        for (field, descending), bound in zip(sort, after):
+            value = sort_value(hit[2], field)
+            if value == bound:
+                continue
+            if value is None:
+                return True
+            return value < bound if descending else value > bound
+        return False
+
+    async def msearch(self, searches=None, body=None, index=None, **kwargs):
+        await self._call("msearch")
+        lines = searches if searches is not None else body
+        responses = []
+        for header, search_body in zip(lines[::2], lines[1::2]):
+            try:
+                response = self._search(header.get("index", index), dict(search_body))
+                response["status"] = 200
+            except (BadRequestError, NotFoundError) as e:
+                response = {"error": e.body["error"], "status": e.meta.status}
+            responses.append(response)
+        return {"took": 0, "responses": responses}
+
+    async def count(self, index=None, query=None, body=None, **kwargs):
+        await self._call("count")
+        query = query or (body or {}).get("query")
+        return {"count": len(self._matching(index, query))}
+
+    async def delete_by_query(self, index: str, query=None, body=None, **kwargs):
+        await self._call("delete_by_query")
+        found = self._matching(index, query or (body or {}).get("query"))
+        for name, doc_id, _ in found:
+            self._indices[name].remove(doc_id)
+        return {"total": len(found), "deleted": len(found), "failures": []}
+
+    async def update_by_query(self, index: str, query=None, script=None, body=None, **kwargs):
+        await self._call("update_by_query")
+        body = body or {}
+        found = self._matching(index, query or body.get("query"))
+        script = script or body.get("script")
+        summary = {"total": len(found), "updated": 0, "noops": 0, "deleted": 0, "version_conflicts": 0, "failures": []}
+        for name, doc_id, _ in found:
+            if script is None:
+                summary["updated"] += 1
+                continue
+            item = self._update_one(name, doc_id, None, script, None, False)
+            summary["noops" if item["result"] == "noop" else item["result"]] += 1
+        return summary
+
+class OverloadedElasticsearch:
+    """
+    A FakeElasticsearch behind a cluster with finite bulk capacity.
+
+    Bulk requests are processed ``write_threads`` at a time at
+    ``item_seconds`` per item, after a ``round_trip`` that requests
+    overlap. Items beyond
+    ``capacity`` waiting across concurrent requests are rejected with 429
+    ``es_rejected_execution_exception``, as a full write thread pool queue
+    rejects them. Items whose id is in ``failing_ids`` always fail with a
+    mapping error. Every other call goes straight to ``inner``.
+    """
+
+    def __init__(
+        self,
+        inner: FakeElasticsearch,
+        capacity: int = 2000,
+        round_trip: float = 0.002,
+        item_seconds: float = 0.0,
+        write_threads: int = 1,
+        failing_ids: Optional[set] = None
+    ):
+        self.inner = inner
+        self.capacity = capacity
+        self.round_trip = round_trip
+        self.item_seconds = item_seconds
+        self.failing_ids = failing_ids or set()
+        self.waiting = 0
+        self.items = 0
+        self.rejected = 0
+        self._threads = asyncio.Semaphore(write_threads)
+
+    def __getattr__(self, name: str):
+        return getattr(self.inner, name)
+
+    async def bulk(self, operations=None, **kwargs):
+        pairs: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = []
+        position = 0
+        while position < len(operations):
+            action = operations[position]
+            source = None if "delete" in action else operations[position + 1]
+            position += 1 if source is None else 2
+            pairs.append((action, source))
+        admitted = max(0, min(len(pairs), self.capacity - self.waiting))
+        self.items += len(pairs)
+        self.rejected += len(pairs) - admitted
+        self.waiting += admitted
+        try:
+            await asyncio.sleep(self.round_trip)
+            async with self._threads:
+                await asyncio.sleep(self.item_seconds * admitted)
+        finally:
+            self.waiting -= admitted
+
+        accepted = [pair for pair in pairs[:admitted] if next(iter(pair[0].values())).get("_id") not in self.failing_ids]
+        stored = iter([])
+        if accepted:
+            operations = [part for pair in accepted for part in pair if part is not None]
+            stored = iter((await self.inner.bulk(operations=operations, **kwargs))["items"])
+        items = []
+        for i, (action, _) in enumerate(pairs):
+            name, meta = next(iter(action.items()))
+            if i >= admitted:
+                error = {"type": "es_rejected_execution_exception", "reason": "rejected execution of bulk item"}
+                items.append({name: {"_id": meta.get("_id"), "status": 429, "error": error}})
+            elif meta.get("_id") in self.failing_ids:
+                error = {"type": "mapper_parsing_exception", "reason": "failed to parse"}
+                items.append({name: {"_id": meta.get("_id"), "status": 400, "error": error}})
+            else:
+                items.append(next(stored, {name: {"_id": meta.get("_id"), "status": 200}}))
+        return {
+            "took": 0,
+            "errors": any(next(iter(item.values()))["status"] >= 300 for item in items),
+            "items": items
+        }
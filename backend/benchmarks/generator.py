@@ -0,0 +1,198 @@
+"""
+Synthetic logs, alerts and security events with realistic distributions.
+"""
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.models.alert import AlertCreate, AlertSeverity, AlertSource
+from app.models.log_entry import LogCreate
+import random
+
+# Roughly what a production SIEM sees: mostly info, a long tail of errors
+LEVEL_WEIGHTS = {"debug": 5, "info": 70, "warning": 15, "error": 8, "critical": 2}
+
+# (level, template) per source family; fields are filled from the pools below
+TEMPLATES: Dict[str, List[Tuple[str, str]]] = {
+    "auth": [
+        ("info", "Accepted password for {user} from {ip} port {port} ssh2"),
+        ("warning", "Failed login for user {user} from {ip}"),
+        ("warning", "authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost={ip} user={user}"),
+        ("info", "session opened for user {user} by (uid=0)"),
+        ("error", "Too many authentication failures for {user} from {ip}"),
+    ],
+    "web": [
+        ("info", "GET /api/v1/{path} 200 {ms}ms"),
+        ("info", "POST /api/v1/{path} 201 {ms}ms"),
+        ("warning", "GET /api/v1/{path} 404 {ms}ms"),
+        ("error", "POST /api/v1/{path} 500 {ms}ms upstream error"),
+        ("debug", "cache miss for /api/v1/{path}"),
+    ],
+    "firewall": [
+        ("info", "ALLOW TCP {ip}:{port} -> {dst}:443"),
+        ("warning", "DENY TCP {ip}:{port} -> {dst}:{dport}"),
+        ("warning", "Port scan detected from {ip} against {dst}"),
+        ("critical", "Unusual outbound large file transfer from {dst} to {ip}"),
+    ],
+    "system": [
+        ("info", "Disk usage at {pct}% on {host}"),
+        ("warning", "Disk usage at {pct}% on {host}"),
+        ("error", "Service {path} exited with status {code}"),
+        ("debug", "cron job {path} finished in {ms}ms"),
+        ("warning", "sudo: {user} : command not allowed ; COMMAND=/bin/{path}"),
+    ],
+    "endpoint": [
+        ("critical", "Malware signature {sig} found on {host}"),
+        ("error", "Quarantine of {sig} failed on {host}"),
+        ("info", "Definitions updated to {code} on {host}"),
+        ("warning", "Suspicious process {path} spawned by {user} on {host}"),
+    ],
+}
+
+EVENT_TYPES = {
+    "authentication_failure": (0.35, ["medium", "low"], "Failed login for {user} from {ip}"),
+    "network_scan": (0.25, ["medium", "high"], "Port scan from {ip} against {dst}"),
+    "malware_activity": (0.1, ["high", "critical"], "Malware {sig} detected on {host}"),
+    "data_exfiltration": (0.05, ["critical", "high"], "Unusual outbound transfer from {dst} to {ip}"),
+    "privilege_escalation": (0.1, ["high", "medium"], "Privilege elevation by {user} on {host}"),
+    "policy_violation": (0.15, ["low", "medium"], "Policy violation by {user} on {host}"),
+}
+
+COUNTRIES = [
+    ("US", 38.0, -97.0), ("CN", 35.0, 103.0), ("RU", 60.0, 100.0), ("DE", 51.0, 9.0),
+    ("BR", -10.0, -55.0), ("IN", 20.0, 77.0), ("NL", 52.5, 5.75), ("KR", 37.0, 127.5),
+]
+
+PATHS = ["users", "login", "orders", "search", "reports", "health", "metrics", "sshd", "nginx", "backup"]
+
+def _zipf_weights(count: int, skew: float) -> List[float]:
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, count + 1)))
+
+class SyntheticData:
+    """
+    Seeded generator for benchmark and test data.
+
+    Sources, hosts, users and IPs are drawn from pools of configurable
+    cardinality with a Zipf skew, so a few noisy sources dominate the way
+    they do in real deployments while the long tail stays large.
+    """
+
+    def __init__(
+        self,
+        seed: int = 1,
+        sources: int = 50,
+        hosts: int = 1000,
+        users: int = 500,
+        ips: int = 5000,
+        skew: float = 1.1,
+        span: timedelta = timedelta(hours=24),
+        now: Optional[datetime] = None
+    ):
+        self.random = random.Random(seed)
+        families = list(TEMPLATES)
+        self.sources = [(f"{families[i % len(families)]}-{i:03d}", families[i % len(families)]) for i in range(sources)]
+        self.hosts = [f"host-{i:05d}" for i in range(hosts)]
+        self.users = [f"user{i:04d}" for i in range(users)]
+        self.ips = [f"{10 + i % 200}.{(i // 200) % 256}.{(i * 7) % 256}.{(i * 13) % 254 + 1}" for i in range(ips)]
+        self.span = span
+        self.now = now or datetime.utcnow()
+        self._source_weights = _zipf_weights(sources, skew)
+        self._host_weights = _zipf_weights(hosts, skew)
+        self._user_weights = _zipf_weights(users, skew)
+        self._ip_weights = _zipf_weights(ips, skew)
+        self._levels = list(LEVEL_WEIGHTS)
+        self._level_weights = list(accumulate(LEVEL_WEIGHTS.values()))
+        self._event_types = list(EVENT_TYPES)
+        self._event_weights = list(accumulate(weight for weight, _, _ in EVENT_TYPES.values()))
+
+    def _pick(self, pool: Sequence[Any], cum_weights: List[float]) -> Any:
+        return self.random.choices(pool, cum_weights=cum_weights)[0]
+
+    def _fields(self) -> Dict[str, Any]:
+        r = self.random
+        return {
+            "user": self._pick(self.users, self._user_weights),
+            "ip": self._pick(self.ips, self._ip_weights),
+            "dst": f"192.168.{r.randrange(256)}.{r.randrange(1, 255)}",
+            "host": self._pick(self.hosts, self._host_weights),
+            "port": r.randrange(1024, 65535),
+            "dport": r.choice([22, 23, 445, 3389, 8080]),
+            "path": r.choice(PATHS),
+            "ms": int(r.lognormvariate(3.5, 1.0)),
+            "pct": r.randrange(50, 100),
+            "code": r.randrange(1, 255),
+            "sig": f"Trojan.Gen.{r.randrange(1000)}",
+        }
+
+    def timestamp(self) -> datetime:
+        return self.now - timedelta(seconds=self.random.random() * self.span.total_seconds())
+
+    def log(self) -> Dict[str, Any]:
+        """One log document as LogCreate accepts it."""
+        source, family = self._pick(self.sources, self._source_weights)
+        wanted = self._pick(self._levels, self._level_weights)
+        templates = TEMPLATES[family]
+        candidates = [t for t in templates if t[0] == wanted] or templates
+        level, template = self.random.choice(candidates)
+        fields = self._fields()
+        return {
+            "message": template.format(**fields),
+            "level": level,
+            "source": source,
+            "host": fields["host"],
+            "timestamp": self.timestamp(),
+            "metadata": {"ip": fields["ip"], "user": fields["user"]},
+            "tags": [family],
+        }
+
+    def logs(self, count: int) -> List[LogCreate]:
+        return [LogCreate(**self.log()) for _ in range(count)]
+
+    def alert(self, repeat_ratio: float = 0.3) -> AlertCreate:
+        """One alert; repeat_ratio of them reuse a small set of fingerprints."""
+        r = self.random
+        if r.random() < repeat_ratio:
+            ip = self.ips[r.randrange(10)]
+            title = "Repeated port scan"
+        else:
+            ip = self._pick(self.ips, self._ip_weights)
+            title = r.choice(["Brute force attempt", "Port scan", "Malware detected", "Privilege escalation"])
+        return AlertCreate(
+            title=title,
+            description=f"{title} involving {ip}",
+            severity=r.choices(list(AlertSeverity), weights=[3, 12, 35, 35, 15])[0],
+            source=r.choice(list(AlertSource)),
+            source_ip=ip,
+            affected_assets=[self._pick(self.hosts, self._host_weights)],
+            tags=[title.split()[0].lower()],
+            timestamp=self.timestamp(),
+        )
+
+    def alerts(self, count: int, repeat_ratio: float = 0.3) -> List[AlertCreate]:
+        return [self.alert(repeat_ratio) for _ in range(count)]
+
+    def event(self) -> Dict[str, Any]:
+        """One security_events document."""
+        r = self.random
+        event_type = self._pick(self._event_types, self._event_weights)
+        _, severities, template = EVENT_TYPES[event_type]
+        fields = self._fields()
+        event = {
+            "timestamp": self.timestamp().isoformat(),
+            "event_type": event_type,
+            "severity": r.choice(severities),
+            "source_ip": fields["ip"],
+            "destination_ip": fields["dst"],
+            "description": template.format(**fields),
+            "threat_score": round(r.betavariate(2, 5), 3),
+            "indicators": [fields["ip"]] + ([fields["sig"]] if event_type == "malware_activity" else []),
+        }
+        if r.random() < 0.8:
+            country, lat, lon = r.choice(COUNTRIES)
+            event["source_geo"] = {
+                "country_iso_code": country,
+                "location": {"lat": lat + r.uniform(-3, 3), "lon": lon + r.uniform(-3, 3)},
+            }
+        return event
+
+    def events(self, count: int) -> List[Dict[str, Any]]:
+        return [self.event() for _ in range(count)]
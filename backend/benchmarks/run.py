@@ -0,0 +1,79 @@
+"""
+Run benchmark scenarios and record or check JSON baselines.
+
+    python -m benchmarks.run                       # all scenarios, quick profile
+    python -m benchmarks.run --profile full --save # rewrite baselines/full.json
+    python -m benchmarks.run --check               # fail on regressions vs baseline
+"""
+from pathlib import Path
+from typing import Any, Dict, List
+from .scenarios import PROFILES, SCENARIOS
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+
+BASELINES = Path(__file__).parent / "baselines"
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Metrics that got worse than the baseline by more than tolerance."""
+    regressions = []
+    for scenario, metrics in results.items():
+        for name, current in metrics.items():
+            previous = baseline.get(scenario, {}).get(name)
+            if not previous or not previous["value"]:
+                continue
+            change = current["value"] / previous["value"] - 1
+            worse = change < -tolerance if current["better"] == "higher" else change > tolerance
+            if worse:
+                regressions.append(
+                    f"{scenario}.{name}: {previous['value']} -> {current['value']} {current['unit']} ({change:+.0%})"
+                )
+    return regressions
+
+async def run(names: List[str], profile: Dict[str, int]) -> Dict[str, Any]:
+    results = {}
+    for name in names:
+        print(f"running {name}...", file=sys.stderr)
+        results[name] = await SCENARIOS[name](profile)
+    return results
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--profile", choices=list(PROFILES), default="quick")
+    parser.add_argument("--save", action="store_true", help="write results as the profile's baseline")
+    parser.add_argument("--check", action="store_true", help="exit non-zero on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative change before a regression")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    results = asyncio.run(run(names, PROFILES[args.profile]))
+    print(json.dumps(results, indent=2))
+
+    baseline_path = BASELINES / f"{args.profile}.json"
+    if args.save:
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        baseline.update(results)
+        baseline["_environment"] = {"python": platform.python_version(), "machine": platform.machine()}
+        BASELINES.mkdir(exist_ok=True)
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"saved {baseline_path}", file=sys.stderr)
+    if args.check:
+        if not baseline_path.exists():
+            print(f"no baseline at {baseline_path}", file=sys.stderr)
+            return 1
+        regressions = compare(results, json.loads(baseline_path.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,775 @@
+"""
+Benchmark scenarios.
+
+Each scenario takes a size profile and returns its metrics as
+``{name: {"value": ..., "unit": ..., "better": "higher" | "lower"}}``.
+"""
+from typing import Any, Awaitable, Callable, Dict, List
+from .fake_elasticsearch import FakeElasticsearch, OverloadedElasticsearch
+from .generator import SyntheticData
+from app.services.ingest_channel import IngestClient, IngestServer
+from app.services.lineage import LineageTracker
+from app.services.alert_manager import AlertManager
+from app.services.log_ingestion import LogIngestionService
+from app.services.partitioning import HashRing, LocalTransport, PartitionRouter
+from app.services.fair_queue import FairQueue
+from app.services.field_extraction import FieldExtractor
+from app.services.hot_window import HotWindow
+from app.services.notifications import NotificationDispatcher, NotificationSink
+from app.services.percolator import Percolator
+from app.services.threat_detection import ThreatDetectionService
+from app.models.alert import AlertCreate, AlertSeverity, AlertSource
+from app.storage.archive import ColdArchive
+from app.storage.base import StorageBackend
+from app.storage.bulk_writer import AdaptiveBulkWriter
+from app.storage.embedded import EmbeddedBackend
+from app.core.json import loads
+from app.core.query_dsl import matches
+from app.storage.instrumented import InstrumentedBackend
+from app.core.instrumentation import Histogram
+from datetime import timedelta
+from pathlib import Path
+import asyncio
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PROFILES = {
+    "quick": {"logs": 2000, "events": 1000, "alerts": 300, "batch": 200, "requests": 40, "concurrency": 8},
+    "full": {"logs": 20000, "events": 5000, "alerts": 2000, "batch": 500, "requests": 200, "concurrency": 16},
+}
+
+ENDPOINTS = [
+    "/api/v1/logs/?limit=50",
+    "/api/v1/logs/statistics",
+    "/api/v1/logs/sources",
+    "/api/v1/alerts/?limit=50",
+    "/api/v1/alerts/statistics/summary",
+    "/api/v1/metrics/dashboard",
+    "/api/v1/metrics/threats/summary",
+    "/api/v1/metrics/security-score",
+    "/api/v1/metrics/top-threats",
+    "/api/v1/metrics/alerts/trends",
+    "/api/v1/metrics/compliance",
+    "/api/v1/metrics/geographic",
+    "/api/v1/dashboard/overview",
+]
+
+Metrics = Dict[str, Dict[str, Any]]
+
+def metric(value: float, unit: str, better: str) -> Dict[str, Any]:
+    return {"value": round(value, 3), "unit": unit, "better": better}
+
+def percentile(samples: List[float], percent: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = min(len(ordered) - 1, max(0, round(percent / 100 * (len(ordered) - 1))))
+    return ordered[rank]
+
+async def seed(es: StorageBackend, data: SyntheticData, profile: Dict[str, int]):
+    """Fill the logs and security_events indices directly."""
+    operations = []
+    for i in range(profile["logs"]):
+        log = data.log()
+        log.update(id=f"seed-{i}", processed=True)
+        operations.extend([{"index": {"_index": "logs", "_id": log["id"]}}, log])
+    for i, event in enumerate(data.events(profile["events"])):
+        operations.extend([{"index": {"_index": "security_events", "_id": f"event-{i}"}}, event])
+    await es.bulk(operations=operations)
+
+async def ingest(profile: Dict[str, int]) -> Metrics:
+    """Logs per second through create_logs_batch and create_log."""
+    es = FakeElasticsearch()
+    service = LogIngestionService()
+    service.es_client = es
+    await service._ensure_index()
+    data = SyntheticData(seed=2)
+    batches = [data.logs(profile["batch"]) for _ in range(max(1, profile["logs"] // profile["batch"]))]
+    singles = data.logs(profile["batch"])
+
+    # Collect first so a full collection of earlier garbage is not timed
+    gc.collect()
+    started = time.perf_counter()
+    for batch in batches:
+        await service.create_logs_batch(batch)
+    batch_seconds = time.perf_counter() - started
+
+    gc.collect()
+    started = time.perf_counter()
+    for log in singles:
+        await service.create_log(log)
+    single_seconds = time.perf_counter() - started
+
+    return {
+        "batch_logs_per_s": metric(sum(map(len, batches)) / batch_seconds, "logs/s", "higher"),
+        "single_logs_per_s": metric(len(singles) / single_seconds, "logs/s", "higher"),
+    }
+
+async def queue_drain(profile: Dict[str, int]) -> Metrics:
+    """Latency from a log being queued to its processing update being written."""
+    es = FakeElasticsearch()
+    service = LogIngestionService()
+    await service.initialize(es)
+    data = SyntheticData(seed=3)
+    logs = data.logs(profile["logs"])
+    enqueued: Dict[str, float] = {}
+    latencies: List[float] = []
+    process_batch = service._process_logs_batch
+
+    async def timed_batch(batch, lineages=None):
+        await process_batch(batch, lineages)
+        done = time.perf_counter()
+        latencies.extend(done - enqueued[log["id"]] for log in batch)
+
+    service._process_logs_batch = timed_batch
+    started = time.perf_counter()
+    try:
+        for i in range(0, len(logs), profile["batch"]):
+            for entry in await service.create_logs_batch(logs[i:i + profile["batch"]]):
+                enqueued[entry.id] = time.perf_counter()
+        await service.processing_queue.join()
+        seconds = time.perf_counter() - started
+    finally:
+        await service.close()
+
+    return {
+        "drain_logs_per_s": metric(len(logs) / seconds, "logs/s", "higher"),
+        "queue_latency_p50_ms": metric(percentile(latencies, 50) * 1000, "ms", "lower"),
+        "queue_latency_p99_ms": metric(percentile(latencies, 99) * 1000, "ms", "lower"),
+    }
+
+async def endpoints(profile: Dict[str, int]) -> Metrics:
+    """p50/p99 per API endpoint with concurrent clients."""
+    from httpx import ASGITransport, AsyncClient
+    from app.main import app
+    from app.api.endpoints import alerts, logs, metrics
+
+    es = FakeElasticsearch()
+    data = SyntheticData(seed=4)
+    await seed(es, data, profile)
+    services = [logs.log_service, metrics.metrics_service, alerts.alert_manager]
+    saved = [service.es_client for service in services]
+    for service in services:
+        service.es_client = es
+        await service._ensure_index()
+    for alert in data.alerts(profile["alerts"]):
+        await alerts.alert_manager.create_alert(alert)
+    await alerts.alert_manager.flush()
+    await alerts.alert_manager.reconcile_statistics()
+
+    results: Metrics = {}
+    semaphore = asyncio.Semaphore(profile["concurrency"])
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            for path in ENDPOINTS:
+                latencies: List[float] = []
+
+                async def request():
+                    async with semaphore:
+                        started = time.perf_counter()
+                        response = await client.get(path)
+                        latencies.append(time.perf_counter() - started)
+                        response.raise_for_status()
+
+                await asyncio.gather(*(request() for _ in range(profile["requests"])))
+                name = path.split("?")[0].removeprefix("/api/v1/").strip("/").replace("/", "_").replace("-", "_")
+                results[f"{name}_p50_ms"] = metric(percentile(latencies, 50) * 1000, "ms", "lower")
+                results[f"{name}_p99_ms"] = metric(percentile(latencies, 99) * 1000, "ms", "lower")
+    finally:
+        for service, client in zip(services, saved):
+            service.es_client = client
+    return results
+
+async def memory(profile: Dict[str, int]) -> Metrics:
+    """Peak Python heap while ingesting and processing the full log set."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        es = FakeElasticsearch()
+        service = LogIngestionService()
+        await service.initialize(es)
+        data = SyntheticData(seed=5)
+        for _ in range(max(1, profile["logs"] // profile["batch"])):
+            await service.create_logs_batch(data.logs(profile["batch"]))
+        await service.processing_queue.join()
+        await service.close()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "ingest_peak_heap_mb": metric(peak / 2**20, "MiB", "lower"),
+        "process_max_rss_mb": metric(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "MiB", "lower"),
+    }
+
+async def embedded(profile: Dict[str, int]) -> Metrics:
+    """Ingest, query and reopen on the embedded backend with persistence on."""
+    with tempfile.TemporaryDirectory() as path:
+        storage = EmbeddedBackend(path, segment_rows=max(1000, profile["logs"] // 4))
+        logs = LogIngestionService()
+        threats = ThreatDetectionService()
+        logs.es_client = threats.es_client = storage
+        await logs._ensure_index()
+        await threats._ensure_index()
+        data = SyntheticData(seed=6)
+
+        started = time.perf_counter()
+        await seed(storage, data, profile)
+        ingest_seconds = time.perf_counter() - started
+
+        queries = {
+            "get_logs": lambda: logs.get_logs({"term": {"level": "error"}}, limit=50),
+            "search_text": lambda: logs.get_logs({"match": {"message": "failed login"}}, limit=50),
+            "log_statistics": lambda: logs.get_statistics(),
+            "top_threats": lambda: threats._compute_top_threats(10, data.now - data.span, data.now),
+        }
+        results = {
+            "ingest_docs_per_s": metric((profile["logs"] + profile["events"]) / ingest_seconds, "docs/s", "higher"),
+        }
+        for name, query in queries.items():
+            latencies = []
+            for _ in range(max(5, profile["requests"] // 4)):
+                started = time.perf_counter()
+                await query()
+                latencies.append(time.perf_counter() - started)
+            results[f"{name}_p50_ms"] = metric(percentile(latencies, 50) * 1000, "ms", "lower")
+
+        await storage.close()
+        started = time.perf_counter()
+        reopened = EmbeddedBackend(path)
+        results["reopen_ms"] = metric((time.perf_counter() - started) * 1000, "ms", "lower")
+        await reopened.close()
+    return results
+
+async def _pipeline_throughput(logs: List[Any], batch: int) -> float:
+    """Logs per CPU second through create_logs_batch and queue processing, instrumented."""
+    service = LogIngestionService()
+    await service.initialize(InstrumentedBackend(FakeElasticsearch()))
+    try:
+        started = time.process_time()
+        for i in range(0, len(logs), batch):
+            await service.create_logs_batch(logs[i:i + batch])
+        await service.processing_queue.join()
+        return len(logs) / (time.process_time() - started)
+    finally:
+        await service.close()
+
+class _AcceptingStorage(FakeElasticsearch):
+    """Acknowledges bulk requests without storing anything."""
+
+    async def bulk(self, operations=None, **kwargs):
+        return {"errors": False, "items": []}
+
+async def _bulk_seconds(storage, operations: List[Dict[str, Any]], calls: int = 200, repeats: int = 7) -> float:
+    """Fastest of several timings of one bulk call, robust to machine noise."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(calls):
+            await storage.bulk(operations=operations)
+        timings.append((time.perf_counter() - started) / calls)
+    return min(timings)
+
+async def instrumentation(profile: Dict[str, int]) -> Metrics:
+    """
+    Cost of internal metrics on the ingest pipeline.
+
+    A batch passes through two instrumented bulk requests (create and
+    processing update), four histogram updates and per-log lineage
+    tracking. Their cost is timed in isolation, where noise cannot hide it,
+    and expressed as a share of the per-batch pipeline time measured end
+    to end.
+    """
+    logs = SyntheticData(seed=8).logs(profile["logs"])
+    batch = profile["batch"]
+    throughput = [await _pipeline_throughput(logs, batch) for _ in range(3)]
+    batch_seconds = batch / percentile(throughput, 50)
+
+    operations = []
+    for log in logs[:batch]:
+        operations.extend([{"update": {"_index": "logs", "_id": log.source}}, {"doc": {"processed": True}}])
+    raw = _AcceptingStorage()
+    bulk_cost = await _bulk_seconds(InstrumentedBackend(raw), operations) - await _bulk_seconds(raw, operations)
+
+    histogram = Histogram("siem_benchmark_seconds", "Scratch histogram for the instrumentation benchmark.")
+    started = time.perf_counter()
+    for i in range(100000):
+        histogram.observe(i * 1e-6)
+    observe_seconds = (time.perf_counter() - started) / 100000
+
+    tracker = LineageTracker(sample_rate=0.0)
+    sources = [log.source for log in logs[:batch]]
+    lineage_timings = []
+    for _ in range(7):
+        started = time.perf_counter()
+        now = time.time()
+        lineages = [tracker.received(source, now) for source in sources]
+        tracker.complete(lineages, now, now, now, now)
+        lineage_timings.append(time.perf_counter() - started)
+    lineage_seconds = min(lineage_timings)
+
+    cost = 2 * max(0.0, bulk_cost) + 4 * observe_seconds + lineage_seconds
+    return {
+        "pipeline_logs_per_cpu_s": metric(percentile(throughput, 50), "logs/s", "higher"),
+        "histogram_observe_ns": metric(observe_seconds * 1e9, "ns", "lower"),
+        "instrumented_bulk_overhead_us": metric(max(0.0, bulk_cost) * 1e6, "us", "lower"),
+        "lineage_per_log_us": metric(lineage_seconds / batch * 1e6, "us", "lower"),
+        "overhead_percent": metric(cost / batch_seconds * 100, "%", "lower"),
+    }
+
+_STARTUP_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import app.main as main
+imported = time.perf_counter()
+
+async def probe():
+    begin = time.perf_counter()
+    await main.startup_event()
+    up = time.perf_counter()
+    while not main.readiness.ready:
+        await asyncio.sleep(0.0005)
+    ready = time.perf_counter()
+    await main.shutdown_event()
+    return up - begin, ready - begin
+
+startup, ready = asyncio.run(probe())
+print(json.dumps({"import": imported - started, "startup": startup, "ready": ready}))
+"""
+
+async def startup(profile: Dict[str, int]) -> Metrics:
+    """
+    Import time, time for the startup handler to return, and cold start:
+    startup until /ready, with in-memory embedded storage so only the
+    app's own work is measured. Each run is a fresh interpreter.
+    """
+    env = dict(os.environ, STORAGE_BACKEND="embedded", EMBEDDED_STORAGE_PATH="", LOG_LEVEL="WARNING")
+    runs = []
+    for _ in range(5):
+        output = await asyncio.to_thread(
+            subprocess.run, [sys.executable, "-W", "ignore", "-c", _STARTUP_PROBE],
+            cwd=Path(__file__).resolve().parents[1], env=env, capture_output=True, text=True, check=True
+        )
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        "import_ms": metric(min(run["import"] for run in runs) * 1000, "ms", "lower"),
+        "startup_handler_ms": metric(min(run["startup"] for run in runs) * 1000, "ms", "lower"),
+        "cold_start_ms": metric(min(run["ready"] for run in runs) * 1000, "ms", "lower"),
+    }
+
+async def channel(profile: Dict[str, int]) -> Metrics:
+    """
+    Logs per second handed from API-worker log services to an ingestion
+    process over the ingest channel, with concurrent requests coalesced
+    into frames; storage acknowledges without storing, so this is the
+    channel's own cost.
+    """
+    data = SyntheticData(seed=9)
+    requests = [data.logs(profile["batch"] // 10 or 1) for _ in range(profile["requests"] * 5)]
+    with tempfile.TemporaryDirectory() as directory:
+        ingestion = LogIngestionService()
+        server = await IngestServer(ingestion, f"{directory}/ingest.sock").start()
+        await ingestion.initialize(_AcceptingStorage())
+        worker = LogIngestionService()
+        worker.channel = IngestClient(server.path)
+        semaphore = asyncio.Semaphore(profile["concurrency"])
+
+        async def request(logs):
+            async with semaphore:
+                await worker.create_logs_batch(logs)
+
+        try:
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                await asyncio.gather(*(request(logs) for logs in requests))
+                await ingestion.processing_queue.join()
+                timings.append(time.perf_counter() - started)
+        finally:
+            await worker.close()
+            await server.close()
+            await ingestion.close()
+    logs = sum(len(batch) for batch in requests)
+    return {"channel_logs_per_s": metric(logs / min(timings), "logs/s", "higher")}
+
+async def partition(profile: Dict[str, int]) -> Metrics:
+    """
+    Routing cost per log for 8 ingest workers, how evenly hosts and logs
+    spread over them (busiest worker over the mean; the synthetic hosts are
+    Zipf-skewed, so logs spread less evenly than keys), and the share of
+    keys that move when a ninth worker joins.
+    """
+    data = SyntheticData(seed=10)
+    logs = [log.model_dump() for log in data.logs(profile["logs"])]
+    workers = [f"w{i}" for i in range(8)]
+    router = PartitionRouter(LocalTransport(), workers, lambda log: log["host"])
+    received = [0.0] * len(logs)
+    timings = []
+    for _ in range(7):
+        started = time.perf_counter()
+        shares = router.partition(logs, received)
+        timings.append(time.perf_counter() - started)
+    per_worker = [len(share_logs) for share_logs, _ in shares.values()]
+
+    ring = HashRing(workers)
+    owners = {host: ring.node_for(host) for host in data.hosts}
+    keys_per_worker: Dict[str, int] = {}
+    for owner in owners.values():
+        keys_per_worker[owner] = keys_per_worker.get(owner, 0) + 1
+    ring.add("w8")
+    moved = sum(1 for host, owner in owners.items() if ring.node_for(host) != owner)
+    return {
+        "partition_route_us_per_log": metric(min(timings) / len(logs) * 1e6, "us", "lower"),
+        "partition_key_imbalance": metric(max(keys_per_worker.values()) / (len(owners) / 8), "ratio", "lower"),
+        "partition_log_imbalance": metric(max(per_worker) / (len(logs) / 8), "ratio", "lower"),
+        "partition_moved_on_join": metric(moved / len(owners), "ratio", "lower"),
+    }
+
+async def bulk(profile: Dict[str, int]) -> Metrics:
+    """
+    Sustained bulk writes into a simulated cluster with 4 write threads
+    (50k items/s between them) and a 2000-item queue that rejects the rest.
+
+    The fixed writer is the old pipeline: 1000 items per request, one
+    request at a time, failed items ignored. The adaptive writer is given
+    the same items as they arrive in 100-item submissions.
+    """
+    data = SyntheticData(seed=11)
+    documents = [log.model_dump() for log in data.logs(profile["logs"])] * 5
+    pairs = [({"index": {"_index": "logs", "_id": str(i)}}, doc) for i, doc in enumerate(documents)]
+    item_seconds = 4 / 50000
+
+    def cluster():
+        return OverloadedElasticsearch(
+            _AcceptingStorage(), capacity=2000, round_trip=0.002, item_seconds=item_seconds, write_threads=4
+        )
+
+    fixed = cluster()
+    started = time.perf_counter()
+    stored = 0
+    for start in range(0, len(pairs), 1000):
+        chunk = pairs[start:start + 1000]
+        result = await fixed.bulk(operations=[part for pair in chunk for part in pair])
+        stored += sum(1 for item in result["items"] if next(iter(item.values()))["status"] < 300)
+    fixed_rate = stored / (time.perf_counter() - started)
+
+    adaptive = cluster()
+    writer = AdaptiveBulkWriter("benchmark", adaptive, retry_base=0.005)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(writer.write(pairs[start:start + 100]) for start in range(0, len(pairs), 100)))
+    adaptive_rate = sum(sum(stored) for stored in results) / (time.perf_counter() - started)
+    await writer.close()
+    return {
+        "bulk_fixed_items_per_s": metric(fixed_rate, "items/s", "higher"),
+        "bulk_adaptive_items_per_s": metric(adaptive_rate, "items/s", "higher"),
+        "bulk_adaptive_speedup": metric(adaptive_rate / fixed_rate, "x", "higher"),
+        "bulk_adaptive_rejected_share": metric(adaptive.rejected / adaptive.items, "ratio", "lower"),
+    }
+
+async def archive(profile: Dict[str, int]) -> Metrics:
+    """
+    Queries on the cold archive: a source and one-hour range, pruned by
+    partition, row group and dictionary columns, against decoding and
+    matching every archived log.
+    """
+    data = SyntheticData(seed=12)
+    documents = [log.model_dump(mode="json") for log in data.logs(profile["logs"] * 5)]
+    middle = data.now - data.span / 2
+    query = {"bool": {"must": [
+        {"term": {"source": documents[0]["source"]}},
+        {"range": {"timestamp": {"gte": middle.isoformat(), "lte": (middle + timedelta(hours=1)).isoformat()}}},
+    ]}}
+    with tempfile.TemporaryDirectory() as path:
+        cold = ColdArchive(path, row_group_rows=1024)
+        started = time.perf_counter()
+        cold.write("logs", documents)
+        write_seconds = time.perf_counter() - started
+        size = sum(file.stat().st_size for file in Path(path).rglob("*.col"))
+
+        latencies = []
+        for _ in range(max(5, profile["requests"] // 4)):
+            started = time.perf_counter()
+            cold.search("logs", query, size=50)
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        manifest = cold.manifest("logs")
+        matched = [
+            doc
+            for entry in manifest["files"]
+            for group in cold._file("logs", entry).groups
+            for doc in map(loads, cold._file("logs", entry).sources(group))
+            if matches(query, doc)
+        ]
+        scan_seconds = time.perf_counter() - started
+        cold.close()
+    return {
+        "archive_write_logs_per_s": metric(len(documents) / write_seconds, "logs/s", "higher"),
+        "archive_bytes_per_log": metric(size / len(documents), "bytes", "lower"),
+        "archive_query_p50_ms": metric(percentile(latencies, 50) * 1000, "ms", "lower"),
+        "archive_full_scan_ms": metric(scan_seconds * 1000, "ms", "lower"),
+    }
+
+async def percolator(profile: Dict[str, int]) -> Metrics:
+    """
+    Cost of matching ingested logs against 10, 1,000 and 10,000 saved
+    searches, each on a host or source plus a level or message token.
+    """
+    data = SyntheticData(seed=13)
+    documents = [log.model_dump(mode="json") for log in data.logs(profile["logs"])]
+    levels = ["error", "critical", "warning"]
+    words = ["failed", "denied", "timeout", "error", "refused"]
+
+    def query(i: int) -> Dict[str, Any]:
+        if i % 2:
+            return {"bool": {"filter": [
+                {"term": {"host": data.hosts[i % len(data.hosts)]}},
+                {"term": {"level": levels[i % len(levels)]}},
+            ]}}
+        return {"bool": {"must": [
+            {"term": {"source": data.sources[i % len(data.sources)][0]}},
+            {"match": {"message": words[i % len(words)]}},
+        ]}}
+
+    results: Metrics = {}
+    for count in (10, 1000, 10000):
+        standing = Percolator()
+        for i in range(count):
+            standing.add(str(i), query(i))
+        started = time.perf_counter()
+        _, checked = standing.percolate_many(documents)
+        seconds = time.perf_counter() - started
+        results[f"percolate_{count}_queries_us_per_log"] = metric(seconds / len(documents) * 1e6, "us", "lower")
+        results[f"percolate_{count}_queries_checked_per_log"] = metric(checked / len(documents), "queries", "lower")
+    return results
+
+async def hot_window(profile: Dict[str, int]) -> Metrics:
+    """
+    Searches of the last 15 minutes in the in-process hot window, as the
+    log listing issues them, against the same searches on the storage
+    stand-in.
+    """
+    data = SyntheticData(seed=14, span=timedelta(minutes=15))
+    # Logs reach the window roughly in time order
+    documents = sorted((log.model_dump() for log in data.logs(profile["logs"] * 5)), key=lambda log: log["timestamp"])
+    for i, document in enumerate(documents):
+        document["id"] = str(i)
+    window = HotWindow(window_seconds=900, segment_seconds=60, max_bytes=1 << 30)
+    window.covered_from = 0
+    started = time.perf_counter()
+    for offset in range(0, len(documents), profile["batch"]):
+        window.add(documents[offset:offset + profile["batch"]])
+    add_seconds = time.perf_counter() - started
+
+    es = FakeElasticsearch()
+    await es.indices.create(index="logs")
+    for document in documents:
+        await es.index(index="logs", id=document["id"], document=document)
+    since = {"range": {"timestamp": {"gte": (data.now - timedelta(minutes=15)).isoformat()}}}
+    queries = [
+        {"bool": {"must": [{"match_all": {}}, since]}},
+        {"bool": {"must": [{"match_all": {}}, {"term": {"source": documents[0]["source"]}}, since]}},
+        {"bool": {"must": [{"match_all": {}}, {"term": {"level": "error"}}, since]}},
+        {"bool": {"must": [
+            {"match_all": {}},
+            {"multi_match": {"query": "failed", "fields": ["message", "host", "source"]}},
+            since,
+        ]}},
+    ]
+    hot, storage = [], []
+    for _ in range(max(5, profile["requests"] // 4)):
+        for query in queries:
+            started = time.perf_counter()
+            window.search(query, limit=50)
+            hot.append(time.perf_counter() - started)
+    for query in queries:
+        started = time.perf_counter()
+        await es.search(index="logs", query=query, size=50, sort=[{"timestamp": {"order": "desc"}}])
+        storage.append(time.perf_counter() - started)
+    return {
+        "hot_window_add_logs_per_s": metric(len(documents) / add_seconds, "logs/s", "higher"),
+        "hot_window_bytes_per_log": metric(window.bytes / len(documents), "bytes", "lower"),
+        "hot_window_query_p50_ms": metric(percentile(hot, 50) * 1000, "ms", "lower"),
+        "hot_window_query_p99_ms": metric(percentile(hot, 99) * 1000, "ms", "lower"),
+        "hot_window_storage_query_p50_ms": metric(percentile(storage, 50) * 1000, "ms", "lower"),
+    }
+
+async def field_extraction(profile: Dict[str, int]) -> Metrics:
+    """
+    Cost of extracting typed fields from each message format, with the
+    source's parse plan already compiled.
+    """
+    messages = {
+        "cef": "CEF:0|Acme|FW|1.0|100|Connection blocked|5|src=10.0.{0}.1 dst=10.0.0.2 spt={0} dpt=22 act=blocked suser=u{0}",
+        "leef": "LEEF:1.0|IBM|QRadar|1.0|Logon|src=10.0.{0}.1\tusrName=u{0}\taction=login\tresult=Denied",
+        "json": '{{"source": {{"ip": "10.0.{0}.1", "port": {0}}}, "user": "u{0}", "event": {{"action": "login", "outcome": "failure"}}}}',
+        "kv": "user=u{0} src=10.0.{0}.1 dst_port=22 action=login outcome=failure",
+        "text": "Failed password for u{0} from 10.0.{0}.1 port 22 ssh2",
+    }
+    results: Metrics = {}
+    for format, template in messages.items():
+        batch = [template.format(i % 250) for i in range(profile["logs"])]
+        extractor = FieldExtractor()
+        extractor.extract(format, batch[0])
+        started = time.perf_counter()
+        for message in batch:
+            extractor.extract(format, message)
+        seconds = time.perf_counter() - started
+        results[f"field_extraction_{format}_us_per_log"] = metric(seconds / len(batch) * 1e6, "us", "lower")
+    return results
+
+async def listing(profile: Dict[str, int]) -> Metrics:
+    """
+    CPU time per 1000-row log and 100-row alert listing request, in full
+    and projected to a few fields.
+    """
+    from httpx import ASGITransport, AsyncClient
+    from app.main import app
+    from app.api.endpoints import alerts, logs
+
+    es = FakeElasticsearch()
+    data = SyntheticData(seed=15)
+    await seed(es, data, profile)
+    services = [logs.log_service, alerts.alert_manager]
+    saved = [(service.es_client, getattr(service, "hot_window", None)) for service in services]
+    for service in services:
+        service.es_client = es
+        await service._ensure_index()
+    logs.log_service.hot_window = None
+    for alert in data.alerts(profile["alerts"]):
+        await alerts.alert_manager.create_alert(alert)
+    await alerts.alert_manager.flush()
+
+    paths = {
+        "logs_1000": "/api/v1/logs/?limit=1000",
+        "logs_1000_projected": "/api/v1/logs/?limit=1000&fields=id,timestamp,level,message",
+        "alerts_100": "/api/v1/alerts/?limit=100",
+    }
+    results: Metrics = {}
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            for name, path in paths.items():
+                # Warm the query cache, so requests measure the listing, not the search
+                (await client.get(path)).raise_for_status()
+                cpu: List[float] = []
+                for _ in range(max(10, profile["requests"] // 4)):
+                    started = time.process_time()
+                    response = await client.get(path)
+                    cpu.append(time.process_time() - started)
+                    response.raise_for_status()
+                results[f"{name}_cpu_ms"] = metric(percentile(cpu, 50) * 1000, "ms", "lower")
+    finally:
+        for service, (client, window) in zip(services, saved):
+            service.es_client = client
+            if window is not None:
+                service.hot_window = window
+    return results
+
+async def security_score(profile: Dict[str, int]) -> Metrics:
+    """
+    Security score latency on the embedded backend with 30 and 180 days of
+    events, once the closed days are finalized; it should not grow with the
+    history kept.
+    """
+    results: Metrics = {}
+    for days in (30, 180):
+        es = EmbeddedBackend(segment_rows=max(1000, profile["events"] // 4))
+        service = ThreatDetectionService()
+        await service.initialize(es)
+        operations = []
+        data = SyntheticData(seed=16, span=timedelta(days=days))
+        # Events arrive in time order, so older segments fall outside today
+        events = sorted(data.events(profile["events"] * days // 30), key=lambda event: event["timestamp"])
+        for i, event in enumerate(events):
+            operations.extend([{"index": {"_index": service.index, "_id": str(i)}}, event])
+        await es.bulk(operations=operations)
+        started = time.perf_counter()
+        await service.calculate_security_score()
+        results[f"security_score_{days}_days_first_ms"] = metric((time.perf_counter() - started) * 1000, "ms", "lower")
+        latencies = []
+        for _ in range(max(10, profile["requests"] // 4)):
+            started = time.perf_counter()
+            await service.calculate_security_score()
+            latencies.append(time.perf_counter() - started)
+        results[f"security_score_{days}_days_p50_ms"] = metric(percentile(latencies, 50) * 1000, "ms", "lower")
+    return results
+
+async def fair_queue(profile: Dict[str, int]) -> Metrics:
+    """
+    Logs served ahead of each firewall log while a debug source floods the
+    processing queue at twice the rate it drains, first-in-first-out against
+    per-source fair queueing.
+    """
+    def classify(item):
+        return item[0], item[0], ()
+
+    results: Metrics = {}
+    for name, queue in (("fifo", asyncio.Queue()), ("fair", FairQueue(classify))):
+        put_at: Dict[int, int] = {}
+        waits: List[float] = []
+        served = 0
+        for step in range(profile["logs"] * 5):
+            await queue.put(("debug-app", None))
+            await queue.put(("debug-app", None))
+            if step % 25 == 0:
+                put_at[step] = served
+                await queue.put(("firewall", step))
+            source, step_put = await queue.get()
+            served += 1
+            if source == "firewall":
+                waits.append(served - put_at[step_put])
+        results[f"{name}_firewall_wait_logs_p99"] = metric(percentile(waits, 99), "logs", "lower")
+    return results
+
+async def notifications(profile: Dict[str, int]) -> Metrics:
+    """
+    create_alert latency with no notification sinks, and with two sinks
+    whose receivers take 200 ms per digest.
+    """
+    class SlowSink(NotificationSink):
+        async def send(self, alerts):
+            await asyncio.sleep(0.2)
+
+    results: Metrics = {}
+    for name, sinks in (("none", []), ("slow", [SlowSink("webhook"), SlowSink("syslog")])):
+        manager = AlertManager()
+        manager.notifier = NotificationDispatcher(sinks, window=0.05, max_alerts=50)
+        await manager.initialize(FakeElasticsearch())
+        latencies = []
+        for i in range(profile["alerts"]):
+            alert = AlertCreate(
+                title=f"Alert {i}", description="benchmark", severity=AlertSeverity.HIGH, source=AlertSource.IDS
+            )
+            started = time.perf_counter()
+            await manager.create_alert(alert)
+            latencies.append(time.perf_counter() - started)
+        await manager.close()
+        results[f"create_alert_{name}_sinks_p99_ms"] = metric(percentile(latencies, 99) * 1000, "ms", "lower")
+    return results
+
+SCENARIOS: Dict[str, Callable[[Dict[str, int]], Awaitable[Metrics]]] = {
+    "ingest": ingest,
+    "queue_drain": queue_drain,
+    "endpoints": endpoints,
+    "memory": memory,
+    "embedded": embedded,
+    "instrumentation": instrumentation,
+    "startup": startup,
+    "channel": channel,
+    "partition": partition,
+    "bulk": bulk,
+    "archive": archive,
+    "percolator": percolator,
+    "hot_window": hot_window,
+    "field_extraction": field_extraction,
+    "listing": listing,
+    "security_score": security_score,
+    "fair_queue": fair_queue,
+    "notifications": notifications,
+}
@@ -1,8 +1,10 @@
 # tests/conftest.py
 import pytest
+import pytest_asyncio
 import asyncio
 from elasticsearch import AsyncElasticsearch
 from app.core.config import settings
+from benchmarks.fake_elasticsearch import FakeElasticsearch
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -18,4 +20,9 @@ async def es_client():
         [f"http://{settings.ELASTICSEARCH_HOST}:{settings.ELASTICSEARCH_PORT}"]
     )
     yield client
-    await client.close()
\ No newline at end of file
+    await client.close()
+
+@pytest.fixture
+def fake_es():
+    """In-process stand-in for elasticsearch."""
+    return FakeElasticsearch()
@@ -0,0 +1,101 @@
+# tests/test_alert_bulk.py
+import pytest
+from app.services.alert_manager import AlertManager
+from app.models.alert import AlertUpdate, AlertStatus, AlertFilter, AlertSeverity, BulkAlertAction
+
+STORED = {
+    "id": "a1",
+    "title": "Brute force",
+    "description": "desc",
+    "severity": "high",
+    "source": "authentication",
+    "timestamp": "2024-01-01T00:00:00",
+    "status": "new",
+}
+
+class TransitionClient:
+    def __init__(self):
+        self.calls = []
+
+    async def update(self, index, id, doc, source=None, **kwargs):
+        self.calls.append(("update", kwargs))
+        return {"_seq_no": 7, "_primary_term": 1, "get": {"_source": {**STORED, **doc}}}
+
+    async def bulk(self, operations, **kwargs):
+        self.calls.append(("bulk", len(operations) // 2))
+        items = []
+        for action in operations[::2]:
+            op, meta = next(iter(action.items()))
+            doc_id = meta["_id"]
+            if doc_id == "missing":
+                items.append({op: {"_id": doc_id, "status": 404}})
+            elif doc_id == "closed":
+                items.append({op: {"_id": doc_id, "status": 200, "result": "noop"}})
+            else:
+                items.append({op: {"_id": doc_id, "status": 200, "result": "updated"}})
+        return {"errors": True, "items": items}
+
+    async def update_by_query(self, index, query, script, **kwargs):
+        self.calls.append(("update_by_query", kwargs))
+        return {"total": 3, "updated": 2, "noops": 1, "version_conflicts": 0, "failures": []}
+
+@pytest.mark.asyncio
+async def test_single_update_is_one_round_trip_with_version():
+    manager = AlertManager()
+    manager.es_client = TransitionClient()
+
+    alert, version = await manager.update_alert_versioned(
+        "a1", AlertUpdate(status=AlertStatus.RESOLVED), version=(6, 1)
+    )
+
+    assert alert.status == AlertStatus.RESOLVED
+    assert alert.resolved_at is not None
+    assert version == (7, 1)
+    assert manager.es_client.calls == [("update", {"if_seq_no": 6, "if_primary_term": 1})]
+
+@pytest.mark.asyncio
+async def test_versioned_update_of_buffered_alert_is_checked_by_storage():
+    manager = AlertManager()
+    manager.es_client = TransitionClient()
+    manager.buffer.index_doc(dict(STORED))
+
+    await manager.update_alert_versioned("a1", AlertUpdate(status=AlertStatus.ACKNOWLEDGED), version=(6, 1))
+
+    # The buffered write is stored before the conditional update, not folded into it
+    assert manager.es_client.calls == [("bulk", 1), ("update", {"if_seq_no": 6, "if_primary_term": 1})]
+    assert manager.buffer.lookup("a1")[1]["status"] == AlertStatus.ACKNOWLEDGED
+
+@pytest.mark.asyncio
+async def test_bulk_close_by_ids_is_chunked():
+    manager = AlertManager()
+    manager.bulk_chunk_size = 2
+    manager.es_client = TransitionClient()
+
+    summary = await manager.bulk_transition(
+        BulkAlertAction.CLOSE, ids=["a1", "a2", "closed", "missing", "a1"]
+    )
+
+    assert [call for call in manager.es_client.calls] == [("bulk", 2), ("bulk", 2)]
+    assert summary["matched"] == 4
+    assert summary["updated"] == 2
+    assert summary["noops"] == 1
+    assert summary["not_found"] == ["missing"]
+
+@pytest.mark.asyncio
+async def test_bulk_by_query_uses_sliced_update_by_query():
+    manager = AlertManager()
+    manager.es_client = TransitionClient()
+    query = manager.build_filter_query(AlertFilter(severity=AlertSeverity.LOW))
+
+    summary = await manager.bulk_transition(BulkAlertAction.ACKNOWLEDGE, query=query)
+
+    _, kwargs = manager.es_client.calls[0]
+    assert kwargs["slices"] == "auto"
+    assert kwargs["conflicts"] == "proceed"
+    assert summary["updated"] == 2
+
+@pytest.mark.asyncio
+async def test_assign_requires_assignee():
+    manager = AlertManager()
+    with pytest.raises(ValueError):
+        await manager.bulk_transition(BulkAlertAction.ASSIGN, ids=["a1"])
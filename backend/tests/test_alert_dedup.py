@@ -0,0 +1,107 @@
+# tests/test_alert_dedup.py
+import pytest
+from datetime import datetime, timedelta
+from app.services.alert_dedup import AlertDeduplicator
+from app.services.alert_manager import AlertManager
+from app.models.alert import AlertCreate, AlertSeverity, AlertSource
+
+FIELDS = ["title", "source", "source_ip", "affected_assets"]
+
+class RecordingClient:
+    """Minimal stand-in recording the calls AlertManager makes."""
+    def __init__(self):
+        self.bulk_calls = []
+
+    async def search(self, index, **kwargs):
+        return {"hits": {"total": {"value": 0}, "hits": []}}
+
+    async def bulk(self, operations, **kwargs):
+        self.bulk_calls.append(operations)
+        actions = [op for op in operations if len(op) == 1 and next(iter(op)) in ("index", "update", "delete")]
+        return {"errors": False, "items": [{next(iter(a)): {"status": 200}} for a in actions]}
+
+def make_alert(**overrides):
+    data = dict(
+        title="Port scan",
+        description="Port scan detected",
+        severity=AlertSeverity.HIGH,
+        source=AlertSource.IDS,
+        source_ip="10.0.0.5",
+        affected_assets=["web-1", "db-1"]
+    )
+    data.update(overrides)
+    return AlertCreate(**data)
+
+def test_fingerprint_ignores_asset_order():
+    dedup = AlertDeduplicator(FIELDS, 300)
+    first = dedup.fingerprint(make_alert().model_dump())
+    second = dedup.fingerprint(make_alert(affected_assets=["db-1", "web-1"]).model_dump())
+    assert first == second
+    assert first != dedup.fingerprint(make_alert(source_ip="10.0.0.6").model_dump())
+
+def test_window_expiry_closes_group():
+    dedup = AlertDeduplicator(FIELDS, 60)
+    now = datetime.utcnow()
+    dedup.open({"id": "a1", "fingerprint": "fp", "timestamp": now}, now)
+    assert dedup.get_open("fp", now + timedelta(seconds=30)) is not None
+    assert dedup.get_open("fp", now + timedelta(seconds=61)) is None
+
+@pytest.mark.asyncio
+async def test_repeats_are_folded_and_flushed_in_one_bulk():
+    manager = AlertManager()
+    manager.es_client = RecordingClient()
+
+    first = await manager.create_alert(make_alert())
+    await manager.buffer.flush(manager.es_client)
+    for _ in range(99):
+        repeat = await manager.create_alert(make_alert())
+        assert repeat.id == first.id
+
+    assert repeat.occurrence_count == 100
+    assert await manager.flush_repeats() == 1
+
+    index_ops, repeat_ops = manager.es_client.bulk_calls
+    assert len(index_ops) == 2
+    assert len(repeat_ops) == 2
+    assert repeat_ops[1]["script"]["params"]["count"] == 99
+
+@pytest.mark.asyncio
+async def test_repeats_of_buffered_alert_fold_into_pending_write():
+    manager = AlertManager()
+    manager.es_client = RecordingClient()
+
+    first = await manager.create_alert(make_alert())
+    await manager.create_alert(make_alert())
+
+    assert manager.dedup.drain() == []
+    await manager.flush()
+    operations = manager.es_client.bulk_calls[0]
+    assert operations[1]["id"] == first.id
+    assert operations[1]["occurrence_count"] == 2
+
+@pytest.mark.asyncio
+async def test_repeats_with_mixed_utc_offsets_fold_into_the_open_alert():
+    manager = AlertManager()
+    manager.es_client = RecordingClient()
+
+    first = await manager.create_alert(make_alert(timestamp=datetime(2024, 5, 1, 12, 0)))
+    await manager.buffer.flush(manager.es_client)
+    repeat = await manager.create_alert(
+        make_alert(timestamp=datetime.fromisoformat("2024-05-01T14:30:00+02:00"))
+    )
+    assert repeat.id == first.id
+    assert repeat.last_seen == datetime(2024, 5, 1, 12, 30)
+
+@pytest.mark.asyncio
+async def test_dedup_lock_is_kept_while_callers_wait_on_it():
+    dedup = AlertDeduplicator(FIELDS, 60)
+    holder = dedup.lock("fp")
+    await holder.acquire()
+    waiter = dedup.lock("fp")
+    # The holder finishing must not hand a later caller a fresh lock
+    holder.release()
+    dedup.release_lock("fp")
+    assert dedup.lock("fp") is waiter
+    dedup.release_lock("fp")
+    dedup.release_lock("fp")
+    assert "fp" not in dedup._locks
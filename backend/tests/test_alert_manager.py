@@ -1,16 +1,18 @@
 # tests/test_alert_manager.py
 import pytest
+import pytest_asyncio
 from datetime import datetime
 from app.services.alert_manager import AlertManager
 from app.models.alert import AlertCreate, AlertSeverity, AlertSource
 
-@pytest.fixture
-async def alert_manager():
+@pytest_asyncio.fixture
+async def alert_manager(fake_es):
     manager = AlertManager()
-    # Mock elasticsearch client here
-    await manager.initialize(None)
-    return manager
+    await manager.initialize(fake_es)
+    yield manager
+    await manager.close()
 
+@pytest.mark.asyncio
 async def test_create_alert(alert_manager):
     alert_data = AlertCreate(
         title="Test Alert",
@@ -22,4 +24,4 @@ async def test_create_alert(alert_manager):
     alert = await alert_manager.create_alert(alert_data)
     assert alert is not None
     assert alert.title == "Test Alert"
-    assert alert.severity == AlertSeverity.HIGH
\ No newline at end of file
+    assert alert.severity == AlertSeverity.HIGH
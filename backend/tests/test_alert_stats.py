@@ -0,0 +1,91 @@
+# tests/test_alert_stats.py
+import pytest
+from collections import Counter
+from datetime import datetime
+from app.services.alert_stats import AlertCounters
+from app.services.alert_manager import AlertManager
+from app.models.alert import AlertCreate, AlertUpdate, AlertSeverity, AlertSource, AlertStatus
+
+TODAY = datetime.utcnow().strftime("%Y-%m-%d")
+
+class StatsClient:
+    """Stand-in aggregating bulk-indexed alerts plus one written out-of-band."""
+    class Indices:
+        async def refresh(self, index):
+            pass
+
+    def __init__(self):
+        self.indices = self.Indices()
+        self.searches = 0
+        self.docs = [{"severity": "low", "status": "new", "source": "ids"}]
+
+    async def bulk(self, operations, **kwargs):
+        for action, doc in zip(operations[::2], operations[1::2]):
+            if "index" in action:
+                self.docs.append({key: getattr(doc[key], "value", doc[key]) for key in ("severity", "status", "source")})
+        return {"errors": False, "items": []}
+
+    async def update(self, index, id, doc, **kwargs):
+        source = {"id": id, "title": "Malware", "description": "desc", "severity": "critical",
+                  "source": "antivirus", "timestamp": datetime.utcnow().isoformat(), **doc}
+        return {"_seq_no": 1, "_primary_term": 1, "get": {"_source": source}}
+
+    async def search(self, index, **kwargs):
+        self.searches += 1
+        if "aggs" not in kwargs:
+            return {"hits": {"total": {"value": 0}, "hits": []}}
+
+        def buckets(field):
+            counts = Counter(doc[field] for doc in self.docs)
+            return {"buckets": [{"key": k, "doc_count": v} for k, v in counts.items()]}
+
+        return {
+            "hits": {"total": {"value": len(self.docs)}},
+            "aggregations": {
+                "severity_stats": buckets("severity"),
+                "status_stats": buckets("status"),
+                "source_stats": buckets("source"),
+                "recent": {"daily": {"buckets": [{"key_as_string": TODAY, "doc_count": len(self.docs)}]}},
+            }
+        }
+
+def test_transitions_move_status_buckets():
+    counters = AlertCounters()
+    counters.record_create({"id": "a1", "severity": "high", "source": "ids", "timestamp": datetime.utcnow()})
+    assert counters.record_transition("a1", AlertStatus.CLOSED)
+    assert counters.snapshot()["by_status"] == {"closed": 1}
+    assert not counters.record_transition("unknown", AlertStatus.CLOSED)
+    assert counters.unknown_transitions == 1
+
+def test_reconcile_keeps_changes_made_during_the_query():
+    counters = AlertCounters()
+    counters.begin_reconcile()
+    counters.record_create({"id": "a2", "severity": "low", "source": "ids", "timestamp": datetime.utcnow()})
+    drift = counters.finish_reconcile(
+        {"total": 1, "by_severity": {"low": 1}, "by_status": {"new": 1},
+         "by_source": {"ids": 1}, "daily": {TODAY: 1}},
+        0.01
+    )
+    assert counters.total == 2
+    assert counters.by_severity["low"] == 2
+    assert drift == 5
+
+@pytest.mark.asyncio
+async def test_statistics_are_served_from_memory_after_first_reconcile():
+    manager = AlertManager()
+    manager.es_client = StatsClient()
+
+    alert = await manager.create_alert(AlertCreate(
+        title="Malware", description="desc", severity=AlertSeverity.CRITICAL, source=AlertSource.ANTIVIRUS
+    ))
+    first = await manager.get_statistics()
+    assert first["total_alerts"] == 2
+    # The out-of-band alert was missing from total, severity, status, source and day
+    assert first["reconciliation"]["last_drift"] == 5
+
+    searches = manager.es_client.searches
+    await manager.update_alert(alert.id, AlertUpdate(status=AlertStatus.RESOLVED))
+    stats = await manager.get_statistics()
+    assert manager.es_client.searches == searches
+    assert stats["by_status"] == {"new": 1, "resolved": 1}
+    assert stats["by_severity"] == {"low": 1, "critical": 1}
@@ -1,10 +1,27 @@
 # tests/test_api.py
+import asyncio
+import json
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.api.endpoints import alerts, logs, metrics, saved_searches
+from benchmarks.fake_elasticsearch import FakeElasticsearch
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def fake_services():
+    """Point the router services at a fresh in-process elasticsearch."""
+    es = FakeElasticsearch()
+    services = [alerts.alert_manager, logs.log_service, metrics.metrics_service, saved_searches.saved_search_service]
+    for service in services:
+        service.es_client = es
+    for index in ("alerts", "logs", "security_events", "saved_searches"):
+        asyncio.run(es.indices.create(index=index))
+    yield es
+    for service in services:
+        service.es_client = None
+
 def test_read_main():
     response = client.get("/")
     assert response.status_code == 200
@@ -20,7 +37,76 @@ def test_get_logs():
     assert response.status_code == 200
     assert isinstance(response.json(), list)
 
+def test_export_logs_streams_ndjson(fake_services):
+    asyncio.run(fake_services.index(
+        index="logs", id="1", document={"id": "1", "timestamp": "2026-01-01T00:00:00", "message": "m", "source": "s"}
+    ))
+    response = client.get("/api/v1/logs/export?source=s")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == ["1"]
+
+def test_get_logs_returns_stored_documents_or_projected_fields(fake_services):
+    # Written before tags and fields existed, so without them
+    asyncio.run(fake_services.index(
+        index="logs", id="1",
+        document={"id": "1", "timestamp": "2026-01-01T00:00:00", "message": "m", "level": "error", "source": "s"}
+    ))
+    full = client.get("/api/v1/logs?source=s").json()
+    assert full == [{
+        "id": "1", "timestamp": "2026-01-01T00:00:00", "message": "m", "level": "error", "source": "s", "host": None,
+        "metadata": {}, "tags": [], "fields": {}, "processed": False, "correlation_id": None,
+    }]
+    assert client.get("/api/v1/logs?source=s&fields=level,message").json() == [{"id": "1", "level": "error", "message": "m"}]
+    assert client.get("/api/v1/logs?fields=password").status_code == 400
+
+    # Extra keys do not stand in for missing fields
+    extra = {f"vendor_{i}": i for i in range(10)}
+    asyncio.run(fake_services.index(
+        index="logs", id="2",
+        document={"id": "2", "timestamp": "2026-01-01T00:00:00", "message": "m", "level": "error", "source": "t", **extra}
+    ))
+    [listed] = client.get("/api/v1/logs?source=t").json()
+    assert listed["tags"] == [] and listed["fields"] == {} and listed["vendor_0"] == 0
+
+def test_distinct_values_of_alert_and_event_fields(fake_services):
+    for i, (owner, ip) in enumerate([("ana", "10.0.0.1"), ("ana", "10.0.0.2"), ("bo", "10.0.0.1")]):
+        asyncio.run(fake_services.index(index="alerts", id=str(i), document={
+            "id": str(i), "timestamp": "2026-01-01T00:00:00", "title": "t", "description": "d",
+            "severity": "high", "source": "ids", "status": "new", "assigned_to": owner
+        }))
+        asyncio.run(fake_services.index(index="security_events", id=str(i), document={"source_ip": ip}))
+
+    assert client.get("/api/v1/alerts/fields/assigned_to/values").json() == [
+        {"value": "ana", "count": 2}, {"value": "bo", "count": 1}
+    ]
+    assert client.get("/api/v1/metrics/events/fields/source_ip/values?prefix=10.0.0.2").json() == [
+        {"value": "10.0.0.2", "count": 1}
+    ]
+    assert client.get("/api/v1/alerts/fields/title/values").status_code == 400
+
+    # Reassigning drops the snapshot, so the change shows immediately
+    assert client.put("/api/v1/alerts/2", json={"assigned_to": "cy"}).status_code == 200
+    assert client.get("/api/v1/alerts/fields/assigned_to/values").json() == [
+        {"value": "ana", "count": 2}, {"value": "cy", "count": 1}
+    ]
+    alerts.alert_manager.distinct.invalidate()
+    metrics.metrics_service.distinct.invalidate()
+
+def test_saved_search_crud():
+    response = client.post("/api/v1/saved-searches", json={"name": "bad", "query": {"wildcard": {"message": "x*"}}})
+    assert response.status_code == 400
+
+    response = client.post("/api/v1/saved-searches", json={
+        "name": "sshd failures", "query": {"bool": {"must": [{"term": {"source": "sshd"}}, {"match": {"message": "failed"}}]}}
+    })
+    assert response.status_code == 200
+    search_id = response.json()["id"]
+    assert [s["id"] for s in client.get("/api/v1/saved-searches").json()] == [search_id]
+    assert client.delete(f"/api/v1/saved-searches/{search_id}").status_code == 200
+    assert client.get(f"/api/v1/saved-searches/{search_id}").status_code == 404
+
 def test_get_metrics():
     response = client.get("/api/v1/metrics/dashboard")
     assert response.status_code == 200
-    assert "securityScore" in response.json()
\ No newline at end of file
+    assert "severity_distribution" in response.json()
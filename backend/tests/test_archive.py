@@ -0,0 +1,107 @@
+# tests/test_archive.py
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from app.core.instrumentation import REGISTRY
+from app.core.query_dsl import matches
+from app.models.log_entry import LogCreate, LogLevel
+from app.services.log_ingestion import LogIngestionService
+from app.storage.archive import ColdArchive, pushdown
+
+START = datetime(2026, 3, 1)
+
+def _docs(count: int):
+    return [
+        {
+            "id": f"log-{i}",
+            "timestamp": (START + timedelta(minutes=7 * i)).isoformat(),
+            "message": f"event {i} from {'db' if i % 5 == 0 else 'web'}",
+            "level": ["info", "warning", "error"][i % 3],
+            "source": f"source-{i % 4}",
+            "host": f"host-{i % 10}",
+            "processed": i % 2 == 0,
+        }
+        for i in range(count)
+    ]
+
+def _row_groups(result: str) -> float:
+    return REGISTRY.get("siem_archive_row_groups_total").labels(result).value
+
+def test_search_prunes_and_matches_brute_force(tmp_path):
+    docs = _docs(1000)
+    archive = ColdArchive(str(tmp_path), row_group_rows=50)
+    # Two runs so files of the same day overlap in time
+    archive.write("logs", docs[1::2])
+    archive.write("logs", docs[::2])
+    assert sorted(path.parent.name for path in tmp_path.glob("logs/*/*.col"))[0] == "2026-03-01"
+
+    query = {"bool": {"must": [
+        {"term": {"source": "source-1"}},
+        {"terms": {"level": ["warning", "error"]}},
+        {"range": {"timestamp": {"gte": "2026-03-02T00:00:00", "lte": "2026-03-03T12:00:00"}}},
+    ]}}
+    assert pushdown(query).exact
+    expected = sorted((doc for doc in docs if matches(query, doc)), key=lambda doc: doc["timestamp"], reverse=True)
+    skipped = _row_groups("skipped")
+
+    assert archive.search("logs", query, size=5, offset=3) == expected[3:8]
+    assert _row_groups("skipped") > skipped
+    assert [doc for _, doc in archive.scan("logs", query)] == expected
+
+    total, counts = archive.count_by("logs", query, ("level", "processed"))
+    assert total == len(expected)
+    assert counts["level"]["info"] == 0 and sum(counts["level"].values()) == total
+
+    # Clauses with no columnar plan are checked on the documents
+    text = {"bool": {"must": [{"match": {"message": "db"}}], "must_not": [{"term": {"host": "host-0"}}]}}
+    assert not pushdown(text).exact
+    assert archive.search("logs", text, size=3) == [
+        doc for doc in reversed(docs) if matches(text, doc)
+    ][:3]
+    assert archive.search("logs", {"term": {"source": "missing"}}, size=3) == []
+
+@pytest_asyncio.fixture
+async def log_service(fake_es, tmp_path):
+    service = LogIngestionService()
+    service.archive = ColdArchive(str(tmp_path / "archive"), row_group_rows=4)
+    await service.initialize(fake_es)
+    yield service
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_reads_union_hot_and_archived_logs(log_service, fake_es):
+    now = datetime.utcnow()
+    created = await log_service.create_logs_batch([
+        LogCreate(
+            message=f"log {i}",
+            level=LogLevel.ERROR if i % 2 else LogLevel.INFO,
+            source="app",
+            timestamp=now - timedelta(days=i)
+        )
+        for i in range(12)
+    ])
+    await log_service.processing_queue.join()
+
+    assert await log_service.archive_old_logs(now - timedelta(days=5, hours=12)) == 6
+    assert (await fake_es.count(index="logs"))["count"] == 6
+
+    newest_first = [log.id for log in created]
+    page = await log_service.get_logs({"match_all": {}}, limit=4, skip=4)
+    assert [log.id for log in page] == newest_first[4:8]
+    errors = await log_service.get_logs({"bool": {"must": [{"term": {"level": "error"}}]}}, limit=10)
+    assert [log.id for log in errors] == newest_first[1::2]
+
+    statistics = await log_service.get_statistics()
+    assert statistics.total_logs == 12
+    assert statistics.logs_by_level["error"] == 6
+    assert statistics.processing_status == {"processed": 12, "unprocessed": 0}
+
+    # A log left in both tiers by an interrupted archival is returned once
+    await fake_es.index(index="logs", id=created[8].id, document=(await log_service.get_logs(
+        {"ids": {"values": [created[8].id]}}, limit=1
+    ))[0].model_dump(mode="json"))
+    exported = [log["id"] async for log in log_service.export_logs({"match_all": {}}, page_size=2)]
+    assert exported == newest_first
+
+    assert await log_service.delete_old_logs(now - timedelta(days=8, hours=12)) >= 3
+    assert len(await log_service.get_logs({"match_all": {}}, limit=20)) == 9
@@ -0,0 +1,86 @@
+# tests/test_bulk_writer.py
+import asyncio
+import json
+import pytest
+from app.storage.bulk_writer import AdaptiveBulkWriter, DeadLetterStore
+from app.storage.errors import api_error
+from elasticsearch import ApiError
+from benchmarks.fake_elasticsearch import OverloadedElasticsearch
+
+def _docs(count: int, prefix: str = "doc"):
+    return [({"index": {"_index": "logs", "_id": f"{prefix}-{i}"}}, {"message": f"event {i}"}) for i in range(count)]
+
+@pytest.mark.asyncio
+async def test_only_rejected_items_are_retried(fake_es):
+    cluster = OverloadedElasticsearch(fake_es, capacity=30)
+    writer = AdaptiveBulkWriter("test", cluster, initial_batch=100, min_batch=10, retry_base=0.001)
+
+    stored = await writer.write(_docs(100))
+
+    assert all(stored)
+    # 100 first, then only the 70 rejected ones come back, and so on
+    assert cluster.items < 100 + 70 + 40 + 10 + 50
+    assert cluster.rejected == cluster.items - 100
+    assert (await fake_es.count(index="logs"))["count"] == 100
+    assert writer.batch_limit < 100
+    await writer.close()
+
+@pytest.mark.asyncio
+async def test_permanent_failures_are_dead_lettered(fake_es, tmp_path):
+    path = tmp_path / "dead" / "logs.jsonl"
+    cluster = OverloadedElasticsearch(fake_es, failing_ids={"doc-3"})
+    writer = AdaptiveBulkWriter("test", cluster, dead_letters=DeadLetterStore(str(path)), retry_base=0.001)
+
+    stored = await writer.write(_docs(5))
+    await writer.close()
+
+    assert stored == [True, True, True, False, True]
+    assert cluster.items == 5
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(entry["action"]["index"]["_id"], entry["status"], entry["attempts"]) for entry in entries] == [
+        ("doc-3", 400, 0)
+    ]
+    assert entries[0]["source"] == {"message": "event 3"}
+    assert writer.dead_letters.entries()[0]["error"].startswith("mapper_parsing_exception")
+
+class _Flaky:
+    """Fails whole requests a few times, then defers to the fake cluster."""
+
+    def __init__(self, inner, failures):
+        self.inner = inner
+        self.failures = list(failures)
+        self.calls = 0
+
+    async def bulk(self, operations=None, **kwargs):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return await self.inner.bulk(operations=operations, **kwargs)
+
+@pytest.mark.asyncio
+async def test_failed_requests_are_retried_and_give_up_eventually(fake_es):
+    too_many = api_error(ApiError, 429, "es_rejected_execution_exception", "rejected")
+    flaky = _Flaky(fake_es, [ConnectionError("reset"), too_many])
+    writer = AdaptiveBulkWriter("test", flaky, retry_base=0.001, max_retries=3)
+    assert await writer.write(_docs(3)) == [True, True, True]
+    assert flaky.calls == 3
+
+    flaky.failures = [ConnectionError("reset")] * 10
+    assert await writer.write(_docs(2, "lost")) == [False, False]
+    assert [entry["attempts"] for entry in writer.dead_letters.entries()] == [3, 3]
+    await writer.close()
+
+@pytest.mark.asyncio
+async def test_limits_grow_under_backlog_and_halve_once_per_overload(fake_es):
+    cluster = OverloadedElasticsearch(fake_es, capacity=10000, round_trip=0.001)
+    writer = AdaptiveBulkWriter("test", cluster, initial_batch=100, max_concurrency=4, retry_base=0.001)
+
+    await asyncio.gather(*(writer.write(_docs(100, f"burst{i}")) for i in range(30)))
+    grown = writer.batch_limit, writer.concurrency
+    assert grown[0] > 100 and grown[1] > 1
+
+    cluster.capacity = 50
+    await asyncio.gather(*(writer.write(_docs(100, f"overload{i}")) for i in range(4)))
+    assert writer.batch_limit < grown[0]
+    assert (await fake_es.count(index="logs"))["count"] == 3400
+    await writer.close()
@@ -0,0 +1,104 @@
+# tests/test_dashboard.py
+import pytest
+import time
+from datetime import datetime, timedelta
+from app.services.dashboard import DashboardService
+from app.services.alert_manager import AlertManager
+from app.services.log_ingestion import LogIngestionService
+from app.services.threat_detection import ThreatDetectionService
+from benchmarks.fake_elasticsearch import FakeElasticsearch
+from benchmarks.generator import SyntheticData
+
+def buckets(**counts):
+    return {"buckets": [{"key": k, "key_as_string": k, "doc_count": v} for k, v in counts.items()]}
+
+class MsearchClient:
+    def __init__(self):
+        self.msearch_calls = []
+
+    async def search(self, aggs=None, **kwargs):
+        if "values" in aggs:
+            # Top sources are paged from a composite aggregation
+            return {"aggregations": {"values": {"buckets": [{"key": {"value": "10.0.0.1"}, "doc_count": 3}]}}}
+        # Finalizing the security score's closed days finds no events
+        return {"hits": {"hits": []}, "aggregations": {"days": buckets()}}
+
+    async def bulk(self, operations):
+        return {"errors": False, "items": []}
+
+    async def msearch(self, searches):
+        self.msearch_calls.append(searches)
+        today = datetime.utcnow().date().isoformat()
+        events = {
+            "event_types": buckets(network_scan=3),
+            "severity_levels": buckets(high=3),
+            "timeline": buckets(),
+            "avg_threat_score": {"value": 0.5},
+            "threat_types": buckets(network_scan=3),
+            "days": {"buckets": [{
+                "key_as_string": today, "doc_count": 3, "severity": buckets(high=3),
+                "threat_score_sum": {"value": 1.5}, "threat_score_count": {"value": 3},
+            }]},
+        }
+        return {"responses": [
+            {"took": 4, "hits": {"total": {"value": 3}}, "aggregations": events},
+            {"took": 3, "hits": {"total": {"value": 3}}, "aggregations": events},
+            {"took": 2, "hits": {"total": {"value": 3}}, "aggregations": events},
+            {"error": {"type": "index_not_found_exception", "reason": "no such index [logs]"}},
+        ]}
+
+class StaticAlerts(AlertManager):
+    async def get_statistics(self):
+        return {"total_alerts": 1}
+
+@pytest.mark.asyncio
+async def test_overview_is_one_msearch_with_per_panel_timings():
+    client = MsearchClient()
+    threats, logs = ThreatDetectionService(), LogIngestionService()
+    threats.es_client = logs.es_client = client
+    service = DashboardService(threats, logs, StaticAlerts())
+
+    end = datetime.utcnow()
+    overview = await service.get_overview(end - timedelta(hours=24), end)
+
+    assert len(client.msearch_calls) == 1
+    assert [header["index"] for header in client.msearch_calls[0][::2]] == [
+        "security_events", "security_events", "security_events", "logs"
+    ]
+    assert overview["threats"]["top_sources"] == [{"ip": "10.0.0.1", "count": 3}]
+    assert overview["security_score"]["overall_score"] == pytest.approx(20.0)
+    assert overview["security_score"]["threat_score"] == pytest.approx(0.5)
+    assert overview["alerts"] == {"total_alerts": 1}
+    assert overview["logs"] is None
+    assert overview["timings"]["logs"] == {"error": "no such index [logs]"}
+    assert overview["timings"]["metrics"] == {"took_ms": 4}
+
+@pytest.mark.asyncio
+async def test_overview_panels_run_concurrently_on_serial_backends():
+    latency = 0.05
+    client = FakeElasticsearch(latency=latency)
+    threats, logs, alerts = ThreatDetectionService(), LogIngestionService(), AlertManager()
+    for service in (threats, logs, alerts):
+        service.es_client = client
+        await service._ensure_index()
+    operations = []
+    for i, event in enumerate(SyntheticData(seed=3).events(50)):
+        operations.extend([{"index": {"_index": threats.index, "_id": str(i)}}, event])
+    await client.bulk(operations=operations)
+    service = DashboardService(threats, logs, alerts)
+
+    end = datetime.utcnow()
+    # The first overview also finalizes the closed days of the security score
+    await service.get_overview(end - timedelta(hours=24), end)
+    started = time.perf_counter()
+    overview = await service.get_overview(end - timedelta(hours=24), end)
+    elapsed = time.perf_counter() - started
+
+    # Every panel is one round trip, all of them at once
+    assert client.calls["msearch"] == 0
+    assert elapsed < 2 * latency
+    assert all(overview[name] is not None for name in ("metrics", "threats", "security_score", "logs", "alerts"))
+    assert set(overview["timings"]["logs"]) == {"took_ms", "round_trip_ms"}
+    # The same top sources as the threat summary endpoint
+    summary = await threats.get_threat_summary(end - timedelta(hours=24), end)
+    assert overview["threats"]["top_sources"] == summary["top_sources"]
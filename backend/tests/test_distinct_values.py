@@ -0,0 +1,115 @@
+# tests/test_distinct_values.py
+import asyncio
+import pytest
+from bisect import bisect_right
+from app.services.distinct_values import DistinctValues
+from app.services.log_ingestion import LogIngestionService
+from app.services.threat_detection import ThreatDetectionService
+
+class CompositeClient:
+    """Pages one field's sorted values the way a composite aggregation does."""
+    def __init__(self, values):
+        self.values = sorted(values.items())
+        self.keys = [key for key, _ in self.values]
+        self.searches = 0
+
+    async def search(self, index, aggs=None, body=None, **kwargs):
+        self.searches += 1
+        if aggs is None:
+            return {
+                "hits": {"total": {"value": sum(c for _, c in self.values)}},
+                "aggregations": {
+                    "threat_types": {"buckets": []},
+                    "severity_levels": {"buckets": []}
+                }
+            }
+        composite = aggs["values"]["composite"]
+        after = composite.get("after")
+        start = bisect_right(self.keys, after["value"]) if after else 0
+        page = self.values[start:start + composite["size"]]
+        buckets = [{"key": {"value": key}, "doc_count": count} for key, count in page]
+        result = {"buckets": buckets}
+        if buckets:
+            result["after_key"] = buckets[-1]["key"]
+        return {"aggregations": {"values": result}}
+
+@pytest.mark.asyncio
+async def test_lists_every_value_beyond_terms_limit():
+    hosts = {f"host-{i:06d}": 1 for i in range(200000)}
+    client = CompositeClient(hosts)
+    service = LogIngestionService()
+    service.es_client = client
+
+    values = await service.get_distinct_values("source")
+
+    assert len(values) == 200000
+    assert client.searches == 21
+
+@pytest.mark.asyncio
+async def test_prefix_served_from_snapshot():
+    client = CompositeClient({"auth": 3, "auditd": 2, "nginx": 7, "au": 1})
+    service = LogIngestionService()
+    service.es_client = client
+
+    await service.get_unique_sources()
+    assert await service.get_unique_sources("au") == ["au", "auditd", "auth"]
+    assert await service.get_unique_sources("x") == []
+    assert client.searches == 1
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_refreshes_in_background():
+    client = CompositeClient({"a": 1})
+    distinct = DistinctValues(page_size=10, snapshot_ttl=0)
+
+    await distinct.get(client, "logs", "source")
+    client.values.append(("b", 1))
+    client.keys.append("b")
+
+    assert await distinct.get(client, "logs", "source") == [("a", 1)]
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert await distinct.get(client, "logs", "source") == [("a", 1), ("b", 1)]
+
+@pytest.mark.asyncio
+async def test_invalidate_discards_walks_under_way():
+    client = CompositeClient({"a": 1})
+    distinct = DistinctValues(page_size=10)
+    search, started = client.search, asyncio.Event()
+
+    async def slow_search(**kwargs):
+        started.set()
+        await asyncio.sleep(0.01)
+        return await search(**kwargs)
+
+    client.search = slow_search
+    walk = asyncio.create_task(distinct.get(client, "alerts", "assigned_to"))
+    await started.wait()
+    distinct.invalidate("alerts")
+    client.values.append(("b", 1))
+    client.keys.append("b")
+
+    # The walk that started first answers its caller but is not kept
+    await walk
+    assert not distinct.has_snapshot("alerts", "assigned_to")
+    assert await distinct.get(client, "alerts", "assigned_to") == [("a", 1), ("b", 1)]
+
+@pytest.mark.asyncio
+async def test_unknown_field_rejected():
+    service = LogIngestionService()
+    with pytest.raises(ValueError):
+        await service.get_distinct_values("message")
+
+@pytest.mark.asyncio
+async def test_threat_summary_lists_top_sources_by_exact_count():
+    ips = {f"10.0.{i // 256}.{i % 256}": i % 7 + 1 for i in range(500)}
+    service = ThreatDetectionService()
+    service.es_client = CompositeClient(ips)
+    service.distinct.page_size = 100
+
+    summary = await service.get_threat_summary()
+    assert len(summary["top_sources"]) == 10
+    assert {source["count"] for source in summary["top_sources"]} == {7}
+
+    summary = await service.get_threat_summary(top_sources=1000)
+    assert len(summary["top_sources"]) == 500
+    assert summary["top_sources"][0]["count"] == 7
@@ -0,0 +1,97 @@
+# tests/test_embedded_storage.py
+import pytest
+from datetime import datetime, timedelta
+from elasticsearch import ConflictError, NotFoundError
+from app.services.alert_manager import AlertManager
+from app.services.log_ingestion import LogIngestionService
+from app.services.threat_detection import ThreatDetectionService
+from app.services.metrics_cache import MetricsCache
+from app.storage.embedded import EmbeddedBackend
+from benchmarks.fake_elasticsearch import FakeElasticsearch
+from benchmarks.generator import SyntheticData
+from benchmarks.scenarios import seed
+
+NOW = datetime(2024, 6, 1, 12)
+
+async def run_queries(storage):
+    """Service reads over the same seeded data, for comparing backends."""
+    logs = LogIngestionService()
+    threats = ThreatDetectionService()
+    alerts = AlertManager()
+    for service in (logs, threats, alerts):
+        service.es_client = storage
+        await service._ensure_index()
+    threats.cache = MetricsCache(0)
+    data = SyntheticData(seed=7, now=NOW, span=timedelta(days=2))
+    await seed(storage, data, {"logs": 600, "events": 400})
+    for i, alert in enumerate(data.alerts(100)):
+        await storage.index(index="alerts", id=str(i), document=alert.model_dump(mode="json"))
+    return {
+        "errors": [log.id for log in await logs.get_logs({"term": {"level": "error"}}, limit=20, skip=3)],
+        "text": [log.id for log in await logs.get_logs({"match": {"message": "failed login"}}, limit=20)],
+        "statistics": (await logs.get_statistics(NOW - timedelta(hours=12), NOW)).model_dump(),
+        "dashboard": await threats.get_dashboard_metrics(NOW - timedelta(days=1), NOW),
+        "summary": await threats.get_threat_summary(NOW - timedelta(days=1), NOW),
+        "trends": await threats.get_alert_trends("1h", NOW - timedelta(days=1), NOW),
+        "top_threats": await threats.get_top_threats(10, NOW - timedelta(days=1), NOW),
+        "compliance": await threats._compute_compliance(NOW - timedelta(days=2), NOW),
+        "geographic": await threats._compute_geographic(NOW - timedelta(days=2), NOW),
+    }
+
+@pytest.mark.asyncio
+async def test_matches_reference_backend_for_service_queries():
+    expected = await run_queries(FakeElasticsearch())
+    actual = await run_queries(EmbeddedBackend(segment_rows=128))
+
+    for name in expected:
+        assert actual[name] == expected[name], name
+
+@pytest.mark.asyncio
+async def test_updates_and_deletes_tombstone_old_rows():
+    storage = EmbeddedBackend()
+    await storage.index(index="alerts", id="a", document={"status": "new", "timestamp": "2024-01-01T00:00:00"})
+    current = await storage.get(index="alerts", id="a")
+
+    await storage.update(index="alerts", id="a", doc={"status": "closed"}, if_seq_no=current["_seq_no"])
+    with pytest.raises(ConflictError):
+        await storage.update(index="alerts", id="a", doc={"status": "new"}, if_seq_no=current["_seq_no"])
+
+    assert (await storage.count(index="alerts", query={"term": {"status": "new"}}))["count"] == 0
+    assert (await storage.count(index="alerts", query={"term": {"status": "closed"}}))["count"] == 1
+
+    await storage.delete(index="alerts", id="a")
+    assert (await storage.count(index="alerts"))["count"] == 0
+    with pytest.raises(NotFoundError):
+        await storage.get(index="alerts", id="a")
+
+@pytest.mark.asyncio
+async def test_reopens_sealed_segments_and_write_ahead_log(tmp_path):
+    storage = EmbeddedBackend(str(tmp_path), segment_rows=4)
+    await storage.indices.create(index="logs", mappings={"properties": {"message": {"type": "text"}}})
+    await storage.bulk(operations=[
+        op
+        for i in range(10)
+        for op in ({"index": {"_index": "logs", "_id": str(i)}},
+                   {"message": f"event {i}", "level": "error" if i % 2 else "info", "timestamp": "2024-01-01T00:00:00"})
+    ])
+    await storage.delete(index="logs", id="3")
+    await storage.update(index="logs", id="4", doc={"level": "error"})
+    await storage.close()
+
+    reopened = EmbeddedBackend(str(tmp_path))
+    errors = await reopened.search(index="logs", query={"term": {"level": "error"}}, size=20)
+
+    assert sorted(hit["_id"] for hit in errors["hits"]["hits"]) == ["1", "4", "5", "7", "9"]
+    assert (await reopened.count(index="logs", query={"match": {"message": "event"}}))["count"] == 9
+    assert reopened._indices["logs"].types["message"] == "text"
+
+@pytest.mark.asyncio
+async def test_sort_prunes_segments_without_losing_order():
+    storage = EmbeddedBackend(segment_rows=5)
+    for i in range(30):
+        day = 1 + i % 3
+        await storage.index(index="logs", id=str(i), document={"timestamp": f"2024-01-0{day}T00:00:{i:02d}"})
+
+    result = await storage.search(index="logs", size=4, sort=[{"timestamp": {"order": "desc"}}])
+
+    assert [hit["_id"] for hit in result["hits"]["hits"]] == ["29", "26", "23", "20"]
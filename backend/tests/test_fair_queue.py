@@ -0,0 +1,55 @@
+# tests/test_fair_queue.py
+import asyncio
+import pytest
+from app.services.fair_queue import FairQueue, SourcePolicy, THROTTLED, source_category
+
+def by_source(item):
+    return item[0], item[0], ()
+
+def test_sources_map_to_alert_source_categories():
+    assert source_category("firewall") == "firewall"
+    assert source_category("Firewall-edge-01") == "firewall"
+    assert source_category("sshd", ["authentication"]) == "authentication"
+    assert source_category("web-006", ["web"]) is None
+    policy = SourcePolicy({"firewall": 4.0, "sshd": 2.0}, {"application": 10.0}, default_rate=None)
+    assert [policy.weight("firewall-01"), policy.weight("sshd", ["authentication"]), policy.weight("web")] == [4.0, 2.0, 1.0]
+    assert [policy.rate("application-debug"), policy.rate("firewall")] == [10.0, None]
+
+@pytest.mark.asyncio
+async def test_sources_are_served_in_proportion_to_their_weights():
+    queue = FairQueue(by_source, SourcePolicy({"firewall": 3.0}), quantum=10)
+    for i in range(1000):
+        await queue.put(("debug", i))
+    await queue.put(("firewall", 0))
+    # A late source is not stuck behind the flood
+    assert ("firewall", 0) in [await queue.get() for _ in range(11)]
+    for i in range(1, 1000):
+        await queue.put(("firewall", i))
+    served = [(await queue.get())[0] for _ in range(400)]
+    assert served.count("firewall") == 300
+    assert served.count("debug") == 100
+    assert queue.qsize() == 2000 - 411
+
+@pytest.mark.asyncio
+async def test_rate_limited_sources_wait_while_others_are_served():
+    queue = FairQueue(by_source, SourcePolicy(rates={"debug": 20.0}), burst_seconds=0.1)
+    throttled = THROTTLED.labels("debug").value
+    for i in range(5):
+        await queue.put(("debug", i))
+    await queue.put(("auth", 0))
+    assert [await queue.get() for _ in range(3)] == [("debug", 0), ("debug", 1), ("auth", 0)]
+    assert THROTTLED.labels("debug").value == throttled + 1
+    with pytest.raises(asyncio.QueueEmpty):
+        queue.get_nowait()
+    # The next token comes after 1/20 s
+    assert await asyncio.wait_for(queue.get(), timeout=1) == ("debug", 2)
+
+    for _ in range(4):
+        queue.task_done()
+    joined = asyncio.create_task(queue.join())
+    await asyncio.sleep(0)
+    assert not joined.done()
+    for _ in range(2):
+        await queue.get()
+        queue.task_done()
+    await asyncio.wait_for(joined, timeout=1)
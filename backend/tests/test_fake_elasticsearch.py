@@ -0,0 +1,51 @@
+# tests/test_fake_elasticsearch.py
+import pytest
+from elasticsearch import ConflictError, NotFoundError
+
+@pytest.mark.asyncio
+async def test_date_histogram_fills_empty_buckets(fake_es):
+    for i, hour in enumerate(["00", "03"]):
+        await fake_es.index(index="logs", id=str(i), document={"timestamp": f"2024-01-01T{hour}:30:00"})
+    
+    result = await fake_es.search(
+        index="logs",
+        size=0,
+        aggs={"timeline": {"date_histogram": {"field": "timestamp", "calendar_interval": "hour"}}}
+    )
+    
+    counts = [b["doc_count"] for b in result["aggregations"]["timeline"]["buckets"]]
+    assert counts == [1, 0, 0, 1]
+
+@pytest.mark.asyncio
+async def test_update_checks_sequence_number(fake_es):
+    await fake_es.index(index="alerts", id="a", document={"status": "new"})
+    current = await fake_es.get(index="alerts", id="a")
+    
+    await fake_es.update(index="alerts", id="a", doc={"status": "acknowledged"}, if_seq_no=current["_seq_no"])
+    with pytest.raises(ConflictError):
+        await fake_es.update(index="alerts", id="a", doc={"status": "closed"}, if_seq_no=current["_seq_no"])
+    with pytest.raises(NotFoundError):
+        await fake_es.get(index="alerts", id="missing")
+
+@pytest.mark.asyncio
+async def test_bulk_reports_item_errors(fake_es):
+    result = await fake_es.bulk(operations=[
+        {"index": {"_index": "logs", "_id": "1"}}, {"message": "hello"},
+        {"update": {"_index": "logs", "_id": "2"}}, {"doc": {"processed": True}},
+    ])
+    
+    assert result["errors"] is True
+    assert [next(iter(item.values()))["status"] for item in result["items"]] == [201, 404]
+
+@pytest.mark.asyncio
+async def test_ip_range_masks_include_the_last_address(fake_es):
+    for i, ip in enumerate(["10.255.255.255", "172.31.255.255", "172.32.0.0", "127.0.0.1"]):
+        await fake_es.index(index="events", id=str(i), document={"source_ip": ip})
+    
+    result = await fake_es.search(index="events", size=0, aggs={"zones": {"ip_range": {
+        "field": "source_ip",
+        "ranges": [{"key": "private", "mask": "10.0.0.0/8"}, {"mask": "172.16.0.0/12"}]
+    }}})
+    
+    buckets = result["aggregations"]["zones"]["buckets"]
+    assert [(b["key"], b["doc_count"]) for b in buckets] == [("private", 1), ("172.16.0.0/12", 1)]
@@ -0,0 +1,64 @@
+# tests/test_field_extraction.py
+import pytest
+import pytest_asyncio
+from app.models.log_entry import LogCreate, LogLevel
+from app.services.field_extraction import FieldExtractor
+from app.services.log_ingestion import LogIngestionService
+
+def test_formats_are_detected_and_fields_typed():
+    extractor = FieldExtractor()
+    messages = {
+        "firewall": (
+            "Oct 19 06:00:00 fw1 CEF:0|Acme|FW|1.0|100|Connection blocked|5|"
+            "src=10.0.0.1 dst=10.0.0.2 spt=5555 dpt=22 act=blocked suser=bob smith msg=a\\=b"
+        ),
+        "qradar": "LEEF:2.0|IBM|QRadar|1.0|Logon|^|src=192.168.1.1^usrName=alice^action=login^result=Denied",
+        "app": '{"event": {"action": "Login", "outcome": "failure"}, "source": {"ip": "1.2.3.4", "port": 999}}',
+        "auth": 'user=root src="10.1.1.1" port=22 action=login result=failed',
+        "sshd": "Failed password for root from 1.2.3.4 port 22 ssh2",
+    }
+    assert [extractor.extract(source, message) for source, message in messages.items()] == [
+        {"src_ip": "10.0.0.1", "dst_ip": "10.0.0.2", "src_port": 5555, "dst_port": 22, "action": "blocked", "user": "bob smith"},
+        {"src_ip": "192.168.1.1", "user": "alice", "action": "login", "outcome": "failure"},
+        {"action": "login", "outcome": "failure", "src_ip": "1.2.3.4", "src_port": 999},
+        {"user": "root", "src_ip": "10.1.1.1", "dst_port": 22, "action": "login", "outcome": "failure"},
+        {},
+    ]
+    assert {source: plan.format for source, plan in extractor.plans.items()} == {
+        "firewall": "cef", "qradar": "leef", "app": "json", "auth": "kv", "sshd": "text"
+    }
+    # Invalid values are dropped rather than failing the ip and integer mappings
+    assert extractor.extract("auth", "user=eve src=not-an-ip port=99999") == {"user": "eve"}
+
+def test_plans_are_recompiled_when_a_source_changes_format():
+    extractor = FieldExtractor(plan_misses=3)
+    assert extractor.extract("app", "plain start-up message") == {}
+    structured = '{"user": "eve", "action": "logout"}'
+    for _ in range(3):
+        # Fitting no plan, each message is still detected on its own
+        assert extractor.extract("app", structured) == {"user": "eve", "action": "logout"}
+    assert "app" not in extractor.plans
+    extractor.extract("app", structured)
+    assert extractor.plans["app"].format == "json"
+
+@pytest_asyncio.fixture
+async def log_service(fake_es):
+    service = LogIngestionService()
+    await service.initialize(fake_es)
+    yield service
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_detection_uses_extracted_fields(log_service, fake_es):
+    created = await log_service.create_logs_batch([
+        LogCreate(message="action=login outcome=failure user=admin src=203.0.113.9", level=LogLevel.WARNING, source="vpn"),
+        LogCreate(message="action=login outcome=success user=bob src=203.0.113.10", source="vpn"),
+    ])
+    await log_service.processing_queue.join()
+
+    failed, succeeded = [(await fake_es.get(index="logs", id=log.id))["_source"] for log in created]
+    assert failed["fields"] == {"action": "login", "outcome": "failure", "user": "admin", "src_ip": "203.0.113.9"}
+    assert failed["metadata"]["patterns_detected"] == ["authentication_failure"]
+    assert succeeded["metadata"]["patterns_detected"] == []
+    found = await log_service.get_logs({"term": {"fields.user": "admin"}})
+    assert [log.id for log in found] == [created[0].id]
@@ -0,0 +1,98 @@
+# tests/test_hot_window.py
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.core.query_dsl import matches
+from app.models.log_entry import LogCreate, LogLevel
+from app.services.hot_window import HotWindow
+from app.services.log_ingestion import LogIngestionService
+
+def _logs(count, start, step=timedelta(seconds=1)):
+    return [{
+        "id": str(i),
+        "timestamp": start + step * i,
+        "message": f"Failed password for user{i % 7}" if i % 3 == 0 else "Connection closed",
+        "level": "error" if i % 3 == 0 else "info",
+        "source": f"app-{i % 4}",
+        "host": "web-1",
+        "metadata": {},
+        "tags": [],
+        "processed": False,
+    } for i in range(count)]
+
+def test_search_matches_a_scan_newest_first():
+    window = HotWindow(window_seconds=900, segment_seconds=60, max_bytes=1 << 30)
+    now = datetime.utcnow()
+    window.covered_from -= 600_000
+    logs = _logs(500, now - timedelta(minutes=9))
+    window.add(reversed(logs))
+    since = {"range": {"timestamp": {"gte": (now - timedelta(minutes=8)).isoformat()}}}
+    queries = [
+        {"bool": {"must": [{"match_all": {}}, since]}},
+        {"bool": {"must": [{"term": {"source": "app-1"}}, {"term": {"level": LogLevel.ERROR}}, since]}},
+        {"bool": {"must": [since, {"multi_match": {"query": "password user3", "fields": ["message", "host", "source"]}}]}},
+    ]
+    for query in queries:
+        expected = sorted((log for log in logs if matches(query, log)), key=lambda log: log["timestamp"], reverse=True)
+        assert [log["id"] for log in window.search(query, limit=20, skip=5)] == [log["id"] for log in expected[5:25]]
+
+    # Without a lower bound the window answers only when it has enough matches
+    assert len(window.search({"match_all": {}}, limit=50)) == 50
+    assert window.search({"term": {"source": "app-1"}}, limit=500) is None
+    # A newer version of a log replaces it
+    window.add([{**logs[-1], "processed": True}])
+    assert [log["id"] for log in window.search({"term": {"processed": True}}, limit=1)] == [logs[-1]["id"]]
+
+def test_window_slides_and_is_bounded():
+    window = HotWindow(window_seconds=60, segment_seconds=10, max_bytes=1 << 30)
+    now = datetime.utcnow()
+    window.covered_from -= 600_000
+    window.add(_logs(120, now - timedelta(seconds=119)))
+    assert 50 <= len(window) <= 70
+    old = {"range": {"timestamp": {"gte": (now - timedelta(seconds=100)).isoformat()}}}
+    assert window.search(old, limit=100) is None
+    assert len(window.search(old, limit=10)) == 10
+
+    window.max_bytes = window.bytes // 2
+    window.add([])
+    assert window.bytes <= window.max_bytes
+    recent = {"range": {"timestamp": {"gte": (now - timedelta(seconds=5)).isoformat()}}}
+    assert len(window.search(recent, limit=10)) == 6
+
+class _NoSearches:
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def search(self, **kwargs):
+        raise AssertionError("served from storage")
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+@pytest_asyncio.fixture
+async def log_service(fake_es, monkeypatch):
+    # The window is opt-in; a single process both ingests and reads here
+    monkeypatch.setattr(settings, "HOT_WINDOW_SECONDS", 900.0)
+    service = LogIngestionService()
+    await service.initialize(fake_es)
+    yield service
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_recent_logs_are_served_from_the_window(log_service, fake_es):
+    started = datetime.utcnow()
+    await log_service.create_logs_batch([
+        LogCreate(message="Failed password for root", source="sshd", level=LogLevel.WARNING),
+        LogCreate(message="Accepted password for bob", source="sshd"),
+    ])
+    await log_service.processing_queue.join()
+    log_service.es_client = _NoSearches(fake_es)
+    query = {"bool": {"must": [
+        {"term": {"source": "sshd"}},
+        {"match": {"message": "failed"}},
+        {"range": {"timestamp": {"gte": started.isoformat()}}},
+    ]}}
+    found = await log_service.get_logs(query)
+    assert [log.message for log in found] == ["Failed password for root"]
+    assert found[0].processed and "risk_score" in found[0].metadata
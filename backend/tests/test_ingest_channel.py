@@ -0,0 +1,66 @@
+# tests/test_ingest_channel.py
+import asyncio
+import pytest
+import pytest_asyncio
+from app.core.instrumentation import REGISTRY
+from app.core.readiness import StorageNotReadyError
+from app.models.log_entry import LogCreate
+from app.services.ingest_channel import IngestClient, IngestServer
+from app.services.log_ingestion import LogIngestionService
+
+@pytest_asyncio.fixture
+async def ingest_process(tmp_path):
+    """The node's ingestion service behind a channel, not yet connected to storage."""
+    service = LogIngestionService()
+    server = await IngestServer(service, str(tmp_path / "ingest.sock")).start()
+    yield service, server
+    await server.close()
+    await service.close()
+
+@pytest_asyncio.fixture
+async def worker(ingest_process):
+    """An API worker's log service handing logs to the ingestion process."""
+    _, server = ingest_process
+    service = LogIngestionService()
+    service.channel = IngestClient(server.path, max_batch=50, linger=0.005)
+    yield service
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_worker_requests_are_coalesced_into_frames(ingest_process, worker, fake_es):
+    ingestion, _ = ingest_process
+    await ingestion.initialize(fake_es)
+    frames = REGISTRY.get("siem_ingest_channel_frame_logs")
+    before = frames.count
+
+    batches = await asyncio.gather(*(
+        worker.create_logs_batch([LogCreate(message=f"request {i} log {j}", source="web") for j in range(5)])
+        for i in range(20)
+    ))
+    single = await worker.create_log(LogCreate(message="single", source="web"))
+    await ingestion.processing_queue.join()
+
+    assert frames.count - before < 21
+    assert worker.processing_queue.qsize() == 0 and not worker._tasks
+    for created in [batch[0] for batch in batches] + [single]:
+        stored = await fake_es.get(index="logs", id=created.id)
+        assert stored["_source"]["processed"] is True
+
+@pytest.mark.asyncio
+async def test_ingestion_process_buffers_until_storage_is_ready(ingest_process, worker, fake_es):
+    ingestion, _ = ingest_process
+    created = await worker.create_logs_batch([LogCreate(message="early", source="web")])
+    assert fake_es.calls["bulk"] == 0
+
+    await ingestion.initialize(fake_es)
+    await ingestion.processing_queue.join()
+
+    stored = await fake_es.get(index="logs", id=created[0].id)
+    assert stored["_source"]["processed"] is True
+
+@pytest.mark.asyncio
+async def test_unreachable_ingestion_process_is_reported_as_not_ready(tmp_path):
+    client = IngestClient(str(tmp_path / "missing.sock"))
+    with pytest.raises(StorageNotReadyError):
+        await client.submit([{"id": "1", "source": "web"}], 0.0)
+    await client.close()
@@ -0,0 +1,61 @@
+# tests/test_instrumentation.py
+import pytest
+from fastapi.testclient import TestClient
+from app.core.instrumentation import Registry, REGISTRY
+from app.main import app
+from app.storage.instrumented import InstrumentedBackend
+from benchmarks.fake_elasticsearch import FakeElasticsearch
+
+def sample(name: str, text: str) -> float:
+    """Value of one sample line in a rendered exposition."""
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{name} not found")
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels(route="/a").observe(value)
+
+    text = registry.render()
+
+    assert "# TYPE latency_seconds histogram" in text
+    assert sample('latency_seconds_bucket{route="/a",le="0.1"}', text) == 2
+    assert sample('latency_seconds_bucket{route="/a",le="1.0"}', text) == 3
+    assert sample('latency_seconds_bucket{route="/a",le="+Inf"}', text) == 4
+    assert sample('latency_seconds_count{route="/a"}', text) == 4
+    assert sample('latency_seconds_sum{route="/a"}', text) == pytest.approx(3.65)
+
+def test_registering_twice_returns_the_same_metric():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events.")
+
+    assert registry.counter("events_total", "Events.") is counter
+    with pytest.raises(ValueError):
+        registry.histogram("events_total", "Events.")
+
+@pytest.mark.asyncio
+async def test_instrumented_backend_counts_bulk_item_errors():
+    storage = InstrumentedBackend(FakeElasticsearch())
+    errors = REGISTRY.get("siem_storage_bulk_item_errors_total").labels("404")
+    before = errors.value
+
+    await storage.bulk(operations=[
+        {"index": {"_index": "logs", "_id": "1"}}, {"message": "hello"},
+        {"update": {"_index": "logs", "_id": "2"}}, {"doc": {"processed": True}},
+    ])
+
+    assert errors.value == before + 1
+
+def test_internal_metrics_endpoint_reports_route_templates():
+    client = TestClient(app)
+    client.get("/api/v1/alerts/does-not-exist")
+
+    response = client.get("/api/v1/metrics/internal")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'route="/api/v1/alerts/{alert_id}"' in response.text
+    assert "siem_storage_request_seconds" in response.text
@@ -1,16 +1,21 @@
 # tests/test_log_ingestion.py
 import pytest
+import pytest_asyncio
 from datetime import datetime
 from app.services.log_ingestion import LogIngestionService
 from app.models.log_entry import LogCreate, LogLevel
+from app.core.instrumentation import REGISTRY
+from app.services.lineage import STAGES, LineageTracker
+from benchmarks.fake_elasticsearch import OverloadedElasticsearch
 
-@pytest.fixture
-async def log_service():
+@pytest_asyncio.fixture
+async def log_service(fake_es):
     service = LogIngestionService()
-    # Mock elasticsearch client here
-    await service.initialize(None)
-    return service
+    await service.initialize(fake_es)
+    yield service
+    await service.close()
 
+@pytest.mark.asyncio
 async def test_create_log(log_service):
     log_data = LogCreate(
         message="Test log message",
@@ -22,4 +27,71 @@ async def test_create_log(log_service):
     log = await log_service.create_log(log_data)
     assert log is not None
     assert log.message == "Test log message"
-    assert log.level == LogLevel.INFO
\ No newline at end of file
+    assert log.level == LogLevel.INFO
+
+@pytest.mark.asyncio
+async def test_create_logs_batch_is_processed(log_service, fake_es):
+    logs = [
+        LogCreate(message=f"failed login {i}", level=LogLevel.WARNING, source="auth")
+        for i in range(5)
+    ]
+    
+    created = await log_service.create_logs_batch(logs)
+    await log_service.processing_queue.join()
+    
+    assert fake_es.calls["bulk"] == 2
+    stored = await fake_es.get(index="logs", id=created[0].id)
+    assert stored["_source"]["processed"] is True
+    assert stored["_source"]["metadata"]["patterns_detected"] == ["authentication_failure"]
+
+@pytest.mark.asyncio
+async def test_processed_logs_record_lineage(log_service):
+    log_service.lineage.sample_rate = 1.0
+    log_service.lineage.freshness_slo = 0.0
+    end_to_end = REGISTRY.get("siem_ingest_end_to_end_seconds").labels("lineage-test")
+    breaches = REGISTRY.get("siem_ingest_freshness_slo_breaches_total").labels("lineage-test")
+    before = end_to_end.count, breaches.value
+
+    created = await log_service.create_logs_batch(
+        [LogCreate(message=f"event {i}", level=LogLevel.INFO, source="lineage-test") for i in range(3)]
+    )
+    await log_service.processing_queue.join()
+
+    assert (end_to_end.count, breaches.value) == (before[0] + 3, before[1] + 3)
+    traces = log_service.lineage.traces()
+    assert {trace["id"] for trace in traces[:3]} == {log.id for log in created}
+    stamps = list(traces[0]["timestamps"].values())
+    assert list(traces[0]["timestamps"]) == list(STAGES)
+    assert stamps == sorted(stamps)
+    assert traces[0]["end_to_end_seconds"] >= sum(traces[0]["stage_seconds"].values()) - 1e-9
+
+def test_sampled_stage_observations_keep_exact_counts():
+    tracker = LineageTracker(sample_rate=0.0, observations_per_batch=8)
+    store = REGISTRY.get("siem_ingest_stage_seconds").labels("store", "sampled-rare")
+    busy = REGISTRY.get("siem_ingest_stage_seconds").labels("store", "sampled-busy")
+    before = store.count, busy.count
+    for batch in range(16):
+        lineages = [tracker.received("sampled-busy", 0.0) for _ in range(127)] + [tracker.received("sampled-rare", 0.0)]
+        tracker.complete(lineages, 1.0, 1.0, 1.0, 1.0)
+        if batch == 14:
+            assert store.count == before[0]
+    # A sixteenth of an observation per batch: the rare source's one observation stands for its 16 logs
+    assert (store.count - before[0], busy.count - before[1]) == (16, 16 * 127)
+
+@pytest.mark.asyncio
+async def test_rejected_writes_are_retried_until_stored(fake_es):
+    service = LogIngestionService()
+    service.writer.retry_base = 0.001
+    await service.initialize(OverloadedElasticsearch(fake_es, capacity=4))
+    try:
+        created = await service.create_logs_batch(
+            [LogCreate(message=f"failed login {i}", source="auth") for i in range(10)]
+        )
+        await service.processing_queue.join()
+    finally:
+        await service.close()
+
+    assert len(created) == 10
+    for log in created:
+        stored = await fake_es.get(index="logs", id=log.id)
+        assert stored["_source"]["processed"] is True
@@ -0,0 +1,116 @@
+# tests/test_metrics.py
+import asyncio
+import pytest
+from datetime import datetime
+from app.services.threat_detection import ThreatDetectionService
+from app.services.metrics_cache import MetricsCache
+
+class CompositeClient:
+    """Serves composite aggregation pages from fixed key/count lists."""
+    def __init__(self, ips, indicators):
+        self.data = {"source_ip": ("ip", ips), "indicators": ("indicator", indicators)}
+        self.searches = []
+
+    async def search(self, index, aggs, **kwargs):
+        self.searches.append(aggs)
+        response = {}
+        for name, agg in aggs.items():
+            key_name, rows = self.data[name]
+            composite = agg["composite"]
+            after = (composite.get("after") or {}).get(key_name)
+            remaining = [row for row in sorted(rows) if after is None or row[0] > after]
+            page = remaining[:composite["size"]]
+            buckets = [
+                {
+                    "key": {key_name: key},
+                    "doc_count": count,
+                    "max_threat_score": {"value": count / 100},
+                    "event_types": {"buckets": [{"key": "port_scan"}]}
+                }
+                for key, count in page
+            ]
+            response[name] = {"buckets": buckets}
+            if page:
+                response[name]["after_key"] = buckets[-1]["key"]
+        return {"aggregations": response}
+
+class GeoClient:
+    """Answers the geographic search with fixed aggregation results."""
+    def __init__(self):
+        self.searches = []
+
+    async def search(self, index, aggs, **kwargs):
+        self.searches.append(aggs)
+        return {"aggregations": {
+            "countries": {"buckets": [{"key": "US", "doc_count": 5}, {"key": "DE", "doc_count": 2}]},
+            "unlocated": {"doc_count": 3},
+            "tiles": {"buckets": [{"key": "4/3/5", "doc_count": 7}]},
+            "zones": {"buckets": [
+                {"key": "private", "doc_count": 2},
+                {"key": "private", "doc_count": 1},
+                {"key": "private", "doc_count": 0},
+                {"key": "loopback", "doc_count": 1}
+            ]},
+            "with_ip": {"value": 10}
+        }}
+
+def make_service(client, page_size=2):
+    service = ThreatDetectionService()
+    service.es_client = client
+    service.composite_page_size = page_size
+    return service
+
+@pytest.mark.asyncio
+async def test_top_threats_pages_through_every_bucket():
+    ips = [(f"10.0.0.{i}", i) for i in range(1, 8)]
+    indicators = [("bad.example", 5), ("evil.example", 9), ("ok.example", 1)]
+    service = make_service(CompositeClient(ips, indicators))
+
+    result = await service.get_top_threats(limit=3)
+
+    assert [s["ip"] for s in result["sources"]] == ["10.0.0.7", "10.0.0.6", "10.0.0.5"]
+    assert [i["indicator"] for i in result["indicators"]] == ["evil.example", "bad.example", "ok.example"]
+    # 7 ips at 2 per page need 4 requests; indicators stop paging after 2
+    assert len(service.es_client.searches) == 4
+    assert "indicators" not in service.es_client.searches[-1]
+
+@pytest.mark.asyncio
+async def test_top_threats_served_from_cache():
+    service = make_service(CompositeClient([("10.0.0.1", 1)], []))
+    end = datetime(2024, 1, 1, 12, 0, 30)
+
+    first = await service.get_top_threats(end_time=end)
+    second = await service.get_top_threats(end_time=end.replace(second=45))
+
+    assert first is second
+    assert len(service.es_client.searches) == 1
+    assert service.cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_cache_single_flight_and_expiry():
+    cache = MetricsCache(ttl_seconds=0)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    # Concurrent requests share the one computation in flight
+    assert await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5))) == [1] * 5
+    assert len(calls) == 1
+    # With no TTL the result is not kept past its computation
+    assert await cache.get_or_compute("k", compute) == 2
+
+@pytest.mark.asyncio
+async def test_geographic_metrics_place_every_event():
+    service = make_service(GeoClient())
+
+    geo = await service.get_geographic_metrics(datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+    assert geo["by_country"] == {"US": 5, "DE": 2}
+    assert sum(geo["by_country"].values()) + geo["unlocated"] == 10
+    assert geo["locations"] == [{"tile": "4/3/5", "count": 7}]
+    # The private ranges add up; whatever has an IP outside them is public
+    assert geo["network_zones"] == {"private": 3, "loopback": 1, "public": 6}
+    assert len(service.es_client.searches) == 1
@@ -0,0 +1,195 @@
+# tests/test_notifications.py
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from app.models.alert import AlertCreate, AlertSeverity, AlertSource
+from app.services.alert_manager import AlertManager
+from app.services.notifications import NotificationDispatcher, RetryQueue, SmtpSink, SyslogSink, WebhookSink
+from app.core.json import loads
+
+class StubWebhook:
+    """A local webhook receiver answering with ``statuses`` in turn, then 200."""
+
+    def __init__(self, delay: float = 0.0, statuses=()):
+        self.delay = delay
+        self.statuses = list(statuses)
+        self.digests = []
+        self.in_flight = self.max_in_flight = 0
+
+    async def handle(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            status = self.statuses.pop(0) if self.statuses else 200
+            if status == 200:
+                self.digests.append(loads(await request.read()))
+            return web.Response(status=status)
+        finally:
+            self.in_flight -= 1
+
+@pytest_asyncio.fixture
+async def serve():
+    runners = []
+
+    async def start(stub):
+        app = web.Application()
+        app.router.add_post("/hook", stub.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        runners.append(runner)
+        return f"http://127.0.0.1:{runner.addresses[0][1]}/hook"
+
+    yield start
+    for runner in runners:
+        await runner.cleanup()
+
+def alert(title: str) -> AlertCreate:
+    return AlertCreate(title=title, description="d", severity=AlertSeverity.HIGH, source=AlertSource.IDS)
+
+@pytest.mark.asyncio
+async def test_alerts_are_digested_without_waiting_on_slow_receivers(fake_es, serve):
+    stub = StubWebhook(delay=0.3)
+    manager = AlertManager()
+    manager.notifier = NotificationDispatcher(
+        [WebhookSink("soc", await serve(stub), concurrency=1)], window=0.05, max_alerts=2
+    )
+    await manager.initialize(fake_es)
+
+    started = time.perf_counter()
+    for i in range(5):
+        await manager.create_alert(alert(f"alert {i}"))
+    assert time.perf_counter() - started < 0.2
+
+    await manager.close()
+    # Two full digests at once, the last after the window, one in delivery at a time
+    assert [digest["count"] for digest in stub.digests] == [2, 2, 1]
+    assert [a["title"] for digest in stub.digests for a in digest["alerts"]] == [f"alert {i}" for i in range(5)]
+    assert stub.max_in_flight == 1
+
+@pytest.mark.asyncio
+async def test_failed_digests_are_retried_from_the_persistent_queue(serve, tmp_path):
+    stub = StubWebhook(statuses=[503, 503])
+    url = await serve(stub)
+    path = str(tmp_path / "retries.jsonl")
+    first = NotificationDispatcher([WebhookSink("soc", url)], window=0.01, retry_path=path, retry_base=0.2)
+    await first.initialize()
+    first.notify({"id": "a1", "title": "kept"})
+    while not first.retries:
+        await asyncio.sleep(0.01)
+    await first.close()
+
+    # A restart picks the digest up again; the 503s back off until it goes through
+    second = NotificationDispatcher([WebhookSink("soc", url)], retry_path=path, retry_base=0.01)
+    await second.initialize()
+    assert len(second.retries) == 1
+    for _ in range(100):
+        if stub.digests:
+            break
+        await asyncio.sleep(0.02)
+    await second.close()
+    assert [a["title"] for a in stub.digests[0]["alerts"]] == ["kept"]
+    assert not stub.statuses
+
+    reloaded = RetryQueue(path)
+    reloaded.load()
+    assert len(reloaded) == 0
+
+    rejected = NotificationDispatcher([WebhookSink("soc", url)], window=0.01)
+    await rejected.initialize()
+    stub.statuses = [400]
+    rejected.notify({"id": "a2", "title": "bad"})
+    await asyncio.sleep(0.2)
+    await rejected.close()
+    assert len(rejected.retries) == 0
+    assert rejected.dead_letters.entries()[0]["source"] == [{"id": "a2", "title": "bad"}]
+
+def test_processes_sharing_a_retry_path_write_their_own_files(tmp_path):
+    path = str(tmp_path / "retries.jsonl")
+    first, second = RetryQueue(path), RetryQueue(path)
+    first.load()
+    second.load()
+    assert (first.path, second.path) == (path, str(tmp_path / "retries.1.jsonl"))
+    first.push({"id": "a", "due_at": 1.0})
+    second.push({"id": "b", "due_at": 2.0})
+    second.push({"id": "c", "due_at": 3.0})
+    second.done("c")
+    first.close()
+
+    # A restart takes over the free slots, and the file of a process that is gone
+    second.close()
+    restarted = RetryQueue(path)
+    restarted.load()
+    assert restarted.path == path
+    assert [entry["id"] for entry in restarted.due(10.0)] == ["a", "b"]
+    assert not (tmp_path / "retries.1.jsonl").exists()
+    restarted.close()
+
+    # Digests of a running process are left to it
+    running, starting = RetryQueue(path), RetryQueue(path)
+    running.load()
+    running.push({"id": "d", "due_at": 4.0})
+    starting.load()
+    assert starting.path != running.path and "d" not in starting.entries
+    running.close()
+    starting.close()
+
+@pytest.mark.asyncio
+async def test_smtp_and_syslog_sinks_deliver_to_local_servers():
+    mail = []
+
+    async def smtp(reader, writer):
+        writer.write(b"220 stub\r\n")
+        data = None
+        while line := await reader.readline():
+            if data is not None:
+                if line == b".\r\n":
+                    mail.append(b"".join(data))
+                    data = None
+                    writer.write(b"250 queued\r\n")
+                else:
+                    data.append(line)
+            elif line.upper().startswith(b"DATA"):
+                data = []
+                writer.write(b"354 go ahead\r\n")
+            elif line.upper().startswith(b"QUIT"):
+                writer.write(b"221 bye\r\n")
+                break
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        writer.close()
+
+    class Syslog(asyncio.DatagramProtocol):
+        received = []
+
+        def datagram_received(self, data, addr):
+            self.received.append(data)
+
+    smtp_server = await asyncio.start_server(smtp, "127.0.0.1", 0)
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(Syslog, local_addr=("127.0.0.1", 0))
+    dispatcher = NotificationDispatcher([
+        SmtpSink("mail", "127.0.0.1", ["soc@example.com"], port=smtp_server.sockets[0].getsockname()[1]),
+        SyslogSink("syslog", "127.0.0.1", port=transport.get_extra_info("sockname")[1])
+    ], window=0.01)
+    await dispatcher.initialize()
+    dispatcher.notify({"id": "a1", "title": "Port scan", "severity": "critical", "source": "ids"})
+    dispatcher.notify({"id": "a2", "title": "Login burst", "severity": "low", "source": "authentication"})
+    for _ in range(100):
+        if mail and len(Syslog.received) == 2:
+            break
+        await asyncio.sleep(0.02)
+    await dispatcher.close()
+    smtp_server.close()
+    transport.close()
+
+    assert len(mail) == 1
+    assert b"Subject: [SIEM] 2 new alerts" in mail[0]
+    assert b"Port scan" in mail[0] and b"Login burst" in mail[0]
+    # local0: critical is <130>, low is <133>
+    assert [m.split(b" ", 1)[0] for m in Syslog.received] == [b"<130>1", b"<133>1"]
+    assert loads(Syslog.received[0].split(b" - alert - ", 1)[1])["title"] == "Port scan"
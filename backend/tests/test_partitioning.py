@@ -0,0 +1,101 @@
+# tests/test_partitioning.py
+from collections import Counter
+import pytest
+import pytest_asyncio
+from app.models.log_entry import LogCreate
+from app.services.correlation import KeyWindows
+from app.services.ingest_channel import IngestClient, IngestServer
+from app.services.log_ingestion import LogIngestionService
+from app.services.partitioning import ChannelTransport, HashRing, LocalTransport, PartitionRouter
+
+def test_ring_balances_keys_and_moves_few_on_join():
+    keys = [f"host-{i}" for i in range(20000)]
+    ring = HashRing([f"w{i}" for i in range(8)], vnodes=256)
+    before = {key: ring.node_for(key) for key in keys}
+    load = Counter(before.values())
+    assert max(load.values()) / (len(keys) / 8) < 1.3
+
+    ring.add("w8")
+    moved = [key for key in keys if ring.node_for(key) != before[key]]
+    assert all(ring.node_for(key) == "w8" for key in moved)
+    assert len(moved) < len(keys) / 9 * 1.4
+
+def test_windows_handed_off_keep_counting():
+    old = KeyWindows(300, {"authentication_failure": 3})
+    new = KeyWindows(300, {"authentication_failure": 3})
+    assert old.observe("db-1", 100.0, ["authentication_failure"]) == []
+    assert old.observe("db-1", 101.0, ["authentication_failure", "warning_flag"]) == []
+
+    new.load(old.export(["db-1"]))
+    assert old.keys() == []
+    assert new.observe("db-1", 102.0, ["authentication_failure"]) == ["repeated_authentication_failure"]
+    # Events that left the window no longer count
+    assert new.observe("db-1", 500.0, ["authentication_failure"]) == []
+
+@pytest_asyncio.fixture
+async def workers(fake_es):
+    services = {}
+    for name in ("w0", "w1", "w2"):
+        services[name] = LogIngestionService()
+        await services[name].initialize(fake_es)
+    yield services
+    for service in services.values():
+        await service.close()
+
+def _moving_host(to: str) -> str:
+    """A host owned by another worker until ``to`` joins."""
+    before, after = HashRing(["w0", "w1"]), HashRing(["w0", "w1", to])
+    return next(
+        f"host-{i}" for i in range(1000)
+        if after.node_for(f"host-{i}") == to and before.node_for(f"host-{i}") != to
+    )
+
+@pytest.mark.asyncio
+async def test_router_keeps_correlating_across_rebalance(workers, fake_es):
+    front = LogIngestionService()
+    router = PartitionRouter(LocalTransport(workers), ["w0", "w1"], front.partition_key)
+    front.channel = router
+    host = _moving_host("w2")
+    owner = router.ring.node_for(host)
+
+    failures = [LogCreate(message="Failed login for admin", source="sshd", host=host) for _ in range(5)]
+    await front.create_logs_batch(failures[:3])
+    await front.create_logs_batch([LogCreate(message=f"ok {i}", source="web", host=f"web-{i}") for i in range(20)])
+    await router.add_worker("w2")
+    assert host not in workers[owner].windows.keys()
+    assert host in workers["w2"].windows.keys()
+
+    created = await front.create_logs_batch(failures[3:])
+    await workers["w2"].processing_queue.join()
+    assert front.processing_queue.qsize() == 0
+    last = (await fake_es.get(index="logs", id=created[-1].id))["_source"]
+    assert "repeated_authentication_failure" in last["metadata"]["patterns_detected"]
+    earlier = (await fake_es.get(index="logs", id=created[0].id))["_source"]
+    assert "repeated_authentication_failure" not in earlier["metadata"]["patterns_detected"]
+
+    await router.remove_worker("w2")
+    assert host not in workers["w2"].windows.keys()
+    assert host in workers[router.ring.node_for(host)].windows.keys()
+
+@pytest.mark.asyncio
+async def test_channel_transport_rebalances_ingestion_processes(workers, tmp_path):
+    servers = {
+        name: await IngestServer(service, str(tmp_path / f"{name}.sock")).start()
+        for name, service in workers.items()
+    }
+    transport = ChannelTransport({name: IngestClient(server.path, linger=0.001) for name, server in servers.items()})
+    router = PartitionRouter(transport, ["w0", "w1"], lambda log: log["host"])
+    front = LogIngestionService()
+    front.channel = router
+    host = _moving_host("w2")
+    try:
+        await front.create_logs_batch(
+            [LogCreate(message="Failed login for root", source="sshd", host=host) for _ in range(2)]
+        )
+        await router.add_worker("w2")
+        assert host in workers["w2"].windows.keys()
+        assert sum(len(state) for state in workers["w2"].windows.export([host]).values()) == 2
+    finally:
+        await router.close()
+        for server in servers.values():
+            await server.close()
@@ -0,0 +1,78 @@
+# tests/test_profiler.py
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.profiler import Profile, SamplingProfiler, profile_process
+from app.core.security import create_access_token
+from app.main import app
+from app.services.log_ingestion import LogIngestionService
+
+def busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+@pytest.mark.asyncio
+async def test_process_profile_sees_the_parked_ingest_task(fake_es):
+    service = LogIngestionService()
+    await service.initialize(fake_es)
+    try:
+        profile = await profile_process(0.1, 0.005, 0.05)
+    finally:
+        await service.close()
+
+    collapsed = profile.collapsed()
+    tasks = [line for line in collapsed.splitlines() if line.startswith("asyncio tasks;")]
+    assert any("LogIngestionService._process_queue" in line and "[awaiting Future]" in line for line in tasks)
+    assert any("Queue.get" in line for line in tasks)
+    assert any(line.startswith("thread MainThread;") for line in collapsed.splitlines())
+
+def test_collapsed_and_speedscope_formats():
+    profile = Profile(0.01)
+    outer, inner = ("main", "app.py", 1), ("work", "app.py", 7)
+    profile.add("thread MainThread", (outer, inner))
+    profile.add("thread MainThread", (outer, inner))
+    profile.add("thread MainThread", (outer,))
+
+    assert profile.collapsed().splitlines() == [
+        "thread MainThread;main (app.py:1);work (app.py:7) 2",
+        "thread MainThread;main (app.py:1) 1",
+    ]
+    document = profile.speedscope()
+    assert document["shared"]["frames"] == [
+        {"name": "main", "file": "app.py", "line": 1},
+        {"name": "work", "file": "app.py", "line": 7},
+    ]
+    [track] = document["profiles"]
+    assert track["samples"] == [[0, 1], [0]]
+    assert track["weights"] == [0.02, 0.01]
+
+def test_sampler_stays_within_its_overhead_budget():
+    profiler = SamplingProfiler(interval=0.001, max_overhead=0.01).start()
+    busy(0.3)
+    profile = profiler.stop()
+
+    assert profile.samples > 0
+    assert profile.overhead <= 0.02
+    assert "busy" in profile.collapsed()
+
+def test_profile_endpoints_require_an_admin(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_USERNAMES", ["root"])
+    client = TestClient(app)
+    admin = {"Authorization": f"Bearer {create_access_token('root')}"}
+    other = {"Authorization": f"Bearer {create_access_token('analyst')}"}
+
+    assert client.post("/api/v1/admin/profile?seconds=0.05").status_code == 401
+    assert client.post("/api/v1/admin/profile?seconds=0.05", headers=other).status_code == 403
+    response = client.post("/api/v1/admin/profile?seconds=0.05&format=speedscope", headers=admin)
+    assert response.status_code == 200
+    assert response.json()["summary"]["samples"] > 0
+
+    # ?profile=1 is ignored for non-admins and returns the request's profile for admins
+    assert client.get("/?profile=1", headers=other).json()["status"] == "healthy"
+    response = client.get("/?profile=1&profile_format=collapsed", headers=admin)
+    assert response.status_code == 200
+    assert response.headers["x-profiled-status"] == "200"
+    assert response.headers["content-type"].startswith("text/plain")
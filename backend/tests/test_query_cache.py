@@ -0,0 +1,124 @@
+# tests/test_query_cache.py
+import time
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from app.models.alert import AlertCreate, AlertSeverity, AlertStatus, AlertUpdate
+from app.models.log_entry import LogCreate, LogLevel
+from app.services.alert_manager import AlertManager
+from app.services.log_ingestion import LogIngestionService
+from app.services.query_cache import QueryCache, normalize_query, query_key
+
+def test_equivalent_queries_share_a_key():
+    a = {"bool": {"must": [
+        {"match_all": {}},
+        {"term": {"level": LogLevel.ERROR}},
+        {"term": {"source": "sshd"}},
+    ]}}
+    b = {"bool": {"must": [{"term": {"source": "sshd"}}, {"term": {"level": "error"}}]}}
+    assert query_key("logs", a, skip=0) == query_key("logs", b, skip=0)
+    assert query_key("logs", a, skip=0) != query_key("logs", a, skip=50)
+    assert normalize_query({"bool": {"must": [{"match_all": {}}]}}) == {"match_all": {}}
+    # Without its must clause a should clause would become required
+    optional = {"bool": {"must": [{"match_all": {}}], "should": [{"term": {"level": "error"}}]}}
+    assert normalize_query(optional) == optional
+    # A repeated should clause counts twice towards minimum_should_match
+    counted = {"bool": {"should": [{"term": {"level": "error"}}] * 2, "minimum_should_match": 2}}
+    distinct = {"bool": {"should": [{"term": {"level": "error"}}], "minimum_should_match": 2}}
+    assert query_key("logs", counted) != query_key("logs", distinct)
+    assert query_key("logs", {"bool": {"should": [{"term": {"level": "error"}}] * 2}}) == query_key(
+        "logs", {"bool": {"should": [{"term": {"level": "error"}}]}}
+    )
+
+@pytest.mark.asyncio
+async def test_ttl_follows_the_watermark_and_size_is_bounded():
+    cache = QueryCache(max_bytes=100, open_ttl=2, sealed_ttl=3600, watermark_lag=300)
+    old = {"range": {"timestamp": {"lte": (datetime.utcnow() - timedelta(days=1)).isoformat()}}}
+    recent = {"range": {"timestamp": {"gte": (datetime.utcnow() - timedelta(days=1)).isoformat()}}}
+
+    async def result(size):
+        return "rows", size
+
+    await cache.get_or_compute(None, "old", "logs", old, lambda: result(40))
+    await cache.get_or_compute(None, "recent", "logs", recent, lambda: result(40))
+    assert cache._entries["old"].expires_at - time.monotonic() > 3000
+    assert cache._entries["recent"].expires_at - time.monotonic() < 3
+
+    assert cache.get("old") == (True, "rows")
+    await cache.get_or_compute(None, "third", "logs", old, lambda: result(40))
+    assert list(cache._entries) == ["old", "third"] and cache.bytes == 80
+
+@pytest_asyncio.fixture
+async def log_service(fake_es):
+    service = LogIngestionService()
+    await service.initialize(fake_es)
+    yield service
+    await service.close()
+
+class _CountingSearches:
+    def __init__(self, inner):
+        self.inner = inner
+        self.searches = 0
+
+    async def search(self, **kwargs):
+        self.searches += 1
+        return await self.inner.search(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+@pytest.mark.asyncio
+async def test_log_writes_invalidate_only_ranges_they_fall_in(log_service, fake_es):
+    storage = _CountingSearches(fake_es)
+    log_service.es_client = storage
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    await log_service.create_logs_batch([LogCreate(message="old", source="app", timestamp=week_ago)])
+    await log_service.processing_queue.join()
+
+    history = {"range": {"timestamp": {"lte": (week_ago + timedelta(hours=1)).isoformat()}}}
+    assert len(await log_service.get_logs(history)) == 1
+    assert len(await log_service.get_logs(history)) == 1
+    assert storage.searches == 1
+
+    await log_service.create_logs_batch([LogCreate(message="now", source="app")])
+    await log_service.processing_queue.join()
+    await log_service.get_logs(history)
+    assert storage.searches == 1
+
+    # A late log inside the cached range is seen at once
+    await log_service.create_logs_batch([LogCreate(message="late", source="app", timestamp=week_ago)])
+    assert len(await log_service.get_logs(history)) == 2
+    assert storage.searches == 2
+
+@pytest.mark.asyncio
+async def test_alert_updates_invalidate_listings(fake_es):
+    manager = AlertManager()
+    await manager.initialize(fake_es)
+    try:
+        alert = await manager.create_alert(AlertCreate(
+            title="Brute force", description="Repeated failures", severity=AlertSeverity.HIGH, source="authentication"
+        ))
+        query = {"term": {"status": AlertStatus.NEW.value}}
+        assert [a.id for a in await manager.get_alerts(query)] == [alert.id]
+        assert manager.query_cache.hits == 0
+
+        await manager.get_alerts(query)
+        assert manager.query_cache.hits == 1
+        await manager.update_alert(alert.id, AlertUpdate(status=AlertStatus.ACKNOWLEDGED))
+        assert await manager.get_alerts(query) == []
+    finally:
+        await manager.close()
+
+@pytest.mark.asyncio
+async def test_alert_listings_are_never_sealed(fake_es):
+    manager = AlertManager()
+    assert manager.query_cache.sealed_ttl == manager.query_cache.open_ttl
+    await manager.initialize(fake_es)
+    try:
+        old = {"range": {"timestamp": {"lte": (datetime.utcnow() - timedelta(days=1)).isoformat()}}}
+        await manager.get_alerts(old)
+        entry = next(iter(manager.query_cache._entries.values()))
+        # Another worker may change an old alert's status at any time
+        assert entry.expires_at <= time.monotonic() + manager.query_cache.open_ttl
+    finally:
+        await manager.close()
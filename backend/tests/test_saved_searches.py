@@ -0,0 +1,130 @@
+# tests/test_saved_searches.py
+import random
+import pytest
+import pytest_asyncio
+from app.core.query_dsl import matches
+from app.models.alert import AlertSeverity
+from app.models.log_entry import LogCreate, LogLevel
+from app.models.saved_search import SavedSearchAction, SavedSearchCreate
+from app.services.alert_manager import AlertManager
+from app.services.log_ingestion import LogIngestionService
+from app.services.percolator import Percolator
+from app.services.saved_searches import SavedSearchService
+
+HOSTS = [f"host-{i}" for i in range(50)]
+WORDS = ["failed", "password", "accepted", "connection", "closed", "denied", "reset"]
+
+def _query(i: int):
+    host = {"term": {"host": HOSTS[i % len(HOSTS)]}}
+    if i % 3 == 0:
+        return {"bool": {"must": [host, {"match": {"message": WORDS[i % len(WORDS)]}}]}}
+    if i % 3 == 1:
+        return {"bool": {"filter": [host, {"terms": {"level": ["error", "critical"]}}]}}
+    return {"bool": {"must": [host], "must_not": [{"term": {"source": "cron"}}]}}
+
+def _log(rng: random.Random):
+    return {
+        "id": str(rng.random()),
+        "host": rng.choice(HOSTS),
+        "source": rng.choice(["sshd", "cron", "nginx"]),
+        "level": rng.choice(list(LogLevel)).value,
+        "message": " ".join(rng.sample(WORDS, 3)),
+    }
+
+def test_percolator_checks_only_candidate_queries():
+    rng = random.Random(7)
+    logs = [_log(rng) for _ in range(200)]
+    checked = {}
+    for count in (50, 500):
+        percolator = Percolator()
+        queries = {str(i): _query(i) for i in range(count)}
+        for query_id, query in queries.items():
+            percolator.add(query_id, query)
+        found, checked[count] = percolator.percolate_many(logs)
+        for log, ids in zip(logs, found):
+            assert sorted(ids) == sorted(i for i, q in queries.items() if matches(q, log))
+    # A log is checked against the queries for its host, not against all of them
+    assert checked[500] < 10 * checked[50] * 1.2
+    assert checked[500] / len(logs) < 500 / len(HOSTS) * 1.5
+
+    percolator.add("range", {"range": {"timestamp": {"gte": "2026-01-01"}}})
+    assert "range" in percolator.candidates(logs[0])
+    percolator.remove("range")
+    assert "range" not in percolator.candidates(logs[0])
+
+def test_percolator_posts_queries_under_pairs_of_anchor_keys():
+    rng = random.Random(11)
+    logs = [_log(rng) for _ in range(200)]
+    queries = {str(i): _query(i) for i in range(300)}
+    # Anchors sharing a key, and a third anchor left to check
+    queries["shared"] = {"bool": {"must": [{"term": {"host": "host-1"}}, {"terms": {"host": ["host-1", "host-2"]}}]}}
+    queries["three"] = {"bool": {"must": [
+        {"term": {"host": "host-3"}}, {"term": {"source": "sshd"}}, {"match": {"message": "failed"}}
+    ]}}
+    percolator = Percolator()
+    for query_id, query in queries.items():
+        percolator.add(query_id, query)
+    found, _ = percolator.percolate_many(logs)
+    for log, ids in zip(logs, found):
+        assert sorted(ids) == sorted(i for i, q in queries.items() if matches(q, log))
+    # Two-anchor queries are found by the pair of keys: only matches are checked
+    two = [i for i in queries if i.isdigit() and int(i) % 3 != 2]
+    assert all(set(percolator.candidates(log)) & set(two) <= set(ids) for log, ids in zip(logs, found))
+
+    for query_id in queries:
+        percolator.remove(query_id)
+    assert not percolator._postings and not percolator._load and not percolator._fields
+
+def test_percolator_rejects_unsupported_clauses():
+    with pytest.raises(ValueError):
+        Percolator().add("q", {"bool": {"must": [{"script": {"source": "true"}}]}})
+
+@pytest_asyncio.fixture
+async def services(fake_es):
+    manager = AlertManager()
+    searches = SavedSearchService()
+    searches.refresh_interval = 0
+    searches.alert_manager = manager
+    log_service = LogIngestionService()
+    log_service.saved_searches = searches
+    for service in (manager, searches, log_service):
+        await service.initialize(fake_es)
+    yield log_service, searches, manager
+    for service in (log_service, searches, manager):
+        await service.close()
+
+@pytest.mark.asyncio
+async def test_ingested_logs_notify_and_alert(services, fake_es):
+    log_service, searches, manager = services
+    notify = await searches.create_search(SavedSearchCreate(
+        name="nginx errors", query={"bool": {"filter": [{"term": {"source": "nginx"}}, {"term": {"level": "error"}}]}}
+    ))
+    alert = await searches.create_search(SavedSearchCreate(
+        name="ssh failures",
+        query={"bool": {"must": [{"term": {"source": "sshd"}}, {"match": {"message": {"query": "failed password", "operator": "and"}}}]}},
+        action=SavedSearchAction.ALERT,
+        severity=AlertSeverity.HIGH
+    ))
+
+    await log_service.create_logs_batch([
+        LogCreate(message="Failed password for root", source="sshd", level=LogLevel.WARNING),
+        LogCreate(message="failed password for admin", source="sshd", level=LogLevel.WARNING),
+        LogCreate(message="upstream timed out", source="nginx", level=LogLevel.ERROR),
+        LogCreate(message="Accepted password for bob", source="sshd"),
+    ])
+    await log_service.processing_queue.join()
+
+    by_search = {n.search_id: n for n in searches.get_notifications()}
+    assert by_search[alert.id].match_count == 2
+    assert by_search[notify.id].match_count == 1
+    alerts = await manager.get_alerts({"match_all": {}})
+    assert [(a.title, a.severity) for a in alerts] == [("Saved search matched: ssh failures", AlertSeverity.HIGH)]
+
+    # Another process picks up the saved searches from storage
+    other = SavedSearchService()
+    other.refresh_interval = 0
+    await other.initialize(fake_es)
+    assert len(other.percolator) == 2
+    assert await searches.delete_search(notify.id)
+    await other.reload()
+    assert list(other.percolator.queries) == [alert.id]
@@ -7,35 +7,37 @@ from app.models.alert import AlertCreate, AlertSeverity
 from datetime import datetime
 
 @pytest.mark.asyncio
-async def test_alert_manager():
+async def test_alert_manager(fake_es):
     manager = AlertManager()
-    await manager.initialize(None)  # Mock ES client for testing
+    await manager.initialize(fake_es)
     
     alert = await manager.create_alert(
         AlertCreate(
             title="Test Alert",
             description="Test Description",
             severity=AlertSeverity.HIGH,
-            source="test"
+            source="custom"
         )
     )
     assert alert is not None
     assert alert.title == "Test Alert"
+    await manager.close()
 
 @pytest.mark.asyncio
-async def test_log_ingestion():
+async def test_log_ingestion(fake_es):
     service = LogIngestionService()
-    await service.initialize(None)  # Mock ES client for testing
+    await service.initialize(fake_es)
     
     stats = await service.get_statistics()
     assert stats is not None
-    assert "total_logs" in stats
+    assert stats.total_logs == 0
+    await service.close()
 
 @pytest.mark.asyncio
-async def test_threat_detection():
+async def test_threat_detection(fake_es):
     service = ThreatDetectionService()
-    await service.initialize(None)  # Mock ES client for testing
+    await service.initialize(fake_es)
     
     score = await service.calculate_security_score()
     assert score is not None
-    assert 0 <= score["overall_score"] <= 100
\ No newline at end of file
+    assert 0 <= score["overall_score"] <= 100
@@ -0,0 +1,91 @@
+# tests/test_startup.py
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.readiness import Readiness, bootstrap_storage, readiness
+from app.main import app
+from app.models.log_entry import LogCreate
+from app.services.log_ingestion import LogIngestionService
+from app.storage.mappings import INDEX_MAPPINGS
+from benchmarks.fake_elasticsearch import FakeElasticsearch
+
+class FlakyStorage(FakeElasticsearch):
+    """Fails its first pings, like elasticsearch still starting up."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    async def ping(self, **kwargs):
+        self.failures -= 1
+        return self.failures < 0
+
+class CountingService:
+    def __init__(self):
+        self.initialized = 0
+
+    async def initialize(self, es_client):
+        self.initialized += 1
+
+@pytest.fixture
+def restore_readiness():
+    yield
+    readiness.state = Readiness.IDLE
+
+@pytest.mark.asyncio
+async def test_bootstrap_retries_until_storage_answers():
+    state = Readiness()
+    state.begin()
+    storage = FlakyStorage(failures=2)
+    service = CountingService()
+
+    connected = await bootstrap_storage(state, lambda: storage, [service], retry_initial=0.001)
+
+    assert connected is storage
+    assert state.ready and state.attempts == 3
+    assert service.initialized == 1
+    for index in INDEX_MAPPINGS:
+        assert await storage.indices.exists(index=index)
+
+@pytest.mark.asyncio
+async def test_logs_are_buffered_until_storage_is_ready(fake_es):
+    service = LogIngestionService()
+    service.startup_buffer_size = 3
+    created = await service.create_logs_batch([LogCreate(message=f"early {i}", source="boot") for i in range(3)])
+    assert fake_es.calls["bulk"] == 0
+
+    await service.initialize(fake_es)
+    await service.processing_queue.join()
+    await service.close()
+
+    stored = await fake_es.get(index="logs", id=created[0].id)
+    assert stored["_source"]["processed"] is True
+
+def test_requests_needing_storage_wait_for_readiness(restore_readiness):
+    readiness.begin()
+    client = TestClient(app)
+
+    assert client.get("/").status_code == 200
+    assert client.get("/ready").status_code == 503
+    response = client.get("/api/v1/alerts")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert client.get("/api/v1/metrics/internal").status_code == 200
+
+def test_startup_returns_before_storage_is_connected(monkeypatch, restore_readiness):
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "embedded")
+    monkeypatch.setattr(settings, "EMBEDDED_STORAGE_PATH", None)
+
+    started = time.perf_counter()
+    with TestClient(app) as client:
+        startup_seconds = time.perf_counter() - started
+        deadline = time.monotonic() + 5
+        while client.get("/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        response = client.get("/ready")
+
+    assert startup_seconds < 1.0
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
@@ -1,17 +1,57 @@
 # tests/test_threat_detection.py
 import pytest
+import pytest_asyncio
 from datetime import datetime, timedelta
 from app.services.threat_detection import ThreatDetectionService
+from benchmarks.generator import SyntheticData
 
-@pytest.fixture
-async def threat_service():
+@pytest_asyncio.fixture
+async def threat_service(fake_es):
     service = ThreatDetectionService()
-    # Mock elasticsearch client here
-    await service.initialize(None)
+    await service.initialize(fake_es)
+    operations = []
+    for i, event in enumerate(SyntheticData(seed=7).events(200)):
+        operations.extend([{"index": {"_index": service.index, "_id": str(i)}}, event])
+    await fake_es.bulk(operations=operations)
     return service
 
+@pytest.mark.asyncio
 async def test_calculate_security_score(threat_service):
     score = await threat_service.calculate_security_score()
     assert score is not None
     assert "overall_score" in score
-    assert 0 <= score["overall_score"] <= 100
\ No newline at end of file
+    assert 0 <= score["overall_score"] <= 100
+
+@pytest.mark.asyncio
+async def test_security_score_finalizes_closed_days_once(fake_es):
+    service = ThreatDetectionService()
+    await service.initialize(fake_es)
+    events = SyntheticData(seed=8, span=timedelta(days=10)).events(500)
+    operations = []
+    for i, event in enumerate(events):
+        operations.extend([{"index": {"_index": service.index, "_id": str(i)}}, event])
+    await fake_es.bulk(operations=operations)
+
+    score = await service.calculate_security_score(days=7)
+    first_day = (datetime.utcnow().date() - timedelta(days=6)).isoformat()
+    expected = {}
+    for event in events:
+        if event["timestamp"][:10] >= first_day:
+            expected[event["severity"]] = expected.get(event["severity"], 0) + 1
+    assert score["severity_distribution"] == expected
+    assert [day["date"] for day in score["trend"]][0] == first_day
+    assert sum(day["count"] for day in score["trend"]) == sum(expected.values())
+    finalized = await fake_es.count(index="security_score_days")
+    assert finalized["count"] == service.score_partials.max_days
+
+    # Closed days are read from their partials, not aggregated again
+    searches = fake_es.calls["search"]
+    late = {**events[0], "timestamp": (datetime.utcnow() - timedelta(days=3)).isoformat(), "severity": "critical"}
+    await fake_es.index(index=service.index, id="late", document=late)
+    again = await service.calculate_security_score(days=7)
+    assert fake_es.calls["search"] == searches + 1
+    assert again["severity_distribution"] == expected
+
+    # Newer days weigh more with a half-life
+    decayed = await service.calculate_security_score(days=7, half_life_days=1)
+    assert decayed["overall_score"] != pytest.approx(again["overall_score"])
@@ -17,6 +17,11 @@ export const api = {
     return response.json();
   },
 
+  async getDashboardOverview(timeRange: string = '24h') {
+    const response = await fetch(`${API_BASE_URL}/dashboard/overview?time_range=${timeRange}`);
+    return response.json();
+  },
+
   async acknowledgeAlert(alertId: string) {
     const response = await fetch(`${API_BASE_URL}/alerts/${alertId}/acknowledge`, {
       method: 'POST'